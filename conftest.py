@@ -0,0 +1,25 @@
+"""
+Fixtures globais dos testes.
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _limpar_cache():
+    """
+    O cache (locmem) sobrevive ao rollback de cada teste; sem limpar, acessos de
+    tenant e códigos de barras gravados num teste apareceriam em outro com os mesmos ids.
+    """
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def _xml_fiscal_temporario(settings, tmp_path):
+    """XML e PDF fiscais gravados pelos testes (armazenamento, importação, cache) ficam fora de media/."""
+    settings.FISCAL_XML_DIR = str(tmp_path / 'xml_fiscal')
+    settings.FISCAL_XML_DURAVEL = True
+    settings.FISCAL_PDF_DIR = str(tmp_path / 'pdf_fiscal')
+    settings.NFE_IMPORT_TMP_DIR = str(tmp_path / 'nfe_import')
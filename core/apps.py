@@ -6,3 +6,5 @@ class CoreConfig(AppConfig):
     name = 'core'
     verbose_name = 'Core'
 
+    def ready(self):
+        import core.signals  # noqa: F401
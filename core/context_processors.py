@@ -1,8 +1,7 @@
 """
 Variáveis de template para tenant (empresa na sessão).
 """
-from .models import UsuarioEmpresa
-from .tenant import SESSION_KEY
+from .tenant import SESSION_KEY, get_acessos_usuario
 
 
 def tenant_context(request):
@@ -10,8 +9,5 @@ def tenant_context(request):
         return {}
     return {
         'empresa_ativa_session_id': request.session.get(SESSION_KEY),
-        'usuario_empresas_ativas': UsuarioEmpresa.objects.filter(
-            user=request.user,
-            is_active=True,
-        ).select_related('empresa'),
+        'usuario_empresas_ativas': get_acessos_usuario(request),
     }
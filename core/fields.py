@@ -1,9 +1,11 @@
 """
 Campos customizados para LGPD e segurança.
 """
+from django.core.exceptions import FieldError
 from django.db import models
+from django.db.models.expressions import Col
 from typing import Optional
-from core.security.encryption import FieldEncryption
+from core.security.encryption import BlindIndex, FieldEncryption
 
 
 class EncryptedCharField(models.CharField):
@@ -26,6 +28,12 @@ class EncryptedCharField(models.CharField):
         cpf = EncryptedCharField('CPF', max_length=18)
         cliente.cpf = '12345678900'  # Armazenado criptografado
         print(cliente.cpf)  # '12345678900' (descriptografado automaticamente)
+    
+    Busca:
+    - O texto cifrado é aleatório, então filtros como `cpf=` ou `cpf__icontains=`
+      nunca encontram registros. Para busca exata, declare um BlindIndexField
+      apontando para este campo e use o lookup `__blind`:
+      Cliente.objects.filter(cpf_cnpj__blind='123.456.789-00')
     """
     
     def __init__(self, *args, **kwargs):
@@ -89,4 +97,91 @@ class EncryptedCharField(models.CharField):
         
         # Tenta descriptografar (com fallback automático para dados antigos)
         return FieldEncryption.decrypt(str_value)
+    
+    def get_blind_index_field(self) -> Optional['BlindIndexField']:
+        """Retorna o BlindIndexField que indexa este campo no model, se houver."""
+        for field in self.model._meta.concrete_fields:
+            if isinstance(field, BlindIndexField) and field.source == self.name:
+                return field
+        return None
+
+
+class BlindIndexField(models.CharField):
+    """
+    Coluna companheira com o índice cego (HMAC-SHA256) de um EncryptedCharField.
+    
+    O valor é recalculado automaticamente a cada save a partir do campo de origem,
+    então nunca deve ser atribuído manualmente. Ao salvar com update_fields,
+    inclua este campo junto com o campo de origem.
+    
+    Modos de normalização (ver BlindIndex.normalizar):
+    - 'exato': compara o valor como digitado
+    - 'digitos': compara apenas os dígitos (CPF/CNPJ com ou sem máscara)
+    
+    Exemplo:
+        cpf_cnpj = EncryptedCharField('CPF / CNPJ', max_length=255)
+        cpf_cnpj_hash = BlindIndexField('cpf_cnpj', modo='digitos')
+        
+        Cliente.objects.filter(empresa=empresa, cpf_cnpj__blind='123.456.789-00')
+    """
+    
+    MODOS = ('exato', 'digitos')
+    
+    def __init__(self, source: str, *args, modo: str = 'exato', **kwargs):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de índice cego inválido: {modo}")
+        self.source = source
+        self.modo = modo
+        kwargs.setdefault('verbose_name', f'Índice cego ({source})')
+        kwargs['max_length'] = 64
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+    
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        args = [self.source, *args]
+        kwargs['modo'] = self.modo
+        kwargs.pop('max_length', None)
+        return name, path, args, kwargs
+    
+    def calcular(self, value: Optional[str]) -> Optional[str]:
+        """Calcula o índice cego de um valor em texto claro."""
+        return BlindIndex.calcular(value, self.modo)
+    
+    def pre_save(self, model_instance, add):
+        value = self.calcular(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
 
+@EncryptedCharField.register_lookup
+class BlindIndexLookup(models.Lookup):
+    """
+    Lookup `__blind`: busca exata em EncryptedCharField via índice cego.
+    
+    Traduz `cpf_cnpj__blind=valor` em `cpf_cnpj_hash = HMAC(valor)`, usando o
+    índice do banco em vez de descriptografar a tabela inteira.
+    """
+    lookup_name = 'blind'
+    prepare_rhs = False
+    
+    def _blind_index_field(self) -> BlindIndexField:
+        field = self.lhs.output_field
+        blind_field = field.get_blind_index_field() if isinstance(field, EncryptedCharField) else None
+        if blind_field is None:
+            raise FieldError(
+                f"O campo '{field.name}' não possui BlindIndexField; lookup '__blind' indisponível."
+            )
+        return blind_field
+    
+    def get_prep_lookup(self):
+        if hasattr(self.rhs, 'resolve_expression'):
+            raise FieldError("O lookup '__blind' aceita apenas valores literais.")
+        return self._blind_index_field().calcular(self.rhs)
+    
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = compiler.compile(Col(self.lhs.alias, self._blind_index_field()))
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} = {rhs_sql}', (*lhs_params, *rhs_params)
@@ -0,0 +1,167 @@
+"""
+Idempotência de requisições que criam vendas (PDV, tablet, efetivação no balcão).
+
+O cliente gera uma chave por operação (UUID) e a envia no header Idempotency-Key
+ou no campo idempotency_key do corpo JSON; repetir a requisição (timeout, fila
+offline) com a mesma chave não cria outra venda:
+
+- 1ª execução: grava ChaveIdempotencia (PROCESSANDO) e executa a view numa
+  transação junto com a gravação da resposta; sucesso (2xx) vira CONCLUIDA
+- repetição de uma CONCLUIDA: devolve a resposta gravada (header Idempotent-Replayed)
+- repetição enquanto a 1ª ainda executa: 409 (tentar de novo em instantes)
+- mesma chave com outro corpo: 422
+- erro (não 2xx ou exceção): a chave é apagada e o cliente pode repetir
+
+Como a venda e a resposta são gravadas na mesma transação, uma chave PROCESSANDO
+mais antiga que IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO (processo morto no meio) não
+tem venda gravada e é reassumida pela próxima repetição.
+Sem chave, a view executa como antes.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import ChaveIdempotencia
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+CAMPO = 'idempotency_key'
+
+
+def _timeout_processamento():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO', 300))
+
+
+def _eh_drf(request) -> bool:
+    # Request do DRF (viewsets) envolve a HttpRequest em _request
+    return hasattr(request, '_request')
+
+
+def _obter_chave(request, corpo: bytes):
+    chave = request.META.get(HEADER)
+    if not chave and corpo:
+        try:
+            dados = json.loads(corpo)
+        except (ValueError, UnicodeDecodeError):
+            dados = None
+        if isinstance(dados, dict):
+            chave = dados.get(CAMPO)
+    chave = str(chave).strip() if chave else ''
+    return chave[:255] or None
+
+
+def _resposta(request, dados, status, reexecucao=False):
+    if _eh_drf(request):
+        from rest_framework.response import Response
+        resposta = Response(dados, status=status)
+    else:
+        resposta = JsonResponse(dados, status=status, safe=False)
+    if reexecucao:
+        resposta['Idempotent-Replayed'] = 'true'
+    return resposta
+
+
+def _conteudo(resposta):
+    """Corpo JSON da resposta (Response do DRF ou JsonResponse)."""
+    if hasattr(resposta, 'data'):
+        return json.loads(json.dumps(resposta.data, cls=DjangoJSONEncoder))
+    return json.loads(resposta.content)
+
+
+def _reservar(usuario, escopo, chave, hash_requisicao):
+    """
+    Cria a chave (PROCESSANDO). Devolve (registro, None) se esta requisição deve
+    executar a view, ou (None, resposta_pronta) caso contrário.
+    """
+    try:
+        with transaction.atomic():
+            return ChaveIdempotencia.objects.create(
+                usuario=usuario,
+                escopo=escopo,
+                chave=chave,
+                hash_requisicao=hash_requisicao,
+            ), None
+    except IntegrityError:
+        pass
+
+    existente = ChaveIdempotencia.objects.filter(usuario=usuario, escopo=escopo, chave=chave).first()
+    if existente is None:
+        # Apagada entre o INSERT e a leitura (1ª execução falhou): tenta de novo
+        return _reservar(usuario, escopo, chave, hash_requisicao)
+    if existente.hash_requisicao != hash_requisicao:
+        return None, (
+            {'erro': 'Chave de idempotência já usada com outra requisição.'}, 422,
+        )
+    if existente.status == 'CONCLUIDA':
+        return None, (existente.resposta, existente.status_http)
+
+    # PROCESSANDO: só reassume se a execução anterior morreu (UPDATE condicional)
+    if existente.updated_at < timezone.now() - _timeout_processamento():
+        reassumida = ChaveIdempotencia.objects.filter(
+            pk=existente.pk,
+            status='PROCESSANDO',
+            updated_at=existente.updated_at,
+        ).update(updated_at=timezone.now())
+        if reassumida:
+            logger.warning('Chave de idempotência %s (%s) reassumida após timeout', chave, escopo)
+            return existente, None
+    return None, (
+        {'erro': 'Requisição com esta chave ainda em processamento. Tente novamente em instantes.'}, 409,
+    )
+
+
+def idempotente(escopo: str):
+    """
+    Decorator de views (função ou, com method_decorator, métodos de viewsets DRF)
+    que devolvem JSON.
+
+    Uso:
+        @login_required
+        @require_http_methods(["POST"])
+        @idempotente('pdv.finalizar_venda')
+        def finalizar_venda(request): ...
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            corpo = request.body
+            chave = _obter_chave(request, corpo)
+            if not chave or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            hash_requisicao = hashlib.sha256(corpo).hexdigest()
+            registro, pronta = _reservar(request.user, escopo, chave, hash_requisicao)
+            if registro is None:
+                dados, status = pronta
+                resposta = _resposta(request, dados, status, reexecucao=(status < 400))
+                if status == 409:
+                    resposta['Retry-After'] = '1'
+                return resposta
+
+            concluida = False
+            try:
+                with transaction.atomic():
+                    resposta = view(request, *args, **kwargs)
+                    if 200 <= resposta.status_code < 300:
+                        registro.status = 'CONCLUIDA'
+                        registro.status_http = resposta.status_code
+                        registro.resposta = _conteudo(resposta)
+                        registro.save(update_fields=['status', 'status_http', 'resposta', 'updated_at'])
+                        concluida = True
+            finally:
+                if not concluida:
+                    ChaveIdempotencia.objects.filter(pk=registro.pk).delete()
+            return resposta
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,37 @@
+"""
+Remove chaves de idempotência (ChaveIdempotencia) antigas.
+
+Depois de alguns dias o cliente não reenvia mais a mesma operação; a chave só
+ocupa espaço. Rodar periodicamente (cron/celery beat).
+
+Uso:
+  python manage.py limpar_chaves_idempotencia
+  python manage.py limpar_chaves_idempotencia --dias 3
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Remove chaves de idempotência mais antigas que N dias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=7,
+            help='Idade mínima em dias para remoção (padrão: 7)',
+        )
+
+    def handle(self, *args, **options):
+        from core.models import ChaveIdempotencia
+
+        dias = options['dias']
+        removidas, _ = ChaveIdempotencia.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=dias),
+        ).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Removidas {removidas} chave(s) de idempotência com mais de {dias} dia(s)')
+        )
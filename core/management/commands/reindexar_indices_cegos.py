@@ -0,0 +1,82 @@
+"""
+Recalcula os índices cegos (BlindIndexField) de todos os models.
+
+Necessário após importar dados com bulk_update/SQL direto, trocar BLIND_INDEX_KEY
+ou rotacionar ENCRYPTION_KEY sem BLIND_INDEX_KEY configurada.
+
+Uso:
+  python manage.py reindexar_indices_cegos
+  python manage.py reindexar_indices_cegos --dry-run --batch-size 1000
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.fields import BlindIndexField
+from core.security.encryption import BlindIndex
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os índices cegos (HMAC) dos campos criptografados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Quantidade de registros por lote (padrão: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas conta os registros desatualizados, sem gravar',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        BlindIndex.get_key.cache_clear()
+
+        total = 0
+        for model in apps.get_models():
+            campos = [f for f in model._meta.concrete_fields if isinstance(f, BlindIndexField)]
+            if not campos:
+                continue
+            atualizados = self._reindexar_model(model, campos, batch_size, dry_run)
+            total += atualizados
+            self.stdout.write(f'{model._meta.label}: {atualizados} registro(s) desatualizado(s)')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'Simulação: {total} registro(s) seriam atualizados.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} registro(s) reindexado(s).'))
+
+    def _reindexar_model(self, model, campos, batch_size, dry_run):
+        """Recalcula os índices de um model em lotes, gravando só os que mudaram."""
+        nomes = [f.attname for f in campos]
+        origens = [f.source for f in campos]
+        atualizados = 0
+        lote = []
+
+        queryset = model._base_manager.only('pk', *origens, *nomes).order_by('pk')
+        for obj in queryset.iterator(chunk_size=batch_size):
+            mudou = False
+            for campo in campos:
+                novo = campo.calcular(getattr(obj, campo.source))
+                if getattr(obj, campo.attname) != novo:
+                    setattr(obj, campo.attname, novo)
+                    mudou = True
+            if mudou:
+                lote.append(obj)
+            if len(lote) >= batch_size:
+                atualizados += self._gravar(model, lote, nomes, dry_run)
+                lote = []
+        if lote:
+            atualizados += self._gravar(model, lote, nomes, dry_run)
+        return atualizados
+
+    def _gravar(self, model, lote, nomes, dry_run):
+        if not dry_run:
+            with transaction.atomic():
+                model._base_manager.bulk_update(lote, nomes)
+        return len(lote)
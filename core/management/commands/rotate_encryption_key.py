@@ -12,8 +12,8 @@ from django.apps import apps
 import os
 from datetime import datetime
 
-from core.security.encryption import FieldEncryption
-from core.fields import EncryptedCharField
+from core.security.encryption import BlindIndex, FieldEncryption
+from core.fields import BlindIndexField, EncryptedCharField
 
 
 class Command(BaseCommand):
@@ -105,8 +105,9 @@ class Command(BaseCommand):
             old_key = settings.ENCRYPTION_KEY
             settings.ENCRYPTION_KEY = new_key
             
-            # Limpa cache do cipher para usar nova chave
+            # Limpa cache do cipher (e da chave do índice cego, derivada dela) para usar nova chave
             FieldEncryption.get_cipher.cache_clear()
+            BlindIndex.get_key.cache_clear()
             
             total_updated = 0
             
@@ -118,7 +119,8 @@ class Command(BaseCommand):
                     self.stdout.write(f'\nProcessando {model.__name__}...')
                     
                     updated_count = self._rotate_model_fields(
-                        model, fields, dry_run=dry_run
+                        model, fields, dry_run=dry_run,
+                        blind_index_fields=model_info['blind_index_fields'],
                     )
                     total_updated += updated_count
                     
@@ -141,6 +143,7 @@ class Command(BaseCommand):
                 # Restaura chave original em dry-run
                 settings.ENCRYPTION_KEY = old_key
                 FieldEncryption.get_cipher.cache_clear()
+                BlindIndex.get_key.cache_clear()
                 self.stdout.write(self.style.SUCCESS(
                     f'\n✓ Simulação concluída! {total_updated} registro(s) seriam atualizados.'
                 ))
@@ -150,6 +153,7 @@ class Command(BaseCommand):
             if not dry_run:
                 settings.ENCRYPTION_KEY = old_key
                 FieldEncryption.get_cipher.cache_clear()
+                BlindIndex.get_key.cache_clear()
                 self.stdout.write(self.style.ERROR(
                     f'\n✗ Erro durante rotação: {str(e)}'
                 ))
@@ -169,21 +173,31 @@ class Command(BaseCommand):
             
             for model in app_config.get_models():
                 encrypted_fields = []
+                blind_index_fields = []
                 
                 for field in model._meta.get_fields():
                     if isinstance(field, EncryptedCharField):
                         encrypted_fields.append(field.name)
+                    elif isinstance(field, BlindIndexField):
+                        blind_index_fields.append(field.name)
                 
                 if encrypted_fields:
                     models_with_encrypted.append({
                         'model': model,
                         'fields': encrypted_fields,
+                        'blind_index_fields': blind_index_fields,
                     })
         
         return models_with_encrypted
     
-    def _rotate_model_fields(self, model: Model, field_names: list, dry_run: bool = False):
-        """Re-criptografa campos de um model com a nova chave."""
+    def _rotate_model_fields(self, model: Model, field_names: list, dry_run: bool = False,
+                             blind_index_fields: list = None):
+        """
+        Re-criptografa campos de um model com a nova chave.
+        
+        Os índices cegos (BlindIndexField) são salvos junto, pois sua chave HMAC
+        é derivada de ENCRYPTION_KEY quando BLIND_INDEX_KEY não está configurada.
+        """
         updated_count = 0
         
         # Busca todos os registros do model
@@ -208,7 +222,7 @@ class Command(BaseCommand):
                         pass
             
             if needs_update and not dry_run:
-                instance.save(update_fields=field_names)
+                instance.save(update_fields=field_names + (blind_index_fields or []))
                 updated_count += 1
             elif needs_update and dry_run:
                 updated_count += 1
@@ -1,8 +1,8 @@
 """
-Middleware: sugere empresa padrão na sessão após login quando ainda vazia.
+Middleware: sugere empresa padrão na sessão após login quando ainda vazia e
+anexa a empresa ativa à request (request.empresa; None se não houver/permitida).
 """
-from .models import UsuarioEmpresa
-from .tenant import SESSION_KEY
+from .tenant import SESSION_KEY, get_acessos_usuario, resolver_empresa_ativa
 
 
 class EmpresaAtivaMiddleware:
@@ -10,17 +10,15 @@ class EmpresaAtivaMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated and not request.session.get(SESSION_KEY):
-            padrao = (
-                UsuarioEmpresa.objects.filter(
-                    user=request.user,
-                    empresa_padrao=True,
-                    is_active=True,
+        request.empresa = None
+        if request.user.is_authenticated:
+            if not request.session.get(SESSION_KEY):
+                padrao = next(
+                    (acesso for acesso in get_acessos_usuario(request) if acesso.empresa_padrao),
+                    None,
                 )
-                .select_related('empresa')
-                .first()
-            )
-            if padrao:
-                request.session[SESSION_KEY] = padrao.empresa_id
+                if padrao:
+                    request.session[SESSION_KEY] = padrao.empresa_id
+            request.empresa = resolver_empresa_ativa(request)
 
         return self.get_response(request)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_add_codigo_ibge_municipio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Data de atualização')),
+                ('escopo', models.CharField(help_text='Endpoint protegido (ex.: pdv.finalizar_venda)', max_length=100, verbose_name='Escopo')),
+                ('chave', models.CharField(max_length=255, verbose_name='Chave')),
+                ('hash_requisicao', models.CharField(max_length=64, verbose_name='Hash da Requisição')),
+                ('status', models.CharField(choices=[('PROCESSANDO', 'Processando'), ('CONCLUIDA', 'Concluída')], default='PROCESSANDO', max_length=20, verbose_name='Status')),
+                ('status_http', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Status HTTP')),
+                ('resposta', models.JSONField(blank=True, null=True, verbose_name='Resposta')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chaves_idempotencia', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Chave de Idempotência',
+                'verbose_name_plural': 'Chaves de Idempotência',
+                'indexes': [models.Index(fields=['created_at'], name='core_chavei_created_dc2780_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'escopo', 'chave'), name='chave_idempotencia_unica')],
+            },
+        ),
+    ]
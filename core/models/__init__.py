@@ -2,6 +2,7 @@ from .base import TimeStampedModel, BaseModel
 from .audit import AuditLog
 from .empresa import Empresa, Loja
 from .guia import GuiaUso
+from .idempotencia import ChaveIdempotencia
 from .usuario_empresa import UsuarioEmpresa
 
 __all__ = [
@@ -11,6 +12,7 @@ __all__ = [
     'Empresa',
     'Loja',
     'GuiaUso',
+    'ChaveIdempotencia',
     'UsuarioEmpresa',
 ]
 
@@ -0,0 +1,50 @@
+"""
+Chaves de idempotência para requisições que criam vendas (core/idempotencia.py).
+"""
+from django.conf import settings
+from django.db import models
+
+from .base import TimeStampedModel
+
+
+class ChaveIdempotencia(TimeStampedModel):
+    """
+    Primeira execução de uma requisição com chave de idempotência.
+
+    A constraint única (usuário, escopo, chave) garante uma única execução: a
+    resposta de sucesso fica gravada e é devolvida às repetições da requisição.
+    """
+
+    STATUS_CHOICES = [
+        ('PROCESSANDO', 'Processando'),
+        ('CONCLUIDA', 'Concluída'),
+    ]
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chaves_idempotencia',
+        verbose_name='Usuário',
+    )
+    escopo = models.CharField('Escopo', max_length=100, help_text='Endpoint protegido (ex.: pdv.finalizar_venda)')
+    chave = models.CharField('Chave', max_length=255)
+    hash_requisicao = models.CharField('Hash da Requisição', max_length=64)
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='PROCESSANDO')
+    status_http = models.PositiveSmallIntegerField('Status HTTP', blank=True, null=True)
+    resposta = models.JSONField('Resposta', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Chave de Idempotência'
+        verbose_name_plural = 'Chaves de Idempotência'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'escopo', 'chave'],
+                name='chave_idempotencia_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.escopo} {self.chave} ({self.status})'
@@ -1,9 +1,9 @@
 """
 Módulo de segurança para criptografia de dados sensíveis (LGPD).
 """
-from .encryption import FieldEncryption
+from .encryption import BlindIndex, FieldEncryption
 
-__all__ = ['FieldEncryption']
+__all__ = ['BlindIndex', 'FieldEncryption']
 
 
 
@@ -8,6 +8,7 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 import base64
 import hashlib
+import hmac
 from functools import lru_cache
 from typing import Optional
 
@@ -111,4 +112,67 @@ class FieldEncryption:
             return encrypted_value
 
 
-
+class BlindIndex:
+    """
+    Índice cego (blind index) para busca em campos criptografados.
+    
+    O Fernet gera um IV aleatório a cada criptografia, então o mesmo CPF produz
+    textos cifrados diferentes e nenhuma busca por igualdade funciona. O índice
+    cego é um HMAC-SHA256 determinístico do valor (opcionalmente normalizado),
+    gravado em coluna própria e indexável, que permite busca exata sem expor o
+    valor original.
+    
+    A chave vem de settings.BLIND_INDEX_KEY; se não configurada, é derivada de
+    ENCRYPTION_KEY com separação de domínio (nunca reutiliza a chave Fernet).
+    """
+    
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def get_key() -> bytes:
+        """
+        Retorna a chave HMAC do índice cego (cacheada com lru_cache).
+        
+        Raises:
+            ImproperlyConfigured: Se nem BLIND_INDEX_KEY nem ENCRYPTION_KEY estiverem configuradas
+        """
+        blind_key = getattr(settings, 'BLIND_INDEX_KEY', None)
+        if blind_key:
+            return blind_key.encode('utf-8') if isinstance(blind_key, str) else blind_key
+        
+        encryption_key = getattr(settings, 'ENCRYPTION_KEY', None)
+        if not encryption_key:
+            raise ImproperlyConfigured(
+                'BLIND_INDEX_KEY/ENCRYPTION_KEY não estão configuradas nas settings.'
+            )
+        if isinstance(encryption_key, str):
+            encryption_key = encryption_key.encode('utf-8')
+        return hmac.new(encryption_key, b'guardiao-aladin:blind-index', hashlib.sha256).digest()
+    
+    @staticmethod
+    def normalizar(value: str, modo: str = 'exato') -> str:
+        """
+        Normaliza o valor antes do HMAC.
+        
+        Modos:
+        - 'exato': apenas remove espaços nas extremidades
+        - 'digitos': mantém somente dígitos (CPF/CNPJ/telefone com ou sem máscara)
+        """
+        value = str(value).strip()
+        if modo == 'digitos':
+            return ''.join(ch for ch in value if ch.isdigit())
+        return value
+    
+    @classmethod
+    def calcular(cls, value: Optional[str], modo: str = 'exato') -> Optional[str]:
+        """
+        Calcula o índice cego (hex, 64 caracteres) de um valor.
+        
+        Returns:
+            Hash hexadecimal, ou None se o valor normalizado for vazio
+        """
+        if value is None:
+            return None
+        normalizado = cls.normalizar(value, modo)
+        if not normalizado:
+            return None
+        return hmac.new(cls.get_key(), normalizado.encode('utf-8'), hashlib.sha256).hexdigest()
@@ -0,0 +1,23 @@
+"""
+Signals do módulo core.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Empresa, UsuarioEmpresa
+from .tenant import invalidar_acessos_usuario
+
+
+@receiver(post_save, sender=UsuarioEmpresa)
+@receiver(post_delete, sender=UsuarioEmpresa)
+def invalidar_cache_acessos(sender, instance, **kwargs):
+    invalidar_acessos_usuario(instance.user_id)
+
+
+@receiver(post_save, sender=Empresa)
+@receiver(post_delete, sender=Empresa)
+def invalidar_cache_acessos_empresa(sender, instance, **kwargs):
+    """Dados da empresa também ficam no cache de acessos de cada usuário vinculado."""
+    user_ids = UsuarioEmpresa.objects.filter(empresa_id=instance.pk).values_list('user_id', flat=True)
+    for user_id in set(user_ids):
+        invalidar_acessos_usuario(user_id)
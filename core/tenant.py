@@ -1,12 +1,140 @@
 """
 Utilitários para contexto de tenant (empresa ativa na sessão).
+
+Os acessos do usuário (UsuarioEmpresa + Empresa) ficam no cache do Django, numa
+chave versionada por usuário (tenant:acessos:<user_id>:<versao>), e são lidos no
+máximo uma vez por request. Os signals de UsuarioEmpresa e Empresa (core/signals.py)
+trocam a versão do usuário, então uma alteração de acesso vale na request seguinte.
+
+A troca de versão só alcança os outros workers com cache compartilhado (REDIS_URL).
+Em memória local (LocMemCache) cada processo tem sua cópia, e a revogação de um
+acesso depende da validade da entrada: TENANT_CACHE_TIMEOUT é de poucos segundos
+nesse caso (settings.CACHE_COMPARTILHADO).
+
+Campos criptografados (EncryptedCharField) vão para o cache cifrados, como no banco.
 """
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
 
+from .fields import EncryptedCharField
 from .models import Empresa, UsuarioEmpresa
 
 SESSION_KEY = 'empresa_ativa_id'
 
+# Atributo de memoização na request
+_ATTR_ACESSOS = '_tenant_acessos'
+
+
+def _timeout():
+    return getattr(settings, 'TENANT_CACHE_TIMEOUT', 3600 if getattr(settings, 'CACHE_COMPARTILHADO', False) else 5)
+
+
+def _chave_versao(user_id) -> str:
+    return f'tenant:versao:{user_id}'
+
+
+def _versao(user_id):
+    versao = cache.get(_chave_versao(user_id))
+    if versao is None:
+        # Sem versão (cache limpo/expirado): começa uma nova, sem reaproveitar entradas antigas
+        cache.add(_chave_versao(user_id), time.time_ns(), None)
+        versao = cache.get(_chave_versao(user_id))
+    return versao
+
+
+def _incrementar_versao(user_id):
+    try:
+        cache.incr(_chave_versao(user_id))
+    except ValueError:
+        cache.set(_chave_versao(user_id), time.time_ns(), None)
+
+
+def invalidar_acessos_usuario(user_id):
+    """
+    Descarta os acessos em cache do usuário. Repete após o commit para descartar
+    valores regravados por requests concorrentes à transação.
+    """
+    _incrementar_versao(user_id)
+    transaction.on_commit(lambda: _incrementar_versao(user_id))
+
+
+def _serializar(instancia) -> dict:
+    dados = {}
+    for campo in instancia._meta.concrete_fields:
+        valor = getattr(instancia, campo.attname)
+        if isinstance(campo, EncryptedCharField):
+            valor = campo.get_prep_value(valor)
+        dados[campo.attname] = valor
+    return dados
+
+
+def _restaurar(modelo, dados: dict):
+    valores = []
+    for campo in modelo._meta.concrete_fields:
+        valor = dados[campo.attname]
+        if isinstance(campo, EncryptedCharField):
+            valor = campo.from_db_value(valor, None, None)
+        valores.append(valor)
+    return modelo.from_db('default', None, valores)
+
+
+def _carregar_acessos(user_id) -> List[UsuarioEmpresa]:
+    chave = f'tenant:acessos:{user_id}:{_versao(user_id)}'
+    dados = cache.get(chave)
+    if dados is None:
+        acessos = list(
+            UsuarioEmpresa.objects.filter(user_id=user_id, is_active=True)
+            .select_related('empresa')
+            .order_by('empresa__nome_fantasia', 'pk')
+        )
+        dados = [(_serializar(acesso), _serializar(acesso.empresa)) for acesso in acessos]
+        cache.set(chave, dados, _timeout())
+        return acessos
+
+    acessos = []
+    for dados_acesso, dados_empresa in dados:
+        acesso = _restaurar(UsuarioEmpresa, dados_acesso)
+        acesso.empresa = _restaurar(Empresa, dados_empresa)
+        acessos.append(acesso)
+    return acessos
+
+
+def get_acessos_usuario(request) -> List[UsuarioEmpresa]:
+    """
+    Acessos ativos do usuário (UsuarioEmpresa com .empresa carregada), ordenados pelo
+    nome da empresa. Memoizado na request; sem consultas ao banco com o cache quente.
+    """
+    if not getattr(request.user, 'is_authenticated', False):
+        return []
+    # Guarda o usuário junto: a Request do DRF lê atributos da HttpRequest, cujo
+    # usuário (sessão) pode ser outro que o autenticado pela API
+    memo = getattr(request, _ATTR_ACESSOS, None)
+    if memo is None or memo[0] != request.user.pk:
+        memo = (request.user.pk, _carregar_acessos(request.user.pk))
+        setattr(request, _ATTR_ACESSOS, memo)
+    return memo[1]
+
+
+def _acesso_da_empresa(request, empresa_id) -> Optional[UsuarioEmpresa]:
+    for acesso in get_acessos_usuario(request):
+        if acesso.empresa_id == empresa_id:
+            return acesso
+    return None
+
+
+def resolver_empresa_ativa(request) -> Optional[Empresa]:
+    """Empresa ativa na sessão, se permitida ao usuário; None caso contrário."""
+    empresa_id = request.session.get(SESSION_KEY)
+    if not empresa_id:
+        return None
+    acesso = _acesso_da_empresa(request, empresa_id)
+    return acesso.empresa if acesso else None
+
 
 def get_empresa_ativa(request):
     """
@@ -17,33 +145,24 @@ def get_empresa_ativa(request):
     if not empresa_id:
         raise PermissionDenied('Nenhuma empresa selecionada na sessão.')
 
-    permitidas = set(
-        UsuarioEmpresa.objects.filter(
-            user=request.user,
-            is_active=True,
-        ).values_list('empresa_id', flat=True)
-    )
-
-    if empresa_id not in permitidas:
+    empresa = resolver_empresa_ativa(request)
+    if empresa is None:
         raise PermissionDenied('Empresa não permitida para este usuário.')
 
-    return Empresa.objects.get(pk=empresa_id)
+    return empresa
 
 
 def set_empresa_ativa(request, empresa_id):
     """
     Define a empresa ativa na sessão após validar permissão.
     """
-    permitida = UsuarioEmpresa.objects.filter(
-        user=request.user,
-        empresa_id=empresa_id,
-        is_active=True,
-    ).exists()
+    acesso = _acesso_da_empresa(request, empresa_id)
 
-    if not permitida:
+    if acesso is None:
         raise PermissionDenied('Empresa não permitida para este usuário.')
 
     request.session[SESSION_KEY] = empresa_id
+    request.empresa = acesso.empresa
 
 
 def get_empresas_permitidas(request):
@@ -193,3 +193,129 @@ class TestIdorEmpresaAtiva:
         lojas_ctx = response.context['lojas']
         assert all(l.empresa_id == emp_a.id for l in lojas_ctx)
 
+
+@pytest.mark.django_db
+class TestCacheAcessosTenant:
+    """Acessos do usuário em cache versionado: sem consultas com o cache quente."""
+
+    @pytest.fixture
+    def empresa(self):
+        return Empresa.objects.create(
+            nome_fantasia='Empresa Cache',
+            razao_social='Empresa Cache LTDA',
+            cnpj='22222222000191',
+        )
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user('tenant_cache', password='pass12345')
+
+    def _request(self, rf, user, empresa_id):
+        request = rf.get('/')
+        request.user = user
+        _add_session(request)
+        request.session[SESSION_KEY] = empresa_id
+        return request
+
+    def test_cache_quente_sem_consultas(self, rf, user, empresa, django_assert_num_queries):
+        UsuarioEmpresa.objects.create(user=user, empresa=empresa, perfil='OPERADOR')
+        get_empresa_ativa(self._request(rf, user, empresa.id))
+
+        request = self._request(rf, user, empresa.id)
+        with django_assert_num_queries(0):
+            for _ in range(3):
+                ativa = get_empresa_ativa(request)
+        assert ativa.pk == empresa.pk
+        assert ativa.cnpj == '22222222000191'
+
+    def test_cnpj_cifrado_no_cache(self, rf, user, empresa):
+        from django.core.cache import cache
+
+        UsuarioEmpresa.objects.create(user=user, empresa=empresa, perfil='OPERADOR')
+        get_empresa_ativa(self._request(rf, user, empresa.id))
+        valores = [repr(cache.get(chave)) for chave in cache._cache]
+        assert not any('22222222000191' in v for v in valores)
+
+    def test_vinculo_desativado_invalida_cache(self, rf, user, empresa):
+        acesso = UsuarioEmpresa.objects.create(user=user, empresa=empresa, perfil='OPERADOR')
+        get_empresa_ativa(self._request(rf, user, empresa.id))
+
+        acesso.is_active = False
+        acesso.save()
+        with pytest.raises(PermissionDenied):
+            get_empresa_ativa(self._request(rf, user, empresa.id))
+
+    def test_revogacao_em_outro_worker_vale_apos_a_validade(self, rf, user, empresa, settings):
+        import time
+        from unittest import mock
+
+        settings.TENANT_CACHE_TIMEOUT = 5
+        UsuarioEmpresa.objects.create(user=user, empresa=empresa, perfil='OPERADOR')
+        get_empresa_ativa(self._request(rf, user, empresa.id))
+
+        # update() não dispara o signal: como uma revogação feita em outro worker com LocMemCache
+        UsuarioEmpresa.objects.filter(user=user).update(is_active=False)
+        assert get_empresa_ativa(self._request(rf, user, empresa.id)).pk == empresa.pk
+        with mock.patch('time.time', return_value=time.time() + 6):
+            with pytest.raises(PermissionDenied):
+                get_empresa_ativa(self._request(rf, user, empresa.id))
+
+    def test_empresa_alterada_invalida_cache(self, rf, user, empresa):
+        UsuarioEmpresa.objects.create(user=user, empresa=empresa, perfil='OPERADOR')
+        get_empresa_ativa(self._request(rf, user, empresa.id))
+
+        empresa.nome_fantasia = 'Empresa Renomeada'
+        empresa.save()
+        assert get_empresa_ativa(self._request(rf, user, empresa.id)).nome_fantasia == 'Empresa Renomeada'
+
+    def test_middleware_anexa_empresa_na_request(self, client, user, empresa):
+        UsuarioEmpresa.objects.create(user=user, empresa=empresa, perfil='OPERADOR', empresa_padrao=True)
+        client.force_login(user)
+        response = client.get('/')
+        assert response.wsgi_request.empresa.pk == empresa.pk
+
+
+@pytest.mark.django_db
+class TestIdempotencia:
+    """Decorator idempotente em views Django (JsonResponse)."""
+
+    def _view(self, chamadas, status=200):
+        from django.http import JsonResponse
+
+        from .idempotencia import idempotente
+
+        @idempotente('teste.view')
+        def view(request):
+            chamadas.append(1)
+            return JsonResponse({'chamada': len(chamadas)}, status=status)
+
+        return view
+
+    def _post(self, rf, user, corpo='{"idempotency_key": "k1", "valor": 1}'):
+        request = rf.post('/x/', corpo, content_type='application/json')
+        request.user = user
+        return request
+
+    def test_chave_no_corpo_reexecuta_resposta_gravada(self, rf):
+        user = User.objects.create_user('idem_user', password='pass12345')
+        chamadas = []
+        view = self._view(chamadas)
+        primeira = view(self._post(rf, user))
+        repetida = view(self._post(rf, user))
+        assert len(chamadas) == 1
+        assert repetida.content == primeira.content
+        assert repetida['Idempotent-Replayed'] == 'true'
+
+    def test_sem_chave_ou_com_erro_executa_sempre(self, rf):
+        from .models import ChaveIdempotencia
+
+        user = User.objects.create_user('idem_user', password='pass12345')
+        chamadas = []
+        view = self._view(chamadas)
+        view(self._post(rf, user, '{"valor": 1}'))
+        view(self._post(rf, user, '{"valor": 1}'))
+        assert len(chamadas) == 2
+
+        com_erro = self._view(chamadas, status=400)
+        com_erro(self._post(rf, user))
+        assert not ChaveIdempotencia.objects.exists()
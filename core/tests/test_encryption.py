@@ -3,13 +3,14 @@ Testes para o sistema de criptografia LGPD.
 """
 import pytest
 from django.test import TestCase, override_settings
-from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import FieldError, ImproperlyConfigured
 from django.db import models
 from django.contrib.auth import get_user_model
 
-from core.security.encryption import FieldEncryption
+from core.security.encryption import BlindIndex, FieldEncryption
 from core.fields import EncryptedCharField
 from core.models import Empresa, Loja
+from pessoas.models import Cliente
 
 User = get_user_model()
 
@@ -201,3 +202,93 @@ class TestEncryptedCharField(TestCase):
         field = EncryptedCharField('Test Field', max_length=100)
         self.assertEqual(field.max_length, 100)
 
+
+class TestBlindIndex(TestCase):
+    """Testes para o índice cego (busca exata em campos criptografados)."""
+    
+    def setUp(self):
+        BlindIndex.get_key.cache_clear()
+        self.addCleanup(BlindIndex.get_key.cache_clear)
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='Teste Empresa',
+            razao_social='Teste Empresa LTDA',
+            cnpj='12345678000190',
+        )
+    
+    def test_calculo_deterministico_e_normalizado(self):
+        """Mesmo documento com ou sem máscara gera o mesmo índice."""
+        h1 = BlindIndex.calcular('123.456.789-00', 'digitos')
+        h2 = BlindIndex.calcular('12345678900', 'digitos')
+        self.assertEqual(h1, h2)
+        self.assertEqual(len(h1), 64)
+        self.assertNotEqual(BlindIndex.calcular('123.456.789-00'), h2)
+        self.assertIsNone(BlindIndex.calcular('', 'digitos'))
+        self.assertIsNone(BlindIndex.calcular(None))
+    
+    def test_chave_dedicada_muda_indice(self):
+        """BLIND_INDEX_KEY, quando configurada, substitui a chave derivada."""
+        h_derivada = BlindIndex.calcular('12345678900')
+        with override_settings(BLIND_INDEX_KEY='outra-chave-de-indice-cego'):
+            BlindIndex.get_key.cache_clear()
+            self.assertNotEqual(BlindIndex.calcular('12345678900'), h_derivada)
+    
+    def test_lookup_blind_encontra_cliente(self):
+        """cpf_cnpj__blind encontra o cliente apesar do texto cifrado aleatório."""
+        cliente = Cliente.objects.create(
+            empresa=self.empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Fulano',
+            cpf_cnpj='123.456.789-00',
+        )
+        self.assertIsNotNone(cliente.cpf_cnpj_hash)
+        
+        encontrados = Cliente.objects.filter(empresa=self.empresa, cpf_cnpj__blind='12345678900')
+        self.assertEqual(list(encontrados), [cliente])
+        self.assertFalse(Cliente.objects.filter(cpf_cnpj__blind='99999999999').exists())
+    
+    def test_consumidor_final_reutiliza_o_cliente(self):
+        """Cliente.consumidor_final cria o 'Consumidor Final' uma vez e depois o reutiliza."""
+        clientes = {Cliente.consumidor_final(self.empresa) for _ in range(3)}
+        self.assertEqual(len(clientes), 1)
+        cliente = clientes.pop()
+        self.assertEqual((cliente.nome_razao_social, cliente.cpf_cnpj), ('Consumidor Final', '00000000000'))
+        self.assertEqual(Cliente.objects.filter(empresa=self.empresa).count(), 1)
+    
+    def test_consumidor_final_com_duplicados_antigos(self):
+        """Com vários 'Consumidor Final' (mesmo índice cego), usa o mais antigo sem erro."""
+        duplicados = [
+            Cliente.objects.create(
+                empresa=self.empresa,
+                tipo_pessoa='PF',
+                nome_razao_social='Consumidor Final',
+                cpf_cnpj='00000000000',
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual(Cliente.consumidor_final(self.empresa), duplicados[0])
+        self.assertEqual(Cliente.objects.filter(empresa=self.empresa).count(), 2)
+
+        outra = Empresa.objects.create(
+            nome_fantasia='Outra', razao_social='Outra LTDA', cnpj='11222333000181',
+        )
+        criado = Cliente.consumidor_final(outra)
+        self.assertEqual((criado.empresa, criado.cpf_cnpj), (outra, '00000000000'))
+        self.assertEqual(Cliente.consumidor_final(outra), criado)
+    
+    def test_indice_atualizado_ao_alterar_documento(self):
+        """Alterar o documento recalcula o índice no save."""
+        cliente = Cliente.objects.create(
+            empresa=self.empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Fulano',
+            cpf_cnpj='11111111111',
+        )
+        cliente.cpf_cnpj = '22222222222'
+        cliente.save()
+        self.assertFalse(Cliente.objects.filter(cpf_cnpj__blind='11111111111').exists())
+        self.assertTrue(Cliente.objects.filter(cpf_cnpj__blind='22222222222').exists())
+    
+    def test_lookup_sem_indice_gera_erro(self):
+        """Campos sem BlindIndexField não aceitam __blind."""
+        with self.assertRaises(FieldError):
+            list(Empresa.objects.filter(cnpj__blind='12345678000190'))
@@ -6,7 +6,6 @@ from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Sum, Q
-from django.db.models.functions import TruncDate, ExtractMonth
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
@@ -127,24 +126,22 @@ def dashboard(request):
     
     # ========== DADOS PARA GRÁFICOS ==========
     
+    # Gráficos de vendas: fato VendaDiaria (faturados) + pedidos ABERTO, sem varrer os itens
+    from vendas.venda_diaria import top_produtos, valor_por_dia
+
     # 1. VENDAS DOS ÚLTIMOS 7 DIAS (incluindo hoje)
     sete_dias_atras = hoje - timedelta(days=6)  # 7 dias incluindo hoje
     
+    # 2. FATURAMENTO MENSAL DO ANO
+    ano_atual = datetime.now().year
+    primeiro_dia_ano = datetime(ano_atual, 1, 1).date()
+    
     try:
-        vendas_7_dias = PedidoVenda.objects.filter(
-            is_active=True,
-            loja__empresa=empresa,
-            data_emissao__date__gte=sete_dias_atras,
-            data_emissao__date__lte=hoje,
-            status__in=['ABERTO', 'FATURADO']
-        ).annotate(
-            dia=TruncDate('data_emissao')
-        ).values('dia').annotate(
-            total=Sum('valor_total')
-        ).order_by('dia')
-        
-        # Criar dicionário para facilitar busca
-        vendas_dict = {v['dia']: float(v['total'] or 0) for v in vendas_7_dias}
+        vendas_dict = valor_por_dia(
+            empresa,
+            desde=min(sete_dias_atras, primeiro_dia_ano),
+            incluir_abertos=True,
+        )
         
         # Preencher todos os 7 dias (mesmo os sem vendas)
         labels_vendas = []
@@ -155,36 +152,22 @@ def dashboard(request):
             dia = sete_dias_atras + timedelta(days=i)
             dia_semana = dias_semana[dia.weekday()]
             labels_vendas.append(f"{dia_semana} {dia.day:02d}")
-            dados_vendas.append(vendas_dict.get(dia, 0))
-    except Exception as e:
-        # Em caso de erro, retorna arrays vazios
-        labels_vendas = []
-        dados_vendas = []
-    
-    # 2. FATURAMENTO MENSAL DO ANO
-    ano_atual = datetime.now().year
-    primeiro_dia_ano = datetime(ano_atual, 1, 1).date()
-    
-    try:
-        faturamento_mensal = PedidoVenda.objects.filter(
-            is_active=True,
-            loja__empresa=empresa,
-            data_emissao__date__gte=primeiro_dia_ano,
-            status__in=['ABERTO', 'FATURADO']
-        ).annotate(
-            mes=ExtractMonth('data_emissao')
-        ).values('mes').annotate(
-            total=Sum('valor_total')
-        ).order_by('mes')
+            dados_vendas.append(float(vendas_dict.get(dia, 0)))
         
-        # Criar dicionário de faturamento
-        faturamento_dict = {f['mes']: float(f['total'] or 0) for f in faturamento_mensal}
+        # Faturamento por mês do ano atual
+        faturamento_dict = {}
+        for dia, valor in vendas_dict.items():
+            if dia >= primeiro_dia_ano:
+                faturamento_dict[dia.month] = faturamento_dict.get(dia.month, 0) + float(valor)
         
         # Preencher todos os 12 meses
         meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 
                  'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         dados_faturamento = [faturamento_dict.get(i+1, 0) for i in range(12)]
     except Exception as e:
+        # Em caso de erro, retorna arrays vazios
+        labels_vendas = []
+        dados_vendas = []
         meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 
                  'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         dados_faturamento = [0] * 12
@@ -193,26 +176,19 @@ def dashboard(request):
     trinta_dias_atras = hoje - timedelta(days=30)
     
     try:
-        from vendas.models import ItemPedidoVenda
-        
-        produtos_top = ItemPedidoVenda.objects.filter(
-            is_active=True,
-            pedido__is_active=True,
-            pedido__loja__empresa=empresa,
-            pedido__data_emissao__date__gte=trinta_dias_atras,
-            pedido__status__in=['ABERTO', 'FATURADO']
-        ).values(
-            'produto__descricao'
-        ).annotate(
-            total_vendido=Sum('quantidade')
-        ).order_by('-total_vendido')[:5]
+        produtos_top = top_produtos(
+            empresa,
+            desde=trinta_dias_atras,
+            limite=5,
+            incluir_abertos=True,
+        )
         
         labels_produtos = [
             (p['produto__descricao'][:30] + '...' if len(p['produto__descricao']) > 30 
              else p['produto__descricao']) 
             for p in produtos_top
         ]
-        dados_produtos = [float(p['total_vendido'] or 0) for p in produtos_top]
+        dados_produtos = [float(p['quantidade'] or 0) for p in produtos_top]
     except Exception as e:
         # Se não houver ItemPedidoVenda ou der erro, retorna vazio
         labels_produtos = []
@@ -0,0 +1,86 @@
+"""
+Reconcilia EstoqueValorado.quantidade_total com a soma real de EstoqueAtual.
+
+quantidade_total é mantida por delta a cada movimento; este comando detecta
+divergências (ajustes manuais no admin, SQL direto, falhas antigas) e, com
+--corrigir, regrava o valor somado. Rodar periodicamente (cron).
+
+Uso:
+  python manage.py reconciliar_estoque_valorado
+  python manage.py reconciliar_estoque_valorado --empresa 1 --corrigir
+"""
+import logging
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Detecta (e opcionalmente corrige) divergência entre EstoqueValorado e EstoqueAtual'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--empresa',
+            type=int,
+            help='Reconcilia apenas a empresa informada (ID)',
+        )
+        parser.add_argument(
+            '--corrigir',
+            action='store_true',
+            help='Regrava quantidade_total com a soma de EstoqueAtual',
+        )
+
+    def handle(self, *args, **options):
+        from estoque.models import EstoqueAtual, EstoqueValorado
+
+        empresa_id = options.get('empresa')
+        corrigir = options['corrigir']
+
+        estoques = EstoqueAtual.objects.filter(is_active=True)
+        valorados = EstoqueValorado.objects.all()
+        if empresa_id:
+            estoques = estoques.filter(local_estoque__loja__empresa_id=empresa_id)
+            valorados = valorados.filter(empresa_id=empresa_id)
+
+        # Uma única agregação agrupada para todas as empresas/produtos
+        somas = {
+            (row['local_estoque__loja__empresa_id'], row['produto_id']): row['total']
+            for row in estoques.order_by()
+            .values('local_estoque__loja__empresa_id', 'produto_id')
+            .annotate(total=Sum('quantidade'))
+        }
+
+        divergentes = []
+        for ev in valorados.select_related('produto').iterator(chunk_size=1000):
+            real = (somas.get((ev.empresa_id, ev.produto_id)) or Decimal('0')).quantize(Decimal('0.001'))
+            if ev.quantidade_total != real:
+                divergentes.append((ev, real))
+                self.stdout.write(
+                    f'  Empresa {ev.empresa_id} / {ev.produto.codigo_interno}: '
+                    f'registrado={ev.quantidade_total} real={real} '
+                    f'diferença={ev.quantidade_total - real}'
+                )
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
+            return
+
+        logger.warning(f'EstoqueValorado: {len(divergentes)} divergência(s) de quantidade_total')
+
+        if not corrigir:
+            self.stdout.write(self.style.WARNING(
+                f'{len(divergentes)} divergência(s). Use --corrigir para regravar.'
+            ))
+            return
+
+        with transaction.atomic():
+            for ev, real in divergentes:
+                ev.quantidade_total = real
+            EstoqueValorado.objects.bulk_update(
+                [ev for ev, _real in divergentes], ['quantidade_total'], batch_size=500
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(divergentes)} registro(s) corrigido(s).'))
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def ajustar_saldos_negativos(apps, schema_editor):
+    """
+    Saldos negativos (gerados por vendas concorrentes antes da baixa atômica)
+    impediriam a criação da constraint. Cada um é levado a zero como em
+    realizar_movimento_estoque (tipo AJUSTE): MovimentoEstoque AJUSTE com o novo
+    saldo e o mesmo delta em EstoqueValorado.quantidade_total da empresa. Os saldos
+    ajustados são listados na saída da migração.
+    """
+    EstoqueAtual = apps.get_model('estoque', 'EstoqueAtual')
+    EstoqueValorado = apps.get_model('estoque', 'EstoqueValorado')
+    MovimentoEstoque = apps.get_model('estoque', 'MovimentoEstoque')
+
+    negativos = list(
+        EstoqueAtual.objects.filter(quantidade__lt=0)
+        .select_related('produto', 'local_estoque__loja')
+        .order_by('pk')
+    )
+    if not negativos:
+        return
+    print(f"\n⚠️  {len(negativos)} saldo(s) negativo(s) em EstoqueAtual ajustado(s) para zero:")
+    for estoque in negativos:
+        local = estoque.local_estoque
+        print(
+            f"   - EstoqueAtual #{estoque.pk}: produto {estoque.produto.codigo_interno} "
+            f"em {local.nome}: {estoque.quantidade} -> 0"
+        )
+        MovimentoEstoque.objects.create(
+            produto_id=estoque.produto_id,
+            local_destino=local,
+            tipo_movimento='AJUSTE',
+            quantidade=Decimal('0.000'),
+            referencia='migracao estoque 0004',
+            observacao=f'Saldo negativo ({estoque.quantidade}) zerado antes da constraint de saldo não negativo.',
+        )
+        EstoqueValorado.objects.filter(
+            empresa_id=local.loja.empresa_id,
+            produto_id=estoque.produto_id,
+        ).update(quantidade_total=F('quantidade_total') - estoque.quantidade)
+        estoque.quantidade = Decimal('0.000')
+        estoque.save(update_fields=['quantidade', 'updated_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0003_transferencia_interempresa'),
+    ]
+
+    operations = [
+        migrations.RunPython(ajustar_saldos_negativos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='estoqueatual',
+            constraint=models.CheckConstraint(condition=models.Q(('quantidade__gte', 0)), name='estoque_atual_quantidade_nao_negativa'),
+        ),
+    ]
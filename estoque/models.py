@@ -69,6 +69,13 @@ class EstoqueAtual(BaseModel):
             models.Index(fields=['produto', 'local_estoque']),
             models.Index(fields=['local_estoque', 'produto']),
         ]
+        constraints = [
+            # Garante no banco o que o MinValueValidator não garante em update()/F()
+            models.CheckConstraint(
+                condition=models.Q(quantidade__gte=0),
+                name='estoque_atual_quantidade_nao_negativa',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.produto.codigo_interno} - {self.local_estoque.nome}: {self.quantidade}"
@@ -2,16 +2,75 @@
 Serviços para movimentação de estoque.
 """
 from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, When
+from django.utils import timezone
 from decimal import Decimal
-from typing import List
+from functools import reduce
+from operator import or_
+from typing import Any, Callable, Dict, List, Optional
 from .models import EstoqueAtual, MovimentoEstoque, LocalEstoque
-from .valoracao import atualizar_quantidade_total
+from .valoracao import ajustar_quantidade_total, ajustar_quantidades_totais
 from produtos.models import Produto
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _validar_movimento(tipo_movimento: str, local_origem, local_destino) -> None:
+    """Valida a combinação tipo de movimento / locais (comum ao fluxo unitário e em lote)."""
+    if tipo_movimento == 'ENTRADA' and not local_destino:
+        raise ValueError("ENTRADA requer local_destino")
+    if tipo_movimento == 'SAIDA' and not local_origem:
+        raise ValueError("SAIDA requer local_origem")
+    if tipo_movimento == 'TRANSFERENCIA' and (not local_origem or not local_destino):
+        raise ValueError("TRANSFERENCIA requer local_origem e local_destino")
+    if tipo_movimento == 'AJUSTE' and not local_destino:
+        raise ValueError("AJUSTE requer local_destino")
+    if tipo_movimento == 'TRANSFERENCIA':
+        if local_origem.loja.empresa_id != local_destino.loja.empresa_id:
+            raise ValueError(
+                "Transferência entre CNPJs distintos não use o tipo TRANSFERENCIA; "
+                "use a rotina de transferência interempresa (saída + entrada separadas)."
+            )
+
+
+def _baixar_estoque(produto: Produto, local: LocalEstoque, quantidade: Decimal) -> None:
+    """
+    Decrementa EstoqueAtual de forma atômica, falhando se não houver saldo.
+    
+    O rowcount do UPDATE condicional diz se havia saldo; só no caso de falha
+    o saldo atual é lido para compor a mensagem de erro.
+    """
+    atualizados = EstoqueAtual.objects.filter(
+        produto=produto,
+        local_estoque=local,
+        quantidade__gte=quantidade,
+    ).update(quantidade=F('quantidade') - quantidade, updated_at=timezone.now())
+    if not atualizados:
+        disponivel = EstoqueAtual.objects.filter(
+            produto=produto,
+            local_estoque=local,
+        ).values_list('quantidade', flat=True).first()
+        raise ValueError(
+            f"Quantidade insuficiente em {local.nome}. "
+            f"Disponível: {disponivel if disponivel is not None else Decimal('0.000')}, "
+            f"Solicitado: {quantidade}"
+        )
+
+
+def _somar_estoque(produto: Produto, local: LocalEstoque, quantidade: Decimal) -> None:
+    """Incrementa EstoqueAtual com F-expression (sem sobrescrever incrementos concorrentes)."""
+    estoque, _ = EstoqueAtual.objects.get_or_create(
+        produto=produto,
+        local_estoque=local,
+        defaults={'quantidade': Decimal('0.000')}
+    )
+    EstoqueAtual.objects.filter(pk=estoque.pk).update(
+        quantidade=F('quantidade') + quantidade,
+        updated_at=timezone.now(),
+    )
+
+
 @transaction.atomic
 def realizar_movimento_estoque(
     produto: Produto,
@@ -42,38 +101,18 @@ def realizar_movimento_estoque(
         MovimentoEstoque criado
     
     Raises:
-        ValueError: Se os parâmetros forem inválidos
+        ValueError: Se os parâmetros forem inválidos ou não houver saldo na origem
     """
-    # Validações
-    if tipo_movimento == 'ENTRADA' and not local_destino:
-        raise ValueError("ENTRADA requer local_destino")
-    if tipo_movimento == 'SAIDA' and not local_origem:
-        raise ValueError("SAIDA requer local_origem")
-    if tipo_movimento == 'TRANSFERENCIA' and (not local_origem or not local_destino):
-        raise ValueError("TRANSFERENCIA requer local_origem e local_destino")
-    if tipo_movimento == 'AJUSTE' and not local_destino:
-        raise ValueError("AJUSTE requer local_destino")
-    if tipo_movimento == 'TRANSFERENCIA':
-        if local_origem.loja.empresa_id != local_destino.loja.empresa_id:
-            raise ValueError(
-                "Transferência entre CNPJs distintos não use o tipo TRANSFERENCIA; "
-                "use a rotina de transferência interempresa (saída + entrada separadas)."
-            )
+    _validar_movimento(tipo_movimento, local_origem, local_destino)
 
-    # Verifica quantidade disponível para saída/transferência
+    # Baixa na origem (saída/transferência) com UPDATE condicional:
+    # "quantidade = quantidade - x WHERE quantidade >= x". Dois caixas vendendo
+    # a última unidade ao mesmo tempo não passam ambos pela condição, sem
+    # depender de ler-verificar-gravar em Python nem de ordem de travamento.
     if tipo_movimento in ['SAIDA', 'TRANSFERENCIA']:
-        estoque_origem, _ = EstoqueAtual.objects.get_or_create(
-            produto=produto,
-            local_estoque=local_origem,
-            defaults={'quantidade': Decimal('0.000')}
-        )
-        if estoque_origem.quantidade < quantidade:
-            raise ValueError(
-                f"Quantidade insuficiente em {local_origem.nome}. "
-                f"Disponível: {estoque_origem.quantidade}, Solicitado: {quantidade}"
-            )
+        _baixar_estoque(produto, local_origem, quantidade)
     
-    # Cria o movimento
+    # Cria o movimento (o signal de custo médio lê EstoqueAtual antes do incremento)
     movimento = MovimentoEstoque.objects.create(
         produto=produto,
         local_origem=local_origem,
@@ -86,50 +125,30 @@ def realizar_movimento_estoque(
         created_by=usuario,
     )
     
-    # Atualiza estoques
-    if tipo_movimento == 'ENTRADA':
-        estoque_destino, _ = EstoqueAtual.objects.get_or_create(
-            produto=produto,
-            local_estoque=local_destino,
-            defaults={'quantidade': Decimal('0.000')}
-        )
-        estoque_destino.quantidade += quantidade
-        estoque_destino.save(update_fields=['quantidade', 'updated_at'])
-    
-    elif tipo_movimento == 'SAIDA':
-        estoque_origem.quantidade -= quantidade
-        estoque_origem.save(update_fields=['quantidade', 'updated_at'])
-    
-    elif tipo_movimento == 'TRANSFERENCIA':
-        estoque_origem.quantidade -= quantidade
-        estoque_origem.save(update_fields=['quantidade', 'updated_at'])
-        
-        estoque_destino, _ = EstoqueAtual.objects.get_or_create(
-            produto=produto,
-            local_estoque=local_destino,
-            defaults={'quantidade': Decimal('0.000')}
-        )
-        estoque_destino.quantidade += quantidade
-        estoque_destino.save(update_fields=['quantidade', 'updated_at'])
+    # Atualiza estoques de destino
+    if tipo_movimento in ['ENTRADA', 'TRANSFERENCIA']:
+        _somar_estoque(produto, local_destino, quantidade)
     
     elif tipo_movimento == 'AJUSTE':
-        estoque_destino, _ = EstoqueAtual.objects.get_or_create(
+        estoque_destino, _ = EstoqueAtual.objects.select_for_update().get_or_create(
             produto=produto,
             local_estoque=local_destino,
             defaults={'quantidade': Decimal('0.000')}
         )
+        quantidade_anterior = estoque_destino.quantidade
         estoque_destino.quantidade = quantidade
         estoque_destino.save(update_fields=['quantidade', 'updated_at'])
 
+    # quantidade_total do EstoqueValorado por delta (ENTRADA com custo já foi
+    # contabilizada pelo signal de custo médio; TRANSFERENCIA não altera o total
+    # da empresa)
     if tipo_movimento == 'ENTRADA':
         if custo_unitario is None or custo_unitario <= 0:
-            atualizar_quantidade_total(local_destino.loja.empresa, produto)
+            ajustar_quantidade_total(local_destino.loja.empresa, produto, quantidade)
     elif tipo_movimento == 'SAIDA':
-        atualizar_quantidade_total(local_origem.loja.empresa, produto)
-    elif tipo_movimento == 'TRANSFERENCIA':
-        atualizar_quantidade_total(local_origem.loja.empresa, produto)
+        ajustar_quantidade_total(local_origem.loja.empresa, produto, -quantidade)
     elif tipo_movimento == 'AJUSTE':
-        atualizar_quantidade_total(local_destino.loja.empresa, produto)
+        ajustar_quantidade_total(local_destino.loja.empresa, produto, quantidade - quantidade_anterior)
 
     # TODO: Log de segurança para produtos com restrição de Exército
     if produto.possui_restricao_exercito:
@@ -144,6 +163,174 @@ def realizar_movimento_estoque(
     return movimento
 
 
+def _mensagem_quantidade_insuficiente(movimento: dict, disponivel: Decimal) -> str:
+    return (
+        f"Quantidade insuficiente em {movimento['local_origem'].nome}. "
+        f"Disponível: {disponivel}, Solicitado: {movimento['quantidade']}"
+    )
+
+
+@transaction.atomic
+def realizar_movimentos_em_lote(
+    movimentos: List[dict],
+    mensagem_saldo_insuficiente: Optional[Callable[[dict, Decimal], str]] = None,
+) -> List[MovimentoEstoque]:
+    """
+    Realiza várias movimentações de estoque com um número fixo de consultas.
+    
+    Mesma semântica de chamar realizar_movimento_estoque para cada item, na ordem
+    (inclusive saldos consumidos por itens anteriores do mesmo produto/local),
+    mas sem o custo por item:
+    - trava todos os EstoqueAtual afetados em um único SELECT ... FOR UPDATE
+      ordenado por PK (ordem global de travamento → sem deadlock entre caixas);
+    - valida disponibilidade em memória;
+    - grava os MovimentoEstoque com bulk_create;
+    - aplica as quantidades com um único UPDATE condicional (CASE por PK);
+    - ajusta EstoqueValorado.quantidade_total por delta em um único UPDATE.
+    
+    Como bulk_create não dispara post_save, o custo médio das ENTRADAs com
+    custo_unitario é aplicado aqui, combinando as entradas do mesmo produto.
+    
+    Args:
+        movimentos: lista de dicts com as mesmas chaves de realizar_movimento_estoque
+            (produto, tipo_movimento, quantidade, local_origem, local_destino,
+            referencia, observacao, usuario, custo_unitario)
+        mensagem_saldo_insuficiente: callable(movimento, disponivel) -> str para
+            personalizar o erro de saldo (padrão: mesma mensagem do fluxo unitário)
+    
+    Returns:
+        Lista de MovimentoEstoque criados, na ordem recebida
+    
+    Raises:
+        ValueError: Se os parâmetros forem inválidos ou o saldo for insuficiente
+    """
+    from .valoracao import atualizar_custos_medios
+    
+    if not movimentos:
+        return []
+    mensagem_saldo_insuficiente = mensagem_saldo_insuficiente or _mensagem_quantidade_insuficiente
+    
+    for mov in movimentos:
+        _validar_movimento(mov['tipo_movimento'], mov.get('local_origem'), mov.get('local_destino'))
+    
+    # Pares (produto, local) afetados; destinos podem ainda não ter linha de estoque
+    pares = set()
+    pares_destino = set()
+    for mov in movimentos:
+        if mov.get('local_origem') and mov['tipo_movimento'] in ('SAIDA', 'TRANSFERENCIA'):
+            pares.add((mov['produto'].pk, mov['local_origem'].pk))
+        if mov.get('local_destino') and mov['tipo_movimento'] != 'SAIDA':
+            pares_destino.add((mov['produto'].pk, mov['local_destino'].pk))
+    pares |= pares_destino
+    
+    if pares_destino:
+        EstoqueAtual.objects.bulk_create(
+            [
+                EstoqueAtual(produto_id=produto_id, local_estoque_id=local_id, quantidade=Decimal('0.000'))
+                for produto_id, local_id in sorted(pares_destino)
+            ],
+            ignore_conflicts=True,
+        )
+    
+    filtro = reduce(or_, (Q(produto_id=p, local_estoque_id=l) for p, l in pares))
+    estoques: Dict[tuple, EstoqueAtual] = {
+        (e.produto_id, e.local_estoque_id): e
+        for e in EstoqueAtual.objects.select_for_update().filter(filtro).order_by('pk')
+    }
+    saldo = {par: e.quantidade for par, e in estoques.items()}
+    
+    # Simula os movimentos em ordem, validando saldo
+    entradas_com_custo: Dict[tuple, list] = {}
+    for mov in movimentos:
+        tipo = mov['tipo_movimento']
+        quantidade = mov['quantidade']
+        produto = mov['produto']
+        if tipo in ('SAIDA', 'TRANSFERENCIA'):
+            par = (produto.pk, mov['local_origem'].pk)
+            disponivel = saldo.get(par, Decimal('0.000'))
+            if disponivel < quantidade:
+                raise ValueError(mensagem_saldo_insuficiente(mov, disponivel))
+            saldo[par] = disponivel - quantidade
+        if tipo in ('ENTRADA', 'TRANSFERENCIA'):
+            par = (produto.pk, mov['local_destino'].pk)
+            saldo[par] += quantidade
+        elif tipo == 'AJUSTE':
+            saldo[(produto.pk, mov['local_destino'].pk)] = quantidade
+        
+        custo = mov.get('custo_unitario')
+        if tipo == 'ENTRADA' and custo is not None and custo > 0:
+            chave = (mov['local_destino'].loja.empresa, produto)
+            entradas_com_custo.setdefault(chave, []).append((quantidade, custo))
+    
+    # Custo médio ponderado (usa EstoqueAtual antes do incremento, como o signal),
+    # um lote por empresa
+    por_empresa: Dict[Any, Dict[int, tuple]] = {}
+    for (empresa, produto), entradas in entradas_com_custo.items():
+        qtd_total = sum((q for q, _c in entradas), Decimal('0'))
+        custo_combinado = sum((q * c for q, c in entradas), Decimal('0')) / qtd_total
+        por_empresa.setdefault(empresa, {})[produto.pk] = (qtd_total, custo_combinado)
+    for empresa, entradas in por_empresa.items():
+        atualizar_custos_medios(empresa, entradas)
+    
+    criados = MovimentoEstoque.objects.bulk_create([
+        MovimentoEstoque(
+            produto=mov['produto'],
+            local_origem=mov.get('local_origem'),
+            local_destino=mov.get('local_destino'),
+            tipo_movimento=mov['tipo_movimento'],
+            quantidade=mov['quantidade'],
+            custo_unitario=mov.get('custo_unitario'),
+            referencia=mov.get('referencia'),
+            observacao=mov.get('observacao'),
+            created_by=mov.get('usuario'),
+        )
+        for mov in movimentos
+    ])
+    
+    alterados = [
+        (estoque, saldo[par] - estoque.quantidade)
+        for par, estoque in estoques.items()
+        if saldo[par] != estoque.quantidade
+    ]
+    if alterados:
+        EstoqueAtual.objects.filter(pk__in=[estoque.pk for estoque, _delta in alterados]).update(
+            quantidade=Case(
+                *[When(pk=estoque.pk, then=F('quantidade') + delta) for estoque, delta in alterados],
+                output_field=DecimalField(max_digits=10, decimal_places=3),
+            ),
+            updated_at=timezone.now(),
+        )
+    
+    # quantidade_total por delta, em um único UPDATE: variação líquida dos
+    # EstoqueAtual de cada produto/empresa, menos as entradas com custo que
+    # atualizar_custos_medios já somou
+    empresa_do_local = {}
+    for mov in movimentos:
+        for local in (mov.get('local_origem'), mov.get('local_destino')):
+            if local is not None:
+                empresa_do_local[local.pk] = local.loja.empresa_id
+    deltas: Dict[tuple, Decimal] = {}
+    for (produto_id, local_id), estoque in estoques.items():
+        chave = (empresa_do_local[local_id], produto_id)
+        deltas[chave] = deltas.get(chave, Decimal('0')) + (saldo[(produto_id, local_id)] - estoque.quantidade)
+    for (empresa, produto), entradas in entradas_com_custo.items():
+        chave = (empresa.pk, produto.pk)
+        deltas[chave] -= sum((q for q, _c in entradas), Decimal('0'))
+    ajustar_quantidades_totais(deltas)
+    
+    for mov in movimentos:
+        if mov['produto'].possui_restricao_exercito:
+            logger.warning(
+                f"Movimentação de produto com restrição de Exército: "
+                f"Produto={mov['produto'].codigo_interno}, "
+                f"Tipo={mov['tipo_movimento']}, "
+                f"Quantidade={mov['quantidade']}, "
+                f"Usuário={mov.get('usuario')}"
+            )
+    
+    return criados
+
+
 @transaction.atomic
 def registrar_saida_estoque_para_pedido(
     pedido,
@@ -169,54 +356,45 @@ def registrar_saida_estoque_para_pedido(
     if not isinstance(pedido, PedidoVenda):
         raise ValueError("pedido deve ser uma instância de PedidoVenda")
     
-    movimentos = []
-    itens = pedido.itens.filter(is_active=True)
+    itens = list(pedido.itens.filter(is_active=True).select_related('produto'))
     
-    if not itens.exists():
+    if not itens:
         raise ValueError("Pedido não possui itens ativos")
     
-    # TODO: Validar se há estoque suficiente antes de permitir a venda
-    # Por enquanto, a validação é feita dentro de realizar_movimento_estoque
+    def mensagem_saldo_insuficiente(movimento, disponivel):
+        produto = movimento['produto']
+        return (
+            f"Estoque insuficiente para produto {produto.codigo_interno} ({produto.descricao}). "
+            f"Local: {local_estoque.nome} (Loja: {local_estoque.loja.nome}). "
+            f"Disponível: {disponivel}, Solicitado: {movimento['quantidade']}"
+        )
     
     for item in itens:
-        produto = item.produto
-        
-        # Valida estoque disponível
-        estoque_atual, _ = EstoqueAtual.objects.get_or_create(
-            produto=produto,
-            local_estoque=local_estoque,
-            defaults={'quantidade': Decimal('0.000')}
-        )
-        
-        if estoque_atual.quantidade < item.quantidade:
-            raise ValueError(
-                f"Estoque insuficiente para produto {produto.codigo_interno} ({produto.descricao}). "
-                f"Local: {local_estoque.nome} (Loja: {local_estoque.loja.nome}). "
-                f"Disponível: {estoque_atual.quantidade}, Solicitado: {item.quantidade}"
-            )
-        
         # TODO: Emitir alerta se o produto tem possui_restricao_exercito=True
-        if produto.possui_restricao_exercito:
+        if item.produto.possui_restricao_exercito:
             logger.warning(
                 f"Baixando estoque de produto com restrição de Exército: "
-                f"Produto={produto.codigo_interno}, "
+                f"Produto={item.produto.codigo_interno}, "
                 f"Pedido={pedido.id}, "
                 f"Quantidade={item.quantidade}, "
                 f"Usuário={usuario}"
             )
-        
-        # Cria movimento de saída
-        movimento = realizar_movimento_estoque(
-            produto=produto,
-            tipo_movimento='SAIDA',
-            quantidade=item.quantidade,
-            local_origem=local_estoque,
-            referencia=f"PEDIDO_{pedido.id}",
-            observacao=f"Venda balcão - Pedido #{pedido.id}",
-            usuario=usuario,
-        )
-        
-        movimentos.append(movimento)
+    
+    movimentos = realizar_movimentos_em_lote(
+        [
+            {
+                'produto': item.produto,
+                'tipo_movimento': 'SAIDA',
+                'quantidade': item.quantidade,
+                'local_origem': local_estoque,
+                'referencia': f"PEDIDO_{pedido.id}",
+                'observacao': f"Venda balcão - Pedido #{pedido.id}",
+                'usuario': usuario,
+            }
+            for item in itens
+        ],
+        mensagem_saldo_insuficiente=mensagem_saldo_insuficiente,
+    )
     
     logger.info(
         f"Estoque baixado para pedido {pedido.id}: "
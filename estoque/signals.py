@@ -13,7 +13,7 @@ def atualizar_valoracao_apos_movimento(sender, instance, created, **kwargs):
     Após criar um MovimentoEstoque:
     - ENTRADA com custo_unitario → custo médio ponderado (EstoqueAtual ainda sem o incremento).
 
-    Sincronização de quantidade_total para demais casos fica em realizar_movimento_estoque
+    Demais casos ajustam quantidade_total por delta em realizar_movimento_estoque
     (após atualizar EstoqueAtual), para funcionar em testes e evitar depender de on_commit.
     """
     if not created:
@@ -3,13 +3,19 @@ Testes do app estoque.
 """
 import pytest
 from decimal import Decimal
+from io import StringIO
+
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 
 from core.models import Empresa, Loja
 from produtos.models import CategoriaProduto, Produto, ProdutoParametrosEmpresa
 
 from .models import EstoqueAtual, EstoqueValorado, LocalEstoque, TransferenciaInterempresa
-from .services import realizar_movimento_estoque
+from .services import realizar_movimento_estoque, realizar_movimentos_em_lote
 from .transferencia import executar_transferencia_interempresa
 from .valoracao import atualizar_custo_medio, atualizar_quantidade_total
 
@@ -69,6 +75,28 @@ class TestMovimentacaoEstoque:
         estoque = EstoqueAtual.objects.get(produto=produto, local_estoque=local)
         assert estoque.quantidade == Decimal('100.000')
 
+        # Saída além do saldo falha sem alterar o estoque
+        with pytest.raises(ValueError, match='Disponível: 100.000, Solicitado: 150'):
+            realizar_movimento_estoque(
+                produto=produto,
+                tipo_movimento='SAIDA',
+                quantidade=Decimal('150'),
+                local_origem=local,
+            )
+        realizar_movimento_estoque(
+            produto=produto,
+            tipo_movimento='SAIDA',
+            quantidade=Decimal('100'),
+            local_origem=local,
+        )
+        estoque.refresh_from_db()
+        assert estoque.quantidade == Decimal('0.000')
+
+        # A constraint do banco impede saldo negativo mesmo fora do serviço
+        with pytest.raises(IntegrityError):
+            with transaction.atomic():
+                EstoqueAtual.objects.filter(pk=estoque.pk).update(quantidade=F('quantidade') - 1)
+
 
 @pytest.mark.django_db
 class TestEstoqueValorado:
@@ -155,6 +183,69 @@ class TestEstoqueValorado:
         assert ev.custo_medio == Decimal('8.0000')
         assert ev.quantidade_total == Decimal('50.000')
 
+    def test_movimentos_mantem_quantidade_total_por_delta(
+        self, empresa_loja_local_produto
+    ):
+        empresa, loja, local, produto = empresa_loja_local_produto
+        vitrine = LocalEstoque.objects.create(loja=loja, nome='Vitrine')
+        realizar_movimento_estoque(
+            produto=produto,
+            tipo_movimento='ENTRADA',
+            quantidade=Decimal('50.000'),
+            local_destino=local,
+            custo_unitario=Decimal('8.0000'),
+        )
+        realizar_movimento_estoque(
+            produto=produto,
+            tipo_movimento='TRANSFERENCIA',
+            quantidade=Decimal('10.000'),
+            local_origem=local,
+            local_destino=vitrine,
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            realizar_movimento_estoque(
+                produto=produto,
+                tipo_movimento='SAIDA',
+                quantidade=Decimal('5.000'),
+                local_origem=vitrine,
+            )
+        assert not any('SUM(' in q['sql'] for q in ctx.captured_queries)
+        realizar_movimento_estoque(
+            produto=produto,
+            tipo_movimento='AJUSTE',
+            quantidade=Decimal('30.000'),
+            local_destino=local,
+        )
+
+        ev = EstoqueValorado.objects.get(empresa=empresa, produto=produto)
+        # depósito 30 (ajuste) + vitrine 5
+        assert ev.quantidade_total == Decimal('35.000')
+
+    def test_reconciliar_detecta_e_corrige_divergencia(
+        self, empresa_loja_local_produto
+    ):
+        empresa, _loja, local, produto = empresa_loja_local_produto
+        realizar_movimento_estoque(
+            produto=produto,
+            tipo_movimento='ENTRADA',
+            quantidade=Decimal('50.000'),
+            local_destino=local,
+            custo_unitario=Decimal('8.0000'),
+        )
+        EstoqueValorado.objects.filter(empresa=empresa, produto=produto).update(
+            quantidade_total=Decimal('47.000')
+        )
+
+        saida = StringIO()
+        call_command('reconciliar_estoque_valorado', stdout=saida)
+        assert 'registrado=47.000 real=50.000' in saida.getvalue()
+        ev = EstoqueValorado.objects.get(empresa=empresa, produto=produto)
+        assert ev.quantidade_total == Decimal('47.000')
+
+        call_command('reconciliar_estoque_valorado', '--corrigir', stdout=StringIO())
+        ev.refresh_from_db()
+        assert ev.quantidade_total == Decimal('50.000')
+
 
 def _parametros_padrao(empresa, produto):
     return ProdutoParametrosEmpresa.objects.create(
@@ -304,3 +395,106 @@ class TestTransferenciaInterempresa:
                 local_destino=c['local_b'],
             )
 
+
+@pytest.mark.django_db
+class TestMovimentosEmLote:
+    """Motor de movimentação em lote (vendas com vários itens)."""
+
+    @pytest.fixture
+    def cenario(self):
+        empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Lote',
+            razao_social='Empresa Lote LTDA',
+            cnpj='33333333000133',
+        )
+        loja = Loja.objects.create(empresa=empresa, nome='Loja Lote')
+        local = LocalEstoque.objects.create(loja=loja, nome='Depósito')
+        categoria = CategoriaProduto.objects.create(nome='Cat Lote')
+        produtos = []
+        for i in range(6):
+            produto = Produto.objects.create(
+                categoria=categoria,
+                codigo_interno=f'LOT{i:03d}',
+                descricao=f'Produto lote {i}',
+                classe_risco='1.4G',
+                ncm='36041000',
+                unidade_comercial='UN',
+                origem='0',
+            )
+            _parametros_padrao(empresa, produto)
+            realizar_movimento_estoque(
+                produto=produto,
+                tipo_movimento='ENTRADA',
+                quantidade=Decimal('10.000'),
+                local_destino=local,
+                custo_unitario=Decimal('5.0000'),
+            )
+            produtos.append(produto)
+        return empresa, local, produtos
+
+    @staticmethod
+    def _saidas(local, produtos, quantidade=Decimal('2.000')):
+        return [
+            {
+                'produto': produto,
+                'tipo_movimento': 'SAIDA',
+                'quantidade': quantidade,
+                'local_origem': local,
+                'referencia': 'PEDIDO_1',
+            }
+            for produto in produtos
+        ]
+
+    def test_saidas_em_lote_atualizam_estoque(self, cenario):
+        empresa, local, produtos = cenario
+        movimentos = realizar_movimentos_em_lote(self._saidas(local, produtos[:3]))
+
+        assert len(movimentos) == 3
+        assert all(m.pk for m in movimentos)
+        for produto in produtos[:3]:
+            assert EstoqueAtual.objects.get(produto=produto, local_estoque=local).quantidade == Decimal('8.000')
+            ev = EstoqueValorado.objects.get(empresa=empresa, produto=produto)
+            assert ev.quantidade_total == Decimal('8.000')
+        assert EstoqueAtual.objects.get(produto=produtos[3], local_estoque=local).quantidade == Decimal('10.000')
+
+    def test_saldo_consumido_por_itens_anteriores(self, cenario):
+        _empresa, local, produtos = cenario
+        movimentos = self._saidas(local, [produtos[0], produtos[0]], quantidade=Decimal('6.000'))
+
+        with pytest.raises(ValueError, match='Quantidade insuficiente em Depósito'):
+            realizar_movimentos_em_lote(movimentos)
+
+        assert EstoqueAtual.objects.get(produto=produtos[0], local_estoque=local).quantidade == Decimal('10.000')
+
+    def test_numero_de_consultas_nao_cresce_com_itens(self, cenario):
+        _empresa, local, produtos = cenario
+        with CaptureQueriesContext(connection) as poucos:
+            realizar_movimentos_em_lote(self._saidas(local, produtos[:1]))
+        with CaptureQueriesContext(connection) as muitos:
+            realizar_movimentos_em_lote(self._saidas(local, produtos[1:]))
+        assert len(muitos) == len(poucos)
+
+    def test_entradas_do_mesmo_produto_combinam_custo_medio(self, cenario):
+        empresa, local, produtos = cenario
+        produto = produtos[0]
+        realizar_movimentos_em_lote([
+            {
+                'produto': produto,
+                'tipo_movimento': 'ENTRADA',
+                'quantidade': Decimal('10.000'),
+                'local_destino': local,
+                'custo_unitario': Decimal('8.0000'),
+            },
+            {
+                'produto': produto,
+                'tipo_movimento': 'ENTRADA',
+                'quantidade': Decimal('20.000'),
+                'local_destino': local,
+                'custo_unitario': Decimal('11.0000'),
+            },
+        ])
+        ev = EstoqueValorado.objects.get(empresa=empresa, produto=produto)
+        # (10*5 + 10*8 + 20*11) / 40
+        assert ev.custo_medio == Decimal('8.7500')
+        assert ev.quantidade_total == Decimal('40.000')
+        assert EstoqueAtual.objects.get(produto=produto, local_estoque=local).quantidade == Decimal('40.000')
@@ -1,11 +1,17 @@
 """
 Serviço de atualização de custo médio ponderado.
 Chamado após cada MovimentoEstoque (via signals).
+
+quantidade_total é mantida por delta (F('quantidade_total') + delta) dentro da
+transação do movimento, com custo O(1) independente do número de locais da
+empresa. A soma completa sobre EstoqueAtual fica restrita à criação do
+EstoqueValorado e à reconciliação (manage.py reconciliar_estoque_valorado).
 """
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import Case, DecimalField, F, Q, Sum, When
+from django.utils import timezone
 
 
 def _quantidade_total_empresa_produto(empresa, produto) -> Decimal:
@@ -23,8 +29,10 @@ def atualizar_custo_medio(empresa, produto, qtd_entrada, custo_entrada):
     """
     Atualiza EstoqueValorado com custo médio ponderado.
 
-    Usa a soma física em EstoqueAtual **antes** do incremento desta entrada
-    (o signal roda logo após criar o movimento e antes de atualizar o EstoqueAtual).
+    Usa a quantidade_total mantida no EstoqueValorado como saldo **antes** desta
+    entrada (o signal roda logo após criar o movimento e antes de atualizar o
+    EstoqueAtual). Na primeira entrada da empresa, o saldo inicial é somado
+    de EstoqueAtual.
 
     Args:
         empresa: instância de Empresa
@@ -39,35 +47,146 @@ def atualizar_custo_medio(empresa, produto, qtd_entrada, custo_entrada):
     if not qtd_entrada or qtd_entrada <= 0:
         return
 
-    Q_before = _quantidade_total_empresa_produto(empresa, produto)
-    nova_qtd = Q_before + qtd_entrada
-
     with transaction.atomic():
         ev, _ = EstoqueValorado.objects.select_for_update().get_or_create(
             empresa=empresa,
             produto=produto,
             defaults={
                 'custo_medio': Decimal('0.0000'),
-                'quantidade_total': Decimal('0.000'),
+                # Callable: só soma EstoqueAtual se o registro for criado agora
+                'quantidade_total': lambda: _quantidade_total_empresa_produto(empresa, produto),
             },
         )
 
-        cm_old = ev.custo_medio or Decimal('0.0000')
-        if Q_before <= 0:
-            novo_custo = Decimal(custo_entrada)
-        else:
-            total_valor_atual = Q_before * cm_old
-            total_valor_entrada = qtd_entrada * Decimal(custo_entrada)
-            novo_custo = (total_valor_atual + total_valor_entrada) / nova_qtd
-
-        ev.custo_medio = novo_custo.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-        ev.quantidade_total = nova_qtd
+        _aplicar_entrada(ev, qtd_entrada, custo_entrada)
         ev.save()
 
 
+def _aplicar_entrada(ev, qtd_entrada, custo_entrada):
+    """Custo médio ponderado de ``ev`` com a entrada (quantidade_total = saldo antes dela)."""
+    Q_before = ev.quantidade_total
+    nova_qtd = Q_before + qtd_entrada
+    cm_old = ev.custo_medio or Decimal('0.0000')
+    if Q_before <= 0:
+        novo_custo = Decimal(custo_entrada)
+    else:
+        total_valor_atual = Q_before * cm_old
+        total_valor_entrada = qtd_entrada * Decimal(custo_entrada)
+        novo_custo = (total_valor_atual + total_valor_entrada) / nova_qtd
+
+    ev.custo_medio = novo_custo.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+    ev.quantidade_total = nova_qtd
+
+
+def atualizar_custos_medios(empresa, entradas):
+    """
+    atualizar_custo_medio para vários produtos da empresa com um número fixo de
+    consultas: EstoqueValorado faltantes criados em lote (saldo inicial somado de
+    EstoqueAtual numa consulta agrupada), todos travados num SELECT ... FOR UPDATE
+    e gravados num único UPDATE.
+
+    Args:
+        empresa: instância de Empresa
+        entradas: dict {produto_id: (qtd_entrada, custo_entrada)}; várias entradas
+            do mesmo produto devem vir combinadas (quantidade somada, custo ponderado)
+    """
+    from .models import EstoqueAtual, EstoqueValorado
+
+    entradas = {
+        produto_id: (qtd, custo)
+        for produto_id, (qtd, custo) in entradas.items()
+        if custo is not None and custo > 0 and qtd and qtd > 0
+    }
+    if not entradas:
+        return
+
+    with transaction.atomic():
+        existentes = set(
+            EstoqueValorado.objects.filter(empresa=empresa, produto_id__in=entradas)
+            .values_list('produto_id', flat=True)
+        )
+        novos = [produto_id for produto_id in entradas if produto_id not in existentes]
+        if novos:
+            saldos = dict(
+                EstoqueAtual.objects.filter(
+                    produto_id__in=novos,
+                    local_estoque__loja__empresa=empresa,
+                    is_active=True,
+                ).values('produto_id').annotate(total=Sum('quantidade')).values_list('produto_id', 'total')
+            )
+            EstoqueValorado.objects.bulk_create(
+                [
+                    EstoqueValorado(
+                        empresa=empresa,
+                        produto_id=produto_id,
+                        custo_medio=Decimal('0.0000'),
+                        quantidade_total=saldos.get(produto_id) or Decimal('0.000'),
+                    )
+                    for produto_id in sorted(novos)
+                ],
+                ignore_conflicts=True,  # criado por outra transação: vale o registro dela
+            )
+
+        valorados = list(
+            EstoqueValorado.objects.select_for_update()
+            .filter(empresa=empresa, produto_id__in=entradas)
+            .order_by('pk')
+        )
+        agora = timezone.now()
+        for ev in valorados:
+            _aplicar_entrada(ev, *entradas[ev.produto_id])
+            ev.atualizado_em = ev.updated_at = agora
+        EstoqueValorado.objects.bulk_update(
+            valorados, ['custo_medio', 'quantidade_total', 'atualizado_em', 'updated_at'],
+        )
+
+
+def ajustar_quantidade_total(empresa, produto, delta):
+    """
+    Aplica um delta em quantidade_total (UPDATE com F-expression, O(1)).
+
+    Sem EstoqueValorado para a empresa/produto (nenhuma entrada com custo
+    ainda), não há o que ajustar — o registro nasce com a soma real.
+    """
+    from .models import EstoqueValorado
+
+    if not delta:
+        return
+    EstoqueValorado.objects.filter(
+        empresa=empresa,
+        produto=produto,
+    ).update(quantidade_total=F('quantidade_total') + delta)
+
+
+def ajustar_quantidades_totais(deltas):
+    """
+    Aplica vários deltas em um único UPDATE (CASE por empresa/produto).
+
+    Args:
+        deltas: dict {(empresa_id, produto_id): Decimal}
+    """
+    from .models import EstoqueValorado
+
+    deltas = {chave: delta for chave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    filtro = Q()
+    whens = []
+    for (empresa_id, produto_id), delta in deltas.items():
+        condicao = Q(empresa_id=empresa_id, produto_id=produto_id)
+        filtro |= condicao
+        whens.append(When(condicao, then=F('quantidade_total') + delta))
+    EstoqueValorado.objects.filter(filtro).update(
+        quantidade_total=Case(*whens, output_field=DecimalField(max_digits=10, decimal_places=3)),
+    )
+
+
 def atualizar_quantidade_total(empresa, produto):
     """
     Recalcula quantidade_total no EstoqueValorado somando EstoqueAtual da empresa.
+
+    Recalculo completo — usado na reconciliação; o fluxo de movimentos usa
+    ajustar_quantidade_total.
     """
     from .models import EstoqueValorado
 
@@ -137,15 +137,7 @@ class EventoVenda(BaseModel):
         # Se não houver cliente, cria ou busca cliente genérico "Consumidor Final"
         if not cliente_final:
             from pessoas.models import Cliente
-            cliente_final, _ = Cliente.objects.get_or_create(
-                empresa=self.empresa,
-                tipo_pessoa='PF',
-                nome_razao_social='Consumidor Final',
-                cpf_cnpj='00000000000',
-                defaults={
-                    'created_by': self.created_by,
-                }
-            )
+            cliente_final = Cliente.consumidor_final(self.empresa, self.created_by)
         
         # Busca ou cria condição de pagamento padrão (à vista) se não informada
         if not condicao_pagamento:
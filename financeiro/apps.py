@@ -6,3 +6,6 @@ class FinanceiroConfig(AppConfig):
     name = 'financeiro'
     verbose_name = 'Financeiro'
 
+    def ready(self):
+        import financeiro.signals  # noqa: F401
+
@@ -0,0 +1,75 @@
+"""
+Confere os fechamentos diários (SaldoDiarioConta) com a soma dos movimentos.
+
+Os fechamentos são mantidos por delta a cada movimento; este comando detecta
+divergências (SQL direto, update() em massa, falhas antigas) e, com --corrigir,
+regrava os fechamentos das contas divergentes. Rodar periodicamente (cron).
+
+Uso:
+  python manage.py verificar_saldos_financeiros
+  python manage.py verificar_saldos_financeiros --empresa 1 --corrigir
+"""
+import logging
+
+from django.core.management.base import BaseCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Detecta (e opcionalmente corrige) divergência entre SaldoDiarioConta e MovimentoFinanceiro'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--empresa',
+            type=int,
+            help='Confere apenas as contas da empresa informada (ID)',
+        )
+        parser.add_argument(
+            '--corrigir',
+            action='store_true',
+            help='Regrava os fechamentos das contas divergentes a partir dos movimentos',
+        )
+
+    def handle(self, *args, **options):
+        from financeiro.models import ContaFinanceira, SaldoDiarioConta
+        from financeiro.services.saldo_diario import calcular_fechamentos, reconstruir_fechamentos
+
+        contas = ContaFinanceira.objects.all()
+        if options.get('empresa'):
+            contas = contas.filter(empresa_id=options['empresa'])
+        nomes = dict(contas.values_list('pk', 'nome'))
+
+        esperado = calcular_fechamentos(nomes)
+        gravado = {
+            (conta_id, data): (entradas, saidas, saldo)
+            for conta_id, data, entradas, saidas, saldo in SaldoDiarioConta.objects.filter(
+                conta_id__in=list(nomes),
+            ).values_list('conta_id', 'data', 'entradas', 'saidas', 'saldo')
+            # Dias sem movimento ativo (estornados) valem como ausentes
+            if entradas or saidas
+        }
+
+        divergentes = {}
+        for chave in esperado.keys() | gravado.keys():
+            if esperado.get(chave) != gravado.get(chave):
+                divergentes.setdefault(chave[0], []).append(chave[1])
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS(f'{len(nomes)} conta(s) conferida(s); nenhuma divergência.'))
+            return
+
+        for conta_id, datas in sorted(divergentes.items()):
+            self.stdout.write(self.style.WARNING(
+                f'Conta {conta_id} ({nomes[conta_id]}): {len(datas)} dia(s) divergente(s), '
+                f'a partir de {min(datas)}'
+            ))
+        logger.warning(f'SaldoDiarioConta: {len(divergentes)} conta(s) com divergência')
+
+        if options['corrigir']:
+            linhas = reconstruir_fechamentos(divergentes)
+            self.stdout.write(self.style.SUCCESS(
+                f'Fechamentos de {len(divergentes)} conta(s) regravados ({linhas} dia(s)).'
+            ))
+        else:
+            self.stdout.write('Use --corrigir para regravar os fechamentos.')
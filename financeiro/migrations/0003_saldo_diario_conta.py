@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:38
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def gerar_fechamentos(apps, schema_editor):
+    """Fechamentos diários dos movimentos já gravados (saldo acumulado por conta)."""
+    MovimentoFinanceiro = apps.get_model('financeiro', 'MovimentoFinanceiro')
+    SaldoDiarioConta = apps.get_model('financeiro', 'SaldoDiarioConta')
+    dias = (
+        MovimentoFinanceiro.objects.filter(is_active=True)
+        .values('conta_id', 'data_movimento')
+        .annotate(
+            entradas=models.Sum('valor', filter=models.Q(tipo='ENTRADA')),
+            saidas=models.Sum('valor', filter=models.Q(tipo='SAIDA')),
+        )
+        .order_by('conta_id', 'data_movimento')
+    )
+    saldos = {}
+    fechamentos = []
+    for dia in dias:
+        entradas = dia['entradas'] or Decimal('0.00')
+        saidas = dia['saidas'] or Decimal('0.00')
+        saldos[dia['conta_id']] = saldos.get(dia['conta_id'], Decimal('0.00')) + entradas - saidas
+        fechamentos.append(SaldoDiarioConta(
+            conta_id=dia['conta_id'],
+            data=dia['data_movimento'],
+            entradas=entradas,
+            saidas=saidas,
+            saldo=saldos[dia['conta_id']],
+        ))
+    SaldoDiarioConta.objects.bulk_create(fechamentos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0002_movimentofinanceiro_categoria_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoDiarioConta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('entradas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Entradas')),
+                ('saidas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Saídas')),
+                ('saldo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Saldo no Fim do Dia')),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_diarios', to='financeiro.contafinanceira', verbose_name='Conta')),
+            ],
+            options={
+                'verbose_name': 'Saldo Diário de Conta',
+                'verbose_name_plural': 'Saldos Diários de Contas',
+                'ordering': ['conta', '-data'],
+                'constraints': [models.UniqueConstraint(fields=('conta', 'data'), name='saldo_diario_conta_data')],
+            },
+        ),
+        migrations.RunPython(gerar_fechamentos, migrations.RunPython.noop),
+    ]
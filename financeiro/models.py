@@ -268,3 +268,36 @@ class MovimentoFinanceiro(BaseModel):
     def __str__(self):
         return f"{self.tipo} - {self.conta.nome} - R$ {self.valor}"
 
+
+
+class SaldoDiarioConta(models.Model):
+    """
+    Fechamento diário de uma conta financeira (dias com movimento).
+
+    entradas/saidas somam os movimentos ativos do dia; saldo é o saldo da conta no
+    fim do dia (todos os movimentos até a data). Mantido a cada inclusão, alteração
+    ou estorno (is_active=False) de MovimentoFinanceiro
+    (financeiro/services/saldo_diario.py); conferido por verificar_saldos_financeiros.
+    """
+
+    conta = models.ForeignKey(
+        ContaFinanceira,
+        on_delete=models.CASCADE,
+        related_name='saldos_diarios',
+        verbose_name='Conta',
+    )
+    data = models.DateField('Data')
+    entradas = models.DecimalField('Entradas', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    saidas = models.DecimalField('Saídas', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    saldo = models.DecimalField('Saldo no Fim do Dia', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = 'Saldo Diário de Conta'
+        verbose_name_plural = 'Saldos Diários de Contas'
+        ordering = ['conta', '-data']
+        constraints = [
+            models.UniqueConstraint(fields=['conta', 'data'], name='saldo_diario_conta_data'),
+        ]
+
+    def __str__(self):
+        return f"{self.conta.nome} - {self.data} - R$ {self.saldo}"
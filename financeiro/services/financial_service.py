@@ -4,12 +4,13 @@ Serviços financeiros para geração de títulos, baixa e relatórios.
 from decimal import Decimal
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Sum, Q
+from django.db.models import Q
 from datetime import timedelta, date
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 import logging
 
 from ..models import TituloReceber, TituloPagar, MovimentoFinanceiro, ContaFinanceira
+from .saldo_diario import fluxo_diario, saldo_atual, saldos_por_conta
 from vendas.models import PedidoVenda, CondicaoPagamento
 from pdv.models import Pagamento
 
@@ -246,11 +247,12 @@ class FinancialService:
         data_fim: date,
         conta_financeira: Optional[ContaFinanceira] = None,
         empresa=None,
-    ) -> List[Dict]:
+    ) -> Iterator[Dict]:
         """
         Calcula fluxo de caixa para um período.
         
-        Retorna lista de dicionários com data, entradas, saídas e saldo acumulado.
+        Gera, por dia com movimento, data, entradas, saídas e saldo ao fim do dia
+        (saldo de abertura + movimentos até o dia), calculados numa única consulta.
         
         Args:
             data_inicio: Data inicial
@@ -258,51 +260,22 @@ class FinancialService:
             conta_financeira: Conta específica (None para todas)
             
         Returns:
-            Lista de dicts: [{'data': date, 'entradas': Decimal, 'saidas': Decimal, 'saldo': Decimal}, ...]
+            Iterador de dicts: {'data': date, 'entradas': Decimal, 'saidas': Decimal, 'saldo': Decimal}
         """
-        # Filtra movimentos por conta e período
-        movimentos_qs = MovimentoFinanceiro.objects.filter(
-            data_movimento__gte=data_inicio,
-            data_movimento__lte=data_fim,
-            is_active=True
-        )
-
+        contas = None
         if conta_financeira:
-            movimentos_qs = movimentos_qs.filter(conta=conta_financeira)
+            contas = ContaFinanceira.objects.filter(pk=conta_financeira.pk)
         elif empresa is not None:
-            movimentos_qs = movimentos_qs.filter(conta__empresa=empresa)
+            contas = ContaFinanceira.objects.filter(empresa=empresa)
 
-        # Agrupa por data
-        movimentos_por_data = {}
-        
-        for movimento in movimentos_qs.select_related('conta'):
-            data_mov = movimento.data_movimento
-            
-            if data_mov not in movimentos_por_data:
-                movimentos_por_data[data_mov] = {
-                    'data': data_mov,
-                    'entradas': Decimal('0.00'),
-                    'saidas': Decimal('0.00'),
-                    'saldo': Decimal('0.00'),
-                }
-            
-            if movimento.tipo == 'ENTRADA':
-                movimentos_por_data[data_mov]['entradas'] += movimento.valor
-            else:
-                movimentos_por_data[data_mov]['saidas'] += movimento.valor
-        
-        # Ordena por data e calcula saldo acumulado
-        resultado = []
-        saldo_acumulado = Decimal('0.00')
-        
-        for data_mov in sorted(movimentos_por_data.keys()):
-            item = movimentos_por_data[data_mov]
-            saldo_dia = item['entradas'] - item['saidas']
-            saldo_acumulado += saldo_dia
-            item['saldo'] = saldo_acumulado
-            resultado.append(item)
-        
-        return resultado
+        centavos = Decimal('0.01')
+        for dia in fluxo_diario(data_inicio, data_fim, contas).iterator():
+            yield {
+                'data': dia['data'],
+                'entradas': dia['entradas_dia'].quantize(centavos),
+                'saidas': dia['saidas_dia'].quantize(centavos),
+                'saldo': dia['saldo_dia'].quantize(centavos),
+            }
     
     @staticmethod
     def get_saldo_atual(
@@ -318,20 +291,19 @@ class FinancialService:
         Returns:
             Saldo total (entradas - saídas)
         """
-        movimentos_qs = MovimentoFinanceiro.objects.filter(is_active=True)
-
+        # Último fechamento diário de cada conta (já inclui os movimentos de hoje)
         if conta_financeira:
-            movimentos_qs = movimentos_qs.filter(conta=conta_financeira)
+            contas = ContaFinanceira.objects.filter(pk=conta_financeira.pk)
         elif empresa is not None:
-            movimentos_qs = movimentos_qs.filter(conta__empresa=empresa)
+            contas = ContaFinanceira.objects.filter(empresa=empresa)
+        else:
+            contas = ContaFinanceira.objects.all()
 
-        entradas = movimentos_qs.filter(tipo='ENTRADA').aggregate(
-            total=Sum('valor')
-        )['total'] or Decimal('0.00')
-        
-        saidas = movimentos_qs.filter(tipo='SAIDA').aggregate(
-            total=Sum('valor')
-        )['total'] or Decimal('0.00')
-        
-        return entradas - saidas
+        return saldo_atual(contas)
 
+    @staticmethod
+    def get_saldos_por_conta(contas) -> Dict[int, Decimal]:
+        """
+        Saldo atual de cada conta numa única consulta: {conta_id: saldo}.
+        """
+        return saldos_por_conta(contas)
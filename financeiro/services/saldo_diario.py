@@ -0,0 +1,163 @@
+"""
+Fechamentos diários por conta (SaldoDiarioConta).
+
+Cada movimento ativo soma nas entradas/saídas do seu dia e no saldo desse dia e de
+todos os dias seguintes da conta (movimento retroativo corrige os fechamentos já
+gravados com um único UPDATE). A conta é travada (select_for_update) durante a
+atualização, então inclusões concorrentes na mesma conta são serializadas.
+
+O saldo atual de uma conta é o saldo do último fechamento, que já inclui os
+movimentos de hoje (e os lançados com data futura, como a soma de todos os
+movimentos fazia).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce
+
+from ..models import ContaFinanceira, MovimentoFinanceiro, SaldoDiarioConta
+
+ZERO = Decimal('0.00')
+
+
+def registrar_movimento(conta_id, data, tipo: str, valor: Decimal, sinal: int = 1):
+    """Aplica (sinal=1) ou retira (sinal=-1) um movimento nos fechamentos da conta."""
+    campo = 'entradas' if tipo == 'ENTRADA' else 'saidas'
+    delta_saldo = sinal * valor if tipo == 'ENTRADA' else -sinal * valor
+
+    with transaction.atomic():
+        list(ContaFinanceira.objects.select_for_update().filter(pk=conta_id).values_list('pk', flat=True))
+        fechamentos = SaldoDiarioConta.objects.filter(conta_id=conta_id)
+        if not fechamentos.filter(data=data).exists():
+            anterior = (
+                fechamentos.filter(data__lt=data).order_by('-data').values_list('saldo', flat=True).first()
+            )
+            SaldoDiarioConta.objects.create(conta_id=conta_id, data=data, saldo=anterior or ZERO)
+        fechamentos.filter(data=data).update(**{campo: F(campo) + sinal * valor})
+        fechamentos.filter(data__gte=data).update(saldo=F('saldo') + delta_saldo)
+
+
+def saldos_por_conta(contas) -> Dict[int, Decimal]:
+    """Saldo atual (último fechamento) de cada conta: {conta_id: saldo}, numa consulta."""
+    ultimo = (
+        SaldoDiarioConta.objects.filter(conta=OuterRef('conta'))
+        .order_by('-data')
+        .values('data')[:1]
+    )
+    saldos = dict(
+        SaldoDiarioConta.objects.filter(conta__in=contas, data=Subquery(ultimo))
+        .values_list('conta_id', 'saldo')
+    )
+    return {conta.pk: saldos.get(conta.pk, ZERO) for conta in contas}
+
+
+def saldo_atual(contas) -> Decimal:
+    """Soma dos saldos atuais das contas (queryset)."""
+    ultimo = (
+        SaldoDiarioConta.objects.filter(conta=OuterRef('conta'))
+        .order_by('-data')
+        .values('data')[:1]
+    )
+    return (
+        SaldoDiarioConta.objects.filter(conta__in=contas, data=Subquery(ultimo))
+        .aggregate(total=Sum('saldo'))['total']
+        or ZERO
+    )
+
+
+def fechamentos_do_periodo(data_inicio, data_fim, contas=None):
+    """Fechamentos com movimento no período (todas as contas ou as do queryset)."""
+    qs = SaldoDiarioConta.objects.filter(
+        data__gte=data_inicio,
+        data__lte=data_fim,
+    ).filter(Q(entradas__gt=0) | Q(saidas__gt=0))
+    if contas is not None:
+        qs = qs.filter(conta__in=contas)
+    return qs
+
+
+def calcular_fechamentos(conta_ids: Optional[Iterable[int]] = None) -> Dict[Tuple[int, object], Tuple]:
+    """
+    Fechamentos esperados a partir dos movimentos ativos:
+    {(conta_id, data): (entradas, saidas, saldo)}.
+    """
+    movimentos = MovimentoFinanceiro.objects.filter(is_active=True)
+    if conta_ids is not None:
+        movimentos = movimentos.filter(conta_id__in=list(conta_ids))
+    dias = (
+        movimentos.values('conta_id', 'data_movimento')
+        .annotate(
+            entradas=Sum('valor', filter=Q(tipo='ENTRADA')),
+            saidas=Sum('valor', filter=Q(tipo='SAIDA')),
+        )
+        .order_by('conta_id', 'data_movimento')
+    )
+    saldos = defaultdict(lambda: ZERO)
+    esperado = {}
+    for dia in dias:
+        entradas = dia['entradas'] or ZERO
+        saidas = dia['saidas'] or ZERO
+        saldos[dia['conta_id']] += entradas - saidas
+        esperado[(dia['conta_id'], dia['data_movimento'])] = (entradas, saidas, saldos[dia['conta_id']])
+    return esperado
+
+
+@transaction.atomic
+def reconstruir_fechamentos(conta_ids: Iterable[int]) -> int:
+    """Regrava os fechamentos das contas a partir dos movimentos. Devolve as linhas gravadas."""
+    conta_ids = list(conta_ids)
+    esperado = calcular_fechamentos(conta_ids)
+    SaldoDiarioConta.objects.filter(conta_id__in=conta_ids).delete()
+    SaldoDiarioConta.objects.bulk_create(
+        [
+            SaldoDiarioConta(conta_id=conta_id, data=data, entradas=entradas, saidas=saidas, saldo=saldo)
+            for (conta_id, data), (entradas, saidas, saldo) in esperado.items()
+        ],
+        batch_size=1000,
+    )
+    return len(esperado)
+
+
+def fluxo_diario(data_inicio, data_fim, contas=None):
+    """
+    Fluxo por dia do período numa consulta: entradas/saídas do dia (somadas entre
+    as contas) e saldo ao fim do dia, partindo do saldo de abertura (último
+    fechamento de cada conta antes de data_inicio).
+
+    Janelas em vez de GROUP BY: a soma acumulada é uma janela ordenada por data
+    (RANGE inclui as outras contas do mesmo dia) e o DISTINCT deixa uma linha por dia.
+    Devolve um queryset de dicts (values); valores sem quantização no SQLite.
+    """
+    decimal = DecimalField(max_digits=14, decimal_places=2)
+
+    ultimo_anterior = (
+        SaldoDiarioConta.objects.filter(conta=OuterRef('conta'), data__lt=data_inicio)
+        .order_by('-data')
+        .values('data')[:1]
+    )
+    abertura = SaldoDiarioConta.objects.filter(data=Subquery(ultimo_anterior))
+    if contas is not None:
+        abertura = abertura.filter(conta__in=contas)
+    abertura = (
+        abertura.order_by()
+        .annotate(grupo=Value(1))
+        .values('grupo')
+        .annotate(total=Sum('saldo'))
+        .values('total')
+    )
+
+    return (
+        fechamentos_do_periodo(data_inicio, data_fim, contas)
+        .annotate(
+            entradas_dia=Window(Sum('entradas'), partition_by=F('data'), output_field=decimal),
+            saidas_dia=Window(Sum('saidas'), partition_by=F('data'), output_field=decimal),
+            saldo_dia=Coalesce(Subquery(abertura, output_field=decimal), Value(ZERO), output_field=decimal)
+            + Window(Sum(F('entradas') - F('saidas')), order_by=F('data').asc(), output_field=decimal),
+        )
+        .values('data', 'entradas_dia', 'saidas_dia', 'saldo_dia')
+        .order_by('data')
+        .distinct()
+    )
@@ -0,0 +1,43 @@
+"""
+Signals do módulo financeiro: fechamentos diários das contas (SaldoDiarioConta).
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import MovimentoFinanceiro
+from .services.saldo_diario import registrar_movimento
+
+_CAMPOS_SALDO = ('conta_id', 'data_movimento', 'tipo', 'valor', 'is_active')
+
+
+def _estado(movimento):
+    return tuple(getattr(movimento, campo) for campo in _CAMPOS_SALDO)
+
+
+@receiver(pre_save, sender=MovimentoFinanceiro)
+def guardar_movimento_anterior(sender, instance, **kwargs):
+    """Guarda o estado gravado no banco para retirar o valor antigo dos fechamentos."""
+    instance._saldo_anterior = None
+    if instance.pk:
+        instance._saldo_anterior = (
+            sender._base_manager.filter(pk=instance.pk).values_list(*_CAMPOS_SALDO).first()
+        )
+
+
+@receiver(post_save, sender=MovimentoFinanceiro)
+def atualizar_saldo_diario(sender, instance, **kwargs):
+    anterior = getattr(instance, '_saldo_anterior', None)
+    if anterior == _estado(instance):
+        return
+    if anterior is not None:
+        conta_id, data, tipo, valor, ativo = anterior
+        if ativo:
+            registrar_movimento(conta_id, data, tipo, valor, sinal=-1)
+    if instance.is_active:
+        registrar_movimento(instance.conta_id, instance.data_movimento, instance.tipo, instance.valor)
+
+
+@receiver(post_delete, sender=MovimentoFinanceiro)
+def retirar_movimento_excluido(sender, instance, **kwargs):
+    if instance.is_active:
+        registrar_movimento(instance.conta_id, instance.data_movimento, instance.tipo, instance.valor, sinal=-1)
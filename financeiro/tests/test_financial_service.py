@@ -99,7 +99,7 @@ class TestFinancialService:
             data_movimento=hoje,
         )
         
-        fluxo = FinancialService.calcular_fluxo_caixa(hoje, hoje, conta)
+        fluxo = list(FinancialService.calcular_fluxo_caixa(hoje, hoje, conta))
         
         assert len(fluxo) == 1
         assert fluxo[0]['entradas'] == Decimal('100.00')
@@ -140,3 +140,90 @@ class TestFinancialService:
 
 
 
+
+
+@pytest.mark.django_db
+class TestSaldoDiarioConta:
+    """Fechamentos diários mantidos por movimento e usados em saldo e fluxo de caixa."""
+
+    @pytest.fixture
+    def conta(self):
+        empresa = Empresa.objects.create(
+            nome_fantasia='Teste',
+            razao_social='Teste LTDA',
+            cnpj='12345678000190',
+        )
+        return ContaFinanceira.objects.create(empresa=empresa, nome='Caixa', tipo='CAIXA')
+
+    def _movimento(self, conta, tipo, valor, data):
+        return MovimentoFinanceiro.objects.create(
+            conta=conta,
+            tipo=tipo,
+            categoria='OUTROS',
+            valor=Decimal(valor),
+            data_movimento=data,
+        )
+
+    def test_movimento_retroativo_e_estorno(self, conta):
+        from financeiro.models import SaldoDiarioConta
+
+        hoje = date.today()
+        ontem = hoje - timedelta(days=1)
+        self._movimento(conta, 'ENTRADA', '100.00', hoje)
+        self._movimento(conta, 'SAIDA', '30.00', hoje)
+        retroativo = self._movimento(conta, 'ENTRADA', '50.00', ontem)
+
+        saldos = dict(SaldoDiarioConta.objects.values_list('data', 'saldo'))
+        assert saldos == {ontem: Decimal('50.00'), hoje: Decimal('120.00')}
+        assert FinancialService.get_saldo_atual(conta) == Decimal('120.00')
+        assert FinancialService.get_saldo_atual(empresa=conta.empresa) == Decimal('120.00')
+
+        retroativo.is_active = False
+        retroativo.save()
+        assert FinancialService.get_saldo_atual(conta) == Decimal('70.00')
+        assert FinancialService.get_saldos_por_conta([conta]) == {conta.pk: Decimal('70.00')}
+
+        fluxo = FinancialService.calcular_fluxo_caixa(ontem, hoje, conta)
+        assert [(f['data'], f['entradas'], f['saidas'], f['saldo']) for f in fluxo] == [
+            (hoje, Decimal('100.00'), Decimal('30.00'), Decimal('70.00')),
+        ]
+
+    def test_verificar_saldos_corrige_divergencia(self, conta):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from financeiro.models import SaldoDiarioConta
+
+        hoje = date.today()
+        self._movimento(conta, 'ENTRADA', '100.00', hoje - timedelta(days=2))
+        self._movimento(conta, 'SAIDA', '40.00', hoje)
+        # Alteração fora dos signals
+        MovimentoFinanceiro.objects.filter(tipo='SAIDA').update(valor=Decimal('45.00'))
+
+        saida = StringIO()
+        call_command('verificar_saldos_financeiros', stdout=saida)
+        assert '1 dia(s) divergente(s)' in saida.getvalue()
+        assert FinancialService.get_saldo_atual(conta) == Decimal('60.00')
+
+        call_command('verificar_saldos_financeiros', '--corrigir', stdout=StringIO())
+        assert FinancialService.get_saldo_atual(conta) == Decimal('55.00')
+        assert SaldoDiarioConta.objects.count() == 2
+
+    def test_fluxo_caixa_com_saldo_de_abertura(self, conta):
+        outra = ContaFinanceira.objects.create(empresa=conta.empresa, nome='Banco', tipo='BANCO')
+        hoje = date.today()
+        ontem = hoje - timedelta(days=1)
+        self._movimento(conta, 'ENTRADA', '200.00', hoje - timedelta(days=10))
+        self._movimento(outra, 'ENTRADA', '0.10', hoje - timedelta(days=5))
+        self._movimento(conta, 'SAIDA', '50.00', ontem)
+        self._movimento(outra, 'ENTRADA', '0.20', ontem)
+        self._movimento(outra, 'SAIDA', '10.00', hoje)
+
+        fluxo = FinancialService.calcular_fluxo_caixa(ontem, hoje, empresa=conta.empresa)
+        assert [(f['data'], f['entradas'], f['saidas'], f['saldo']) for f in fluxo] == [
+            (ontem, Decimal('0.20'), Decimal('50.00'), Decimal('150.30')),
+            (hoje, Decimal('0.00'), Decimal('10.00'), Decimal('140.30')),
+        ]
+        fluxo_conta = list(FinancialService.calcular_fluxo_caixa(ontem, hoje, conta))
+        assert [f['saldo'] for f in fluxo_conta] == [Decimal('150.00')]
@@ -78,10 +78,11 @@ class DashboardFinanceiroView(TemplateView):
         ).aggregate(total=Sum('valor'))['total'] or Decimal('0.00')
 
         # Saldo das contas
-        contas = ContaFinanceira.objects.filter(empresa=empresa, is_active=True)
+        contas = list(ContaFinanceira.objects.filter(empresa=empresa, is_active=True))
+        saldos = FinancialService.get_saldos_por_conta(contas)
         saldo_contas = {}
         for conta in contas:
-            saldo_contas[conta.nome] = FinancialService.get_saldo_atual(conta)
+            saldo_contas[conta.nome] = saldos[conta.pk]
 
         saldo_total = FinancialService.get_saldo_atual(empresa=empresa)
 
@@ -517,23 +518,25 @@ class RelatorioFluxoCaixaView(TemplateView):
             data_fim = form.cleaned_data['data_fim']
             conta_financeira = form.cleaned_data.get('conta_financeira')
             
-            fluxo = FinancialService.calcular_fluxo_caixa(
+            # Uma passada pelo iterador alimenta a tabela e o gráfico
+            fluxo = []
+            fluxo_grafico = []
+            for item in FinancialService.calcular_fluxo_caixa(
                 data_inicio,
                 data_fim,
                 conta_financeira,
                 empresa=empresa,
-            )
-            
-            context['fluxo'] = fluxo
-            context['fluxo_json'] = json.dumps([
-                {
+            ):
+                fluxo.append(item)
+                fluxo_grafico.append({
                     'data': item['data'].strftime('%d/%m/%Y'),
                     'entradas': float(item['entradas']),
                     'saidas': float(item['saidas']),
                     'saldo': float(item['saldo']),
-                }
-                for item in fluxo
-            ])
+                })
+            
+            context['fluxo'] = fluxo
+            context['fluxo_json'] = json.dumps(fluxo_grafico)
         else:
             context['fluxo'] = []
             context['fluxo_json'] = '[]'
@@ -3,7 +3,7 @@ Admin para modelos fiscais.
 """
 from django.contrib import admin
 from .forms import ConfiguracaoFiscalLojaAdminForm
-from .models import ConfiguracaoFiscalLoja, NotaFiscalSaida, NotaFiscalEntrada, ItemNotaFiscalEntrada, HistoricoEntradaEstoque, AlertaNotaFiscal
+from .models import ConfiguracaoFiscalLoja, NotaFiscalSaida, NotaFiscalEntrada, ItemNotaFiscalEntrada, HistoricoEntradaEstoque, AlertaNotaFiscal, LoteNFe, AutorizacaoNFe
 
 
 @admin.register(ConfiguracaoFiscalLoja)
@@ -119,3 +119,19 @@ class AlertaNotaFiscalAdmin(admin.ModelAdmin):
     search_fields = ['chave_acesso', 'razao_social_emitente', 'cnpj_emitente']
     readonly_fields = ['data_consulta_sefaz', 'created_at', 'updated_at']
 
+
+
+@admin.register(LoteNFe)
+class LoteNFeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'loja', 'status', 'recibo', 'c_stat', 'consultas', 'proxima_consulta', 'created_at']
+    list_filter = ['status', 'loja']
+    search_fields = ['recibo']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(AutorizacaoNFe)
+class AutorizacaoNFeAdmin(admin.ModelAdmin):
+    list_display = ['nota', 'chave', 'status', 'lote', 'tentativas', 'proxima_tentativa', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['chave', 'nota__numero']
+    readonly_fields = ['created_at', 'updated_at']
@@ -6,3 +6,5 @@ class FiscalConfig(AppConfig):
     name = 'fiscal'
     verbose_name = 'Fiscal'
 
+    def ready(self):
+        import fiscal.signals  # noqa: F401
@@ -0,0 +1,226 @@
+"""
+Armazenamento dos XML fiscais (NF-e emitidas e importadas) fora das linhas das tabelas.
+
+O XML assinado/autorizado (dezenas a centenas de KB) vira um arquivo comprimido
+endereçado pelo SHA-256 do conteúdo; a linha guarda só o hash e o tamanho. Listas,
+contagens e somas de NotaFiscalSaida/NotaFiscalEntrada deixam de arrastar o XML.
+
+- Caminho: ``ab/cd/<sha256>.xml.zst`` (zstd, se o pacote ``zstandard`` estiver
+  instalado) ou ``.xml.gz`` (gzip); o leitor aceita os dois
+- Armazenamento: ``STORAGES['xml_fiscal']`` se configurado (ex.: S3 via
+  django-storages, settings.FISCAL_XML_STORAGE_BACKEND); senão, disco em
+  FISCAL_XML_DIR (padrão MEDIA_ROOT/xml_fiscal)
+- Guarda legal: só com settings.FISCAL_XML_DURAVEL (armazenamento que sobrevive
+  a deploys: S3, disco persistente) a linha fica apenas com o hash. Sem isso
+  (ex.: disco efêmero do Render), a coluna legada mantém uma cópia do XML, lida
+  se o arquivo sumir, e migrar_xml_fiscal se recusa a limpá-la
+- Conteúdo idêntico é gravado uma vez; arquivos nunca são alterados nem removidos
+  pela aplicação (guarda legal de 5 anos dos XML fiscais): excluir ou reemitir a
+  nota não apaga o XML anterior. Backup/expurgo são feitos no diretório.
+- A leitura confere o SHA-256: arquivo corrompido gera erro em vez de XML errado
+- Os arquivos são gzip/zstd comuns, legíveis sem a aplicação (zcat/zstdcat)
+
+XMLArmazenadoField expõe isso como um atributo de texto: ``nota.xml_arquivo``
+carrega o XML do disco no primeiro acesso; atribuir e salvar grava o arquivo.
+XML de linhas anteriores a este armazenamento fica na coluna legada até o
+comando ``migrar_xml_fiscal`` movê-lo.
+"""
+import gzip
+import hashlib
+from pathlib import Path
+from typing import Optional, Tuple
+
+from django import forms
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+EXTENSOES = ('.xml.zst', '.xml.gz')
+
+
+def _storage() -> Storage:
+    if 'xml_fiscal' in settings.STORAGES:
+        return storages['xml_fiscal']
+    diretorio = getattr(settings, 'FISCAL_XML_DIR', None) or Path(settings.MEDIA_ROOT) / 'xml_fiscal'
+    return FileSystemStorage(location=diretorio)
+
+
+def armazenamento_duravel() -> bool:
+    """Os arquivos sobrevivem a deploys/reinícios (settings.FISCAL_XML_DURAVEL)?"""
+    return getattr(settings, 'FISCAL_XML_DURAVEL', False)
+
+
+def copia_legado(conteudo: Optional[str]) -> Optional[str]:
+    """Valor da coluna legada para um XML gravado: cópia na linha se o armazenamento não é durável."""
+    return None if armazenamento_duravel() else conteudo
+
+
+def _caminho(sha256: str, extensao: str) -> str:
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}{extensao}'
+
+
+def _comprimir(dados: bytes) -> Tuple[bytes, str]:
+    if zstandard is not None and getattr(settings, 'FISCAL_XML_COMPRESSAO', 'zstd') == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(dados), '.xml.zst'
+    return gzip.compress(dados, compresslevel=9, mtime=0), '.xml.gz'
+
+
+def _descomprimir(dados: bytes, extensao: str) -> bytes:
+    if extensao == '.xml.zst':
+        if zstandard is None:
+            raise ValueError('XML fiscal comprimido com zstd: instale o pacote zstandard para ler.')
+        return zstandard.ZstdDecompressor().decompress(dados)
+    return gzip.decompress(dados)
+
+
+def salvar_xml(conteudo: str) -> Tuple[str, int]:
+    """Grava o XML (se ainda não existir) e retorna (sha256, tamanho em bytes sem compressão)."""
+    dados = conteudo.encode('utf-8')
+    sha256 = hashlib.sha256(dados).hexdigest()
+    storage = _storage()
+    if not any(storage.exists(_caminho(sha256, ext)) for ext in EXTENSOES):
+        comprimido, extensao = _comprimir(dados)
+        storage.save(_caminho(sha256, extensao), ContentFile(comprimido))
+    return sha256, len(dados)
+
+
+def carregar_xml(sha256: str) -> str:
+    """
+    Lê o XML pelo hash, conferindo a integridade.
+
+    Raises:
+        FileNotFoundError: se não houver arquivo para o hash
+        ValueError: se o conteúdo não corresponder ao hash
+    """
+    storage = _storage()
+    for extensao in EXTENSOES:
+        caminho = _caminho(sha256, extensao)
+        if storage.exists(caminho):
+            with storage.open(caminho, 'rb') as arquivo:
+                dados = _descomprimir(arquivo.read(), extensao)
+            if hashlib.sha256(dados).hexdigest() != sha256:
+                raise ValueError(f'XML fiscal {sha256} corrompido: conteúdo não confere com o hash.')
+            return dados.decode('utf-8')
+    raise FileNotFoundError(f'XML fiscal não encontrado no armazenamento: {sha256}')
+
+
+class _ConteudoXMLDescriptor:
+    """Atributo com o XML: lido do armazenamento pelo hash (coluna) no primeiro acesso."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        dados = instance.__dict__
+        if self.field.chave_pendente in dados:
+            return dados[self.field.chave_pendente]
+        # getattr da coluna carrega o hash se ela estiver adiada (.only/.defer)
+        referencia = getattr(instance, self.field.attname)
+        if not referencia:
+            return self.field.carregar_legado(instance)
+        cache = dados.get(self.field.chave_cache)
+        if cache is None or cache[0] != referencia:
+            cache = dados[self.field.chave_cache] = (referencia, self.field.carregar(instance, referencia))
+        return cache[1]
+
+    def __set__(self, instance, value):
+        # Gravado no armazenamento no save (pre_save)
+        instance.__dict__[self.field.chave_pendente] = value
+
+
+class XMLArmazenadoField(models.Field):
+    """
+    XML fiscal guardado em arquivo comprimido; a coluna (``<nome>_sha256``) tem só o hash.
+
+    ``nota.xml_arquivo`` devolve o XML (carregado sob demanda) e aceita atribuição;
+    ``nota.xml_arquivo_sha256`` é o hash. ``campo_tamanho`` recebe o tamanho do XML
+    em bytes a cada save. ``campo_legado`` é a coluna de texto antiga, lida
+    enquanto a linha não tiver hash (ver migrar_xml_fiscal) e, sem armazenamento
+    durável, cópia do XML atual. Ao salvar com update_fields, inclua os dois
+    junto com este campo.
+
+    Exemplo:
+        xml_arquivo = XMLArmazenadoField('XML da Nota', campo_tamanho='xml_tamanho', campo_legado='xml_legado')
+        nota.xml_arquivo = xml_assinado
+        nota.save(update_fields=['xml_arquivo', 'xml_tamanho', 'xml_legado'])
+    """
+
+    def __init__(self, *args, campo_tamanho: str = 'xml_tamanho', campo_legado: Optional[str] = None, **kwargs):
+        self.campo_tamanho = campo_tamanho
+        self.campo_legado = campo_legado
+        kwargs['max_length'] = 64
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['campo_tamanho'] = self.campo_tamanho
+        if self.campo_legado:
+            kwargs['campo_legado'] = self.campo_legado
+        kwargs.pop('max_length', None)
+        return name, path, args, kwargs
+
+    def get_attname(self):
+        return f'{self.name}_sha256'
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        self.chave_pendente = f'_{name}_pendente'
+        self.chave_cache = f'_{name}_cache'
+        setattr(cls, name, _ConteudoXMLDescriptor(self))
+
+    def get_internal_type(self):
+        return 'CharField'
+
+    def get_prep_value(self, value):
+        return value or None
+
+    def carregar_legado(self, instance) -> Optional[str]:
+        return getattr(instance, self.campo_legado) if self.campo_legado else None
+
+    def carregar(self, instance, sha256: str) -> str:
+        try:
+            return carregar_xml(sha256)
+        except FileNotFoundError:
+            # Arquivo perdido (disco efêmero): vale a cópia da linha, se for o mesmo XML
+            copia = self.carregar_legado(instance)
+            if copia and hashlib.sha256(copia.encode('utf-8')).hexdigest() == sha256:
+                return copia
+            raise
+
+    def pre_save(self, model_instance, add):
+        dados = model_instance.__dict__
+        if self.chave_pendente in dados:
+            conteudo = dados.pop(self.chave_pendente)
+            sha256, tamanho = salvar_xml(conteudo) if conteudo else (None, 0)
+            setattr(model_instance, self.attname, sha256)
+            setattr(model_instance, self.campo_tamanho, tamanho)
+            if sha256:
+                dados[self.chave_cache] = (sha256, conteudo)
+            if self.campo_legado:
+                # XML vazio limpa também a coluna antiga: o descriptor a leria no lugar do arquivo
+                setattr(model_instance, self.campo_legado, copia_legado(conteudo) if sha256 else None)
+        return getattr(model_instance, self.attname)
+
+    def value_from_object(self, obj):
+        return getattr(obj, self.name)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj) or ''
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{
+            'form_class': forms.CharField,
+            'widget': forms.Textarea,
+            **kwargs,
+        })
@@ -0,0 +1,133 @@
+"""
+Cache dos PDF de documentos fiscais que não mudam mais: DANFE de NF-e
+AUTORIZADA e cupom de pedido FATURADO.
+
+O PDF é renderizado (WeasyPrint) uma vez e gravado em
+``<FISCAL_PDF_DIR>/<tipo>/<id>/<status>-<hash>.pdf``; o hash cobre as entradas
+do documento (marcas de atualização das linhas usadas e o próprio template), e
+qualquer alteração nelas gera outro arquivo em vez de servir PDF desatualizado.
+Reimpressões servem o arquivo com ETag: If-None-Match igual devolve 304 sem
+ler o arquivo. Documento em outro status é renderizado a cada pedido e não é
+gravado.
+
+Com settings.FISCAL_PDF_PRERENDER, o DANFE é gerado numa thread logo após a
+autorização (prerenderizar_danfe), e a primeira impressão já encontra o arquivo.
+"""
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.template.loader import get_template
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+logger = logging.getLogger(__name__)
+
+
+def _storage() -> FileSystemStorage:
+    diretorio = getattr(settings, 'FISCAL_PDF_DIR', None) or Path(settings.MEDIA_ROOT) / 'pdf_fiscal'
+    return FileSystemStorage(location=diretorio)
+
+
+@lru_cache(maxsize=None)
+def hash_template(nome: str) -> str:
+    """SHA-256 do arquivo do template: editar o layout invalida os PDF gravados."""
+    return hashlib.sha256(Path(get_template(nome).origin.name).read_bytes()).hexdigest()
+
+
+def hash_entradas(*entradas) -> str:
+    """SHA-256 das entradas do documento (valores convertidos para texto, em ordem)."""
+    return hashlib.sha256('\x1f'.join(str(e) for e in entradas).encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class DocumentoPDF:
+    tipo: str  # 'danfe' | 'cupom'
+    documento_id: int
+    status: str
+    entradas: str  # hash_entradas(...)
+    cacheavel: bool  # status final: o PDF pode ser gravado
+
+    @property
+    def caminho(self) -> str:
+        return f'{self.tipo}/{self.documento_id}/{self.status}-{self.entradas}.pdf'
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.tipo}-{self.documento_id}-{self.status}-{self.entradas[:32]}"'
+
+
+def em_cache(documento: DocumentoPDF) -> bool:
+    return documento.cacheavel and _storage().exists(documento.caminho)
+
+
+def obter_pdf(documento: DocumentoPDF, renderizar: Callable[[], bytes]) -> bytes:
+    """PDF do documento: lido do cache ou renderizado (e gravado, se cacheável)."""
+    storage = _storage()
+    if documento.cacheavel and storage.exists(documento.caminho):
+        with storage.open(documento.caminho, 'rb') as arquivo:
+            return arquivo.read()
+    pdf = renderizar()
+    if documento.cacheavel and not storage.exists(documento.caminho):
+        storage.save(documento.caminho, ContentFile(pdf))
+    return pdf
+
+
+def resposta_pdf(request, documento: DocumentoPDF, renderizar: Callable[[], bytes], nome_arquivo: str) -> HttpResponse:
+    """
+    Resposta inline com o PDF. Documento cacheável leva ETag e é revalidado a
+    cada acesso (Cache-Control private/no-cache: o navegador guarda, mas a view
+    confere permissão e versão antes de responder 304).
+    """
+    disposicao = f'inline; filename="{nome_arquivo}"'
+    if not documento.cacheavel:
+        response = HttpResponse(renderizar(), content_type='application/pdf')
+        response['Content-Disposition'] = disposicao
+        return response
+
+    if documento.etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        storage = _storage()
+        if storage.exists(documento.caminho):
+            response = FileResponse(storage.open(documento.caminho, 'rb'), content_type='application/pdf')
+        else:
+            response = HttpResponse(obter_pdf(documento, renderizar), content_type='application/pdf')
+        response['Content-Disposition'] = disposicao
+    response['ETag'] = documento.etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _prerenderizar_danfe(nota_id: int):
+    from .danfe import documento_danfe, gerar_pdf_danfe
+    from .models import NotaFiscalSaida
+
+    try:
+        nota = NotaFiscalSaida.objects.select_related(
+            'loja', 'loja__empresa', 'cliente', 'pedido_venda',
+        ).get(pk=nota_id)
+        documento = documento_danfe(nota)
+        if documento.cacheavel:
+            obter_pdf(documento, lambda: gerar_pdf_danfe(nota))
+    except Exception:
+        logger.exception('Erro ao pré-renderizar DANFE da nota %s', nota_id)
+    finally:
+        connection.close()
+
+
+def prerenderizar_danfe(nota_id: int):
+    """Gera o DANFE da nota autorizada numa thread, se settings.FISCAL_PDF_PRERENDER."""
+    from .danfe import WEASYPRINT_AVAILABLE
+
+    if getattr(settings, 'FISCAL_PDF_PRERENDER', False) and WEASYPRINT_AVAILABLE:
+        threading.Thread(target=_prerenderizar_danfe, args=(nota_id,), daemon=True).start()
@@ -1,24 +1,65 @@
 """
 Cálculos fiscais conforme normas SEFAZ-BA.
 """
+from collections.abc import Mapping
 from decimal import Decimal
 from types import SimpleNamespace
 from django.apps import apps as django_apps
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 
-def _parametros_fiscais_produto(item, produto) -> Optional[object]:
-    pedido = getattr(item, 'pedido', None)
+def _campo(item, nome, default=None):
+    """Lê um campo do item, seja objeto (ItemPedidoVenda) ou dict."""
+    if isinstance(item, Mapping):
+        return item.get(nome, default)
+    return getattr(item, nome, default)
+
+
+def _empresa_id_do_item(item) -> Optional[int]:
+    empresa_id = _campo(item, 'empresa_id')
+    if empresa_id:
+        return empresa_id
+    pedido = _campo(item, 'pedido')
     loja = getattr(pedido, 'loja', None) if pedido else None
-    empresa = getattr(loja, 'empresa', None) if loja else None
-    if not empresa:
-        return None
+    return getattr(loja, 'empresa_id', None) if loja else None
+
+
+def _produto_id_do_item(item) -> Optional[int]:
+    produto_id = _campo(item, 'produto_id')
+    if produto_id is None:
+        produto = _campo(item, 'produto')
+        produto_id = getattr(produto, 'pk', None)
+    return produto_id
+
+
+def carregar_parametros_fiscais(empresa_id, produto_ids: Iterable[int]) -> Dict[int, object]:
+    """
+    Mapa {produto_id: ProdutoParametrosEmpresa} ativos da empresa, em uma única consulta.
+    Pode ser passado a calcular_impostos_nota/calcular_impostos_item (parametros=...).
+    """
+    produto_ids = {pk for pk in produto_ids if pk}
+    if not empresa_id or not produto_ids:
+        return {}
     ProdutoParametrosEmpresa = django_apps.get_model('produtos', 'ProdutoParametrosEmpresa')
-    return ProdutoParametrosEmpresa.objects.filter(
-        produto_id=produto.pk,
-        empresa_id=empresa.pk,
-        ativo_nessa_empresa=True,
-    ).first()
+    return {
+        p.produto_id: p
+        for p in ProdutoParametrosEmpresa.objects.filter(
+            produto_id__in=produto_ids,
+            empresa_id=empresa_id,
+            ativo_nessa_empresa=True,
+        )
+    }
+
+
+def _parametros_fiscais_produto(item, produto_id, parametros=None) -> Optional[object]:
+    if parametros is not None:
+        fiscal = parametros.get(produto_id)
+        # Parâmetros também podem vir como dict (cálculo sem ORM)
+        return SimpleNamespace(**{**vars(_FISCAL_FALLBACK), **fiscal}) if isinstance(fiscal, Mapping) else fiscal
+    empresa_id = _empresa_id_do_item(item)
+    if not empresa_id:
+        return None
+    return carregar_parametros_fiscais(empresa_id, [produto_id]).get(produto_id)
 
 
 _FISCAL_FALLBACK = SimpleNamespace(
@@ -40,7 +81,7 @@ _FISCAL_FALLBACK = SimpleNamespace(
 )
 
 
-def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None) -> Dict[str, Decimal]:
+def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None, parametros=None) -> Dict[str, Decimal]:
     """
     Calcula os impostos de um item do pedido conforme normas SEFAZ-BA.
     
@@ -50,9 +91,12 @@ def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None) ->
     separadamente, pois já estão embutidos no preço. Apenas informa-se a base de cálculo.
     
     Args:
-        item: ItemPedidoVenda com produto OU serviço relacionado
+        item: ItemPedidoVenda com produto OU serviço relacionado, ou dict com
+            produto_id (ou servico), total e, sem parametros, empresa_id
         regime_tributario: Regime tributário da empresa ('SIMPLES_NACIONAL', 'LUCRO_PRESUMIDO', etc.)
         config_fiscal: ConfiguracaoFiscalLoja (opcional, para feature flag da reforma)
+        parametros: Mapa {produto_id: parâmetros fiscais} já carregado
+            (ver carregar_parametros_fiscais); se None, consulta o banco
         
     Returns:
         Dict com os valores calculados (impostos atuais + reforma 2026):
@@ -80,21 +124,20 @@ def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None) ->
         }
     """
     # ═══ IDENTIFICAR PRODUTO OU SERVIÇO ═══
+    # Produto é identificado pelo id (evita carregar o Produto só para isso)
     item_fiscal = None
     tipo_item = None
+    produto_id = _produto_id_do_item(item)
+    servico = _campo(item, 'servico')
     
-    if hasattr(item, 'produto') and item.produto:
-        item_fiscal = item.produto
+    if produto_id:
+        item_fiscal = produto_id
         tipo_item = 'PRODUTO'
-    elif hasattr(item, 'servico') and item.servico:
-        item_fiscal = item.servico
+    elif servico:
+        item_fiscal = servico
         tipo_item = 'SERVICO'
-    else:
-        # Fallback: tentar item.produto direto (compatibilidade)
-        item_fiscal = getattr(item, 'produto', None)
-        tipo_item = 'PRODUTO' if item_fiscal else None
     
-    valor_item = item.total  # Valor total do item (já com desconto)
+    valor_item = _campo(item, 'total')  # Valor total do item (já com desconto)
     
     # Inicializar valores
     base_icms = Decimal('0.00')
@@ -151,9 +194,9 @@ def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None) ->
     is_simples_nacional = regime_tributario and 'SIMPLES' in regime_tributario.upper()
     
     # ═══ CÁLCULO ICMS (só para produtos) ═══
+    fiscal = None
     if tipo_item == 'PRODUTO':
-        produto = item_fiscal
-        fiscal = _parametros_fiscais_produto(item, produto) or _FISCAL_FALLBACK
+        fiscal = _parametros_fiscais_produto(item, produto_id, parametros) or _FISCAL_FALLBACK
         # Verificar CST/CSOSN para determinar se calcula ICMS
         csosn_cst = fiscal.csosn_cst or '000'
     
@@ -240,7 +283,7 @@ def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None) ->
     if usar_reforma and item_fiscal:
         # Parâmetros por empresa (produto) vs. serviço (mantém campos no próprio modelo)
         if tipo_item == 'PRODUTO':
-            _fref = _parametros_fiscais_produto(item, item_fiscal) or _FISCAL_FALLBACK
+            _fref = fiscal
         else:
             _fref = item_fiscal
         # Obter classificação tributária
@@ -297,7 +340,7 @@ def calcular_impostos_item(item, regime_tributario=None, config_fiscal=None) ->
     }
 
 
-def calcular_impostos_nota(itens: List, regime_tributario=None, config_fiscal=None) -> Dict[str, Decimal]:
+def calcular_impostos_nota(itens: List, regime_tributario=None, config_fiscal=None, parametros=None) -> Dict[str, Decimal]:
     """
     Calcula os impostos totais da nota fiscal somando todos os itens.
     
@@ -306,14 +349,24 @@ def calcular_impostos_nota(itens: List, regime_tributario=None, config_fiscal=No
     IMPORTANTE: Para Simples Nacional, os impostos não são calculados separadamente.
     Apenas informa-se a base de cálculo para fins de informação na NF-e.
     
+    Os parâmetros fiscais de todos os produtos são carregados em uma única consulta
+    (ou recebidos prontos em parametros), em vez de uma por item.
+    
     Args:
-        itens: Lista de ItemPedidoVenda
+        itens: Lista de ItemPedidoVenda ou de dicts (produto_id, total, empresa_id)
         regime_tributario: Regime tributário da empresa ('SIMPLES_NACIONAL', etc.)
         config_fiscal: ConfiguracaoFiscalLoja (opcional, para feature flag da reforma)
+        parametros: Mapa {produto_id: parâmetros fiscais (objeto ou dict)} já carregado
         
     Returns:
-        Dict com os totais calculados (impostos atuais + reforma 2026)
+        Dict com os totais calculados (impostos atuais + reforma 2026) e, em 'itens',
+        a lista de impostos de cada item na mesma ordem da entrada
     """
+    itens = list(itens)
+    if parametros is None:
+        empresa_id = _empresa_id_do_item(itens[0]) if itens else None
+        parametros = carregar_parametros_fiscais(empresa_id, (_produto_id_do_item(i) for i in itens))
+    
     totais = {
         # Impostos atuais (mantidos)
         'base_icms': Decimal('0.00'),
@@ -338,11 +391,13 @@ def calcular_impostos_nota(itens: List, regime_tributario=None, config_fiscal=No
         'valor_ibs': Decimal('0.00'),
         'base_cbs': Decimal('0.00'),
         'valor_cbs': Decimal('0.00'),
+        'itens': [],
     }
     
     for item in itens:
         # Calcular impostos do item (inclui CBS/IBS se ativado)
-        impostos_item = calcular_impostos_item(item, regime_tributario, config_fiscal)
+        impostos_item = calcular_impostos_item(item, regime_tributario, config_fiscal, parametros)
+        totais['itens'].append(impostos_item)
         
         # Somar totais atuais
         totais['base_icms'] += impostos_item['base_icms']
@@ -355,7 +410,7 @@ def calcular_impostos_nota(itens: List, regime_tributario=None, config_fiscal=No
         totais['valor_cofins'] += impostos_item['valor_cofins']
         totais['base_ipi'] += impostos_item['base_ipi']
         totais['valor_ipi'] += impostos_item['valor_ipi']
-        totais['valor_produtos'] += item.total
+        totais['valor_produtos'] += _campo(item, 'total')
         
         # Somar totais reforma 2026
         totais['base_ibs'] += impostos_item.get('base_ibs', Decimal('0.00'))
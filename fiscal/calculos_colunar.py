@@ -0,0 +1,183 @@
+"""
+Cálculo de impostos em colunas (lote), para recálculos em massa e simulações.
+
+Mesmas regras de fiscal.calculos.calcular_impostos_item (itens de produto), mas
+sobre listas paralelas (uma por campo) e com aritmética inteira de ponto fixo:
+
+- valores/bases em centavos (ESCALA_VALOR = 100)
+- alíquotas percentuais com 2 casas como inteiros (18,00% → 1800; ESCALA_ALIQUOTA = 100)
+- impostos em milionésimos de real (centavos × alíquota inteira; ESCALA_IMPOSTO = 10**6)
+
+Como base × (alíquota / 100) com 2 casas em cada fator é exato em Decimal, o
+resultado inteiro é numericamente idêntico ao do cálculo escalar (sem arredondamento
+intermediário); para_decimal converte de volta.
+"""
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+ESCALA_VALOR = 100
+ESCALA_ALIQUOTA = 100
+ESCALA_IMPOSTO = ESCALA_VALOR * ESCALA_ALIQUOTA * 100
+
+COLUNAS_PARAMETROS = [
+    'csosn_cst',
+    'aliquota_icms',
+    'icms_st_cst',
+    'aliquota_icms_st',
+    'pis_cst',
+    'aliquota_pis',
+    'cofins_cst',
+    'aliquota_cofins',
+    'ipi_venda_cst',
+    'aliquota_ipi_venda',
+    'aliquota_ibs',
+    'aliquota_cbs',
+]
+
+_CST_IPI_TRIBUTADO = {'00', '01', '02', '03'}
+
+
+def _inteiro_exato(valor, escala: int, nome: str) -> int:
+    if valor is None:
+        return 0
+    escalado = Decimal(valor) * escala
+    inteiro = int(escalado)
+    if inteiro != escalado:
+        raise ValueError(f'{nome} {valor} tem mais casas decimais que a escala suporta.')
+    return inteiro
+
+
+def para_centavos(valor) -> int:
+    """Decimal com até 2 casas → centavos (int)."""
+    return _inteiro_exato(valor, ESCALA_VALOR, 'Valor')
+
+
+def aliquota_para_inteiro(aliquota) -> int:
+    """Alíquota percentual com até 2 casas → inteiro (18.00 → 1800)."""
+    return _inteiro_exato(aliquota, ESCALA_ALIQUOTA, 'Alíquota')
+
+
+def para_decimal(valor: int, escala: int) -> Decimal:
+    """Converte um inteiro de ponto fixo de volta a Decimal."""
+    return Decimal(valor) / Decimal(escala)
+
+
+def calcular_impostos_colunas(
+    valores: Sequence[int],
+    parametros: Dict[str, Sequence],
+    regimes: Sequence[Optional[str]],
+    usar_reforma: bool = False,
+    aliquota_ibs_padrao: int = aliquota_para_inteiro(Decimal('0.10')),
+    aliquota_cbs_padrao: int = aliquota_para_inteiro(Decimal('0.90')),
+) -> Dict[str, List[int]]:
+    """
+    Calcula impostos de N itens de produto de uma vez.
+
+    Args:
+        valores: total de cada item, em centavos
+        parametros: listas de tamanho N por campo de COLUNAS_PARAMETROS (CSTs como str
+            ou None; alíquotas já como inteiros, ver aliquota_para_inteiro). Itens sem
+            parâmetros na empresa devem usar os valores de _FISCAL_FALLBACK.
+        regimes: regime tributário de cada item (ex.: 'SIMPLES_NACIONAL')
+        usar_reforma: calcula IBS/CBS (equivale a config_fiscal.usar_reforma_2026)
+        aliquota_ibs_padrao / aliquota_cbs_padrao: alíquotas inteiras usadas quando o
+            parâmetro do produto é zero (config da loja ou padrão 2026)
+
+    Returns:
+        Dict de listas: base_* em centavos, valor_* em ESCALA_IMPOSTO e
+        aliquota_ibs/aliquota_cbs em ESCALA_ALIQUOTA
+    """
+    n = len(valores)
+    zeros = [0] * n
+    simples = [bool(r) and 'SIMPLES' in r.upper() for r in regimes]
+    csosn = [c or '000' for c in parametros['csosn_cst']]
+    aliq_icms = parametros['aliquota_icms']
+
+    # Simples Nacional (CSOSN 102): só informa bases; regime normal (CST 00): ICMS/PIS/COFINS
+    sn102 = [c == '102' and s for c, s in zip(csosn, simples)]
+    normal = [c == '00' and not sn for c, sn in zip(csosn, sn102)]
+    tem_pis = [nm and (p or '01') == '01' for nm, p in zip(normal, parametros['pis_cst'])]
+    tem_cofins = [nm and (c or '01') == '01' for nm, c in zip(normal, parametros['cofins_cst'])]
+
+    base_icms = [
+        v if (sn or nm or a > 0) else 0
+        for v, sn, nm, a in zip(valores, sn102, normal, aliq_icms)
+    ]
+    valor_icms = [v * a if nm else 0 for v, nm, a in zip(valores, normal, aliq_icms)]
+    base_pis = [v if (sn or tp) else 0 for v, sn, tp in zip(valores, sn102, tem_pis)]
+    valor_pis = [v * a if tp else 0 for v, tp, a in zip(valores, tem_pis, parametros['aliquota_pis'])]
+    base_cofins = [v if (sn or tc) else 0 for v, sn, tc in zip(valores, sn102, tem_cofins)]
+    valor_cofins = [
+        v * a if tc else 0 for v, tc, a in zip(valores, tem_cofins, parametros['aliquota_cofins'])
+    ]
+
+    tem_st = [bool(c) and a != 0 for c, a in zip(parametros['icms_st_cst'], parametros['aliquota_icms_st'])]
+    base_icms_st = [v if t else 0 for v, t in zip(valores, tem_st)]
+    valor_icms_st = [v * a if t else 0 for v, t, a in zip(valores, tem_st, parametros['aliquota_icms_st'])]
+
+    cst_ipi = [c or '52' for c in parametros['ipi_venda_cst']]
+    ipi_tributado = [c in _CST_IPI_TRIBUTADO for c in cst_ipi]
+    base_ipi = [v if (c == '52' or t) else 0 for v, c, t in zip(valores, cst_ipi, ipi_tributado)]
+    valor_ipi = [
+        v * a if t else 0 for v, t, a in zip(valores, ipi_tributado, parametros['aliquota_ipi_venda'])
+    ]
+
+    if usar_reforma:
+        aliquota_ibs = [a or aliquota_ibs_padrao for a in parametros['aliquota_ibs']]
+        aliquota_cbs = [a or aliquota_cbs_padrao for a in parametros['aliquota_cbs']]
+        base_ibs = list(valores)
+        valor_ibs = [v * a for v, a in zip(valores, aliquota_ibs)]
+        base_cbs = list(valores)
+        valor_cbs = [v * a for v, a in zip(valores, aliquota_cbs)]
+    else:
+        aliquota_ibs = aliquota_cbs = base_ibs = valor_ibs = base_cbs = valor_cbs = zeros
+
+    return {
+        'base_icms': base_icms,
+        'valor_icms': valor_icms,
+        'base_icms_st': base_icms_st,
+        'valor_icms_st': valor_icms_st,
+        'base_pis': base_pis,
+        'valor_pis': valor_pis,
+        'base_cofins': base_cofins,
+        'valor_cofins': valor_cofins,
+        'base_ipi': base_ipi,
+        'valor_ipi': valor_ipi,
+        'base_ibs': base_ibs,
+        'valor_ibs': valor_ibs,
+        'aliquota_ibs': aliquota_ibs,
+        'base_cbs': base_cbs,
+        'valor_cbs': valor_cbs,
+        'aliquota_cbs': aliquota_cbs,
+    }
+
+
+def parametros_para_colunas(lista_parametros: Sequence[Optional[object]]) -> Dict[str, list]:
+    """
+    Converte parâmetros fiscais (ProdutoParametrosEmpresa, dict ou None) em colunas,
+    aplicando o mesmo fallback do cálculo escalar para itens sem parâmetros.
+    """
+    from fiscal.calculos import _FISCAL_FALLBACK
+
+    # Muitos itens compartilham o mesmo objeto de parâmetros: converte uma vez por objeto
+    convertidos = {}
+    linhas = []
+    for fiscal in lista_parametros:
+        linha = convertidos.get(id(fiscal))
+        if linha is None:
+            linha = convertidos[id(fiscal)] = _linha_parametros(fiscal, _FISCAL_FALLBACK)
+        linhas.append(linha)
+    colunas = zip(*linhas) if linhas else ([] for _ in COLUNAS_PARAMETROS)
+    return {nome: list(coluna) for nome, coluna in zip(COLUNAS_PARAMETROS, colunas)}
+
+def _linha_parametros(fiscal, fallback) -> tuple:
+    if fiscal is None:
+        fiscal = fallback
+    elif isinstance(fiscal, dict):
+        fiscal = SimpleNamespace(**{**vars(fallback), **fiscal})
+    return tuple(
+        aliquota_para_inteiro(getattr(fiscal, nome, None)) if nome.startswith('aliquota_')
+        else getattr(fiscal, nome, None)
+        for nome in COLUNAS_PARAMETROS
+    )
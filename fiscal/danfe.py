@@ -0,0 +1,175 @@
+"""
+DANFE: PDF da NF-e de saída no layout SEFAZ-BA (template fiscal/nfe_pdf.html).
+
+Requer weasyprint instalado: pip install weasyprint
+"""
+import base64
+import io
+import re
+
+from django.db.models import Count, Max
+from django.template.loader import render_to_string
+
+from .cache_pdf import DocumentoPDF, hash_entradas, hash_template
+from .models import ConfiguracaoFiscalLoja
+
+try:
+    from weasyprint import HTML
+    WEASYPRINT_AVAILABLE = True
+except ImportError:
+    WEASYPRINT_AVAILABLE = False
+
+try:
+    import qrcode
+    QRCODE_AVAILABLE = True
+except ImportError:
+    qrcode = None  # type: ignore[misc, assignment]
+    QRCODE_AVAILABLE = False
+
+TEMPLATE = 'fiscal/nfe_pdf.html'
+
+
+def _formatar_cnpj(valor) -> str:
+    digitos = re.sub(r'\D', '', str(valor or ''))
+    if len(digitos) == 14:
+        return f'{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}'
+    return digitos or '-'
+
+
+def _formatar_cpf_ou_cnpj(valor) -> str:
+    digitos = re.sub(r'\D', '', str(valor or ''))
+    if len(digitos) == 11:
+        return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+    if len(digitos) == 14:
+        return f'{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}'
+    return digitos or '-'
+
+
+def _gerar_qrcode_nfe_base64(chave_acesso: str) -> str:
+    if not chave_acesso or not QRCODE_AVAILABLE:
+        return ''
+    url = (
+        'https://www.nfe.fazenda.gov.br/portal/consultaRecaptcha.aspx'
+        '?tipoConsulta=completa&tipoConteudo=XbSeqxE8pl8='
+        f'&nfe={chave_acesso}'
+    )
+    qr = qrcode.QRCode(version=1, box_size=3, border=2)
+    qr.add_data(url)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color='black', back_color='white')
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def documento_danfe(nota) -> DocumentoPDF:
+    """
+    Identificação do DANFE no cache de PDF: muda com a nota, os itens do pedido
+    (e parâmetros fiscais dos produtos), loja/empresa, cliente, configuração
+    fiscal e o template. Só NF-e AUTORIZADA é gravada.
+    """
+    from produtos.models import ProdutoParametrosEmpresa
+
+    pedido = nota.pedido_venda
+    itens = {}
+    parametros = None
+    if pedido:
+        ativos = pedido.itens.filter(is_active=True)
+        itens = ativos.aggregate(quantidade=Count('pk'), alterado=Max('updated_at'))
+        parametros = ProdutoParametrosEmpresa.objects.filter(
+            empresa_id=nota.loja.empresa_id,
+            produto_id__in=ativos.values('produto_id'),
+        ).aggregate(alterado=Max('updated_at'))['alterado']
+    config = ConfiguracaoFiscalLoja.objects.filter(loja_id=nota.loja_id).values_list('updated_at', flat=True).first()
+    return DocumentoPDF(
+        tipo='danfe',
+        documento_id=nota.pk,
+        status=nota.status,
+        entradas=hash_entradas(
+            nota.updated_at, nota.chave_acesso, nota.xml_arquivo_sha256,
+            pedido and pedido.updated_at, itens.get('quantidade'), itens.get('alterado'), parametros,
+            nota.loja.updated_at, nota.loja.empresa.updated_at,
+            nota.cliente and nota.cliente.updated_at, config,
+            hash_template(TEMPLATE),
+        ),
+        cacheavel=nota.status == 'AUTORIZADA',
+    )
+
+
+def gerar_pdf_danfe(nota) -> bytes:
+    """Renderiza o DANFE (consultas, QR Code e impostos da nota)."""
+    from produtos.models import ProdutoParametrosEmpresa
+
+    # Buscar dados relacionados
+    pedido = nota.pedido_venda
+    itens = []
+    if pedido:
+        itens = list(
+            pedido.itens.filter(is_active=True).select_related('produto')
+        )
+
+    loja_empresa = nota.loja.empresa
+
+    params_map = {}
+    if itens:
+        produto_ids = [item.produto_id for item in itens]
+        params_qs = ProdutoParametrosEmpresa.objects.filter(
+            empresa=loja_empresa,
+            produto_id__in=produto_ids,
+        )
+        params_map = {p.produto_id: p for p in params_qs}
+
+    itens_com_params = []
+    for item in itens:
+        params = params_map.get(item.produto_id)
+        itens_com_params.append({
+            'item': item,
+            'cfop': params.cfop_venda_dentro_uf if params else None,
+            'cst': params.csosn_cst if params else None,
+        })
+
+    # Buscar configuração fiscal da loja
+    config_fiscal = None
+    try:
+        config_fiscal = nota.loja.configuracao_fiscal
+    except ConfiguracaoFiscalLoja.DoesNotExist:
+        pass
+
+    cnpj_emitente_raw = ''
+    if config_fiscal and config_fiscal.cnpj:
+        cnpj_emitente_raw = config_fiscal.cnpj
+    elif loja_empresa.cnpj:
+        cnpj_emitente_raw = loja_empresa.cnpj
+    cnpj_emitente_formatado = _formatar_cnpj(cnpj_emitente_raw)
+
+    cliente = nota.cliente
+    cpf_cnpj_dest_formatado = _formatar_cpf_ou_cnpj(
+        cliente.cpf_cnpj if cliente else ''
+    )
+
+    qrcode_b64 = _gerar_qrcode_nfe_base64(nota.chave_acesso or '')
+
+    # Calcular impostos conforme normas SEFAZ-BA
+    # IMPORTANTE: Para Simples Nacional, os impostos não são calculados separadamente
+    # Usar get_impostos() que já considera snapshot se autorizada
+    impostos = nota.get_impostos()
+
+    # Preparar contexto
+    context = {
+        'nota': nota,
+        'loja': nota.loja,
+        'empresa': loja_empresa,
+        'cliente': cliente,
+        'pedido': pedido,
+        'itens': itens,
+        'itens_com_params': itens_com_params,
+        'config_fiscal': config_fiscal,
+        'impostos': impostos,
+        'cnpj_emitente_formatado': cnpj_emitente_formatado,
+        'cpf_cnpj_dest_formatado': cpf_cnpj_dest_formatado,
+        'qrcode_b64': qrcode_b64,
+    }
+
+    # Renderizar template HTML
+    html_string = render_to_string(TEMPLATE, context)
+    return HTML(string=html_string).write_pdf()
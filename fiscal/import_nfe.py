@@ -4,192 +4,142 @@ Serviço de importação de NF-e a partir de arquivo XML.
 Suporta estrutura nfeProc (com proc) e NFe direto.
 Referência: Manual de Orientação do Contribuinte - NF-e 4.0
 """
+import io
 import re
-import xml.etree.ElementTree as ET
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from datetime import datetime
 from typing import Optional
 
+from lxml import etree
+
 # Namespace padrão NF-e 4.0
 NS_NFE = 'http://www.portalfiscal.inf.br/nfe'
 
 
-def _find_text(element, path: str, default: str = '') -> str:
-    """Busca texto em elemento XML. Suporta namespace NFe."""
-    if element is None:
-        return default
-    ns = NS_NFE
-    parts = path.split('/')
-    current = element
-    for part in parts:
-        child = current.find(f'{{{ns}}}{part}')
-        if child is None:
-            child = current.find(part)
-        if child is None:
-            return default
-        current = child
-    return (current.text or '').strip()
-
-
-def _get_root(xml_content: str) -> ET.Element:
-    """Obtém o elemento infNFe da NF-e (NFe ou nfeProc)."""
-    root = ET.fromstring(xml_content)
-    ns = NS_NFE
-    # nfeProc contém NFe dentro
-    if 'nfeProc' in (root.tag or ''):
-        for elem in root.iter():
-            if 'infNFe' in (elem.tag or ''):
-                return elem
-            if 'NFe' in (elem.tag or ''):
-                inf = elem.find(f'{{{ns}}}infNFe') or elem.find('infNFe')
-                if inf is not None:
-                    return inf
-    # NFe direto ou infNFe na raiz
-    inf = root.find(f'{{{ns}}}infNFe') or root.find('infNFe')
-    if inf is not None:
-        return inf
-    if 'infNFe' in (root.tag or ''):
-        return root
-    return root
+def _nome(elemento) -> str:
+    """Nome do elemento sem namespace (aceita XML com e sem o namespace NF-e)."""
+    return elemento.tag.rpartition('}')[2] if isinstance(elemento.tag, str) else ''
 
 
-def parse_nfe_xml(xml_content: str) -> dict:
+def _texto(elemento, caminho: str) -> str:
+    """Texto do filho em ``caminho`` (ex.: 'prod/cProd'), em qualquer namespace."""
+    return (elemento.findtext('/'.join(f'{{*}}{parte}' for parte in caminho.split('/'))) or '').strip()
+
+
+def _decimal(valor: str, padrao: Decimal = Decimal('0')) -> Decimal:
+    if not valor:
+        return padrao
+    try:
+        return Decimal(valor.replace(',', '.'))
+    except (InvalidOperation, ValueError):
+        return padrao
+
+
+def _item(det, posicao: int) -> Optional[dict]:
+    prod = det.find('{*}prod')
+    if prod is None:
+        return None
+    try:
+        numero_item = int(det.get('nItem', posicao))
+    except (ValueError, TypeError):
+        numero_item = posicao
+
+    c_ean = _texto(prod, 'cEAN')
+    x_prod = _texto(prod, 'xProd')
+    u_com = _texto(prod, 'uCom') or 'UN'
+    quantidade = _decimal(_texto(prod, 'qCom'))
+    preco_unitario = _decimal(_texto(prod, 'vUnCom'))
+    v_prod = _texto(prod, 'vProd')
+    valor_total = _decimal(v_prod, None)
+    if valor_total is None:
+        valor_total = preco_unitario * quantidade if v_prod and quantidade else Decimal('0')
+
+    return {
+        'numero_item': numero_item,
+        'codigo_produto_fornecedor': _texto(prod, 'cProd'),
+        'codigo_barras': re.sub(r'\D', '', c_ean) if c_ean and c_ean != 'SEM GTIN' else '',
+        'ncm': _texto(prod, 'NCM'),
+        'descricao': x_prod[:255] if x_prod else '',
+        'quantidade': quantidade,
+        'unidade_comercial': u_com[:10] if u_com else 'UN',
+        'preco_unitario': preco_unitario,
+        'valor_total': valor_total,
+    }
+
+
+def ler_nfe(conteudo: bytes) -> dict:
     """
-    Extrai dados principais de uma NF-e a partir do XML.
+    Extrai os dados da NF-e (NFe ou nfeProc) com lxml iterparse: cada ``det`` é
+    lido e descartado ao terminar, então notas de 990 itens não ficam inteiras na
+    árvore. Não usa Django (roda nos processos da importação em lote).
 
     Returns:
-        dict com: chave_acesso, numero, serie, valor_total, data_emissao,
-                  cnpj_emitente, razao_social_emitente, xml_arquivo
+        dict como parse_nfe_xml, sem xml_arquivo
     Raises:
         ValueError: se XML inválido ou não for NF-e
     """
-    if not xml_content or not xml_content.strip():
-        raise ValueError('Conteúdo XML vazio.')
-
-    # Remove BOM e espaços
-    xml_content = xml_content.strip()
-    if xml_content.startswith('\ufeff'):
-        xml_content = xml_content[1:]
-
+    chave = ''
+    chave_protocolo = ''
+    ide = emit = None
+    vnf = ''
+    itens = []
+    eventos = etree.iterparse(
+        io.BytesIO(conteudo), events=('start', 'end'), resolve_entities=False, no_network=True,
+    )
     try:
-        root = _get_root(xml_content)
-    except ET.ParseError as e:
+        for evento, elemento in eventos:
+            nome = _nome(elemento)
+            if evento == 'start':
+                if nome == 'infNFe' and not chave:
+                    chave = elemento.get('Id', '')
+                    if chave.startswith('NFe'):
+                        chave = chave[3:]
+                continue
+            if nome == 'det':
+                item = _item(elemento, len(itens) + 1)
+                if item is not None:
+                    itens.append(item)
+                elemento.clear()
+                while elemento.getprevious() is not None:
+                    del elemento.getparent()[0]
+            elif nome == 'ide' and ide is None:
+                ide = {campo: _texto(elemento, campo) for campo in ('nNF', 'serie', 'dhEmi')}
+            elif nome == 'emit' and emit is None:
+                emit = {campo: _texto(elemento, campo) for campo in ('CNPJ', 'CPF', 'xNome')}
+            elif nome == 'ICMSTot' and not vnf:
+                vnf = _texto(elemento, 'vNF')
+            elif nome == 'chNFe' and not chave_protocolo:
+                chave_protocolo = (elemento.text or '').strip()
+    except etree.XMLSyntaxError as e:
         raise ValueError(f'XML inválido: {e}') from e
 
-    # Chave de acesso - pode estar em infNFe ou no atributo Id
-    chave = ''
-    inf = root
-    if root.tag.endswith('infNFe'):
-        chave = root.get('Id', '')
-        if chave.startswith('NFe'):
-            chave = chave[3:]
+    # Chave de acesso - atributo Id do infNFe ou chNFe (protocolo)
     if not chave or len(chave) != 44:
-        chave = _find_text(root, 'ide/chNFe') or _find_text(root, 'chNFe')
+        chave = chave_protocolo
     if not chave or len(chave) != 44:
         raise ValueError('Não foi possível extrair a chave de acesso (44 dígitos) do XML.')
 
-    # ide
-    ide = root.find('{http://www.portalfiscal.inf.br/nfe}ide') or root.find('ide')
-    numero = _find_text(ide, 'nNF') if ide is not None else ''
-    serie = _find_text(ide, 'serie') if ide is not None else ''
-    dh_emi = _find_text(ide, 'dhEmi') if ide is not None else ''
-
+    ide = ide or {}
+    emit = emit or {}
+    numero = ide.get('nNF')
     if not numero:
         raise ValueError('Número da nota não encontrado no XML.')
+    serie = ide.get('serie') or '1'
 
-    numero_int = int(numero)
-    serie = serie or '1'
-
-    # Data emissão
+    # Data emissão - formato: 2024-01-15T10:30:00-03:00
     data_emissao = None
+    dh_emi = ide.get('dhEmi')
     if dh_emi:
         try:
-            # Formato: 2024-01-15T10:30:00-03:00
-            dt = datetime.fromisoformat(dh_emi.replace('Z', '+00:00'))
-            data_emissao = dt.date()
+            data_emissao = datetime.fromisoformat(dh_emi.replace('Z', '+00:00')).date()
         except (ValueError, TypeError):
             pass
     if not data_emissao:
         data_emissao = datetime.now().date()
 
     # Emitente (fornecedor)
-    emit = root.find('{http://www.portalfiscal.inf.br/nfe}emit') or root.find('emit')
-    cnpj_emitente = ''
-    razao_social_emitente = ''
-    if emit is not None:
-        cnpj_emitente = _find_text(emit, 'CNPJ') or _find_text(emit, 'CPF')
-        razao_social_emitente = _find_text(emit, 'xNome')
-
-    # Valor total
-    total = root.find('{http://www.portalfiscal.inf.br/nfe}total') or root.find('total')
-    valor_total = Decimal('0.00')
-    if total is not None:
-        icms = total.find('{http://www.portalfiscal.inf.br/nfe}ICMSTot') or total.find('ICMSTot')
-        if icms is not None:
-            vnf = _find_text(icms, 'vNF')
-            if vnf:
-                try:
-                    valor_total = Decimal(vnf.replace(',', '.'))
-                except (ValueError, TypeError):
-                    pass
-
-    # Itens (det)
-    itens = []
-    ns = NS_NFE
-    for det in root.findall(f'{{{ns}}}det') or root.findall('det'):
-        n_item = det.get('nItem', str(len(itens) + 1))
-        try:
-            numero_item = int(n_item)
-        except (ValueError, TypeError):
-            numero_item = len(itens) + 1
-
-        prod = det.find(f'{{{ns}}}prod') or det.find('prod')
-        if prod is None:
-            continue
-
-        c_prod = _find_text(prod, 'cProd')
-        c_ean = _find_text(prod, 'cEAN')
-        if c_ean == 'SEM GTIN':
-            c_ean = ''
-        ncm = _find_text(prod, 'NCM')
-        x_prod = _find_text(prod, 'xProd')
-        q_com = _find_text(prod, 'qCom')
-        v_un_com = _find_text(prod, 'vUnCom')
-        v_prod = _find_text(prod, 'vProd')
-        u_com = _find_text(prod, 'uCom') or 'UN'
-
-        quantidade = Decimal('0')
-        if q_com:
-            try:
-                quantidade = Decimal(q_com.replace(',', '.'))
-            except (ValueError, TypeError):
-                pass
-
-        preco_unitario = Decimal('0')
-        if v_un_com:
-            try:
-                preco_unitario = Decimal(v_un_com.replace(',', '.'))
-            except (ValueError, TypeError):
-                pass
-
-        valor_total_item = Decimal('0')
-        if v_prod:
-            try:
-                valor_total_item = Decimal(v_prod.replace(',', '.'))
-            except (ValueError, TypeError):
-                valor_total_item = preco_unitario * quantidade if quantidade else Decimal('0')
-
-        itens.append({
-            'numero_item': numero_item,
-            'codigo_produto_fornecedor': c_prod,
-            'codigo_barras': re.sub(r'\D', '', c_ean) if c_ean and c_ean != 'SEM GTIN' else '',
-            'ncm': ncm,
-            'descricao': x_prod[:255] if x_prod else '',
-            'quantidade': quantidade,
-            'unidade_comercial': u_com[:10] if u_com else 'UN',
-            'preco_unitario': preco_unitario,
-            'valor_total': valor_total_item,
-        })
+    cnpj_emitente = emit.get('CNPJ') or emit.get('CPF')
+    valor_total = _decimal(vnf, Decimal('0.00'))
 
     # Validação rígida: vNF deve bater com soma dos itens (XML é gerado por sistema)
     if itens:
@@ -203,12 +153,53 @@ def parse_nfe_xml(xml_content: str) -> dict:
 
     return {
         'chave_acesso': chave,
-        'numero': numero_int,
+        'numero': int(numero),
         'serie': serie,
         'valor_total': valor_total,
         'data_emissao': data_emissao,
         'cnpj_emitente': re.sub(r'\D', '', cnpj_emitente) if cnpj_emitente else '',
-        'razao_social_emitente': razao_social_emitente,
-        'xml_arquivo': xml_content,
+        'razao_social_emitente': emit.get('xNome', ''),
         'itens': itens,
     }
+
+
+def decodificar_xml(conteudo: bytes) -> str:
+    """Bytes do arquivo enviado -> texto do XML (UTF-8, sem BOM nem espaços nas pontas)."""
+    return conteudo.decode('utf-8', errors='replace').strip().lstrip('\ufeff')
+
+
+def parse_nfe_xml(xml_content: str) -> dict:
+    """
+    Extrai dados principais de uma NF-e a partir do XML.
+
+    Returns:
+        dict com: chave_acesso, numero, serie, valor_total, data_emissao,
+                  cnpj_emitente, razao_social_emitente, xml_arquivo, itens
+    Raises:
+        ValueError: se XML inválido ou não for NF-e
+    """
+    if not xml_content or not xml_content.strip():
+        raise ValueError('Conteúdo XML vazio.')
+
+    # Remove BOM e espaços
+    xml_content = xml_content.strip().lstrip('\ufeff')
+    # A declaração de encoding do arquivo não vale mais para o texto já decodificado
+    dados = ler_nfe(re.sub(r'^<\?xml[^>]*\?>', '', xml_content).encode('utf-8'))
+    dados['xml_arquivo'] = xml_content
+    return dados
+
+
+def processar_arquivo_nfe(nome: str, conteudo: bytes) -> dict:
+    """
+    Lê um arquivo da importação em lote (executado em ProcessPoolExecutor).
+
+    Returns:
+        dict com arquivo, status ('OK' ou 'ERRO'), mensagem, dados (parse_nfe_xml)
+    """
+    try:
+        dados = parse_nfe_xml(decodificar_xml(conteudo))
+    except ValueError as e:
+        return {'arquivo': nome, 'status': 'ERRO', 'mensagem': str(e), 'dados': None}
+    except Exception as e:  # arquivo inesperado não derruba o lote
+        return {'arquivo': nome, 'status': 'ERRO', 'mensagem': f'Erro ao ler arquivo: {e}', 'dados': None}
+    return {'arquivo': nome, 'status': 'OK', 'mensagem': '', 'dados': dados}
@@ -0,0 +1,172 @@
+"""
+Importação de NF-e de entrada em lote: vários XML e/ou arquivos .zip num upload.
+
+- Os XML são lidos em paralelo (ProcessPoolExecutor, settings.NFE_IMPORT_PROCESSOS)
+  por fiscal.import_nfe.processar_arquivo_nfe (lxml iterparse, sem Django)
+- Chaves já cadastradas são descobertas numa consulta; chave repetida no próprio
+  lote é importada uma vez
+- Cada nota válida tem o XML gravado no armazenamento fiscal
+  (fiscal/armazenamento_xml.py) e os dados extraídos salvos em JSON
+  (fiscal/storage_nfe.py): a confirmação usa esses dados e não relê o XML
+- O resultado traz o status de cada arquivo (PRONTA, DUPLICADA, REPETIDA, ERRO)
+"""
+import logging
+import multiprocessing
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+
+from fiscal.armazenamento_xml import salvar_xml
+from fiscal.import_nfe import processar_arquivo_nfe
+from fiscal.storage_nfe import salvar_dados_temporarios
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES_XML = ('.xml', '.nfe')
+MAX_ARQUIVOS = 1000
+MAX_TAMANHO_XML = 10 * 1024 * 1024  # bytes por XML (descompactado)
+MAX_TAMANHO_TOTAL = 200 * 1024 * 1024  # bytes de XML (descompactados) por envio
+# Abaixo disso, subir processos custa mais que ler os XML no próprio worker
+MIN_ARQUIVOS_PROCESSOS = 8
+
+
+def _erro(nome: str, mensagem: str) -> Dict:
+    return {'arquivo': nome, 'status': 'ERRO', 'mensagem': mensagem}
+
+
+def extrair_arquivos(uploads) -> Tuple[List[Tuple[str, bytes]], List[Dict]]:
+    """
+    Separa os XML enviados (soltos ou dentro de .zip).
+
+    Os limites (MAX_ARQUIVOS, MAX_TAMANHO_TOTAL) são conferidos antes de ler
+    cada arquivo, com o tamanho declarado no .zip (a leitura do membro não passa
+    dele): um .zip com milhares de entradas ou que descompacta gigabytes é
+    recusado sem ser expandido.
+
+    Returns:
+        (lista de (nome, conteúdo), lista de resultados ERRO dos arquivos recusados)
+    Raises:
+        ValueError: se o upload exceder MAX_ARQUIVOS ou MAX_TAMANHO_TOTAL
+    """
+    arquivos = []
+    recusados = []
+    total = 0
+
+    def reservar(tamanho: int):
+        nonlocal total
+        if len(arquivos) >= MAX_ARQUIVOS:
+            raise ValueError(f'Envie no máximo {MAX_ARQUIVOS} XML por importação.')
+        total += tamanho
+        if total > MAX_TAMANHO_TOTAL:
+            raise ValueError(
+                f'Envie no máximo {MAX_TAMANHO_TOTAL // (1024 * 1024)} MB de XML (descompactados) por importação.'
+            )
+
+    for upload in uploads:
+        nome = upload.name
+        if nome.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(upload) as pacote:
+                    for info in pacote.infolist():
+                        interno = f'{nome}/{info.filename}'
+                        if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                            continue
+                        if not info.filename.lower().endswith(EXTENSOES_XML):
+                            recusados.append(_erro(interno, 'Arquivo ignorado: não é XML de NF-e.'))
+                        elif info.file_size > MAX_TAMANHO_XML:
+                            recusados.append(_erro(interno, 'Arquivo maior que o limite de 10 MB.'))
+                        else:
+                            reservar(info.file_size)
+                            try:
+                                conteudo = pacote.read(info)
+                            except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError):
+                                # Membro corrompido, criptografado ou com compressão não suportada
+                                recusados.append(_erro(interno, 'Arquivo corrompido ou ilegível dentro do .zip.'))
+                                continue
+                            arquivos.append((f'{nome}/{PurePosixPath(info.filename).name}', conteudo))
+            except zipfile.BadZipFile:
+                recusados.append(_erro(nome, 'Arquivo .zip inválido ou corrompido.'))
+        elif nome.lower().endswith(EXTENSOES_XML):
+            if upload.size > MAX_TAMANHO_XML:
+                recusados.append(_erro(nome, 'Arquivo maior que o limite de 10 MB.'))
+            else:
+                reservar(upload.size)
+                arquivos.append((nome, upload.read()))
+        else:
+            recusados.append(_erro(nome, 'O arquivo deve ser um XML de NF-e (.xml ou .nfe) ou um .zip.'))
+    return arquivos, recusados
+
+
+def ler_arquivos(arquivos: List[Tuple[str, bytes]], processos: int = None) -> List[Dict]:
+    """Executa processar_arquivo_nfe em cada arquivo, em paralelo quando compensa."""
+    processos = processos or getattr(settings, 'NFE_IMPORT_PROCESSOS', 1)
+    nomes = [nome for nome, _ in arquivos]
+    conteudos = [conteudo for _, conteudo in arquivos]
+    if processos <= 1 or len(arquivos) < MIN_ARQUIVOS_PROCESSOS:
+        return list(map(processar_arquivo_nfe, nomes, conteudos))
+
+    # spawn: o worker web tem threads e conexões abertas que um fork herdaria
+    with ProcessPoolExecutor(
+        max_workers=min(processos, len(arquivos)),
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as executor:
+        chunksize = max(1, len(arquivos) // (processos * 4))
+        return list(executor.map(processar_arquivo_nfe, nomes, conteudos, chunksize=chunksize))
+
+
+def importar_arquivos(uploads, processos: int = None) -> Dict:
+    """
+    Lê os XML enviados e prepara as notas para confirmação.
+
+    Returns:
+        dict com ``arquivos``: um resultado por arquivo (arquivo, status, mensagem e,
+        se lido, chave_acesso/numero/serie/emitente/valor_total/itens); as notas
+        PRONTA têm ``key`` para carregar_dados_temporarios
+    Raises:
+        ValueError: se o upload exceder MAX_ARQUIVOS ou MAX_TAMANHO_TOTAL
+    """
+    from fiscal.models import NotaFiscalEntrada
+
+    arquivos, recusados = extrair_arquivos(uploads)
+    lidos = ler_arquivos(arquivos, processos)
+
+    chaves = {r['dados']['chave_acesso'] for r in lidos if r['status'] == 'OK'}
+    cadastradas = set(
+        NotaFiscalEntrada.objects.filter(chave_acesso__in=chaves, is_active=True)
+        .values_list('chave_acesso', flat=True)
+    )
+
+    resultados = []
+    vistas = set()
+    for resultado in lidos:
+        dados = resultado.pop('dados')
+        if dados is not None:
+            chave = dados['chave_acesso']
+            resultado.update({
+                'chave_acesso': chave,
+                'numero': dados['numero'],
+                'serie': dados['serie'],
+                'emitente': dados['razao_social_emitente'] or dados['cnpj_emitente'],
+                'valor_total': dados['valor_total'],
+                'itens': len(dados['itens']),
+            })
+            if chave in cadastradas:
+                resultado.update(status='DUPLICADA', mensagem='Nota com esta chave já está cadastrada.')
+            elif chave in vistas:
+                resultado.update(status='REPETIDA', mensagem='Mesma chave de outro arquivo deste envio.')
+            else:
+                vistas.add(chave)
+                dados['xml_sha256'], dados['xml_tamanho'] = salvar_xml(dados.pop('xml_arquivo'))
+                resultado.update(status='PRONTA', key=salvar_dados_temporarios(dados))
+        resultados.append(resultado)
+    resultados.extend(recusados)
+
+    logger.info(
+        'Importação de XML em lote: %s arquivo(s), %s pronta(s)',
+        len(resultados), sum(1 for r in resultados if r['status'] == 'PRONTA'),
+    )
+    return {'arquivos': resultados}
@@ -0,0 +1,144 @@
+"""
+Compara o tempo de serialização da NF-e: entidades + SerializacaoXML do PyNFe
+(fiscal.nfe_xml.serializar_nfe_pynfe) x serializador lxml nativo
+(fiscal.nfe_xml_nativo.serializar_nfe).
+
+Usa dados sintéticos no formato de preparar_dados_nfe (sem banco) e mede só a
+serialização: a assinatura é a mesma nos dois caminhos. Confere também que os
+dois XML são iguais após canonicalização (C14N).
+
+Uso:
+  python manage.py benchmark_nfe_xml
+  python manage.py benchmark_nfe_xml --itens 10 100 990 --repeticoes 10
+"""
+import statistics
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from lxml import etree
+
+from fiscal.nfe_xml import serializar_nfe_pynfe
+from fiscal.nfe_xml_nativo import serializar_nfe
+
+CSOSNS = ['102', '102', '102', '500', '101']
+
+
+def _dados(quantidade_itens):
+    def itens():
+        for i in range(1, quantidade_itens + 1):
+            quantidade = Decimal(1 + i % 7)
+            valor_unitario = Decimal('9.90') + i % 50
+            total = (quantidade * valor_unitario).quantize(Decimal('0.01'))
+            desconto = Decimal('0.50') if i % 10 == 0 else Decimal('0.00')
+            base = total - desconto
+            yield {
+                'numero_item': i,
+                'codigo': f'BENCH-{i:06d}',
+                'ean': f'789{i:010d}',
+                'descricao': f'Produto sintético {i}',
+                'ncm': '36041000',
+                'cest': '',
+                'cfop': '5102',
+                'unidade': 'UN',
+                'quantidade': quantidade,
+                'valor_unitario': valor_unitario,
+                'valor_total': total,
+                'desconto': desconto,
+                'icms_origem': 0,
+                'icms_cst': CSOSNS[i % len(CSOSNS)],
+                'icms_modalidade_bc': 0,
+                'icms_base': Decimal('0.00'),
+                'icms_aliquota': Decimal('0.00'),
+                'icms_valor': Decimal('0.00'),
+                'pis_cst': '49',
+                'pis_base': base,
+                'pis_aliquota': Decimal('0.00'),
+                'pis_valor': Decimal('0.00'),
+                'cofins_cst': '49',
+                'cofins_base': base,
+                'cofins_aliquota': Decimal('0.00'),
+                'cofins_valor': Decimal('0.00'),
+                'ipi_cst': '53',
+            }
+
+    endereco = {
+        'endereco_logradouro': 'Rua do Benchmark',
+        'endereco_numero': '1',
+        'endereco_complemento': '',
+        'endereco_bairro': 'Centro',
+        'endereco_municipio': 'Salvador',
+        'endereco_uf': 'BA',
+        'endereco_cep': '40010000',
+        'endereco_pais': '1058',
+        'endereco_telefone': '',
+    }
+    return {
+        'homologacao': True,
+        'simples': True,
+        'uf': 'BA',
+        'municipio': '2927408',
+        'serie': '1',
+        'numero': '1',
+        'data_emissao': datetime.now().astimezone(),
+        'codigo_numerico': '12345678',
+        'emitente': {
+            'razao_social': 'Benchmark LTDA',
+            'nome_fantasia': 'Benchmark',
+            'cnpj': '33445566000173',
+            'inscricao_estadual': '123456789',
+            'codigo_de_regime_tributario': '1',
+            **endereco,
+        },
+        'destinatario': {
+            'razao_social': 'Cliente Benchmark',
+            'email': '',
+            'tipo_documento': 'CPF',
+            'numero_documento': '12345678909',
+            'indicador_ie': 9,
+            **endereco,
+        },
+        'itens': itens(),
+    }
+
+
+def _c14n(raiz) -> bytes:
+    return etree.tostring(etree.fromstring(etree.tostring(raiz)), method='c14n')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark da serialização da NF-e: PyNFe x serializador lxml nativo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--itens',
+            type=int,
+            nargs='+',
+            default=[10, 100, 990],
+            help='Quantidades de itens por nota (padrão: 10 100 990)',
+        )
+        parser.add_argument('--repeticoes', type=int, default=5, help='Medições por cenário (padrão: 5)')
+
+    def handle(self, *args, **options):
+        for quantidade in options['itens']:
+            if not 1 <= quantidade <= 990:
+                raise CommandError('A NF-e aceita de 1 a 990 itens.')
+            if _c14n(serializar_nfe(_dados(quantidade))) != _c14n(serializar_nfe_pynfe(_dados(quantidade))):
+                raise CommandError(f'XML nativo diverge do PyNFe com {quantidade} itens.')
+
+            pynfe = self._medir(serializar_nfe_pynfe, quantidade, options['repeticoes'])
+            nativo = self._medir(serializar_nfe, quantidade, options['repeticoes'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{quantidade:>4} itens: PyNFe {pynfe:8.1f}ms  nativo {nativo:7.1f}ms  '
+                f'({pynfe / nativo:.1f}x)'
+            ))
+
+    def _medir(self, serializar, quantidade, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            dados = _dados(quantidade)
+            inicio = time.perf_counter()
+            etree.tostring(serializar(dados))
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tempos)
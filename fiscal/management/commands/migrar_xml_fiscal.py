@@ -0,0 +1,108 @@
+"""
+Move o XML das notas fiscais da coluna legada (texto na linha) para o
+armazenamento comprimido por SHA-256 (fiscal/armazenamento_xml.py).
+
+Processa em lotes por pk: grava o arquivo, relê e confere o conteúdo e só então
+grava hash/tamanho e limpa a coluna legada, um lote por transação. Pode ser
+interrompido e executado de novo; linhas que já têm hash só perdem a cópia legada.
+
+Só roda com settings.FISCAL_XML_DURAVEL (armazenamento que sobrevive a deploys,
+ex.: S3 ou disco persistente): em disco efêmero a coluna legada é a única cópia
+que resiste a um novo deploy.
+
+Uso:
+  python manage.py migrar_xml_fiscal
+  python manage.py migrar_xml_fiscal --dry-run
+  python manage.py migrar_xml_fiscal --modelo fiscal.NotaFiscalEntrada --batch-size 200
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from fiscal.armazenamento_xml import XMLArmazenadoField, armazenamento_duravel, carregar_xml, salvar_xml
+
+
+class Command(BaseCommand):
+    help = 'Move o XML fiscal das linhas (coluna legada) para arquivos comprimidos por SHA-256'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Quantidade de notas por lote (padrão: 200)',
+        )
+        parser.add_argument(
+            '--modelo',
+            help='Migra apenas este model (ex.: fiscal.NotaFiscalSaida)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas conta as notas com XML na coluna legada, sem gravar',
+        )
+
+    def handle(self, *args, **options):
+        if not options['dry_run'] and not armazenamento_duravel():
+            raise CommandError(
+                'Armazenamento de XML fiscal não declarado durável (FISCAL_XML_DURAVEL). '
+                'Configure STORAGES["xml_fiscal"] (ex.: S3) ou um disco persistente antes de '
+                'limpar a coluna legada: é a única cópia que sobrevive a um novo deploy.'
+            )
+        campos = [
+            (model, campo)
+            for model in apps.get_models()
+            for campo in model._meta.concrete_fields
+            if isinstance(campo, XMLArmazenadoField) and campo.campo_legado
+        ]
+        if options['modelo']:
+            campos = [(m, c) for m, c in campos if m._meta.label_lower == options['modelo'].lower()]
+            if not campos:
+                raise CommandError(f'Model sem XML armazenado: {options["modelo"]}')
+
+        total = 0
+        for model, campo in campos:
+            pendentes = model._base_manager.filter(**{f'{campo.campo_legado}__isnull': False})
+            if options['dry_run']:
+                quantidade = pendentes.count()
+            else:
+                quantidade = self._migrar(model, campo, pendentes, options['batch_size'])
+            total += quantidade
+            self.stdout.write(f'{model._meta.label}: {quantidade} nota(s)')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Simulação: {total} nota(s) seriam migradas.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} nota(s) migrada(s).'))
+
+    def _migrar(self, model, campo, pendentes, batch_size):
+        nomes = [campo.name, campo.campo_tamanho, campo.campo_legado]
+        migradas = 0
+        ultimo_pk = None
+        while True:
+            queryset = pendentes.only('pk', campo.attname, campo.campo_legado).order_by('pk')
+            if ultimo_pk is not None:
+                queryset = queryset.filter(pk__gt=ultimo_pk)
+            lote = list(queryset[:batch_size])
+            if not lote:
+                return migradas
+
+            movidas, sem_conteudo = [], []
+            for obj in lote:
+                conteudo = getattr(obj, campo.campo_legado)
+                if getattr(obj, campo.attname) or not conteudo:
+                    # Já migrada (hash vale) ou vazia: só descarta a cópia legada
+                    sem_conteudo.append(obj.pk)
+                    continue
+                sha256, tamanho = salvar_xml(conteudo)
+                if carregar_xml(sha256) != conteudo:
+                    raise CommandError(f'{model._meta.label} {obj.pk}: XML relido difere do original.')
+                setattr(obj, campo.attname, sha256)
+                setattr(obj, campo.campo_tamanho, tamanho)
+                setattr(obj, campo.campo_legado, None)
+                movidas.append(obj)
+            with transaction.atomic():
+                model._base_manager.bulk_update(movidas, nomes)
+                model._base_manager.filter(pk__in=sem_conteudo).update(**{campo.campo_legado: None})
+            migradas += len(lote)
+            ultimo_pk = lote[-1].pk
@@ -0,0 +1,70 @@
+"""
+Worker da fila de autorização de NF-e (fiscal/nfe_fila.py).
+
+Envia as notas enfileiradas em lotes por loja, consulta os recibos pendentes e
+atualiza o status das notas. Sem --loop executa um ciclo (cron a cada minuto);
+com --loop fica rodando (systemd/supervisor): um ciclo que falha (banco
+desconectado, resposta inesperada da SEFAZ) é registrado no log e o próximo
+ciclo roda normalmente, com as conexões antigas descartadas.
+
+Uso:
+  python manage.py processar_fila_nfe
+  python manage.py processar_fila_nfe --loop --intervalo 5
+  python manage.py processar_fila_nfe --tamanho-lote 20
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Envia em lote as NF-e da fila de autorização e consulta os recibos na SEFAZ'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Continua processando até ser interrompido',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=5,
+            help='Segundos entre ciclos com --loop (padrão: 5)',
+        )
+        parser.add_argument(
+            '--tamanho-lote',
+            type=int,
+            default=50,
+            help='Notas por lote enviNFe, no máximo 50 (padrão: 50)',
+        )
+
+    def handle(self, *args, **options):
+        from fiscal.nfe_fila import processar_fila
+
+        while True:
+            if not options['loop']:
+                resultado = processar_fila(options['tamanho_lote'])
+            else:
+                close_old_connections()
+                try:
+                    resultado = processar_fila(options['tamanho_lote'])
+                except Exception:
+                    logger.exception('Erro no ciclo da fila de autorização de NF-e')
+                    resultado = {}
+            if any(resultado.values()) or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Lotes enviados: {resultado["lotes_enviados"]} ({resultado["notas_enviadas"]} nota(s)); '
+                    f'consultados: {resultado["lotes_consultados"]}; '
+                    f'recuperados: {resultado["lotes_recuperados"]}'
+                ))
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,174 @@
+"""
+Simula a Reforma Tributária (IBS/CBS) sobre as vendas faturadas, por NCM/CFOP.
+
+Lê os itens de pedidos faturados em blocos (values_list, sem instanciar modelos),
+calcula os impostos atuais e os de IBS/CBS com o motor em colunas
+(fiscal/calculos_colunar.py) e agrega por (NCM, CFOP de venda dentro da UF).
+
+Impostos atuais usam o regime da configuração fiscal da loja. IBS/CBS usam a
+alíquota informada na linha de comando (para todos os itens) ou, sem ela, a mesma
+precedência do cálculo escalar: alíquota do produto na empresa > padrão 2026 da loja.
+
+Uso:
+    python manage.py simular_reforma
+    python manage.py simular_reforma --empresa 1 --data-inicio 2026-01-01 --data-fim 2026-06-30
+    python manage.py simular_reforma --aliquota-ibs 17.70 --aliquota-cbs 8.80 --csv reforma.csv
+"""
+import csv
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiscal.calculos import carregar_parametros_fiscais
+from fiscal.calculos_colunar import (
+    ESCALA_IMPOSTO,
+    ESCALA_VALOR,
+    aliquota_para_inteiro,
+    calcular_impostos_colunas,
+    para_centavos,
+    para_decimal,
+    parametros_para_colunas,
+)
+from fiscal.models import ConfiguracaoFiscalLoja
+from vendas.models import ItemPedidoVenda
+
+IMPOSTOS = ['icms', 'icms_st', 'pis', 'cofins', 'ipi', 'ibs', 'cbs']
+
+
+class Command(BaseCommand):
+    help = 'Simula IBS/CBS sobre as vendas faturadas e agrega o resultado por NCM/CFOP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+        parser.add_argument('--data-inicio', type=date.fromisoformat, help='AAAA-MM-DD (data de emissão)')
+        parser.add_argument('--data-fim', type=date.fromisoformat, help='AAAA-MM-DD (data de emissão)')
+        parser.add_argument('--aliquota-ibs', type=Decimal, help='Alíquota IBS (%%) simulada para todos os itens')
+        parser.add_argument('--aliquota-cbs', type=Decimal, help='Alíquota CBS (%%) simulada para todos os itens')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Itens por bloco (padrão: 5000)')
+        parser.add_argument('--csv', help='Grava o relatório agregado neste arquivo CSV')
+
+    def handle(self, *args, **options):
+        try:
+            aliquota_ibs = self._aliquota_opcao(options['aliquota_ibs'])
+            aliquota_cbs = self._aliquota_opcao(options['aliquota_cbs'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        configs = {
+            c['loja_id']: c
+            for c in ConfiguracaoFiscalLoja.objects.values(
+                'loja_id', 'regime_tributario', 'aliquota_ibs_padrao_2026', 'aliquota_cbs_padrao_2026',
+            )
+        }
+
+        itens = ItemPedidoVenda.objects.filter(is_active=True, pedido__status='FATURADO')
+        if options['empresa']:
+            itens = itens.filter(pedido__loja__empresa_id=options['empresa'])
+        if options['data_inicio']:
+            itens = itens.filter(pedido__data_emissao__date__gte=options['data_inicio'])
+        if options['data_fim']:
+            itens = itens.filter(pedido__data_emissao__date__lte=options['data_fim'])
+        linhas = itens.order_by().values_list(
+            'produto_id', 'total', 'produto__ncm', 'pedido__loja_id', 'pedido__loja__empresa_id',
+        ).iterator(chunk_size=options['chunk_size'])
+
+        self.parametros = {}
+        agregado = defaultdict(lambda: defaultdict(int))
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) >= options['chunk_size']:
+                self._processar_bloco(bloco, configs, aliquota_ibs, aliquota_cbs, agregado)
+                bloco = []
+        if bloco:
+            self._processar_bloco(bloco, configs, aliquota_ibs, aliquota_cbs, agregado)
+
+        relatorio = self._relatorio(agregado)
+        self._imprimir(relatorio)
+        if options['csv']:
+            self._gravar_csv(options['csv'], relatorio)
+            self.stdout.write(self.style.SUCCESS(f'Relatório gravado em {options["csv"]}'))
+
+    def _aliquota_opcao(self, valor):
+        return aliquota_para_inteiro(valor) if valor is not None else None
+
+    def _carregar_parametros(self, bloco):
+        """Parâmetros fiscais dos produtos do bloco ainda não carregados (1 consulta por empresa)."""
+        faltantes = defaultdict(set)
+        for produto_id, _total, _ncm, _loja_id, empresa_id in bloco:
+            if (empresa_id, produto_id) not in self.parametros:
+                faltantes[empresa_id].add(produto_id)
+        for empresa_id, produto_ids in faltantes.items():
+            encontrados = carregar_parametros_fiscais(empresa_id, produto_ids)
+            for produto_id in produto_ids:
+                self.parametros[(empresa_id, produto_id)] = encontrados.get(produto_id)
+
+    def _processar_bloco(self, bloco, configs, aliquota_ibs, aliquota_cbs, agregado):
+        self._carregar_parametros(bloco)
+        lista_parametros = [self.parametros[(linha[4], linha[0])] for linha in bloco]
+        colunas = parametros_para_colunas(lista_parametros)
+
+        # Alíquota por linha: linha de comando > produto > loja > padrão 2026
+        regimes = []
+        for i, (_produto_id, _total, _ncm, loja_id, _empresa_id) in enumerate(bloco):
+            config = configs.get(loja_id) or {}
+            regimes.append(config.get('regime_tributario'))
+            if aliquota_ibs is not None:
+                colunas['aliquota_ibs'][i] = aliquota_ibs
+            elif not colunas['aliquota_ibs'][i]:
+                colunas['aliquota_ibs'][i] = aliquota_para_inteiro(config.get('aliquota_ibs_padrao_2026', Decimal('0.10')))
+            if aliquota_cbs is not None:
+                colunas['aliquota_cbs'][i] = aliquota_cbs
+            elif not colunas['aliquota_cbs'][i]:
+                colunas['aliquota_cbs'][i] = aliquota_para_inteiro(config.get('aliquota_cbs_padrao_2026', Decimal('0.90')))
+
+        valores = [para_centavos(linha[1]) for linha in bloco]
+        resultado = calcular_impostos_colunas(valores, colunas, regimes, usar_reforma=True)
+
+        for i, (_produto_id, _total, ncm, _loja_id, _empresa_id) in enumerate(bloco):
+            fiscal = lista_parametros[i]
+            cfop = getattr(fiscal, 'cfop_venda_dentro_uf', None) or '-'
+            grupo = agregado[(ncm or '-', cfop)]
+            grupo['itens'] += 1
+            grupo['valor_produtos'] += valores[i]
+            for imposto in IMPOSTOS:
+                grupo[imposto] += resultado[f'valor_{imposto}'][i]
+
+    def _relatorio(self, agregado):
+        relatorio = []
+        for (ncm, cfop), grupo in sorted(agregado.items()):
+            linha = {
+                'ncm': ncm,
+                'cfop': cfop,
+                'itens': grupo['itens'],
+                'valor_produtos': para_decimal(grupo['valor_produtos'], ESCALA_VALOR),
+            }
+            for imposto in IMPOSTOS:
+                linha[imposto] = para_decimal(grupo[imposto], ESCALA_IMPOSTO).quantize(Decimal('0.01'))
+            relatorio.append(linha)
+        return relatorio
+
+    def _imprimir(self, relatorio):
+        if not relatorio:
+            self.stdout.write(self.style.WARNING('Nenhum item faturado no período.'))
+            return
+        cabecalho = f'{"NCM":<10} {"CFOP":<5} {"Itens":>7} {"Valor":>14} ' + ' '.join(
+            f'{imposto.upper():>12}' for imposto in IMPOSTOS
+        )
+        self.stdout.write(cabecalho)
+        for linha in relatorio:
+            self.stdout.write(
+                f'{linha["ncm"]:<10} {linha["cfop"]:<5} {linha["itens"]:>7} {linha["valor_produtos"]:>14} '
+                + ' '.join(f'{linha[imposto]:>12}' for imposto in IMPOSTOS)
+            )
+        total_itens = sum(linha['itens'] for linha in relatorio)
+        self.stdout.write(self.style.SUCCESS(f'{len(relatorio)} grupo(s) NCM/CFOP, {total_itens} item(ns).'))
+
+    def _gravar_csv(self, caminho, relatorio):
+        campos = ['ncm', 'cfop', 'itens', 'valor_produtos', *IMPOSTOS]
+        with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+            writer = csv.DictWriter(arquivo, fieldnames=campos, delimiter=';')
+            writer.writeheader()
+            writer.writerows(relatorio)
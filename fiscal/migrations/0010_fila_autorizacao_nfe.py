@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_chave_idempotencia'),
+        ('fiscal', '0009_rename_fiscal_alert_loja_id_7a8f3a_idx_fiscal_aler_loja_id_423327_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteNFe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Data de atualização')),
+                ('status', models.CharField(choices=[('ENVIANDO', 'Enviando'), ('AGUARDANDO', 'Aguardando processamento'), ('PROCESSADO', 'Processado'), ('ERRO', 'Erro')], default='ENVIANDO', max_length=20, verbose_name='Status')),
+                ('recibo', models.CharField(blank=True, max_length=20, verbose_name='Recibo (nRec)')),
+                ('c_stat', models.CharField(blank=True, max_length=3, verbose_name='cStat')),
+                ('x_motivo', models.TextField(blank=True, verbose_name='xMotivo')),
+                ('consultas', models.PositiveIntegerField(default=0, verbose_name='Consultas realizadas')),
+                ('proxima_consulta', models.DateTimeField(blank=True, null=True, verbose_name='Próxima consulta')),
+                ('loja', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lotes_nfe', to='core.loja', verbose_name='Loja')),
+            ],
+            options={
+                'verbose_name': 'Lote de NF-e',
+                'verbose_name_plural': 'Lotes de NF-e',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AutorizacaoNFe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Data de atualização')),
+                ('chave', models.CharField(max_length=44, verbose_name='Chave de Acesso')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EM_LOTE', 'Em lote'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('proxima_tentativa', models.DateTimeField(blank=True, null=True, verbose_name='Próxima tentativa')),
+                ('ultimo_erro', models.TextField(blank=True, verbose_name='Último erro')),
+                ('nota', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='autorizacao_fila', to='fiscal.notafiscalsaida', verbose_name='Nota Fiscal')),
+                ('lote', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='autorizacoes', to='fiscal.lotenfe', verbose_name='Lote')),
+            ],
+            options={
+                'verbose_name': 'Autorização de NF-e (fila)',
+                'verbose_name_plural': 'Autorizações de NF-e (fila)',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lotenfe',
+            index=models.Index(fields=['status', 'proxima_consulta'], name='fiscal_lote_status_d31532_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autorizacaonfe',
+            index=models.Index(fields=['status', 'proxima_tentativa'], name='fiscal_auto_status_ebc792_idx'),
+        ),
+    ]
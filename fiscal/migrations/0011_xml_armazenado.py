@@ -0,0 +1,54 @@
+import fiscal.armazenamento_xml
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiscal', '0010_fila_autorizacao_nfe'),
+    ]
+
+    operations = [
+        # O XML atual fica na coluna legada até `manage.py migrar_xml_fiscal` movê-lo
+        # para o armazenamento comprimido (fiscal/armazenamento_xml.py)
+        migrations.RenameField(
+            model_name='notafiscalentrada',
+            old_name='xml_arquivo',
+            new_name='xml_legado',
+        ),
+        migrations.AlterField(
+            model_name='notafiscalentrada',
+            name='xml_legado',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='XML da Nota (legado)'),
+        ),
+        migrations.AddField(
+            model_name='notafiscalentrada',
+            name='xml_arquivo',
+            field=fiscal.armazenamento_xml.XMLArmazenadoField(blank=True, campo_legado='xml_legado', campo_tamanho='xml_tamanho', null=True, verbose_name='XML da Nota'),
+        ),
+        migrations.AddField(
+            model_name='notafiscalentrada',
+            name='xml_tamanho',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tamanho do XML (bytes)'),
+        ),
+        migrations.RenameField(
+            model_name='notafiscalsaida',
+            old_name='xml_arquivo',
+            new_name='xml_legado',
+        ),
+        migrations.AlterField(
+            model_name='notafiscalsaida',
+            name='xml_legado',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='XML da Nota (legado)'),
+        ),
+        migrations.AddField(
+            model_name='notafiscalsaida',
+            name='xml_arquivo',
+            field=fiscal.armazenamento_xml.XMLArmazenadoField(blank=True, campo_legado='xml_legado', campo_tamanho='xml_tamanho', null=True, verbose_name='XML da Nota'),
+        ),
+        migrations.AddField(
+            model_name='notafiscalsaida',
+            name='xml_tamanho',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tamanho do XML (bytes)'),
+        ),
+    ]
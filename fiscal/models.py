@@ -5,8 +5,9 @@ from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
-from core.models import BaseModel, Loja
+from core.models import BaseModel, Loja, TimeStampedModel
 from core.fields import EncryptedCharField
+from fiscal.armazenamento_xml import XMLArmazenadoField
 from pessoas.models import Cliente, Fornecedor
 from produtos.models import Produto
 
@@ -152,7 +153,10 @@ class NotaFiscalSaida(BaseModel):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))]
     )
-    xml_arquivo = models.TextField('XML da Nota', blank=True, null=True)
+    # XML em arquivo comprimido (fiscal/armazenamento_xml.py); a linha guarda hash e tamanho
+    xml_arquivo = XMLArmazenadoField('XML da Nota', campo_tamanho='xml_tamanho', campo_legado='xml_legado')
+    xml_tamanho = models.PositiveIntegerField('Tamanho do XML (bytes)', default=0, editable=False)
+    xml_legado = models.TextField('XML da Nota (legado)', blank=True, null=True, editable=False)
     status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='RASCUNHO')
     data_emissao = models.DateTimeField('Data de Emissão', null=True, blank=True)
     motivo_cancelamento = models.TextField('Motivo do Cancelamento', blank=True, null=True)
@@ -225,7 +229,7 @@ class NotaFiscalSaida(BaseModel):
         Args:
             config_fiscal: ConfiguracaoFiscalLoja (opcional, busca automaticamente se None)
         """
-        from fiscal.calculos import calcular_impostos_nota, calcular_impostos_item
+        from fiscal.calculos import calcular_impostos_nota
         
         if not self.pedido_venda:
             raise ValueError("Nota deve ter pedido_venda para gravar snapshot")
@@ -237,10 +241,10 @@ class NotaFiscalSaida(BaseModel):
             except:
                 config_fiscal = None
         
-        itens = self.pedido_venda.itens.filter(is_active=True)
+        itens = list(self.pedido_venda.itens.filter(is_active=True).select_related('produto'))
         regime = config_fiscal.regime_tributario if config_fiscal else None
         
-        # Calcular totais
+        # Calcular totais (e impostos por item, reaproveitados no snapshot)
         totais = calcular_impostos_nota(itens, regime, config_fiscal)
         
         # Gravar cache de totais
@@ -251,9 +255,7 @@ class NotaFiscalSaida(BaseModel):
         
         # Gravar snapshot por item
         snapshot = []
-        for item in itens:
-            impostos_item = calcular_impostos_item(item, regime, config_fiscal)
-            
+        for item, impostos_item in zip(itens, totais['itens']):
             snapshot.append({
                 'item_id': item.id,
                 'produto_id': item.produto_id if hasattr(item, 'produto_id') else None,
@@ -424,7 +426,10 @@ class NotaFiscalEntrada(BaseModel):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))]
     )
-    xml_arquivo = models.TextField('XML da Nota', blank=True, null=True)
+    # XML em arquivo comprimido (fiscal/armazenamento_xml.py); a linha guarda hash e tamanho
+    xml_arquivo = XMLArmazenadoField('XML da Nota', campo_tamanho='xml_tamanho', campo_legado='xml_legado')
+    xml_tamanho = models.PositiveIntegerField('Tamanho do XML (bytes)', default=0, editable=False)
+    xml_legado = models.TextField('XML da Nota (legado)', blank=True, null=True, editable=False)
     data_emissao = models.DateField('Data de Emissão')
     data_entrada = models.DateField('Data de Entrada')
 
@@ -668,3 +673,89 @@ class AlertaNotaFiscal(BaseModel):
     def __str__(self):
         return f"Alerta NF-e {self.numero}/{self.serie} - {self.chave_acesso[:10]}..."
 
+
+
+class LoteNFe(TimeStampedModel):
+    """
+    Lote enviNFe enviado à SEFAZ pela fila de autorização (fiscal/nfe_fila.py).
+
+    Envio assíncrono (indSinc=0): a SEFAZ devolve um recibo (nRec) e o resultado
+    de cada nota é consultado depois (retAutorizacao).
+    """
+
+    STATUS_CHOICES = [
+        ('ENVIANDO', 'Enviando'),
+        ('AGUARDANDO', 'Aguardando processamento'),
+        ('PROCESSADO', 'Processado'),
+        ('ERRO', 'Erro'),
+    ]
+
+    loja = models.ForeignKey(
+        Loja,
+        on_delete=models.PROTECT,
+        related_name='lotes_nfe',
+        verbose_name='Loja',
+    )
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='ENVIANDO')
+    recibo = models.CharField('Recibo (nRec)', max_length=20, blank=True)
+    c_stat = models.CharField('cStat', max_length=3, blank=True)
+    x_motivo = models.TextField('xMotivo', blank=True)
+    consultas = models.PositiveIntegerField('Consultas realizadas', default=0)
+    proxima_consulta = models.DateTimeField('Próxima consulta', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Lote de NF-e'
+        verbose_name_plural = 'Lotes de NF-e'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'proxima_consulta']),
+        ]
+
+    def __str__(self):
+        return f"Lote {self.pk} - {self.loja} ({self.status})"
+
+
+class AutorizacaoNFe(TimeStampedModel):
+    """
+    Item da fila de autorização: uma NF-e em EM_PROCESSAMENTO aguardando envio,
+    em lote na SEFAZ ou concluída. Falhas de comunicação voltam para PENDENTE com
+    espera crescente até esgotar as tentativas (ERRO).
+    """
+
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EM_LOTE', 'Em lote'),
+        ('CONCLUIDA', 'Concluída'),
+        ('ERRO', 'Erro'),
+    ]
+
+    nota = models.OneToOneField(
+        NotaFiscalSaida,
+        on_delete=models.CASCADE,
+        related_name='autorizacao_fila',
+        verbose_name='Nota Fiscal',
+    )
+    chave = models.CharField('Chave de Acesso', max_length=44)
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='PENDENTE')
+    lote = models.ForeignKey(
+        LoteNFe,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='autorizacoes',
+        verbose_name='Lote',
+    )
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    proxima_tentativa = models.DateTimeField('Próxima tentativa', null=True, blank=True)
+    ultimo_erro = models.TextField('Último erro', blank=True)
+
+    class Meta:
+        verbose_name = 'Autorização de NF-e (fila)'
+        verbose_name_plural = 'Autorizações de NF-e (fila)'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa']),
+        ]
+
+    def __str__(self):
+        return f"NF-e {self.nota.numero}/{self.nota.serie} ({self.status})"
@@ -101,9 +101,7 @@ def enviar_nfe_para_autorizacao(nota) -> dict:
     Returns:
         dict: autorizada, cStat, xMotivo, chNFe, nProt, xml_proc
     """
-    from pynfe.processamento.comunicacao import ComunicacaoSefaz
-
-    from fiscal.nfe_status import get_certificado_path, get_senha_certificado
+    from fiscal.sefaz_conexao import obter_comunicacao
 
     if not getattr(nota, 'status', None) == 'EM_PROCESSAMENTO':
         raise ValueError(
@@ -119,16 +117,7 @@ def enviar_nfe_para_autorizacao(nota) -> dict:
     except Exception as exc:
         raise ValueError(f'Configuração fiscal da loja não encontrada: {exc}') from exc
 
-    homologacao = config.ambiente == 'HOMOLOGACAO'
-    certificado_path = get_certificado_path(config)
-    senha = get_senha_certificado(config)
-
-    con = ComunicacaoSefaz(
-        uf='ba',
-        certificado=certificado_path,
-        certificado_senha=senha,
-        homologacao=homologacao,
-    )
+    con = obter_comunicacao(config)
 
     xml_text = nota.xml_arquivo
     if isinstance(xml_text, bytes):
@@ -80,10 +80,10 @@ def cancelar_nfe(nota, justificativa: str, usuario=None) -> dict:
     from pynfe.entidades.evento import EventoCancelarNota
     from pynfe.entidades.fonte_dados import _fonte_dados
     from pynfe.processamento.assinatura import AssinaturaA1
-    from pynfe.processamento.comunicacao import ComunicacaoSefaz
     from pynfe.processamento.serializacao import SerializacaoXML
 
     from fiscal.nfe_status import get_certificado_path, get_senha_certificado
+    from fiscal.sefaz_conexao import obter_comunicacao
 
     _ = usuario
 
@@ -161,12 +161,7 @@ def cancelar_nfe(nota, justificativa: str, usuario=None) -> dict:
     a1 = AssinaturaA1(certificado_path, senha)
     xml_assinado = a1.assinar(xml_evento)
 
-    con = ComunicacaoSefaz(
-        uf='ba',
-        certificado=certificado_path,
-        certificado_senha=senha,
-        homologacao=homologacao,
-    )
+    con = obter_comunicacao(config)
 
     logger.info(
         'Enviando cancelamento NF-e %s/%s chave=%s...',
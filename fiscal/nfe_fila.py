@@ -0,0 +1,483 @@
+"""
+Fila de autorização de NF-e: envio em lote (enviNFe) assíncrono à SEFAZ.
+
+A view só enfileira a nota (AutorizacaoNFe PENDENTE); o worker
+(manage.py processar_fila_nfe) faz o resto fora da requisição:
+
+1. agrupa as pendentes por loja (certificado) em lotes de até 50 notas e envia
+   com indSinc=0; a SEFAZ responde 103 com o recibo (nRec)
+2. consulta o recibo (NFeRetAutorizacao4 / retAutorizacao) a partir de 15 s
+   depois do envio; 105 (em processamento) reagenda a consulta com espera crescente
+3. com o lote processado (104), aplica o protNFe de cada nota (AUTORIZADA ou
+   REJEITADA) na mesma transação que conclui o item da fila
+
+Falha de comunicação ou serviço paralisado devolvem as notas do lote para
+PENDENTE com espera crescente; esgotadas NFE_FILA_MAX_TENTATIVAS, o item fica
+em ERRO (nota continua EM_PROCESSAMENTO e pode ser enfileirada de novo).
+
+Nota que volta à fila pode já ter sido autorizada (a SEFAZ recebeu o lote e a
+resposta se perdeu). Por isso o protNFe de duplicidade (204/539) não rejeita a
+nota: a situação é consultada por chave (NfeConsultaProtocolo4) e, se autorizada,
+vale o protNFe original. Lote interrompido no envio tem as notas consultadas
+antes de voltar à fila.
+
+Com settings.SEFAZ_NFE_URL definido, envios e consultas vão para esse endereço
+sem certificado (SEFAZ local de fiscal/sefaz_stub.py, em testes e desenvolvimento).
+"""
+import copy
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from lxml import etree
+
+from .models import AutorizacaoNFe, LoteNFe, NotaFiscalSaida
+
+logger = logging.getLogger(__name__)
+
+NS = 'http://www.portalfiscal.inf.br/nfe'
+VERSAO = '4.00'
+
+TAMANHO_MAXIMO_LOTE = 50
+TIMEOUT_SEFAZ = 30  # segundos por requisição
+ESPERA_PRIMEIRA_CONSULTA = timedelta(seconds=15)  # mínimo recomendado pelo MOC
+ESPERA_BASE = timedelta(seconds=30)
+ESPERA_MAXIMA = timedelta(hours=1)
+# Lote em ENVIANDO há mais tempo que isso: o worker morreu durante o envio
+TIMEOUT_ENVIO = timedelta(minutes=10)
+
+CSTAT_LOTE_RECEBIDO = '103'
+CSTAT_LOTE_PROCESSADO = '104'
+CSTAT_LOTE_EM_PROCESSAMENTO = '105'
+CSTAT_SERVICO_INDISPONIVEL = ('108', '109', '656')
+CSTAT_AUTORIZADA = ('100', '150')
+CSTAT_DUPLICIDADE = ('204', '539')
+
+
+def _max_tentativas() -> int:
+    return getattr(settings, 'NFE_FILA_MAX_TENTATIVAS', 8)
+
+
+def espera(tentativas: int) -> timedelta:
+    """Espera antes da próxima tentativa: 30 s, 1 min, 2 min, ... até 1 h."""
+    return min(ESPERA_BASE * (2 ** max(tentativas - 1, 0)), ESPERA_MAXIMA)
+
+
+def chave_do_xml(xml_text) -> str:
+    """Chave de acesso (44 dígitos) do atributo Id de infNFe."""
+    if isinstance(xml_text, str):
+        xml_text = xml_text.encode('utf-8')
+    try:
+        raiz = etree.fromstring(xml_text)
+    except Exception as exc:
+        raise ValueError(f'XML da nota inválido (não é XML bem formado): {exc}') from exc
+    inf_nfe = raiz if etree.QName(raiz).localname == 'infNFe' else raiz.find('.//{*}infNFe')
+    chave = (inf_nfe.get('Id') or '')[3:] if inf_nfe is not None else ''
+    if len(chave) != 44:
+        raise ValueError('XML da nota sem chave de acesso (infNFe/@Id).')
+    return chave
+
+
+def enfileirar(nota) -> AutorizacaoNFe:
+    """
+    Coloca a nota (EM_PROCESSAMENTO, XML assinado) na fila. Nota já pendente ou em
+    lote não é enfileirada de novo; concluída com erro volta a PENDENTE.
+    """
+    if nota.status != 'EM_PROCESSAMENTO':
+        raise ValueError(
+            f"Nota #{nota.id} está com status '{nota.status}'. "
+            'Só é possível enviar notas com status EM_PROCESSAMENTO.'
+        )
+    if not nota.xml_arquivo:
+        raise ValueError(f'Nota #{nota.id} não possui XML gerado.')
+    chave = chave_do_xml(nota.xml_arquivo)
+
+    with transaction.atomic():
+        item, criado = AutorizacaoNFe.objects.select_for_update().get_or_create(
+            nota=nota,
+            defaults={'chave': chave, 'proxima_tentativa': timezone.now()},
+        )
+        if not criado and item.status not in ('PENDENTE', 'EM_LOTE'):
+            item.chave = chave
+            item.status = 'PENDENTE'
+            item.lote = None
+            item.tentativas = 0
+            item.proxima_tentativa = timezone.now()
+            item.ultimo_erro = ''
+            item.save()
+    return item
+
+
+# ---------------------------------------------------------------------------
+# Comunicação
+# ---------------------------------------------------------------------------
+
+class ClienteSefaz:
+    """Envio de lote e consultas de recibo e de situação (SOAP) para a configuração fiscal de uma loja."""
+
+    def __init__(self, config):
+        from .sefaz_conexao import obter_comunicacao
+
+        self.url_local = getattr(settings, 'SEFAZ_NFE_URL', '')
+        self.con = obter_comunicacao(config, sem_certificado=bool(self.url_local))
+
+    def _post(self, servico: str, metodo: str, dados) -> etree._Element:
+        xml = self.con._construir_xml_soap(metodo, dados)
+        url = self.url_local or self.con._get_url(modelo='nfe', consulta=servico)
+        resposta = self.con._post(url, xml, timeout=TIMEOUT_SEFAZ)
+        resposta.raise_for_status()
+        return etree.fromstring(resposta.content)
+
+    def enviar_lote(self, id_lote, nfes: List[etree._Element]) -> etree._Element:
+        raiz = etree.Element('enviNFe', xmlns=NS, versao=VERSAO)
+        etree.SubElement(raiz, 'idLote').text = str(id_lote)
+        etree.SubElement(raiz, 'indSinc').text = '0'
+        for nfe in nfes:
+            raiz.append(nfe)
+        return self._post('AUTORIZACAO', 'NFeAutorizacao4', raiz)
+
+    def consultar_recibo(self, recibo: str) -> etree._Element:
+        raiz = etree.Element('consReciNFe', versao=VERSAO, xmlns=NS)
+        etree.SubElement(raiz, 'tpAmb').text = str(self.con._ambiente)
+        etree.SubElement(raiz, 'nRec').text = recibo
+        return self._post('RECIBO', 'NFeRetAutorizacao4', raiz)
+
+    def consultar_protocolo(self, chave: str) -> etree._Element:
+        raiz = etree.Element('consSitNFe', versao=VERSAO, xmlns=NS)
+        etree.SubElement(raiz, 'tpAmb').text = str(self.con._ambiente)
+        etree.SubElement(raiz, 'xServ').text = 'CONSULTAR'
+        etree.SubElement(raiz, 'chNFe').text = chave
+        return self._post('CHAVE', 'NFeConsultaProtocolo4', raiz)
+
+
+def _texto(elemento, tag: str) -> str:
+    el = elemento.find(f'{{*}}{tag}')
+    return (el.text or '').strip() if el is not None else ''
+
+
+def _retorno(resposta: etree._Element, tag: str) -> Dict:
+    """cStat/xMotivo/nRec do retEnviNFe ou retConsReciNFe e os protNFe por chave."""
+    ret = resposta if etree.QName(resposta).localname == tag else resposta.find(f'.//{{*}}{tag}')
+    if ret is None:
+        return {'cStat': '999', 'xMotivo': f'Resposta sem {tag}', 'nRec': '', 'protocolos': {}}
+    protocolos = {}
+    for prot in ret.findall('{*}protNFe'):
+        inf_prot = prot.find('{*}infProt')
+        if inf_prot is not None:
+            protocolos[_texto(inf_prot, 'chNFe')] = prot
+    inf_rec = ret.find('{*}infRec')
+    return {
+        'cStat': _texto(ret, 'cStat'),
+        'xMotivo': _texto(ret, 'xMotivo'),
+        'nRec': _texto(inf_rec, 'nRec') if inf_rec is not None else _texto(ret, 'nRec'),
+        'protocolos': protocolos,
+    }
+
+
+def _protocolo_autorizado(cliente: ClienteSefaz, chave: str):
+    """protNFe de autorização da nota segundo a consulta por chave (retConsSitNFe), ou None."""
+    resposta = cliente.consultar_protocolo(chave)
+    ret = resposta if etree.QName(resposta).localname == 'retConsSitNFe' else resposta.find('.//{*}retConsSitNFe')
+    if ret is None:
+        raise ValueError('Resposta sem retConsSitNFe')
+    for prot in ret.findall('{*}protNFe'):
+        inf_prot = prot.find('{*}infProt')
+        if (
+            inf_prot is not None
+            and _texto(inf_prot, 'chNFe') == chave
+            and _texto(inf_prot, 'cStat') in CSTAT_AUTORIZADA
+        ):
+            return prot
+    return None
+
+
+def _resolver_duplicidades(cliente: ClienteSefaz, retorno: Dict):
+    """
+    protNFe de duplicidade (204/539) é trocado pelo protNFe original quando a
+    consulta por chave mostra a nota autorizada. Se a consulta falhar, a nota
+    fica sem protocolo no retorno e volta à fila.
+    """
+    for chave, prot in list(retorno['protocolos'].items()):
+        if _texto(prot.find('{*}infProt'), 'cStat') not in CSTAT_DUPLICIDADE:
+            continue
+        try:
+            autorizado = _protocolo_autorizado(cliente, chave)
+        except Exception:
+            logger.exception('Erro na consulta da NF-e %s (duplicidade)', chave)
+            del retorno['protocolos'][chave]
+            continue
+        if autorizado is not None:
+            retorno['protocolos'][chave] = autorizado
+
+
+def _nfe_proc(xml_nfe, prot_nfe) -> str:
+    """nfeProc (NFe assinada + protNFe) gravado na nota autorizada."""
+    if isinstance(xml_nfe, str):
+        xml_nfe = xml_nfe.encode('utf-8')
+    raiz = etree.Element(f'{{{NS}}}nfeProc', nsmap={None: NS}, versao=VERSAO)
+    raiz.append(etree.fromstring(xml_nfe))
+    raiz.append(copy.deepcopy(prot_nfe))
+    return etree.tostring(raiz, encoding='unicode')
+
+
+# ---------------------------------------------------------------------------
+# Transições
+# ---------------------------------------------------------------------------
+
+def _devolver_para_fila(itens, motivo: str):
+    """Itens voltam a PENDENTE com espera crescente (ou ERRO sem tentativas restantes)."""
+    agora = timezone.now()
+    for item in itens:
+        item.tentativas += 1
+        item.ultimo_erro = motivo[:2000]
+        item.lote = None
+        if item.tentativas >= _max_tentativas():
+            item.status = 'ERRO'
+            logger.error('NF-e (nota %s) sem tentativas restantes na fila: %s', item.nota_id, motivo)
+        else:
+            item.status = 'PENDENTE'
+            item.proxima_tentativa = agora + espera(item.tentativas)
+    AutorizacaoNFe.objects.bulk_update(
+        itens, ['tentativas', 'ultimo_erro', 'lote', 'status', 'proxima_tentativa', 'updated_at'],
+    )
+
+
+@transaction.atomic
+def _falha_lote(lote: LoteNFe, motivo: str, c_stat: str = ''):
+    logger.warning('Lote NF-e %s (loja %s) falhou: %s', lote.pk, lote.loja_id, motivo)
+    lote.status = 'ERRO'
+    lote.c_stat = c_stat
+    lote.x_motivo = motivo
+    lote.save(update_fields=['status', 'c_stat', 'x_motivo', 'updated_at'])
+    _devolver_para_fila(list(lote.autorizacoes.filter(status='EM_LOTE')), motivo)
+
+
+def _resultado_protocolo(item: AutorizacaoNFe, prot) -> Dict:
+    inf_prot = prot.find('{*}infProt')
+    c_stat = _texto(inf_prot, 'cStat')
+    return {
+        'autorizada': c_stat in CSTAT_AUTORIZADA,
+        'cStat': c_stat,
+        'xMotivo': _texto(inf_prot, 'xMotivo'),
+        'chNFe': item.chave,
+        'nProt': _texto(inf_prot, 'nProt'),
+        'xml_proc': '',
+    }
+
+
+def _concluir_item(item: AutorizacaoNFe, nota, resultado: Dict, prot=None):
+    from .services import aplicar_retorno_autorizacao
+
+    # Nota já finalizada por outro caminho (envio síncrono, reenvio) não é sobrescrita
+    if nota.status == 'EM_PROCESSAMENTO':
+        if resultado['autorizada']:
+            resultado['xml_proc'] = _nfe_proc(nota.xml_arquivo, prot)
+        aplicar_retorno_autorizacao(nota, resultado)
+    item.status = 'CONCLUIDA'
+    item.ultimo_erro = '' if resultado['autorizada'] else f"cStat {resultado['cStat']}: {resultado['xMotivo']}"
+
+
+@transaction.atomic
+def _aplicar_retorno_lote(lote: LoteNFe, retorno: Dict):
+    """
+    Lote processado (104): aplica o protNFe de cada nota. Lote rejeitado por
+    inteiro (outro cStat): a rejeição vale para todas as notas.
+    """
+    processado = retorno['cStat'] == CSTAT_LOTE_PROCESSADO
+    lote.status = 'PROCESSADO' if processado else 'ERRO'
+    lote.c_stat = retorno['cStat']
+    lote.x_motivo = retorno['xMotivo']
+    lote.save(update_fields=['status', 'c_stat', 'x_motivo', 'updated_at'])
+
+    itens = list(lote.autorizacoes.filter(status='EM_LOTE'))
+    notas = NotaFiscalSaida.objects.select_for_update().select_related('loja').in_bulk(
+        [item.nota_id for item in itens]
+    )
+    sem_protocolo = []
+    for item in itens:
+        prot = retorno['protocolos'].get(item.chave)
+        if processado and prot is None:
+            sem_protocolo.append(item)
+            continue
+        if prot is not None:
+            resultado = _resultado_protocolo(item, prot)
+        else:
+            resultado = {
+                'autorizada': False,
+                'cStat': retorno['cStat'],
+                'xMotivo': retorno['xMotivo'],
+                'chNFe': '',
+                'nProt': '',
+                'xml_proc': '',
+            }
+        _concluir_item(item, notas[item.nota_id], resultado, prot)
+    AutorizacaoNFe.objects.bulk_update(
+        [item for item in itens if item.status == 'CONCLUIDA'], ['status', 'ultimo_erro', 'updated_at'],
+    )
+    if sem_protocolo:
+        _devolver_para_fila(sem_protocolo, f'Nota ausente no retorno do lote {lote.pk}')
+
+
+@transaction.atomic
+def _aplicar_autorizadas(lote: LoteNFe, protocolos: Dict):
+    """Conclui as notas do lote autorizadas segundo a consulta por chave ({chave: protNFe})."""
+    itens = list(lote.autorizacoes.filter(status='EM_LOTE', chave__in=list(protocolos)))
+    notas = NotaFiscalSaida.objects.select_for_update().select_related('loja').in_bulk(
+        [item.nota_id for item in itens]
+    )
+    for item in itens:
+        prot = protocolos[item.chave]
+        _concluir_item(item, notas[item.nota_id], _resultado_protocolo(item, prot), prot)
+    AutorizacaoNFe.objects.bulk_update(itens, ['status', 'ultimo_erro', 'updated_at'])
+
+
+def _reagendar_consulta(lote: LoteNFe, motivo: str):
+    lote.consultas += 1
+    lote.x_motivo = motivo
+    lote.proxima_consulta = timezone.now() + espera(lote.consultas)
+    lote.save(update_fields=['consultas', 'x_motivo', 'proxima_consulta', 'updated_at'])
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def recuperar_lotes_interrompidos() -> int:
+    """
+    Lotes em ENVIANDO além de TIMEOUT_ENVIO (worker morto durante o envio): a
+    SEFAZ pode ter recebido o lote, então cada nota é consultada por chave; as
+    autorizadas são concluídas e as demais voltam à fila (falha na consulta
+    também: o reenvio cai na duplicidade, resolvida por _resolver_duplicidades).
+    """
+    lotes = list(
+        LoteNFe.objects.filter(status='ENVIANDO', updated_at__lt=timezone.now() - TIMEOUT_ENVIO)
+        .select_related('loja')
+    )
+    for lote in lotes:
+        protocolos = {}
+        try:
+            cliente = ClienteSefaz(lote.loja.configuracao_fiscal)
+            for chave in lote.autorizacoes.filter(status='EM_LOTE').values_list('chave', flat=True):
+                prot = _protocolo_autorizado(cliente, chave)
+                if prot is not None:
+                    protocolos[chave] = prot
+        except Exception:
+            logger.exception('Erro na consulta das notas do lote interrompido %s', lote.pk)
+        if protocolos:
+            _aplicar_autorizadas(lote, protocolos)
+        _falha_lote(lote, 'Envio do lote interrompido')
+    return len(lotes)
+
+
+def formar_lotes(tamanho_lote: int = TAMANHO_MAXIMO_LOTE, limite: int = 1000) -> List[LoteNFe]:
+    """Reserva as notas pendentes vencidas em lotes por loja (até tamanho_lote notas cada)."""
+    tamanho_lote = max(1, min(tamanho_lote, TAMANHO_MAXIMO_LOTE))
+    with transaction.atomic():
+        itens = list(
+            AutorizacaoNFe.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDENTE', proxima_tentativa__lte=timezone.now())
+            .order_by('proxima_tentativa', 'pk')[:limite]
+        )
+        lojas = dict(
+            NotaFiscalSaida.objects.filter(pk__in=[item.nota_id for item in itens]).values_list('pk', 'loja_id')
+        )
+        por_loja = defaultdict(list)
+        for item in itens:
+            por_loja[lojas[item.nota_id]].append(item)
+
+        lotes = []
+        for loja_id, itens_loja in por_loja.items():
+            for inicio in range(0, len(itens_loja), tamanho_lote):
+                lote = LoteNFe.objects.create(loja_id=loja_id)
+                AutorizacaoNFe.objects.filter(
+                    pk__in=[item.pk for item in itens_loja[inicio:inicio + tamanho_lote]],
+                ).update(status='EM_LOTE', lote=lote, updated_at=timezone.now())
+                lotes.append(lote)
+    return lotes
+
+
+def enviar_lote(lote: LoteNFe) -> str:
+    """Envia o lote (fora de transação: a requisição pode levar segundos). Devolve o cStat."""
+    itens = list(lote.autorizacoes.filter(status='EM_LOTE').select_related('nota'))
+    try:
+        cliente = ClienteSefaz(lote.loja.configuracao_fiscal)
+        nfes = [etree.fromstring(item.nota.xml_arquivo.encode('utf-8')) for item in itens]
+        logger.info('Enviando lote NF-e %s: %s nota(s) da loja %s', lote.pk, len(nfes), lote.loja_id)
+        retorno = _retorno(cliente.enviar_lote(lote.pk, nfes), 'retEnviNFe')
+    except Exception as exc:
+        # A SEFAZ pode ter recebido o lote (timeout na resposta): o reenvio
+        # volta com duplicidade e _resolver_duplicidades aplica o protocolo original
+        logger.exception('Erro de comunicação no envio do lote NF-e %s', lote.pk)
+        _falha_lote(lote, f'Erro de comunicação: {exc}', '999')
+        return '999'
+
+    c_stat = retorno['cStat']
+    if c_stat == CSTAT_LOTE_RECEBIDO:
+        lote.status = 'AGUARDANDO'
+        lote.recibo = retorno['nRec']
+        lote.c_stat = c_stat
+        lote.x_motivo = retorno['xMotivo']
+        lote.proxima_consulta = timezone.now() + ESPERA_PRIMEIRA_CONSULTA
+        lote.save(update_fields=['status', 'recibo', 'c_stat', 'x_motivo', 'proxima_consulta', 'updated_at'])
+    elif c_stat in CSTAT_SERVICO_INDISPONIVEL:
+        _falha_lote(lote, f"cStat {c_stat}: {retorno['xMotivo']}", c_stat)
+    else:
+        _resolver_duplicidades(cliente, retorno)
+        _aplicar_retorno_lote(lote, retorno)
+    return c_stat
+
+
+def consultar_lote(lote: LoteNFe) -> str:
+    """Consulta o recibo do lote (retAutorizacao). Devolve o cStat."""
+    try:
+        cliente = ClienteSefaz(lote.loja.configuracao_fiscal)
+        retorno = _retorno(cliente.consultar_recibo(lote.recibo), 'retConsReciNFe')
+    except Exception as exc:
+        logger.exception('Erro de comunicação na consulta do lote NF-e %s', lote.pk)
+        _reagendar_consulta(lote, f'Erro de comunicação: {exc}')
+        return '999'
+
+    c_stat = retorno['cStat']
+    if c_stat == CSTAT_LOTE_PROCESSADO:
+        _resolver_duplicidades(cliente, retorno)
+        _aplicar_retorno_lote(lote, retorno)
+    elif c_stat == CSTAT_LOTE_EM_PROCESSAMENTO or c_stat in CSTAT_SERVICO_INDISPONIVEL:
+        _reagendar_consulta(lote, f"cStat {c_stat}: {retorno['xMotivo']}")
+    else:
+        # Recibo não localizado (106) e afins: as notas voltam para um novo lote
+        _falha_lote(lote, f"cStat {c_stat}: {retorno['xMotivo']}", c_stat)
+    return c_stat
+
+
+def consultar_lotes_aguardando() -> int:
+    """Consulta os lotes com consulta vencida. Devolve quantos foram consultados."""
+    consultados = 0
+    agora = timezone.now()
+    for lote in LoteNFe.objects.filter(status='AGUARDANDO', proxima_consulta__lte=agora).select_related('loja'):
+        # Reserva a consulta (outro worker pode ter pegado o mesmo lote)
+        if not LoteNFe.objects.filter(
+            pk=lote.pk, status='AGUARDANDO', proxima_consulta=lote.proxima_consulta,
+        ).update(proxima_consulta=agora + ESPERA_PRIMEIRA_CONSULTA):
+            continue
+        consultar_lote(lote)
+        consultados += 1
+    return consultados
+
+
+def processar_fila(tamanho_lote: int = TAMANHO_MAXIMO_LOTE) -> Dict[str, int]:
+    """Um ciclo do worker: recupera lotes interrompidos, consulta recibos e envia novos lotes."""
+    resultado = {
+        'lotes_recuperados': recuperar_lotes_interrompidos(),
+        'lotes_consultados': consultar_lotes_aguardando(),
+        'lotes_enviados': 0,
+        'notas_enviadas': 0,
+    }
+    for lote in formar_lotes(tamanho_lote):
+        resultado['notas_enviadas'] += lote.autorizacoes.count()
+        enviar_lote(lote)
+        resultado['lotes_enviados'] += 1
+    return resultado
@@ -44,18 +44,9 @@ def consultar_status_servico_nfe(config_fiscal) -> dict:
     Consulta o status do servico NF-e na SEFAZ.
     """
     try:
-        from pynfe.processamento.comunicacao import ComunicacaoSefaz
+        from fiscal.sefaz_conexao import obter_comunicacao
 
-        certificado_path = get_certificado_path(config_fiscal)
-        senha = get_senha_certificado(config_fiscal)
-        homologacao = config_fiscal.ambiente == "HOMOLOGACAO"
-
-        con = ComunicacaoSefaz(
-            uf="ba",
-            certificado=certificado_path,
-            certificado_senha=senha,
-            homologacao=homologacao,
-        )
+        con = obter_comunicacao(config_fiscal)
         resposta = con.status_servico("nfe")
 
         if resposta is None:
@@ -75,6 +66,7 @@ def consultar_status_servico_nfe(config_fiscal) -> dict:
             "cStat": c_stat,
             "xMotivo": x_motivo,
             "ambiente": config_fiscal.ambiente,
+            **con.ultima_requisicao,
         }
         logger.info(
             "Status SEFAZ-BA: cStat=%s xMotivo=%s ambiente=%s",
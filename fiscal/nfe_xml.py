@@ -1,14 +1,20 @@
 """
-Geração do XML da NF-e usando PyNFe.
-Monta os dados do pedido/nota para assinatura (envio SEFAZ em etapa futura).
+Geração do XML da NF-e.
+Monta os dados do pedido/nota (preparar_dados_nfe), serializa com o serializador
+lxml nativo (fiscal/nfe_xml_nativo.py) e assina com o PyNFe.
+
+serializar_nfe_pynfe mantém o caminho pelas entidades do PyNFe: é a referência
+de equivalência do serializador nativo (testes e benchmark_nfe_xml).
 
 NotaFiscalProduto: o serializador 0.6.5 lê vários atributos sem default útil no objeto —
 ``ind_total``, ``valor_tributos_aprox``, ``pis_modalidade``, ``cofins_modalidade``,
 ``icms_csosn``, ``icms_credito``, etc. — e precisam ser definidos explicitamente.
 """
 import logging
+import random
 import re
 from decimal import Decimal
+from typing import Iterator
 
 from django.utils import timezone
 from pynfe.entidades.cliente import Cliente
@@ -21,9 +27,12 @@ from pynfe.utils import obter_municipio_por_codigo
 from pynfe.utils.flags import CODIGO_BRASIL
 
 from fiscal.nfe_status import get_certificado_path, get_senha_certificado
+from fiscal.nfe_xml_nativo import CNPJ_AUTORIZADO_XML, serializar_nfe
 
 logger = logging.getLogger(__name__)
 
+ITENS_POR_BLOCO = 500
+
 
 def _limpar_cnpj_cpf(valor: str) -> str:
     return re.sub(r'\D', '', str(valor or ''))
@@ -109,9 +118,13 @@ def _acumular_totais_produto_na_nfe(nfe: NotaFiscal, obj: NotaFiscalProduto) ->
     )
 
 
-def gerar_xml_nfe(nota) -> str:
+def preparar_dados_nfe(nota) -> dict:
     """
-    Gera o XML da NF-e assinada (string) a partir de uma NotaFiscalSaida em RASCUNHO.
+    Valida e reúne os dados da NF-e de uma NotaFiscalSaida em RASCUNHO.
+
+    Cabeçalho (emitente/destinatário nos argumentos das entidades PyNFe) e, em
+    ``itens``, um gerador que percorre os itens do pedido em blocos; os parâmetros
+    fiscais dos produtos são carregados numa única consulta.
     """
     from produtos.models import ProdutoParametrosEmpresa
 
@@ -123,10 +136,9 @@ def gerar_xml_nfe(nota) -> str:
         raise ValueError(f"Nota #{nota.id} não está vinculada a um pedido de venda.")
 
     try:
-        config = loja.configuracao_fiscal
+        config = loja.configuracao_fiscal
     except Exception as exc:
-        raise ValueError(f"Loja {loja.nome} não possui configuração fiscal.") from exc
-    homologacao = config.ambiente == 'HOMOLOGACAO'
+        raise ValueError(f"Loja {loja.nome} não possui configuração fiscal.") from exc
     homologacao = config.ambiente == 'HOMOLOGACAO'
 
     cnpj_emitente = _limpar_cnpj_cpf(config.cnpj)
@@ -144,7 +156,7 @@ def gerar_xml_nfe(nota) -> str:
     uf_loja = (loja.uf or 'BA').upper()
     nome_municipio_emitente = _nome_municipio_ibge(codigo_ibge, uf_loja)
 
-    emitente = Emitente(
+    emitente = dict(
         razao_social=(loja.empresa.razao_social or loja.nome or '')[:60],
         nome_fantasia=(loja.empresa.nome_fantasia or loja.nome or '')[:60],
         cnpj=cnpj_emitente,
@@ -179,7 +191,7 @@ def gerar_xml_nfe(nota) -> str:
     uf_dest = (cliente.uf or uf_loja).upper()
     nome_municipio_dest = _nome_municipio_ibge(codigo_ibge_dest, uf_dest)
 
-    destinatario = Cliente(
+    destinatario = dict(
         razao_social='NF-E EMITIDA EM AMBIENTE DE HOMOLOGACAO - SEM VALOR FISCAL' if homologacao else (cliente.nome_razao_social or 'Consumidor Final')[:60],
         email=(cliente.email or ''),
         tipo_documento=doc_tipo,
@@ -196,56 +208,51 @@ def gerar_xml_nfe(nota) -> str:
         endereco_telefone=_limpar_cnpj_cpf(cliente.telefone or '')[:12] or '',
     )
 
-
     tz_emissao = nota.data_emissao or timezone.now()
     if timezone.is_naive(tz_emissao):
         tz_emissao = timezone.make_aware(tz_emissao, timezone.get_current_timezone())
 
-    nfe = NotaFiscal(
-        emitente=emitente,
-        cliente=destinatario,
-        modelo=55,
-        serie=str(int(nota.serie)),
-        numero_nf=str(nota.numero),
-        data_emissao=tz_emissao,
-        data_saida_entrada=tz_emissao,
-        natureza_operacao='VENDA',
-        tipo_documento=1,
-        tipo_impressao_danfe=1,
-        forma_emissao='1',
-        finalidade_emissao=1,
-        cliente_final=1,
-        indicador_presencial=1,
-        indicador_destino=1,
-        indicador_intermediador=0,
-        municipio=codigo_ibge,
-        uf=uf_loja,
-        transporte_modalidade_frete=9,
-    )
-
     itens = pedido.itens.filter(is_active=True).select_related('produto')
     if not itens.exists():
         raise ValueError(f"Pedido #{pedido.id} não possui itens ativos.")
 
+    parametros = {
+        p.produto_id: p
+        for p in ProdutoParametrosEmpresa.objects.filter(
+            empresa=loja.empresa,
+            produto_id__in=itens.values('produto_id'),
+        )
+    }
     is_simples = 'SIMPLES' in (config.regime_tributario or '').upper()
 
-    for seq, item in enumerate(itens, start=1):
+    return {
+        'homologacao': homologacao,
+        'simples': is_simples,
+        'uf': uf_loja,
+        'municipio': codigo_ibge,
+        'serie': str(int(nota.serie)),
+        'numero': str(nota.numero),
+        'data_emissao': tz_emissao,
+        'codigo_numerico': str(random.randint(0, 99999999)).zfill(8),
+        'emitente': emitente,
+        'destinatario': destinatario,
+        'itens': _itens_nfe(itens, parametros, is_simples, loja.empresa),
+    }
+
+
+def _itens_nfe(itens, parametros, is_simples: bool, empresa) -> Iterator[dict]:
+    """Itens da NF-e (valores em Decimal) na ordem do pedido, lidos em blocos."""
+    for seq, item in enumerate(itens.iterator(chunk_size=ITENS_POR_BLOCO), start=1):
         produto = item.produto
-        try:
-            params = ProdutoParametrosEmpresa.objects.get(
-                produto=produto,
-                empresa=loja.empresa,
-            )
-        except ProdutoParametrosEmpresa.DoesNotExist:
+        params = parametros.get(produto.id)
+        if params is None:
             raise ValueError(
                 f"Produto {produto.codigo_interno} não possui parâmetros fiscais "
-                f"para a empresa {loja.empresa.nome_fantasia}."
+                f"para a empresa {empresa.nome_fantasia}."
             )
 
         valor_total_item = item.total
         desconto = item.desconto or Decimal('0.00')
-        quantidade = item.quantidade
-        valor_unitario = item.preco_unitario
         base_icms = valor_total_item - desconto
         valor_icms = (base_icms * params.aliquota_icms / Decimal('100')).quantize(Decimal('0.01'))
         valor_pis = (base_icms * params.aliquota_pis / Decimal('100')).quantize(Decimal('0.01'))
@@ -257,100 +264,173 @@ def gerar_xml_nfe(nota) -> str:
                 f"Produto {produto.codigo_interno}: NCM deve ter 8 dígitos (atual: {produto.ncm!r})."
             )
 
-        cest_digits = re.sub(r'\D', '', produto.cest or '')
         cfop = re.sub(r'\D', '', params.cfop_venda_dentro_uf or '5102')
         if len(cfop) != 4:
             cfop = '5102'
 
-        p = NotaFiscalProduto()
-
-        p.numero_item = str(seq)
-        p.codigo = produto.codigo_interno or str(produto.id)
-        p.ean = (produto.codigo_barras or '').strip() or 'SEM GTIN'
-        p.ean_tributavel = p.ean
-        p.descricao = (produto.descricao or 'Produto').strip()[:120]
-        p.ncm = ncm
-        p.cest = cest_digits or ''
-        p.cfop = cfop
-
-        p.unidade_comercial = produto.unidade_comercial or 'UN'
-        p.unidade_tributavel = produto.unidade_comercial or 'UN'
-        p.quantidade_comercial = float(quantidade)
-        p.quantidade_tributavel = float(quantidade)
-        p.valor_unitario_comercial = float(valor_unitario)
-        p.valor_unitario_tributavel = float(valor_unitario)
-        p.valor_total_bruto = float(valor_total_item)
-        p.desconto = float(desconto)
-        p.total_frete = 0
-        p.total_seguro = 0
-        p.outras_despesas_acessorias = 0
-
-        p.ind_total = 1
-        p.valor_tributos_aprox = 0
-        p.informacoes_adicionais = ''
-        p.numero_pedido = ''
-        p.nfci = ''
+        dados = {
+            'numero_item': seq,
+            'codigo': produto.codigo_interno or str(produto.id),
+            'ean': (produto.codigo_barras or '').strip() or 'SEM GTIN',
+            'descricao': (produto.descricao or 'Produto').strip()[:120],
+            'ncm': ncm,
+            'cest': re.sub(r'\D', '', produto.cest or ''),
+            'cfop': cfop,
+            'unidade': produto.unidade_comercial or 'UN',
+            'quantidade': item.quantidade,
+            'valor_unitario': item.preco_unitario,
+            'valor_total': valor_total_item,
+            'desconto': desconto,
+            'icms_origem': int(produto.origem or '0'),
+        }
 
         csosn_raw = (params.csosn_cst or '').strip()
-        p.icms_origem = int(produto.origem or '0')
         if is_simples:
-            csosn3 = csosn_raw.zfill(3)[-3:]
-            p.icms_modalidade = csosn3
-            p.icms_csosn = csosn3
-            p.icms_credito = 0
-            p.icms_modalidade_determinacao_bc = 0
-            p.icms_valor_base_calculo = 0.0
-            p.icms_aliquota = 0.0
-            p.icms_valor = 0.0
+            dados.update(
+                icms_cst=csosn_raw.zfill(3)[-3:],
+                icms_modalidade_bc=0,
+                icms_base=Decimal('0.00'),
+                icms_aliquota=Decimal('0.00'),
+                icms_valor=Decimal('0.00'),
+            )
         else:
-            cst2 = csosn_raw.zfill(2)[-2:]
-            p.icms_modalidade = cst2
-            p.icms_csosn = ''
-            p.icms_credito = 0
-            p.icms_modalidade_determinacao_bc = 3
-            p.icms_valor_base_calculo = float(base_icms)
-            p.icms_aliquota = float(params.aliquota_icms)
-            p.icms_valor = float(valor_icms)
-
-        pis_cst = (params.pis_cst or '01').strip().zfill(2)[-2:]
-        p.pis_situacao_tributaria = pis_cst
-        p.pis_modalidade = pis_cst
-        p.pis_tipo_calculo = 'percentual'
-        p.pis_valor_base_calculo = float(base_icms)
-        p.pis_aliquota_percentual = float(params.aliquota_pis)
-        p.pis_valor = float(valor_pis)
-
-        cofins_cst = (params.cofins_cst or '01').strip().zfill(2)[-2:]
-        p.cofins_situacao_tributaria = cofins_cst
-        p.cofins_modalidade = cofins_cst
-        p.cofins_tipo_calculo = 'percentual'
-        p.cofins_valor_base_calculo = float(base_icms)
-        p.cofins_aliquota_percentual = float(params.aliquota_cofins)
-        p.cofins_valor = float(valor_cofins)
-
-        ipi_cst = (params.ipi_venda_cst or '53').strip()
-        p.ipi_situacao_tributaria = ipi_cst
-        p.ipi_codigo_enquadramento = '999'
-        p.ipi_valor_base_calculo = 0.0
-        p.ipi_aliquota = 0.0
-        p.ipi_valor_ipi = 0.0
-
-        _acumular_totais_produto_na_nfe(nfe, p)
-
-    total_nota = nfe.totais_icms_total_nota
-    nfe.adicionar_autorizados_baixar_xml(CPFCNPJ='13937073000156')
+            dados.update(
+                icms_cst=csosn_raw.zfill(2)[-2:],
+                icms_modalidade_bc=3,
+                icms_base=base_icms,
+                icms_aliquota=params.aliquota_icms,
+                icms_valor=valor_icms,
+            )
+
+        dados.update(
+            pis_cst=(params.pis_cst or '01').strip().zfill(2)[-2:],
+            pis_base=base_icms,
+            pis_aliquota=params.aliquota_pis,
+            pis_valor=valor_pis,
+            cofins_cst=(params.cofins_cst or '01').strip().zfill(2)[-2:],
+            cofins_base=base_icms,
+            cofins_aliquota=params.aliquota_cofins,
+            cofins_valor=valor_cofins,
+            ipi_cst=(params.ipi_venda_cst or '53').strip(),
+        )
+        yield dados
+
+
+def produto_pynfe(item: dict, is_simples: bool) -> NotaFiscalProduto:
+    """NotaFiscalProduto do PyNFe a partir de um item de ``preparar_dados_nfe``."""
+    p = NotaFiscalProduto()
+
+    p.numero_item = str(item['numero_item'])
+    p.codigo = item['codigo']
+    p.ean = item['ean']
+    p.ean_tributavel = p.ean
+    p.descricao = item['descricao']
+    p.ncm = item['ncm']
+    p.cest = item['cest']
+    p.cfop = item['cfop']
+
+    p.unidade_comercial = item['unidade']
+    p.unidade_tributavel = item['unidade']
+    p.quantidade_comercial = item['quantidade']
+    p.quantidade_tributavel = item['quantidade']
+    p.valor_unitario_comercial = item['valor_unitario']
+    p.valor_unitario_tributavel = item['valor_unitario']
+    p.valor_total_bruto = item['valor_total']
+    p.desconto = item['desconto']
+    p.total_frete = 0
+    p.total_seguro = 0
+    p.outras_despesas_acessorias = 0
+
+    p.ind_total = 1
+    p.valor_tributos_aprox = 0
+    p.informacoes_adicionais = ''
+    p.numero_pedido = ''
+    p.nfci = ''
+
+    p.icms_origem = item['icms_origem']
+    p.icms_modalidade = item['icms_cst']
+    p.icms_csosn = item['icms_cst'] if is_simples else ''
+    p.icms_credito = 0
+    p.icms_modalidade_determinacao_bc = item['icms_modalidade_bc']
+    p.icms_valor_base_calculo = item['icms_base']
+    p.icms_aliquota = item['icms_aliquota']
+    p.icms_valor = item['icms_valor']
+
+    p.pis_situacao_tributaria = item['pis_cst']
+    p.pis_modalidade = item['pis_cst']
+    p.pis_tipo_calculo = 'percentual'
+    p.pis_valor_base_calculo = item['pis_base']
+    p.pis_aliquota_percentual = item['pis_aliquota']
+    p.pis_valor = item['pis_valor']
+
+    p.cofins_situacao_tributaria = item['cofins_cst']
+    p.cofins_modalidade = item['cofins_cst']
+    p.cofins_tipo_calculo = 'percentual'
+    p.cofins_valor_base_calculo = item['cofins_base']
+    p.cofins_aliquota_percentual = item['cofins_aliquota']
+    p.cofins_valor = item['cofins_valor']
+
+    p.ipi_situacao_tributaria = item['ipi_cst']
+    p.ipi_codigo_enquadramento = '999'
+    p.ipi_valor_base_calculo = 0.0
+    p.ipi_aliquota = 0.0
+    p.ipi_valor_ipi = 0.0
+    return p
+
+
+def serializar_nfe_pynfe(dados: dict):
+    """
+    XML (lxml, sem assinatura) montado pelas entidades e pelo serializador do PyNFe.
+
+    Referência do serializador nativo (fiscal/nfe_xml_nativo.py) nos testes e no
+    benchmark_nfe_xml.
+    """
+    nfe = NotaFiscal(
+        emitente=Emitente(**dados['emitente']),
+        cliente=Cliente(**dados['destinatario']),
+        modelo=55,
+        serie=dados['serie'],
+        numero_nf=dados['numero'],
+        data_emissao=dados['data_emissao'],
+        data_saida_entrada=dados['data_emissao'],
+        natureza_operacao='VENDA',
+        tipo_documento=1,
+        tipo_impressao_danfe=1,
+        forma_emissao='1',
+        finalidade_emissao=1,
+        cliente_final=1,
+        indicador_presencial=1,
+        indicador_destino=1,
+        indicador_intermediador=0,
+        municipio=dados['municipio'],
+        uf=dados['uf'],
+        transporte_modalidade_frete=9,
+    )
+    nfe.codigo_numerico_aleatorio = dados['codigo_numerico']
+
+    for item in dados['itens']:
+        _acumular_totais_produto_na_nfe(nfe, produto_pynfe(item, dados['simples']))
+
+    nfe.adicionar_autorizados_baixar_xml(CPFCNPJ=CNPJ_AUTORIZADO_XML)
     nfe.adicionar_pagamento(
         t_pag='01',
-        v_pag=Decimal(str(total_nota)),
+        v_pag=Decimal(str(nfe.totais_icms_total_nota)),
         ind_pag=0,
     )
 
     fonte = FonteDados()
     fonte.adicionar_objeto(nfe)
+    return SerializacaoXML(fonte, homologacao=dados['homologacao']).exportar(retorna_string=False)
+
 
-    serializador = SerializacaoXML(fonte, homologacao=homologacao)
-    xml_raiz = serializador.exportar(retorna_string=False)
+def gerar_xml_nfe(nota) -> str:
+    """
+    Gera o XML da NF-e assinada (string) a partir de uma NotaFiscalSaida em RASCUNHO.
+    """
+    dados = preparar_dados_nfe(nota)
+    xml_raiz = serializar_nfe(dados)
 
+    config = nota.loja.configuracao_fiscal
     certificado_path = get_certificado_path(config)
     senha = get_senha_certificado(config)
     assinatura = AssinaturaA1(certificado_path, senha)
@@ -360,5 +440,5 @@ def gerar_xml_nfe(nota) -> str:
 def salvar_xml_na_nota(nota, xml_assinado: str) -> None:
     nota.xml_arquivo = xml_assinado
     nota.status = 'EM_PROCESSAMENTO'
-    nota.save(update_fields=['xml_arquivo', 'status', 'updated_at'])
+    nota.save(update_fields=['xml_arquivo', 'xml_tamanho', 'xml_legado', 'status', 'updated_at'])
     logger.info('XML NF-e salvo para nota %s/%s (id=%s)', nota.numero, nota.serie, nota.pk)
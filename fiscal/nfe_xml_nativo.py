@@ -0,0 +1,303 @@
+"""
+Serializador lxml direto da NF-e (modelo 55, layout 4.00).
+
+Recebe os dados de fiscal.nfe_xml.preparar_dados_nfe e grava cada item direto na
+árvore enquanto os itens são lidos do banco, acumulando os totais (ICMSTot) na
+mesma passada — sem montar NotaFiscal/NotaFiscalProduto do PyNFe nem os ~30
+totais por item de _acumular_totais_produto_na_nfe.
+
+A saída é a mesma do SerializacaoXML do PyNFe 0.6.5 para os dados que o sistema
+gera (ordem das tags, formatação dos números, grupos opcionais omitidos); a
+equivalência após canonicalização (C14N) é verificada nos testes contra o PyNFe
+e contra os arquivos de referência em fiscal/testdata/. CSTs de ICMS pouco usados
+(ST, diferimento, monofásico, CSOSN 201/202/203/900) são delegados ao próprio
+serializador do PyNFe, item a item.
+"""
+from decimal import Decimal
+
+from lxml import etree
+from pynfe.entidades.notafiscal import NotaFiscal
+from pynfe.utils import obter_codigo_por_municipio, obter_pais_por_codigo
+from pynfe.utils.flags import CODIGOS_ESTADOS, NAMESPACE_NFE, VERSAO_PADRAO
+
+ZERO = Decimal('0')
+VERSAO_PROCESSO = f'PyNFe {NotaFiscal.versao_processo_emissao}'
+# CNPJ autorizado a baixar o XML (autXML) em todas as notas
+CNPJ_AUTORIZADO_XML = '13937073000156'
+
+ICMS_SN102 = ('102', '103', '300', '400')
+ICMS_40 = ('40', '41', '50')
+PIS_COFINS_NT = ('04', '05', '06', '07', '08', '09')
+
+_SubElement = etree.SubElement
+
+
+def _sub(pai, tag, texto):
+    elemento = _SubElement(pai, tag)
+    elemento.text = texto
+    return elemento
+
+
+def _v2(valor) -> str:
+    return '{:.2f}'.format(valor)
+
+
+def _v4(valor) -> str:
+    return '{:.4f}'.format(valor)
+
+
+def _data_hora(valor) -> str:
+    tz = valor.strftime('%z')
+    return valor.strftime('%Y-%m-%dT%H:%M:%S') + f'{tz[:-2]}:{tz[-2:]}'
+
+
+def _digito_verificador(chave: str) -> str:
+    """DV módulo 11 da chave de acesso (pesos 2..9 da direita para a esquerda)."""
+    soma = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(chave)))
+    resto = soma % 11
+    return '0' if resto in (0, 1) else str(11 - resto)
+
+
+def chave_acesso(dados: dict) -> str:
+    data = dados['data_emissao']
+    chave = (
+        f"{CODIGOS_ESTADOS[dados['uf']]}{data:%y%m}{dados['emitente']['cnpj'].zfill(14)}55"
+        f"{dados['serie'].zfill(3)}{dados['numero'].zfill(9)}1{dados['codigo_numerico']}"
+    )
+    return chave + _digito_verificador(chave)
+
+
+def serializar_nfe(dados: dict):
+    """
+    Elemento <NFe> (sem assinatura) no mesmo formato do SerializacaoXML do PyNFe.
+    Consome o gerador ``dados['itens']``.
+    """
+    raiz = etree.Element('NFe', xmlns=NAMESPACE_NFE)
+    chave = chave_acesso(dados)
+    inf = _SubElement(raiz, 'infNFe', versao=VERSAO_PADRAO)
+    inf.attrib['Id'] = f'NFe{chave}'
+
+    _ide(inf, dados, chave)
+    _emitente(inf, dados['emitente'])
+    _destinatario(inf, dados['destinatario'])
+    aut = _SubElement(inf, 'autXML')
+    _sub(aut, 'CNPJ', CNPJ_AUTORIZADO_XML)
+
+    totais = dict.fromkeys(('vBC', 'vICMS', 'vProd', 'vDesc', 'vPIS', 'vCOFINS'), ZERO)
+    simples = dados['simples']
+    for item in dados['itens']:
+        _item(inf, item, simples, totais)
+
+    valor_nota = totais['vProd'] - totais['vDesc']
+    total = _SubElement(inf, 'total')
+    icms_tot = _SubElement(total, 'ICMSTot')
+    for tag, valor in (
+        ('vBC', totais['vBC']), ('vICMS', totais['vICMS']), ('vICMSDeson', ZERO),
+        ('vFCP', ZERO), ('vBCST', ZERO), ('vST', ZERO), ('vFCPST', ZERO), ('vFCPSTRet', ZERO),
+        ('vProd', totais['vProd']), ('vFrete', ZERO), ('vSeg', ZERO), ('vDesc', totais['vDesc']),
+        ('vII', ZERO), ('vIPI', ZERO), ('vIPIDevol', ZERO),
+        ('vPIS', totais['vPIS']), ('vCOFINS', totais['vCOFINS']), ('vOutro', ZERO),
+        ('vNF', valor_nota),
+    ):
+        _sub(icms_tot, tag, _v2(valor))
+
+    transp = _SubElement(inf, 'transp')
+    _sub(transp, 'modFrete', '9')
+
+    pag = _SubElement(inf, 'pag')
+    det_pag = _SubElement(pag, 'detPag')
+    _sub(det_pag, 'indPag', '0')
+    _sub(det_pag, 'tPag', '01')
+    _sub(det_pag, 'vPag', _v2(valor_nota))
+    return raiz
+
+
+def _ide(inf, dados, chave):
+    data = _data_hora(dados['data_emissao'])
+    ide = _SubElement(inf, 'ide')
+    for tag, texto in (
+        ('cUF', CODIGOS_ESTADOS[dados['uf']]),
+        ('cNF', dados['codigo_numerico']),
+        ('natOp', 'VENDA'),
+        ('mod', '55'),
+        ('serie', dados['serie']),
+        ('nNF', dados['numero']),
+        ('dhEmi', data),
+        ('dhSaiEnt', data),
+        ('tpNF', '1'),
+        ('idDest', '1'),
+        ('cMunFG', dados['municipio']),
+        ('tpImp', '1'),
+        ('tpEmis', '1'),
+        ('cDV', chave[-1]),
+        ('tpAmb', '2' if dados['homologacao'] else '1'),
+        ('finNFe', '1'),
+        ('indFinal', '1'),
+        ('indPres', '1'),
+        ('procEmi', '0'),
+        ('verProc', VERSAO_PROCESSO),
+    ):
+        _sub(ide, tag, texto)
+
+
+def _endereco(pai, tag, dados, cep_obrigatorio):
+    endereco = _SubElement(pai, tag)
+    _sub(endereco, 'xLgr', dados['endereco_logradouro'])
+    _sub(endereco, 'nro', dados['endereco_numero'])
+    if dados['endereco_complemento']:
+        _sub(endereco, 'xCpl', dados['endereco_complemento'])
+    _sub(endereco, 'xBairro', dados['endereco_bairro'])
+    _sub(endereco, 'cMun', obter_codigo_por_municipio(dados['endereco_municipio'], dados['endereco_uf']))
+    _sub(endereco, 'xMun', dados['endereco_municipio'])
+    _sub(endereco, 'UF', dados['endereco_uf'])
+    if cep_obrigatorio or dados['endereco_cep']:
+        _sub(endereco, 'CEP', dados['endereco_cep'])
+    _sub(endereco, 'cPais', dados['endereco_pais'])
+    _sub(endereco, 'xPais', obter_pais_por_codigo(dados['endereco_pais']))
+    if dados['endereco_telefone']:
+        _sub(endereco, 'fone', dados['endereco_telefone'])
+
+
+def _emitente(inf, emitente):
+    emit = _SubElement(inf, 'emit')
+    _sub(emit, 'CPF' if len(emitente['cnpj']) == 11 else 'CNPJ', emitente['cnpj'])
+    _sub(emit, 'xNome', emitente['razao_social'])
+    _sub(emit, 'xFant', emitente['nome_fantasia'])
+    _endereco(emit, 'enderEmit', emitente, cep_obrigatorio=True)
+    _sub(emit, 'IE', emitente['inscricao_estadual'])
+    _sub(emit, 'CRT', emitente['codigo_de_regime_tributario'])
+
+
+def _destinatario(inf, destinatario):
+    dest = _SubElement(inf, 'dest')
+    _sub(dest, destinatario['tipo_documento'], destinatario['numero_documento'])
+    if destinatario['razao_social']:
+        _sub(dest, 'xNome', destinatario['razao_social'])
+    _endereco(dest, 'enderDest', destinatario, cep_obrigatorio=False)
+    # Destinatário sempre não contribuinte (indicador_ie=9)
+    _sub(dest, 'indIEDest', '9')
+    if destinatario['email']:
+        _sub(dest, 'email', destinatario['email'])
+
+
+def _item(inf, item, simples, totais):
+    det = _SubElement(inf, 'det')
+    det.attrib['nItem'] = str(item['numero_item'])
+
+    quantidade = str(item['quantidade'])
+    valor_unitario = '{:.10f}'.format(item['valor_unitario'])
+    prod = _SubElement(det, 'prod')
+    _sub(prod, 'cProd', str(item['codigo']))
+    _sub(prod, 'cEAN', item['ean'])
+    _sub(prod, 'xProd', item['descricao'])
+    _sub(prod, 'NCM', item['ncm'])
+    _sub(prod, 'CFOP', item['cfop'])
+    _sub(prod, 'uCom', item['unidade'])
+    _sub(prod, 'qCom', quantidade)
+    _sub(prod, 'vUnCom', valor_unitario)
+    _sub(prod, 'vProd', _v2(item['valor_total']))
+    _sub(prod, 'cEANTrib', item['ean'])
+    _sub(prod, 'uTrib', item['unidade'])
+    _sub(prod, 'qTrib', quantidade)
+    _sub(prod, 'vUnTrib', valor_unitario)
+    if item['desconto']:
+        _sub(prod, 'vDesc', _v2(item['desconto']))
+    _sub(prod, 'indTot', '1')
+    # Como no PyNFe, numero_item vai em nItemPed (item do pedido de compra)
+    _sub(prod, 'nItemPed', str(item['numero_item']))
+
+    imposto = _SubElement(det, 'imposto')
+    _icms(imposto, item, simples)
+    # IPI: cEnq 999 com valores zerados não gera o grupo (igual ao PyNFe)
+    if item['cfop'][1] == '3':
+        ii = _SubElement(imposto, 'II')
+        for tag in ('vBC', 'vDespAdu', 'vII', 'vIOF'):
+            _sub(ii, tag, '0.00')
+    _pis_cofins(imposto, 'PIS', item['pis_cst'], item['pis_base'], item['pis_aliquota'], item['pis_valor'], item)
+    _pis_cofins(
+        imposto, 'COFINS', item['cofins_cst'], item['cofins_base'], item['cofins_aliquota'], item['cofins_valor'], item,
+    )
+
+    totais['vBC'] += item['icms_base']
+    totais['vICMS'] += item['icms_valor']
+    totais['vProd'] += item['valor_total']
+    totais['vDesc'] += item['desconto']
+    totais['vPIS'] += item['pis_valor']
+    totais['vCOFINS'] += item['cofins_valor']
+
+
+def _icms(imposto, item, simples):
+    cst = item['icms_cst']
+    origem = str(item['icms_origem'])
+    if simples and cst in ICMS_SN102:
+        grupo = _SubElement(_SubElement(imposto, 'ICMS'), 'ICMSSN102')
+        _sub(grupo, 'orig', origem)
+        _sub(grupo, 'CSOSN', cst)
+    elif simples and cst == '101':
+        grupo = _SubElement(_SubElement(imposto, 'ICMS'), 'ICMSSN101')
+        _sub(grupo, 'orig', origem)
+        _sub(grupo, 'CSOSN', cst)
+        _sub(grupo, 'pCredSN', _v2(item['icms_aliquota']))
+        _sub(grupo, 'vCredICMSSN', '0.00')
+    elif simples and cst == '500':
+        grupo = _SubElement(_SubElement(imposto, 'ICMS'), 'ICMSSN500')
+        _sub(grupo, 'orig', origem)
+        _sub(grupo, 'CSOSN', cst)
+    elif not simples and cst in ('00', '20'):
+        grupo = _SubElement(_SubElement(imposto, 'ICMS'), 'ICMS' + cst)
+        _sub(grupo, 'orig', origem)
+        _sub(grupo, 'CST', cst)
+        _sub(grupo, 'modBC', str(item['icms_modalidade_bc']))
+        if cst == '20':
+            _sub(grupo, 'pRedBC', '0.00')
+        _sub(grupo, 'vBC', _v2(item['icms_base']))
+        _sub(grupo, 'pICMS', _v2(item['icms_aliquota']))
+        _sub(grupo, 'vICMS', _v2(item['icms_valor']))
+    elif not simples and cst in ICMS_40:
+        grupo = _SubElement(_SubElement(imposto, 'ICMS'), 'ICMS40')
+        _sub(grupo, 'orig', origem)
+        _sub(grupo, 'CST', cst)
+    else:
+        _icms_pynfe(imposto, item, simples)
+
+
+_serializador_pynfe = None
+
+
+def _icms_pynfe(imposto, item, simples):
+    """Grupo ICMS de CSTs sem caminho próprio: usa o serializador do PyNFe no item."""
+    global _serializador_pynfe
+    from pynfe.entidades.fonte_dados import FonteDados
+    from pynfe.processamento.serializacao import SerializacaoXML
+
+    from fiscal.nfe_xml import produto_pynfe
+
+    if _serializador_pynfe is None:
+        _serializador_pynfe = SerializacaoXML(FonteDados())
+    _serializador_pynfe._serializar_imposto_icms(
+        produto_pynfe(item, simples), tag_raiz=imposto, retorna_string=False,
+    )
+
+
+def _pis_cofins(imposto, tributo, cst, base, aliquota, valor, item):
+    grupo = _SubElement(imposto, tributo)
+    if cst in PIS_COFINS_NT:
+        _sub(_SubElement(grupo, f'{tributo}NT'), 'CST', cst)
+        return
+    if cst in ('01', '02'):
+        detalhe = _SubElement(grupo, f'{tributo}Aliq')
+        _sub(detalhe, 'CST', cst)
+        _sub(detalhe, 'vBC', _v2(base))
+        _sub(detalhe, f'p{tributo}', _v2(aliquota))
+    elif cst == '03':
+        # Cálculo por quantidade: alíquota em reais não é informada (0)
+        detalhe = _SubElement(grupo, f'{tributo}Qtde')
+        _sub(detalhe, 'CST', cst)
+        _sub(detalhe, 'qBCProd', _v4(item['quantidade']))
+        _sub(detalhe, 'vAliqProd', '0.0000')
+    else:
+        detalhe = _SubElement(grupo, f'{tributo}Outr')
+        _sub(detalhe, 'CST', cst)
+        _sub(detalhe, 'vBC', _v2(base))
+        _sub(detalhe, f'p{tributo}', _v2(aliquota))
+    _sub(detalhe, f'v{tributo}', _v2(valor))
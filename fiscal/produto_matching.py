@@ -2,16 +2,200 @@
 Serviço de matching de produtos para itens de NF-e de entrada.
 
 Regras:
-- cEAN válido: buscar_produto_por_codigo -> VINCULADO se encontrou
+- cEAN válido: código de barras principal ou alternativo do produto -> VINCULADO se encontrou
 - cProd + fornecedor: CodigoBarrasAlternativo -> VINCULADO se encontrou
 - NCM + descrição similar (fuzzy): NUNCA auto-vincular; sempre AGUARDANDO_CONFIRMACAO com produto_sugerido
+
+casar_itens_em_lote resolve todos os itens da nota de uma vez: códigos (cEAN/cProd)
+em duas consultas IN e sugestões por similaridade de trigramas num índice do
+catálogo da empresa montado uma vez por lote (IndiceSugestoes).
 """
-from typing import Optional, Tuple
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Exists, OuterRef
 
-from produtos.utils import buscar_produto_por_codigo
-from produtos.models import CodigoBarrasAlternativo, Produto
+from produtos.busca import normalizar, trigramas
+from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
 from pessoas.models import Fornecedor
 
+TAMANHOS_EAN = (8, 12, 13, 14)
+# Similaridade mínima (coeficiente de Dice dos trigramas da descrição) para sugerir
+LIMIAR_SUGESTAO = 0.3
+MAX_CANDIDATOS = 5
+
+
+@dataclass
+class ResultadoCasamento:
+    produto: Optional[Produto] = None  # vínculo certo (código)
+    produto_sugerido: Optional[Produto] = None  # melhor candidato por similaridade
+    status: str = 'NAO_VINCULADO'  # VINCULADO | AGUARDANDO_CONFIRMACAO | NAO_VINCULADO
+    # [(produto, similaridade 0-1)] em ordem decrescente
+    candidatos: List[Tuple[Produto, float]] = field(default_factory=list)
+
+
+def _ean(codigo: str) -> bool:
+    return codigo.isdigit() and len(codigo) in TAMANHOS_EAN
+
+
+def _digitos_ncm(ncm: Optional[str]) -> str:
+    return re.sub(r'\D', '', ncm or '')[:8]
+
+
+def _gramas(descricao: str) -> set:
+    # Palavras com espaço nas pontas, como o pg_trgm: início/fim de palavra contam
+    gramas = set()
+    for palavra in re.findall(r'\w+', normalizar(descricao)):
+        gramas |= trigramas(f' {palavra} ')
+    return gramas
+
+
+class IndiceSugestoes:
+    """
+    Catálogo ativo da empresa em memória (uma consulta), agrupado pelos 4 primeiros
+    dígitos do NCM, com listas invertidas de trigramas da descrição.
+    """
+
+    def __init__(self, empresa):
+        self.produtos: Dict[int, Produto] = {}
+        self.ncms: Dict[int, str] = {}
+        self.tamanhos: Dict[int, int] = {}
+        # (NCM 4 dígitos, trigrama) -> ids
+        self.postings: Dict[Tuple[str, str], List[int]] = {}
+
+        produtos = Produto.objects.filter(
+            is_active=True,
+            parametros_por_empresa__empresa=empresa,
+            parametros_por_empresa__ativo_nessa_empresa=True,
+        ).distinct().order_by('pk')
+        for produto in produtos.iterator(chunk_size=2000):
+            ncm = _digitos_ncm(produto.ncm)
+            if len(ncm) < 4:
+                continue
+            gramas = _gramas(produto.descricao)
+            self.produtos[produto.pk] = produto
+            self.ncms[produto.pk] = ncm
+            self.tamanhos[produto.pk] = len(gramas)
+            for grama in gramas:
+                self.postings.setdefault((ncm[:4], grama), []).append(produto.pk)
+
+    def sugerir(self, ncm: str, descricao: str, limite: int = MAX_CANDIDATOS) -> List[Tuple[Produto, float]]:
+        """Produtos do mesmo NCM (4 dígitos) ordenados pela similaridade da descrição."""
+        ncm = _digitos_ncm(ncm)
+        gramas = _gramas(descricao)
+        if len(ncm) < 4 or not gramas:
+            return []
+
+        comuns: Dict[int, int] = {}
+        for grama in gramas:
+            for pk in self.postings.get((ncm[:4], grama), ()):
+                comuns[pk] = comuns.get(pk, 0) + 1
+
+        pontuados = []
+        for pk, n in comuns.items():
+            similaridade = 2 * n / (len(gramas) + self.tamanhos[pk])
+            if similaridade >= LIMIAR_SUGESTAO:
+                # Desempate: NCM completo igual, depois descrição
+                pontuados.append((-similaridade, self.ncms[pk] != ncm, self.produtos[pk].descricao, pk))
+        pontuados.sort()
+        return [(self.produtos[pk], round(-s, 3)) for s, _ncm, _desc, pk in pontuados[:limite]]
+
+
+def casar_itens_em_lote(
+    itens: Iterable[dict],
+    fornecedor: Optional[Fornecedor],
+    empresa,
+) -> List[ResultadoCasamento]:
+    """
+    Encontra ou sugere produto para todos os itens de uma NF-e.
+
+    Args:
+        itens: dicts com codigo_barras, codigo_produto_fornecedor, ncm, descricao
+        fornecedor: Fornecedor da nota (para buscar CodigoBarrasAlternativo)
+        empresa: Empresa para filtrar produtos
+
+    Returns:
+        Um ResultadoCasamento por item, na mesma ordem
+    """
+    itens = [
+        {
+            'codigo_barras': (item.get('codigo_barras') or '').strip(),
+            'codigo_fornecedor': (item.get('codigo_produto_fornecedor') or '').strip(),
+            'ncm': (item.get('ncm') or '').strip(),
+            'descricao': (item.get('descricao') or '').strip(),
+        }
+        for item in itens
+    ]
+    eans = {i['codigo_barras'] for i in itens if _ean(i['codigo_barras'])}
+    codigos_fornecedor = {i['codigo_fornecedor'] for i in itens if i['codigo_fornecedor']} if fornecedor else set()
+    eans_fornecedor = {c for c in codigos_fornecedor if _ean(c)}
+    codigos_empresa = eans | eans_fornecedor
+
+    # 1) Código de barras principal dos produtos ativos na empresa
+    por_ean: Dict[str, Produto] = {}
+    if eans:
+        for produto in Produto.objects.filter(
+            is_active=True,
+            codigo_barras__in=eans,
+            parametros_por_empresa__empresa=empresa,
+            parametros_por_empresa__ativo_nessa_empresa=True,
+        ).distinct().order_by('pk'):
+            por_ean.setdefault(produto.codigo_barras, produto)
+
+    # 2) Códigos alternativos: cEAN/cProd como código de qualquer fornecedor (produto
+    #    ativo na empresa) ou cProd cadastrado para o fornecedor da nota
+    alternativo_empresa: Dict[str, Produto] = {}
+    alternativo_fornecedor: Dict[str, Produto] = {}
+    codigos = codigos_empresa | codigos_fornecedor
+    if codigos:
+        alternativos = CodigoBarrasAlternativo.objects.filter(
+            codigo_barras__in=codigos,
+            produto__is_active=True,
+            is_active=True,
+        ).annotate(
+            ativo_na_empresa=Exists(ProdutoParametrosEmpresa.objects.filter(
+                produto_id=OuterRef('produto_id'),
+                empresa=empresa,
+                ativo_nessa_empresa=True,
+            )),
+        ).select_related('produto').order_by('pk')
+        for alt in alternativos:
+            if fornecedor and alt.fornecedor_id == fornecedor.pk and alt.codigo_barras in codigos_fornecedor:
+                alternativo_fornecedor.setdefault(alt.codigo_barras, alt.produto)
+            if alt.ativo_na_empresa and alt.codigo_barras in codigos_empresa:
+                alternativo_empresa.setdefault(alt.codigo_barras, alt.produto)
+
+    indice = None
+    resultados = []
+    for item in itens:
+        ean = item['codigo_barras'] if _ean(item['codigo_barras']) else ''
+        codigo = item['codigo_fornecedor'] if fornecedor else ''
+        produto = (
+            (ean and (por_ean.get(ean) or alternativo_empresa.get(ean)))
+            or (codigo and alternativo_fornecedor.get(codigo))
+            or (codigo in eans_fornecedor and alternativo_empresa.get(codigo))
+        )
+        if produto:
+            resultados.append(ResultadoCasamento(produto=produto, status='VINCULADO'))
+            continue
+
+        # 3) NCM + descrição similar -> só sugestão
+        candidatos = []
+        if item['ncm'] and item['descricao']:
+            if indice is None:
+                indice = IndiceSugestoes(empresa)
+            candidatos = indice.sugerir(item['ncm'], item['descricao'])
+        if candidatos:
+            resultados.append(ResultadoCasamento(
+                produto_sugerido=candidatos[0][0],
+                status='AGUARDANDO_CONFIRMACAO',
+                candidatos=candidatos,
+            ))
+        else:
+            resultados.append(ResultadoCasamento())
+    return resultados
+
 
 def encontrar_ou_sugerir_produto(
     item_nfe: dict,
@@ -19,7 +203,8 @@ def encontrar_ou_sugerir_produto(
     empresa,
 ) -> Tuple[Optional[Produto], Optional[Produto], str]:
     """
-    Encontra ou sugere produto para um item de NF-e.
+    Encontra ou sugere produto para um item de NF-e (para vários itens, use
+    casar_itens_em_lote: as consultas e o índice são feitos uma vez por lote).
 
     Args:
         item_nfe: dict com codigo_barras, codigo_produto_fornecedor, ncm, descricao
@@ -32,83 +217,5 @@ def encontrar_ou_sugerir_produto(
         - produto_sugerido: Sugestão para confirmação (fuzzy match)
         - status: VINCULADO | AGUARDANDO_CONFIRMACAO | NAO_VINCULADO
     """
-    codigo_barras = (item_nfe.get('codigo_barras') or '').strip()
-    codigo_fornecedor = (item_nfe.get('codigo_produto_fornecedor') or '').strip()
-    ncm = (item_nfe.get('ncm') or '').strip()
-    descricao = (item_nfe.get('descricao') or '').strip()
-
-    # 1. cEAN válido (8, 12, 13 ou 14 dígitos)
-    if codigo_barras and codigo_barras.isdigit() and len(codigo_barras) in [8, 12, 13, 14]:
-        produto, _, _ = buscar_produto_por_codigo(codigo_barras, empresa=empresa)
-        if produto:
-            return produto, None, 'VINCULADO'
-
-    # 2. cProd + fornecedor -> CodigoBarrasAlternativo
-    if codigo_fornecedor and fornecedor:
-        alt = CodigoBarrasAlternativo.objects.filter(
-            codigo_barras=codigo_fornecedor,
-            fornecedor=fornecedor,
-            produto__is_active=True,
-            is_active=True,
-        ).select_related('produto').first()
-        if alt:
-            return alt.produto, None, 'VINCULADO'
-
-        # Também buscar por codigo_fornecedor como cEAN (fornecedor pode usar codigo próprio como EAN)
-        if codigo_fornecedor.isdigit() and len(codigo_fornecedor) in [8, 12, 13, 14]:
-            alt = CodigoBarrasAlternativo.objects.filter(
-                codigo_barras=codigo_fornecedor,
-                produto__parametros_por_empresa__empresa=empresa,
-                produto__parametros_por_empresa__ativo_nessa_empresa=True,
-                produto__is_active=True,
-                is_active=True,
-            ).select_related('produto').distinct().first()
-            if alt:
-                return alt.produto, None, 'VINCULADO'
-
-    # 3. NCM + descrição similar (fuzzy) -> NUNCA auto-vincular; sempre AGUARDANDO_CONFIRMACAO
-    if ncm and descricao:
-        produto_sugerido = _buscar_fuzzy_ncm_descricao(ncm, descricao, empresa)
-        if produto_sugerido:
-            return None, produto_sugerido, 'AGUARDANDO_CONFIRMACAO'
-
-    return None, None, 'NAO_VINCULADO'
-
-
-def _buscar_fuzzy_ncm_descricao(ncm: str, descricao: str, empresa) -> Optional[Produto]:
-    """
-    Busca produto por NCM e descrição similar.
-    Retorna apenas sugestão; nunca usar como vínculo automático.
-    """
-    from django.db.models import Q
-
-    # NCM exato (primeiros 4 ou 8 dígitos)
-    ncm_limpo = ncm.replace('.', '').replace(' ', '')[:8]
-    if not ncm_limpo:
-        return None
-
-    qs = Produto.objects.filter(
-        is_active=True,
-        parametros_por_empresa__empresa=empresa,
-        parametros_por_empresa__ativo_nessa_empresa=True,
-        ncm__icontains=ncm_limpo[:4],
-    ).distinct()
-
-    # Descrição: primeiras palavras em comum
-    palavras = [p for p in descricao[:50].split() if len(p) > 2][:3]
-    if palavras:
-        for p in palavras:
-            qs = qs.filter(descricao__icontains=p)
-        if qs.exists():
-            return qs.first()
-
-    # NCM + primeira palavra
-    if qs.exists() and len(descricao) > 3:
-        primeira = descricao.split()[0] if descricao.split() else ''
-        if primeira and len(primeira) > 2:
-            qs = qs.filter(descricao__icontains=primeira)
-            if qs.exists():
-                return qs.first()
-        return qs.first()
-
-    return None
+    resultado = casar_itens_em_lote([item_nfe], fornecedor, empresa)[0]
+    return resultado.produto, resultado.produto_sugerido, resultado.status
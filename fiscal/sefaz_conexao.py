@@ -0,0 +1,285 @@
+"""
+Comunicação com a SEFAZ reaproveitada entre requisições (mTLS com keep-alive).
+
+O ComunicacaoSefaz do PyNFe relê e descriptografa o .pfx, grava chave/certificado
+em arquivos temporários e abre uma conexão TLS nova a cada chamada. Aqui cada
+(loja, impressão digital do certificado, ambiente) tem uma comunicação única no
+processo, com:
+
+- chave/certificado extraídos uma vez (PEM em diretório temporário privado,
+  removido ao invalidar)
+- requests.Session com pool de conexões HTTPS: o handshake mTLS só se repete
+  quando a SEFAZ fecha a conexão
+- métricas que separam o tempo de conexão (TCP + handshake TLS) do tempo de
+  resposta da SEFAZ
+
+A comunicação é revalidada pela versão da configuração (updated_at, caminho e
+mtime do .pfx, ambiente) a cada uso, então alterações feitas por outro processo
+também são percebidas; neste processo, salvar/excluir ConfiguracaoFiscalLoja
+invalida na hora (fiscal/signals.py).
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import requests
+from lxml import etree
+from pynfe.processamento.comunicacao import ComunicacaoSefaz
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_PADRAO = 30  # segundos
+CONEXOES_POR_HOST = 4
+
+_cronometro = threading.local()
+
+
+def _somar_conexao(inicio: float):
+    _cronometro.conexao = getattr(_cronometro, 'conexao', 0.0) + time.perf_counter() - inicio
+    _cronometro.conexoes = getattr(_cronometro, 'conexoes', 0) + 1
+
+
+class _HTTPSConexaoCronometrada(HTTPSConnection):
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _somar_conexao(inicio)
+
+
+class _HTTPConexaoCronometrada(HTTPConnection):
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _somar_conexao(inicio)
+
+
+class _HTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConexaoCronometrada
+
+
+class _HTTPPool(HTTPConnectionPool):
+    ConnectionCls = _HTTPConexaoCronometrada
+
+
+class _AdapterCronometrado(HTTPAdapter):
+    """HTTPAdapter cujas conexões medem o tempo de connect (TCP + handshake TLS)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPPool, 'https': _HTTPSPool}
+
+
+@dataclass
+class MetricasComunicacao:
+    requisicoes: int = 0
+    conexoes: int = 0
+    tempo_conexao: float = 0.0  # TCP + handshake TLS (segundos)
+    tempo_sefaz: float = 0.0  # envio + processamento + resposta (segundos)
+
+    def como_dict(self) -> Dict:
+        return {
+            'requisicoes': self.requisicoes,
+            'conexoes': self.conexoes,
+            'tempo_conexao': round(self.tempo_conexao, 3),
+            'tempo_sefaz': round(self.tempo_sefaz, 3),
+        }
+
+
+@dataclass
+class CertificadoCarregado:
+    impressao_digital: str  # SHA-256 do certificado (hex)
+    diretorio: str
+    caminho_certificado: str
+    caminho_chave: str
+
+    def remover(self):
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+
+def carregar_certificado(config) -> CertificadoCarregado:
+    """Lê o .pfx da configuração e grava certificado/chave em PEM num diretório privado."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, pkcs12
+
+    from .nfe_status import get_certificado_path, get_senha_certificado
+
+    caminho = get_certificado_path(config)
+    senha = get_senha_certificado(config)
+    with open(caminho, 'rb') as arquivo:
+        try:
+            chave, certificado = pkcs12.load_key_and_certificates(arquivo.read(), senha.encode())[:2]
+        except Exception as exc:
+            raise ValueError(
+                f'Falha ao carregar certificado digital A1 da loja {config.loja_id}: verifique arquivo e senha.'
+            ) from exc
+
+    diretorio = tempfile.mkdtemp(prefix='sefaz-cert-')  # 0700
+    caminho_certificado = os.path.join(diretorio, 'cert.pem')
+    caminho_chave = os.path.join(diretorio, 'chave.pem')
+    with open(os.open(caminho_certificado, os.O_WRONLY | os.O_CREAT, 0o600), 'wb') as arquivo:
+        arquivo.write(certificado.public_bytes(Encoding.PEM))
+    with open(os.open(caminho_chave, os.O_WRONLY | os.O_CREAT, 0o600), 'wb') as arquivo:
+        arquivo.write(chave.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()))
+
+    return CertificadoCarregado(
+        impressao_digital=certificado.fingerprint(hashes.SHA256()).hex(),
+        diretorio=diretorio,
+        caminho_certificado=caminho_certificado,
+        caminho_chave=caminho_chave,
+    )
+
+
+class ComunicacaoSefazPersistente(ComunicacaoSefaz):
+    """
+    ComunicacaoSefaz (PyNFe) com sessão HTTPS persistente e certificado já extraído.
+    Os métodos do PyNFe (autorizacao, evento, status_servico, ...) usam este _post.
+    """
+
+    def __init__(self, uf: str, certificado: Optional[CertificadoCarregado], homologacao: bool):
+        super().__init__(uf=uf, certificado=None, certificado_senha=None, homologacao=homologacao)
+        self.certificado_carregado = certificado
+        self.metricas = MetricasComunicacao()
+        self.ultima_requisicao = {}
+        self._lock_metricas = threading.Lock()
+        self.sessao = requests.Session()
+        adapter = _AdapterCronometrado(pool_connections=2, pool_maxsize=CONEXOES_POR_HOST)
+        self.sessao.mount('https://', adapter)
+        self.sessao.mount('http://', adapter)
+        if certificado is not None:
+            self.sessao.cert = (certificado.caminho_certificado, certificado.caminho_chave)
+        self.sessao.verify = False  # como no PyNFe: cadeia ICP-Brasil fora do bundle padrão
+
+    def _post(self, url, xml, timeout=None):
+        # Mesmo corpo do ComunicacaoSefaz._post (inclusive o ajuste do qrCode da NFC-e)
+        corpo = re.sub(
+            '<qrCode>(.*?)</qrCode>',
+            lambda x: x.group(0).replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', ''),
+            etree.tostring(xml, encoding='unicode').replace('\n', ''),
+        )
+        corpo = '<?xml version="1.0" encoding="UTF-8"?>' + corpo
+
+        _cronometro.conexao = 0.0
+        _cronometro.conexoes = 0
+        inicio = time.perf_counter()
+        try:
+            resposta = self.sessao.post(
+                url,
+                corpo.encode('utf-8'),
+                headers=self._post_header(),
+                timeout=timeout or TIMEOUT_PADRAO,
+            )
+        finally:
+            total = time.perf_counter() - inicio
+            tempo_conexao = _cronometro.conexao
+            with self._lock_metricas:
+                self.metricas.requisicoes += 1
+                self.metricas.conexoes += _cronometro.conexoes
+                self.metricas.tempo_conexao += tempo_conexao
+                self.metricas.tempo_sefaz += total - tempo_conexao
+                self.ultima_requisicao = {
+                    'conexao_nova': bool(_cronometro.conexoes),
+                    'tempo_conexao': round(tempo_conexao, 3),
+                    'tempo_sefaz': round(total - tempo_conexao, 3),
+                }
+            logger.debug(
+                'SEFAZ %s: conexão %.3fs (%s nova(s)), SEFAZ %.3fs',
+                url, tempo_conexao, _cronometro.conexoes, total - tempo_conexao,
+            )
+        resposta.encoding = 'utf-8'
+        return resposta
+
+    def fechar(self):
+        self.sessao.close()
+        if self.certificado_carregado is not None:
+            self.certificado_carregado.remover()
+
+
+# ---------------------------------------------------------------------------
+# Pool por loja
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+# (loja_id, impressão digital, ambiente) -> comunicação
+_comunicacoes: Dict[Tuple, ComunicacaoSefazPersistente] = {}
+# loja_id -> (versão da configuração, chave em _comunicacoes)
+_versoes: Dict[int, Tuple[Tuple, Tuple]] = {}
+
+
+def _versao(config, sem_certificado: bool) -> Tuple:
+    caminho = config.certificado_arquivo if not sem_certificado else None
+    try:
+        mtime = os.stat(caminho).st_mtime_ns if caminho else None
+    except OSError:
+        mtime = None
+    return (config.pk, config.updated_at, caminho, mtime, config.ambiente, sem_certificado)
+
+
+def obter_comunicacao(config, sem_certificado: bool = False) -> ComunicacaoSefazPersistente:
+    """
+    Comunicação SEFAZ-BA da loja da configuração fiscal. sem_certificado=True é
+    para a SEFAZ local de testes (settings.SEFAZ_NFE_URL).
+    """
+    versao = _versao(config, sem_certificado)
+    with _lock:
+        atual = _versoes.get(config.loja_id)
+        if atual is not None and atual[0] == versao and atual[1] in _comunicacoes:
+            return _comunicacoes[atual[1]]
+
+        certificado = None if sem_certificado else carregar_certificado(config)
+        chave = (config.loja_id, certificado.impressao_digital if certificado else None, config.ambiente)
+        comunicacao = _comunicacoes.get(chave)
+        if comunicacao is not None:
+            # Mesmo certificado e ambiente (ex.: mudou só a série): mantém a sessão
+            if certificado is not None:
+                certificado.remover()
+        else:
+            if atual is not None:
+                _descartar(atual[1])
+            comunicacao = ComunicacaoSefazPersistente(
+                uf='ba',
+                certificado=certificado,
+                homologacao=config.ambiente == 'HOMOLOGACAO',
+            )
+            _comunicacoes[chave] = comunicacao
+            logger.info(
+                'Comunicação SEFAZ criada para loja %s (certificado %s, ambiente %s)',
+                config.loja_id, chave[1][:16] if chave[1] else '-', config.ambiente,
+            )
+        _versoes[config.loja_id] = (versao, chave)
+        return comunicacao
+
+
+def _descartar(chave: Tuple):
+    comunicacao = _comunicacoes.pop(chave, None)
+    if comunicacao is not None:
+        comunicacao.fechar()
+
+
+def invalidar(loja_id: Optional[int] = None):
+    """Descarta a comunicação da loja (ou todas): próxima chamada relê o certificado."""
+    with _lock:
+        for chave in [c for c in _comunicacoes if loja_id is None or c[0] == loja_id]:
+            _descartar(chave)
+        if loja_id is None:
+            _versoes.clear()
+        else:
+            _versoes.pop(loja_id, None)
+
+
+def metricas() -> Dict[int, Dict]:
+    """Métricas acumuladas por loja: requisições, conexões novas e tempos (segundos)."""
+    with _lock:
+        return {chave[0]: comunicacao.metricas.como_dict() for chave, comunicacao in _comunicacoes.items()}
@@ -0,0 +1,196 @@
+"""
+SEFAZ local (stub) para testes e desenvolvimento da fila de autorização (fiscal/nfe_fila.py).
+
+Atende no mesmo endereço os serviços usados pela fila, distinguidos pelo corpo:
+
+- NFeAutorizacao4 (enviNFe): responde 103 com um recibo novo
+- NFeRetAutorizacao4 (consReciNFe): responde 105 nas primeiras
+  ``consultas_em_processamento`` consultas do recibo e depois 104 com um protNFe
+  por nota; notas em ``rejeitar`` ({chave: (cStat, xMotivo)}) voltam rejeitadas,
+  as já autorizadas em outro lote com duplicidade (204) e as demais autorizadas (100)
+- NFeConsultaProtocolo4 (consSitNFe): 100 com o protNFe da nota autorizada
+  (``autorizadas``: {chave: protNFe}) ou 217 (não consta na base)
+
+``falhar_envios`` faz os próximos N envios responderem HTTP 500 (teste de retentativa).
+
+Uso:
+    stub = SefazStub()
+    url = stub.iniciar()          # settings.SEFAZ_NFE_URL = url
+    ...
+    stub.parar()
+
+    python -m fiscal.sefaz_stub 8089   # SEFAZ_NFE_URL=http://127.0.0.1:8089/
+"""
+import copy
+import itertools
+import sys
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lxml import etree
+
+NS = 'http://www.portalfiscal.inf.br/nfe'
+NS_SOAP = 'http://www.w3.org/2003/05/soap-envelope'
+NS_WSDL = 'http://www.portalfiscal.inf.br/nfe/wsdl/'
+
+
+class SefazStub:
+    """Servidor HTTP em thread que simula a autorização assíncrona da SEFAZ."""
+
+    def __init__(self, consultas_em_processamento=0):
+        self.consultas_em_processamento = consultas_em_processamento
+        self.rejeitar = {}
+        self.falhar_envios = 0
+        # Recibo -> chaves do lote; lotes recebidos (idLote, chaves) em ordem
+        self.recibos = {}
+        self.lotes = []
+        self.autorizadas = {}
+        self._consultas = {}
+        self._sequencia = itertools.count(1)
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    def iniciar(self, porta=0) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, como a SEFAZ
+
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status, resposta = stub.responder(corpo)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', porta), Handler)
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self._servidor.server_address[1]}/'
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    # -----------------------------------------------------------------------
+
+    def responder(self, corpo: bytes):
+        raiz = etree.fromstring(corpo)
+        envi = raiz.find('.//{*}enviNFe')
+        if envi is not None:
+            with self._lock:
+                if self.falhar_envios:
+                    self.falhar_envios -= 1
+                    return 500, b'Erro interno (stub)'
+            return 200, self._envelope('NFeAutorizacao4', self._ret_envi(envi))
+        cons = raiz.find('.//{*}consReciNFe')
+        if cons is not None:
+            return 200, self._envelope('NFeRetAutorizacao4', self._ret_cons_reci(cons))
+        cons_sit = raiz.find('.//{*}consSitNFe')
+        if cons_sit is not None:
+            return 200, self._envelope('NFeConsultaProtocolo4', self._ret_cons_sit(cons_sit))
+        return 400, b'Servico desconhecido (stub)'
+
+    def _envelope(self, metodo, ret) -> bytes:
+        envelope = etree.Element(f'{{{NS_SOAP}}}Envelope', nsmap={'soap': NS_SOAP})
+        body = etree.SubElement(envelope, f'{{{NS_SOAP}}}Body')
+        msg = etree.SubElement(body, f'{{{NS_WSDL}{metodo}}}nfeResultMsg', nsmap={None: NS_WSDL + metodo})
+        msg.append(ret)
+        return etree.tostring(envelope, xml_declaration=True, encoding='UTF-8')
+
+    @staticmethod
+    def _ret(tag, campos):
+        ret = etree.Element(f'{{{NS}}}{tag}', nsmap={None: NS}, versao='4.00')
+        for nome, valor in campos:
+            etree.SubElement(ret, f'{{{NS}}}{nome}').text = valor
+        return ret
+
+    def _ret_envi(self, envi):
+        chaves = [(inf.get('Id') or '')[3:] for inf in envi.iter(f'{{{NS}}}infNFe')]
+        with self._lock:
+            recibo = f'29{next(self._sequencia):013d}'
+            self.recibos[recibo] = chaves
+            self.lotes.append((envi.findtext(f'{{{NS}}}idLote'), chaves))
+        ret = self._ret('retEnviNFe', [
+            ('tpAmb', '2'), ('verAplic', 'STUB'), ('cStat', '103'),
+            ('xMotivo', 'Lote recebido com sucesso'), ('cUF', '29'),
+        ])
+        inf_rec = etree.SubElement(ret, f'{{{NS}}}infRec')
+        etree.SubElement(inf_rec, f'{{{NS}}}nRec').text = recibo
+        etree.SubElement(inf_rec, f'{{{NS}}}tMed').text = '1'
+        return ret
+
+    def _ret_cons_reci(self, cons):
+        recibo = cons.findtext(f'{{{NS}}}nRec')
+        with self._lock:
+            chaves = self.recibos.get(recibo)
+            self._consultas[recibo] = self._consultas.get(recibo, 0) + 1
+            consultas = self._consultas[recibo]
+        if chaves is None:
+            return self._ret('retConsReciNFe', [
+                ('tpAmb', '2'), ('verAplic', 'STUB'), ('nRec', recibo or ''),
+                ('cStat', '106'), ('xMotivo', 'Lote não localizado'), ('cUF', '29'),
+            ])
+        if consultas <= self.consultas_em_processamento:
+            return self._ret('retConsReciNFe', [
+                ('tpAmb', '2'), ('verAplic', 'STUB'), ('nRec', recibo),
+                ('cStat', '105'), ('xMotivo', 'Lote em processamento'), ('cUF', '29'),
+            ])
+
+        ret = self._ret('retConsReciNFe', [
+            ('tpAmb', '2'), ('verAplic', 'STUB'), ('nRec', recibo),
+            ('cStat', '104'), ('xMotivo', 'Lote processado'), ('cUF', '29'),
+        ])
+        agora = datetime.now().astimezone().isoformat(timespec='seconds')
+        for chave in chaves:
+            with self._lock:
+                autorizada = self.autorizadas.get(chave)
+            if autorizada is not None:
+                c_stat, x_motivo = '204', 'Rejeição: Duplicidade de NF-e'
+            else:
+                c_stat, x_motivo = self.rejeitar.get(chave, ('100', 'Autorizado o uso da NF-e'))
+            prot = etree.SubElement(ret, f'{{{NS}}}protNFe', versao='4.00')
+            inf_prot = etree.SubElement(prot, f'{{{NS}}}infProt')
+            campos = [('tpAmb', '2'), ('verAplic', 'STUB'), ('chNFe', chave), ('dhRecbto', agora)]
+            if c_stat == '100':
+                campos.append(('nProt', f'1292{next(self._sequencia):011d}'))
+            campos += [('cStat', c_stat), ('xMotivo', x_motivo)]
+            for nome, valor in campos:
+                etree.SubElement(inf_prot, f'{{{NS}}}{nome}').text = valor
+            if c_stat == '100':
+                with self._lock:
+                    self.autorizadas[chave] = copy.deepcopy(prot)
+        return ret
+
+    def _ret_cons_sit(self, cons):
+        chave = cons.findtext(f'{{{NS}}}chNFe') or ''
+        with self._lock:
+            prot = self.autorizadas.get(chave)
+        if prot is None:
+            return self._ret('retConsSitNFe', [
+                ('tpAmb', '2'), ('verAplic', 'STUB'), ('cStat', '217'),
+                ('xMotivo', 'Rejeição: NF-e não consta na base de dados da SEFAZ'), ('cUF', '29'), ('chNFe', chave),
+            ])
+        ret = self._ret('retConsSitNFe', [
+            ('tpAmb', '2'), ('verAplic', 'STUB'), ('cStat', '100'),
+            ('xMotivo', 'Autorizado o uso da NF-e'), ('cUF', '29'), ('chNFe', chave),
+        ])
+        ret.append(copy.deepcopy(prot))
+        return ret
+
+
+if __name__ == '__main__':
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    stub = SefazStub()
+    print(f'SEFAZ stub em {stub.iniciar(porta)} (Ctrl+C para sair)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.parar()
@@ -3,7 +3,9 @@ Serviços do módulo fiscal.
 """
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from .models import NotaFiscalSaida, ConfiguracaoFiscalLoja
+from .cache_pdf import prerenderizar_danfe
 from .numeracao import reservar_numero_nfe
 from vendas.models import PedidoVenda
 import logging
@@ -184,38 +186,30 @@ def gerar_xml_nfe_para_nota(nota_id: int, usuario=None):
     return nota
 
 
-def autorizar_nfe(nota_id: int, usuario=None):
+def aplicar_retorno_autorizacao(nota: NotaFiscalSaida, resultado: dict) -> None:
     """
-    Envia NF-e para a SEFAZ (modo síncrono) e atualiza a nota conforme o retorno.
+    Atualiza a nota conforme o retorno da SEFAZ (envio síncrono ou fila de lotes):
+    AUTORIZADA com chave e nfeProc, ou REJEITADA com cStat/xMotivo.
     """
-    from .nfe_autorizacao import enviar_nfe_para_autorizacao
-
-    nota = NotaFiscalSaida.objects.select_related(
-        'loja', 'loja__configuracao_fiscal',
-        'cliente', 'pedido_venda',
-    ).get(pk=nota_id)
-
-    if nota.status != 'EM_PROCESSAMENTO':
-        raise ValidationError(
-            f"Nota #{nota_id} está com status '{nota.status}'. "
-            'Envie apenas notas com status EM_PROCESSAMENTO.'
-        )
-
-    resultado = enviar_nfe_para_autorizacao(nota)
-
     if resultado['autorizada']:
         nota.status = 'AUTORIZADA'
         nota.chave_acesso = resultado['chNFe'] or nota.chave_acesso
         nota.xml_arquivo = resultado['xml_proc']
         nota.motivo_cancelamento = ''
         nota.save(update_fields=[
-            'status', 'chave_acesso', 'xml_arquivo', 'motivo_cancelamento', 'updated_at',
+            'status', 'chave_acesso', 'xml_arquivo', 'xml_tamanho', 'xml_legado', 'motivo_cancelamento',
+            'updated_at',
         ])
         try:
             if nota.pedido_venda_id:
-                nota.gravar_snapshot_impostos()
+                with transaction.atomic():
+                    nota.gravar_snapshot_impostos()
         except Exception as exc:
-            logger.warning('Erro ao gravar snapshot de impostos nota %s: %s', nota_id, exc)
+            logger.warning('Erro ao gravar snapshot de impostos nota %s: %s', nota.pk, exc)
+
+        # DANFE pronto no cache antes da primeira impressão (se FISCAL_PDF_PRERENDER)
+        nota_id = nota.pk
+        transaction.on_commit(lambda: prerenderizar_danfe(nota_id))
 
         logger.info(
             'NF-e AUTORIZADA: %s/%s chave=%s prot=%s',
@@ -232,9 +226,43 @@ def autorizar_nfe(nota_id: int, usuario=None):
             nota.numero, nota.serie, msg,
         )
 
+
+def autorizar_nfe(nota_id: int, usuario=None):
+    """
+    Envia NF-e para a SEFAZ (modo síncrono) e atualiza a nota conforme o retorno.
+    Nas telas, use enfileirar_autorizacao_nfe (lote assíncrono, fiscal/nfe_fila.py).
+    """
+    from .nfe_autorizacao import enviar_nfe_para_autorizacao
+
+    nota = NotaFiscalSaida.objects.select_related(
+        'loja', 'loja__configuracao_fiscal',
+        'cliente', 'pedido_venda',
+    ).get(pk=nota_id)
+
+    if nota.status != 'EM_PROCESSAMENTO':
+        raise ValidationError(
+            f"Nota #{nota_id} está com status '{nota.status}'. "
+            'Envie apenas notas com status EM_PROCESSAMENTO.'
+        )
+
+    resultado = enviar_nfe_para_autorizacao(nota)
+    aplicar_retorno_autorizacao(nota, resultado)
     return resultado
 
 
+def enfileirar_autorizacao_nfe(nota_id: int, usuario=None):
+    """
+    Coloca a NF-e na fila de autorização; o worker (manage.py processar_fila_nfe)
+    envia em lote e atualiza a nota quando a SEFAZ processar.
+    """
+    from .nfe_fila import enfileirar
+
+    nota = NotaFiscalSaida.objects.get(pk=nota_id)
+    item = enfileirar(nota)
+    logger.info('NF-e %s/%s na fila de autorização (%s)', nota.numero, nota.serie, item.status)
+    return item
+
+
 def cancelar_nota_fiscal(nota_id: int, justificativa: str, usuario=None) -> dict:
     """
     Cancela NF-e autorizada via evento na SEFAZ.
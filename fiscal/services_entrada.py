@@ -8,7 +8,7 @@ from decimal import Decimal
 from typing import Tuple, List, Iterable, Union
 
 from .models import NotaFiscalEntrada, ItemNotaFiscalEntrada, HistoricoEntradaEstoque
-from estoque.services import realizar_movimento_estoque
+from estoque.services import realizar_movimentos_em_lote
 from estoque.models import LocalEstoque
 
 TOLERANCIA_MANUAL = Decimal('0.10')
@@ -41,6 +41,7 @@ def validar_totais(
         )
 
 
+@transaction.atomic
 def dar_entrada_estoque_nota(
     nota: NotaFiscalEntrada,
     local_estoque_padrao: LocalEstoque,
@@ -50,69 +51,82 @@ def dar_entrada_estoque_nota(
     Dá entrada em estoque para os itens vinculados da nota.
 
     Fonte de verdade: ItemNotaFiscalEntrada.status != ESTOQUE_ENTRADO
-    Usa savepoint por item para modo "melhor esforço".
+    Modo "melhor esforço": itens que não passam na validação (sem local, quantidade
+    inválida) ficam de fora com o erro listado; os demais entram juntos, em lote
+    (realizar_movimentos_em_lote: custo médio combinado por produto, inclusive com
+    várias linhas do mesmo produto) e têm o status gravado num único UPDATE.
 
     Returns:
         (itens_processados, lista_erros, motivo_parcial)
         motivo_parcial: None | 'PARCIAL_SEM_VINCULO' | 'PARCIAL_COM_ERRO'
     """
-    itens_processados = 0
     lista_erros = []
     motivo_parcial = None
 
-    itens_todos = list(nota.itens.filter(is_active=True))
+    # Trava a nota: duas entradas simultâneas não lançam os mesmos itens duas vezes
+    NotaFiscalEntrada.objects.select_for_update().filter(pk=nota.pk).first()
+    itens_todos = list(
+        nota.itens.filter(is_active=True)
+        .select_related('produto', 'local_estoque__loja__empresa')
+        .order_by('numero_item', 'pk')
+    )
     if itens_todos:
         validar_totais(
             nota.valor_total,
             (i.valor_total for i in itens_todos),
             tolerancia=TOLERANCIA_MANUAL,
         )
-    itens = nota.itens.filter(
-        is_active=True,
-        produto__isnull=False,
-    ).exclude(status='ESTOQUE_ENTRADO').select_related('produto', 'local_estoque')
 
-    total_vinculados = nota.itens.filter(is_active=True, produto__isnull=False).count()
-    total_estoque_entrado_antes = nota.itens.filter(
-        is_active=True, status='ESTOQUE_ENTRADO'
-    ).count()
+    vinculados = [i for i in itens_todos if i.produto_id is not None]
+    pendentes = [i for i in vinculados if i.status != 'ESTOQUE_ENTRADO']
+    total_estoque_entrado_antes = len(vinculados) - len(pendentes)
 
-    for item in itens:
+    validos = []
+    for item in pendentes:
         local = item.local_estoque or local_estoque_padrao
         if not local:
             lista_erros.append(f"Item {item.numero_item}: Nenhum local de estoque definido.")
-            motivo_parcial = 'PARCIAL_COM_ERRO'
-            continue
+        elif not item.quantidade or item.quantidade <= 0:
+            lista_erros.append(f"Item {item.numero_item} ({item.descricao[:30]}...): Quantidade inválida.")
+        else:
+            validos.append((item, local))
+    if lista_erros:
+        motivo_parcial = 'PARCIAL_COM_ERRO'
 
+    itens_processados = 0
+    if validos:
         sid = transaction.savepoint()
         try:
-            realizar_movimento_estoque(
-                produto=item.produto,
-                tipo_movimento='ENTRADA',
-                quantidade=item.quantidade,
-                local_destino=local,
-                referencia=f"NFE_{nota.id}",
-                observacao=f"NF-e Entrada {nota.numero}/{nota.serie} - Item {item.numero_item}",
-                usuario=usuario,
-                custo_unitario=item.preco_unitario,
+            realizar_movimentos_em_lote([
+                {
+                    'produto': item.produto,
+                    'tipo_movimento': 'ENTRADA',
+                    'quantidade': item.quantidade,
+                    'local_destino': local,
+                    'referencia': f"NFE_{nota.id}",
+                    'observacao': f"NF-e Entrada {nota.numero}/{nota.serie} - Item {item.numero_item}",
+                    'usuario': usuario,
+                    'custo_unitario': item.preco_unitario,
+                }
+                for item, local in validos
+            ])
+            ItemNotaFiscalEntrada.objects.filter(pk__in=[item.pk for item, _local in validos]).update(
+                status='ESTOQUE_ENTRADO',
+                updated_at=timezone.now(),
             )
-            item.status = 'ESTOQUE_ENTRADO'
-            item.save(update_fields=['status', 'updated_at'])
-            itens_processados += 1
             transaction.savepoint_commit(sid)
+            itens_processados = len(validos)
         except Exception as e:
             transaction.savepoint_rollback(sid)
-            lista_erros.append(f"Item {item.numero_item} ({item.descricao[:30]}...): {e}")
+            lista_erros.append(f"Entrada dos itens {', '.join(str(i.numero_item) for i, _l in validos)}: {e}")
             motivo_parcial = 'PARCIAL_COM_ERRO'
 
-    total_estoque_entrado_depois = nota.itens.filter(
-        is_active=True, status='ESTOQUE_ENTRADO'
-    ).count()
+    total_estoque_entrado_depois = total_estoque_entrado_antes + itens_processados
 
     if itens_processados > 0:
         nota.data_entrada_estoque = timezone.now()
         nota.usuario_entrada_estoque = usuario
-        if total_estoque_entrado_depois >= total_vinculados:
+        if total_estoque_entrado_depois >= len(vinculados):
             nota.status = 'ESTOQUE_TOTAL'
         else:
             nota.status = 'ESTOQUE_PARCIAL'
@@ -0,0 +1,18 @@
+"""
+Signals do módulo fiscal: invalidação da comunicação SEFAZ em cache (fiscal/sefaz_conexao.py).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ConfiguracaoFiscalLoja
+
+
+@receiver(post_save, sender=ConfiguracaoFiscalLoja)
+@receiver(post_delete, sender=ConfiguracaoFiscalLoja)
+def invalidar_comunicacao_sefaz(sender, instance, **kwargs):
+    """Certificado, senha ou ambiente podem ter mudado: relê na próxima comunicação."""
+    from .sefaz_conexao import invalidar
+
+    loja_id = instance.loja_id
+    transaction.on_commit(lambda: invalidar(loja_id))
@@ -2,8 +2,13 @@
 Armazenamento temporário de XML de NF-e para importação.
 
 Evita guardar XML inteiro na sessão (limite ~4KB). NF-e pode ter até 990 itens.
+Os dados já extraídos do XML (parse_nfe_xml) também ficam aqui, em JSON, para a
+confirmação não precisar ler o XML de novo.
 """
+import json
 import uuid
+from datetime import date
+from decimal import Decimal
 from pathlib import Path
 
 from django.conf import settings
@@ -65,9 +70,66 @@ def deletar_xml_temporario(key: str) -> bool:
     return False
 
 
+def _codificar(valor):
+    if isinstance(valor, Decimal):
+        return {'__decimal__': str(valor)}
+    if isinstance(valor, date):
+        return {'__date__': valor.isoformat()}
+    raise TypeError(f'Tipo não serializável: {type(valor).__name__}')
+
+
+def _decodificar(objeto: dict):
+    if '__decimal__' in objeto:
+        return Decimal(objeto['__decimal__'])
+    if '__date__' in objeto:
+        return date.fromisoformat(objeto['__date__'])
+    return objeto
+
+
+def salvar_dados_temporarios(dados: dict, key: str = None) -> str:
+    """
+    Salva dados (dict com Decimal/date, ex.: retorno de parse_nfe_xml) em JSON.
+    Com ``key``, sobrescreve o arquivo dessa chave.
+
+    Returns:
+        str: UUID do arquivo (chave para recuperar depois)
+    """
+    key = key or str(uuid.uuid4())
+    path = get_tmp_dir() / f"{key}.json"
+    path.write_text(json.dumps(dados, default=_codificar, ensure_ascii=False), encoding='utf-8')
+    return key
+
+
+def carregar_dados_temporarios(key: str) -> dict:
+    """
+    Carrega os dados salvos por salvar_dados_temporarios, com Decimal/date restaurados.
+
+    Raises:
+        FileNotFoundError: se o arquivo não existir
+    """
+    path = get_tmp_dir() / f"{key}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"Arquivo temporário não encontrado: {key}")
+    return json.loads(path.read_text(encoding='utf-8'), object_hook=_decodificar)
+
+
+def deletar_dados_temporarios(key: str) -> bool:
+    """
+    Deleta os dados temporários da chave.
+
+    Returns:
+        bool: True se deletou, False se não existia
+    """
+    path = get_tmp_dir() / f"{key}.json"
+    if path.exists():
+        path.unlink()
+        return True
+    return False
+
+
 def limpar_xml_temporarios_antigos(horas: int = 24) -> int:
     """
-    Remove arquivos XML temporários com mais de N horas.
+    Remove arquivos temporários (XML e dados extraídos) com mais de N horas.
     Cobre abandono (usuário fechou aba sem confirmar).
 
     Returns:
@@ -81,7 +143,7 @@ def limpar_xml_temporarios_antigos(horas: int = 24) -> int:
 
     limite = time.time() - (horas * 3600)
     removidos = 0
-    for path in tmp_dir.glob("*.xml"):
+    for path in [*tmp_dir.glob("*.xml"), *tmp_dir.glob("*.json")]:
         try:
             if path.stat().st_mtime < limite:
                 path.unlink()
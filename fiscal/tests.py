@@ -1,8 +1,10 @@
 """
 Testes do módulo fiscal.
 """
+import io
 import unittest
 from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection
 from django.test import TestCase
@@ -92,3 +94,1418 @@ class TestExtrairProtocoloCancelamento(TestCase):
 
     def test_xml_vazio_retorna_string_vazia(self):
         self.assertEqual(extrair_protocolo_do_xml(''), '')
+
+
+class TestCalculoImpostosNota(TestCase):
+    """Parâmetros fiscais carregados uma vez por nota e itens como dict."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from pessoas.models import Cliente
+        from produtos.models import CategoriaProduto, Produto, ProdutoParametrosEmpresa
+        from vendas.models import CondicaoPagamento, PedidoVenda
+
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Imp',
+            razao_social='Empresa Imp LTDA',
+            cnpj='88888888000188',
+        )
+        loja = Loja.objects.create(empresa=self.empresa, nome='Loja Imp')
+        usuario = get_user_model().objects.create_user('fiscal_imp', password='secret123')
+        cliente = Cliente.objects.create(
+            empresa=self.empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Cliente Imp',
+            cpf_cnpj='12345678901',
+        )
+        condicao = CondicaoPagamento.objects.create(
+            empresa=self.empresa,
+            nome='À vista',
+            numero_parcelas=1,
+            dias_entre_parcelas=0,
+        )
+        self.pedido = PedidoVenda.objects.create(
+            loja=loja,
+            cliente=cliente,
+            tipo_venda='BALCAO',
+            vendedor=usuario,
+            condicao_pagamento=condicao,
+        )
+        categoria = CategoriaProduto.objects.create(nome='Cat Imp')
+        dados = []
+        for i in range(5):
+            produto = Produto.objects.create(
+                categoria=categoria,
+                descricao=f'Produto imp {i}',
+                classe_risco='1.4G',
+                ncm='36041000',
+            )
+            ProdutoParametrosEmpresa.objects.create(
+                empresa=self.empresa,
+                produto=produto,
+                preco_venda=Decimal('10.00'),
+                cfop_venda_dentro_uf='5102',
+                csosn_cst='00',
+                aliquota_icms=Decimal('18.00'),
+            )
+            dados.append({
+                'produto': produto,
+                'quantidade': Decimal('1.000'),
+                'preco_unitario': Decimal('10.00'),
+            })
+        self.pedido.adicionar_itens(dados)
+
+    def test_uma_consulta_de_parametros_por_nota(self):
+        from fiscal.calculos import calcular_impostos_nota
+
+        itens = list(self.pedido.itens.filter(is_active=True))
+        # Uma consulta de parâmetros para todos os produtos (antes: uma por item)
+        with self.assertNumQueries(1):
+            totais = calcular_impostos_nota(itens, 'LUCRO_PRESUMIDO')
+        self.assertEqual(totais['valor_icms'], Decimal('9.00'))
+        self.assertEqual(len(totais['itens']), 5)
+        self.assertEqual(totais['itens'][0]['valor_icms'], Decimal('1.80'))
+
+    def test_itens_e_parametros_como_dict_sem_orm(self):
+        from fiscal.calculos import calcular_impostos_nota
+
+        itens = [
+            {'produto_id': 1, 'total': Decimal('100.00')},
+            {'produto_id': 2, 'total': Decimal('50.00')},
+        ]
+        parametros = {1: {'csosn_cst': '00', 'aliquota_icms': Decimal('12.00')}}
+        with self.assertNumQueries(0):
+            totais = calcular_impostos_nota(itens, 'LUCRO_PRESUMIDO', parametros=parametros)
+        self.assertEqual(totais['valor_produtos'], Decimal('150.00'))
+        self.assertEqual(totais['itens'][0]['valor_icms'], Decimal('12.00'))
+        # Produto sem parâmetros usa o fallback (CST 000: sem ICMS destacado)
+        self.assertEqual(totais['itens'][1]['valor_icms'], Decimal('0.00'))
+
+
+class TestCalculoColunar(TestCase):
+    """Motor em colunas deve reproduzir exatamente calcular_impostos_item."""
+
+    def test_colunas_identicas_ao_calculo_escalar(self):
+        import random
+        from types import SimpleNamespace
+        from fiscal.calculos import calcular_impostos_item
+        from fiscal.calculos_colunar import (
+            ESCALA_ALIQUOTA,
+            ESCALA_IMPOSTO,
+            ESCALA_VALOR,
+            calcular_impostos_colunas,
+            para_centavos,
+            para_decimal,
+            parametros_para_colunas,
+        )
+
+        rnd = random.Random(7)
+
+        def aliquota():
+            return rnd.choice([Decimal('0.00'), Decimal('0.10'), Decimal('1.65'), Decimal('18.00'), Decimal('27.35')])
+
+        regimes, itens, lista_parametros = [], [], []
+        for i in range(500):
+            regimes.append(rnd.choice(['SIMPLES_NACIONAL', 'LUCRO_PRESUMIDO', 'LUCRO_REAL', None]))
+            itens.append({'produto_id': i + 1, 'total': Decimal(rnd.randint(1, 10**7)) / 100})
+            if rnd.random() < 0.1:
+                lista_parametros.append(None)
+                continue
+            lista_parametros.append({
+                'csosn_cst': rnd.choice(['00', '102', '500', '000', None]),
+                'aliquota_icms': aliquota(),
+                'icms_st_cst': rnd.choice(['10', None]),
+                'aliquota_icms_st': rnd.choice([None, aliquota()]),
+                'pis_cst': rnd.choice(['01', '07', None]),
+                'aliquota_pis': aliquota(),
+                'cofins_cst': rnd.choice(['01', '07', None]),
+                'aliquota_cofins': aliquota(),
+                'ipi_venda_cst': rnd.choice(['52', '00', '03', '99', None]),
+                'aliquota_ipi_venda': aliquota(),
+                'aliquota_ibs': aliquota(),
+                'aliquota_cbs': aliquota(),
+            })
+
+        config = SimpleNamespace(
+            usar_reforma_2026=True,
+            aliquota_ibs_padrao_2026=Decimal('0.10'),
+            aliquota_cbs_padrao_2026=Decimal('0.90'),
+        )
+        resultado = calcular_impostos_colunas(
+            [para_centavos(item['total']) for item in itens],
+            parametros_para_colunas(lista_parametros),
+            regimes,
+            usar_reforma=True,
+        )
+
+        for i, item in enumerate(itens):
+            parametros = {item['produto_id']: lista_parametros[i]} if lista_parametros[i] else {}
+            esperado = calcular_impostos_item(item, regimes[i], config, parametros=parametros)
+            for imposto in ['icms', 'icms_st', 'pis', 'cofins', 'ipi', 'ibs', 'cbs']:
+                self.assertEqual(
+                    para_decimal(resultado[f'base_{imposto}'][i], ESCALA_VALOR), esperado[f'base_{imposto}'],
+                )
+                self.assertEqual(
+                    para_decimal(resultado[f'valor_{imposto}'][i], ESCALA_IMPOSTO), esperado[f'valor_{imposto}'],
+                )
+            self.assertEqual(para_decimal(resultado['aliquota_ibs'][i], ESCALA_ALIQUOTA), esperado['aliquota_ibs'])
+
+    def test_aliquota_com_mais_casas_rejeitada(self):
+        from fiscal.calculos_colunar import aliquota_para_inteiro
+
+        with self.assertRaises(ValueError):
+            aliquota_para_inteiro(Decimal('18.125'))
+
+
+class TestSimularReforma(TestCase):
+    """Comando simular_reforma agrega itens faturados por NCM/CFOP."""
+
+    setUp = TestCalculoImpostosNota.setUp
+
+    def test_relatorio_por_ncm_cfop(self):
+        import csv
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from vendas.models import PedidoVenda
+
+        PedidoVenda.objects.filter(pk=self.pedido.pk).update(status='FATURADO')
+        ConfiguracaoFiscalLoja.objects.create(
+            loja=self.pedido.loja,
+            cnpj='88888888000188',
+            inscricao_estadual='123',
+            regime_tributario='LUCRO_PRESUMIDO',
+        )
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as arquivo:
+            out = StringIO()
+            call_command(
+                'simular_reforma', '--chunk-size', '2', '--aliquota-cbs', '8.80', '--csv', arquivo.name, stdout=out,
+            )
+            with open(arquivo.name, encoding='utf-8') as f:
+                linhas = list(csv.DictReader(f, delimiter=';'))
+
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual(linhas[0]['ncm'], '36041000')
+        self.assertEqual(linhas[0]['cfop'], '5102')
+        self.assertEqual(linhas[0]['itens'], '5')
+        self.assertEqual(Decimal(linhas[0]['valor_produtos']), Decimal('50.00'))
+        self.assertEqual(Decimal(linhas[0]['icms']), Decimal('9.00'))
+        self.assertEqual(Decimal(linhas[0]['ibs']), Decimal('0.05'))
+        self.assertEqual(Decimal(linhas[0]['cbs']), Decimal('4.40'))
+        self.assertIn('1 grupo(s) NCM/CFOP, 5 item(ns).', out.getvalue())
+
+
+class TestFilaAutorizacaoNFe(TestCase):
+    """Fila de autorização em lote contra a SEFAZ local (fiscal/sefaz_stub.py)."""
+
+    def setUp(self):
+        from django.test import override_settings
+        from pessoas.models import Cliente
+        from fiscal.sefaz_stub import SefazStub
+
+        from fiscal.sefaz_conexao import invalidar
+
+        self.stub = SefazStub(consultas_em_processamento=1)
+        self.addCleanup(invalidar)
+        configuracao = override_settings(SEFAZ_NFE_URL=self.stub.iniciar(), NFE_FILA_MAX_TENTATIVAS=2)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.addCleanup(self.stub.parar)
+
+        empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Fila',
+            razao_social='Empresa Fila LTDA',
+            cnpj='33445566000173',
+        )
+        self.cliente = Cliente.objects.create(
+            empresa=empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Cliente Fila',
+            cpf_cnpj='12345678901',
+        )
+        self.lojas = []
+        for nome in ('Loja A', 'Loja B'):
+            loja = Loja.objects.create(empresa=empresa, nome=nome)
+            ConfiguracaoFiscalLoja.objects.create(
+                loja=loja,
+                cnpj='33445566000173',
+                inscricao_estadual='123456789',
+                regime_tributario='SIMPLES_NACIONAL',
+            )
+            self.lojas.append(loja)
+
+    def _nota(self, loja, numero):
+        from fiscal.models import NotaFiscalSaida
+
+        chave = f'2926103344556600017355001{numero:09d}1{numero:08d}'[:43] + '0'
+        return NotaFiscalSaida.objects.create(
+            loja=loja,
+            cliente=self.cliente,
+            tipo_documento='NFE',
+            numero=numero,
+            serie='001',
+            valor_total=Decimal('10.00'),
+            status='EM_PROCESSAMENTO',
+            xml_arquivo=(
+                '<NFe xmlns="http://www.portalfiscal.inf.br/nfe">'
+                f'<infNFe Id="NFe{chave}" versao="4.00"><ide><nNF>{numero}</nNF></ide></infNFe></NFe>'
+            ),
+        )
+
+    def _vencer_agendamentos(self):
+        from django.utils import timezone
+        from fiscal.models import AutorizacaoNFe, LoteNFe
+
+        LoteNFe.objects.filter(status='AGUARDANDO').update(proxima_consulta=timezone.now())
+        AutorizacaoNFe.objects.filter(status='PENDENTE').update(proxima_tentativa=timezone.now())
+
+    def test_lotes_por_loja_com_consulta_de_recibo(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from fiscal.models import LoteNFe
+        from fiscal.nfe_fila import processar_fila
+        from fiscal.services import enfileirar_autorizacao_nfe
+
+        notas = [self._nota(self.lojas[0], n) for n in (1, 2, 3)] + [self._nota(self.lojas[1], 4)]
+        for nota in notas:
+            enfileirar_autorizacao_nfe(nota.pk)
+        rejeitada = notas[1]
+        self.stub.rejeitar[rejeitada.autorizacao_fila.chave] = ('539', 'Duplicidade de NF-e')
+
+        resultado = processar_fila(tamanho_lote=2)
+        self.assertEqual(resultado['lotes_enviados'], 3)
+        self.assertEqual(sorted(len(chaves) for _id, chaves in self.stub.lotes), [1, 1, 2])
+        self.assertEqual(LoteNFe.objects.filter(status='AGUARDANDO').count(), 3)
+
+        # 1ª consulta: 105 (em processamento) reagenda; 2ª: 104 com os protocolos
+        self._vencer_agendamentos()
+        self.assertEqual(processar_fila()['lotes_consultados'], 3)
+        self.assertEqual(LoteNFe.objects.filter(status='AGUARDANDO', consultas=1).count(), 3)
+        self._vencer_agendamentos()
+        call_command('processar_fila_nfe', stdout=StringIO())
+
+        self.assertEqual(LoteNFe.objects.filter(status='PROCESSADO').count(), 3)
+        for nota in notas:
+            nota.refresh_from_db()
+            self.assertEqual(nota.autorizacao_fila.status, 'CONCLUIDA')
+        self.assertEqual(rejeitada.status, 'REJEITADA')
+        self.assertEqual(rejeitada.motivo_cancelamento, 'cStat 539: Duplicidade de NF-e')
+        autorizada = notas[0]
+        self.assertEqual(autorizada.status, 'AUTORIZADA')
+        self.assertEqual(autorizada.chave_acesso, autorizada.autorizacao_fila.chave)
+        self.assertIn('<nfeProc', autorizada.xml_arquivo)
+        self.assertIn('<cStat>100</cStat>', autorizada.xml_arquivo)
+
+    def test_falha_de_envio_volta_para_fila_com_espera(self):
+        from django.utils import timezone
+        from fiscal.nfe_fila import enfileirar, processar_fila
+
+        nota = self._nota(self.lojas[0], 7)
+        enfileirar(nota)
+        self.stub.falhar_envios = 3
+
+        processar_fila()
+        item = nota.autorizacao_fila
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.tentativas), ('PENDENTE', 1))
+        self.assertGreater(item.proxima_tentativa, timezone.now())
+        self.assertEqual(processar_fila()['lotes_enviados'], 0)
+
+        self._vencer_agendamentos()
+        processar_fila()
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.tentativas), ('ERRO', 2))
+        nota.refresh_from_db()
+        self.assertEqual(nota.status, 'EM_PROCESSAMENTO')
+
+        # Enfileirar de novo zera as tentativas
+        self.stub.falhar_envios = 0
+        enfileirar(nota)
+        processar_fila()
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.tentativas), ('EM_LOTE', 0))
+
+    def _autorizar_sem_resposta(self, nota):
+        """Lote enviado e autorizado na SEFAZ, mas o worker morre antes de gravar o retorno."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from fiscal.models import LoteNFe
+        from fiscal.nfe_fila import ClienteSefaz, enfileirar, processar_fila
+
+        enfileirar(nota)
+        self.stub.consultas_em_processamento = 0
+        processar_fila()
+        lote = LoteNFe.objects.get(status='AGUARDANDO')
+        ClienteSefaz(nota.loja.configuracao_fiscal).consultar_recibo(lote.recibo)
+        LoteNFe.objects.filter(pk=lote.pk).update(status='ENVIANDO', updated_at=timezone.now() - timedelta(hours=1))
+        return self.stub.autorizadas[nota.autorizacao_fila.chave].findtext('.//{*}nProt')
+
+    def test_lote_interrompido_consulta_situacao_da_nota(self):
+        from fiscal.models import AutorizacaoNFe
+        from fiscal.nfe_fila import processar_fila
+
+        nota = self._nota(self.lojas[0], 8)
+        n_prot = self._autorizar_sem_resposta(nota)
+
+        resultado = processar_fila()
+        self.assertEqual((resultado['lotes_recuperados'], resultado['lotes_enviados']), (1, 0))
+        nota.refresh_from_db()
+        self.assertEqual(nota.status, 'AUTORIZADA')
+        self.assertEqual(AutorizacaoNFe.objects.get(nota=nota).status, 'CONCLUIDA')
+        self.assertIn(f'<nProt>{n_prot}</nProt>', nota.xml_arquivo)
+
+    def test_reenvio_com_duplicidade_aplica_protocolo_original(self):
+        from unittest import mock
+        from fiscal.models import AutorizacaoNFe
+        from fiscal.nfe_fila import ClienteSefaz, processar_fila
+
+        nota = self._nota(self.lojas[0], 9)
+        n_prot = self._autorizar_sem_resposta(nota)
+
+        # Consulta indisponível na recuperação: a nota volta à fila e é reenviada
+        with mock.patch.object(ClienteSefaz, 'consultar_protocolo', side_effect=OSError('timeout')):
+            processar_fila()
+        self.assertEqual(AutorizacaoNFe.objects.get(nota=nota).status, 'PENDENTE')
+        self._vencer_agendamentos()
+        processar_fila()
+        self._vencer_agendamentos()
+        processar_fila()
+
+        nota.refresh_from_db()
+        self.assertEqual(nota.status, 'AUTORIZADA')
+        self.assertEqual(len(self.stub.lotes), 2)
+        self.assertIn(f'<nProt>{n_prot}</nProt>', nota.xml_arquivo)
+        self.assertEqual(AutorizacaoNFe.objects.get(nota=nota).ultimo_erro, '')
+
+    def test_loop_continua_apos_ciclo_com_erro(self):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.db import OperationalError
+
+        ciclo = {'lotes_recuperados': 0, 'lotes_consultados': 0, 'lotes_enviados': 1, 'notas_enviadas': 2}
+        saida = StringIO()
+        with mock.patch('fiscal.nfe_fila.processar_fila', side_effect=[OperationalError('conexão perdida'), ciclo]) as processar, \
+                mock.patch('time.sleep', side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs('fiscal.management.commands.processar_fila_nfe', 'ERROR'):
+            call_command('processar_fila_nfe', '--loop', stdout=saida)
+        self.assertEqual(processar.call_count, 2)
+        self.assertIn('Lotes enviados: 1 (2 nota(s))', saida.getvalue())
+
+    def test_tela_usa_fila_so_com_worker(self):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from core.models import UsuarioEmpresa
+        from core.tenant import SESSION_KEY
+        from fiscal.models import AutorizacaoNFe
+
+        usuario = get_user_model().objects.create_user('fiscal', password='secret123', is_staff=True)
+        UsuarioEmpresa.objects.create(user=usuario, empresa=self.lojas[0].empresa)
+        self.client.force_login(usuario)
+        session = self.client.session
+        session[SESSION_KEY] = self.lojas[0].empresa.pk
+        session.save()
+        nota = self._nota(self.lojas[0], 8)
+        url = f'/fiscal/nota/{nota.pk}/autorizar/'
+
+        retorno = {'autorizada': True, 'chNFe': '29', 'cStat': '100', 'xMotivo': 'Autorizado'}
+        with self.settings(NFE_FILA_ATIVA=False), \
+                mock.patch('fiscal.services.autorizar_nfe', return_value=retorno) as sincrono:
+            self.client.post(url)
+        sincrono.assert_called_once_with(nota.pk, usuario=usuario)
+        self.assertFalse(AutorizacaoNFe.objects.exists())
+
+        with self.settings(NFE_FILA_ATIVA=True):
+            self.client.post(url)
+        self.assertEqual(AutorizacaoNFe.objects.get().nota, nota)
+
+
+class TestComunicacaoSefaz(TestCase):
+    """Pool de comunicação SEFAZ por loja/certificado (fiscal/sefaz_conexao.py)."""
+
+    def setUp(self):
+        import os
+        import tempfile
+        from datetime import datetime, timedelta
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.primitives.serialization import BestAvailableEncryption, pkcs12
+        from cryptography.x509.oid import NameOID
+        from fiscal.sefaz_conexao import invalidar
+
+        self.addCleanup(invalidar)
+        chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        nome = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'EMPRESA CERT:44556677000181')])
+        certificado = (
+            x509.CertificateBuilder()
+            .subject_name(nome)
+            .issuer_name(nome)
+            .public_key(chave.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(datetime.now() - timedelta(days=1))
+            .not_valid_after(datetime.now() + timedelta(days=30))
+            .sign(chave, hashes.SHA256())
+        )
+        self.impressao = certificado.fingerprint(hashes.SHA256()).hex()
+        fd, self.caminho_pfx = tempfile.mkstemp(suffix='.pfx')
+        with os.fdopen(fd, 'wb') as arquivo:
+            arquivo.write(pkcs12.serialize_key_and_certificates(
+                b'cert', chave, certificado, None, BestAvailableEncryption(b'senha123'),
+            ))
+        self.addCleanup(os.remove, self.caminho_pfx)
+
+        empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Cert',
+            razao_social='Empresa Cert LTDA',
+            cnpj='44556677000181',
+        )
+        self.config = ConfiguracaoFiscalLoja.objects.create(
+            loja=Loja.objects.create(empresa=empresa, nome='Loja Cert'),
+            cnpj='44556677000181',
+            inscricao_estadual='123456789',
+            regime_tributario='SIMPLES_NACIONAL',
+            certificado_arquivo=self.caminho_pfx,
+            senha_certificado='senha123',
+        )
+
+    def test_certificado_lido_uma_vez_e_invalidado_ao_salvar(self):
+        import os
+        from unittest import mock
+        from fiscal import sefaz_conexao
+
+        with mock.patch.object(
+            sefaz_conexao, 'carregar_certificado', wraps=sefaz_conexao.carregar_certificado,
+        ) as carregar:
+            con = sefaz_conexao.obter_comunicacao(self.config)
+            self.assertIs(sefaz_conexao.obter_comunicacao(self.config), con)
+            self.assertEqual(carregar.call_count, 1)
+            self.assertEqual(con.certificado_carregado.impressao_digital, self.impressao)
+            cert_pem, chave_pem = con.sessao.cert
+            self.assertEqual(os.stat(chave_pem).st_mode & 0o777, 0o600)
+
+            # Mesmo certificado e ambiente: relê o .pfx mas mantém a sessão
+            self.config.serie_nfe = '002'
+            self.config.save()
+            self.assertIs(sefaz_conexao.obter_comunicacao(self.config), con)
+            self.assertEqual(carregar.call_count, 2)
+
+            # Outro ambiente: nova comunicação; a anterior é fechada e os PEM removidos
+            self.config.ambiente = 'PRODUCAO'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.config.save()
+            self.assertFalse(os.path.exists(chave_pem))
+            nova = sefaz_conexao.obter_comunicacao(self.config)
+            self.assertIsNot(nova, con)
+            self.assertEqual(nova._ambiente, 1)
+
+    def test_conexao_reutilizada_entre_requisicoes(self):
+        from django.test import override_settings
+        from fiscal import sefaz_conexao
+        from fiscal.nfe_fila import ClienteSefaz
+        from fiscal.sefaz_stub import SefazStub
+
+        stub = SefazStub()
+        url = stub.iniciar()
+        self.addCleanup(stub.parar)
+        with override_settings(SEFAZ_NFE_URL=url):
+            cliente = ClienteSefaz(self.config)
+            for _ in range(3):
+                cliente.consultar_recibo('291234567890123')
+
+        metricas = sefaz_conexao.metricas()[self.config.loja_id]
+        self.assertEqual(metricas['requisicoes'], 3)
+        self.assertEqual(metricas['conexoes'], 1)
+        self.assertFalse(cliente.con.ultima_requisicao['conexao_nova'])
+        self.assertGreater(metricas['tempo_sefaz'], 0)
+
+
+def _dados_nfe(quantidade_itens, simples=True, csts=('102',), pis_cst='01', cfops=('5102',)):
+    """Dados no formato de fiscal.nfe_xml.preparar_dados_nfe, determinísticos e sem banco."""
+    from datetime import datetime
+    from zoneinfo import ZoneInfo
+
+    def itens():
+        for i in range(1, quantidade_itens + 1):
+            quantidade = Decimal('2.000') if i % 2 else Decimal('1.500')
+            valor_unitario = Decimal('12.34') + i
+            total = (quantidade * valor_unitario).quantize(Decimal('0.01'))
+            desconto = Decimal('1.00') if i % 3 == 0 else Decimal('0.00')
+            base = total - desconto
+            yield {
+                'numero_item': i,
+                'codigo': f'FOGO-{i:04d}',
+                'ean': 'SEM GTIN' if i % 2 else '7891234567895',
+                'descricao': f'Bateria {i} tiros',
+                'ncm': '36041000',
+                'cest': '',
+                'cfop': cfops[i % len(cfops)],
+                'unidade': 'UN' if i % 4 else 'CX',
+                'quantidade': quantidade,
+                'valor_unitario': valor_unitario,
+                'valor_total': total,
+                'desconto': desconto,
+                'icms_origem': 0,
+                'icms_cst': csts[i % len(csts)],
+                'icms_modalidade_bc': 0 if simples else 3,
+                'icms_base': Decimal('0.00') if simples else base,
+                'icms_aliquota': Decimal('0.00') if simples else Decimal('18.00'),
+                'icms_valor': Decimal('0.00') if simples else (base * Decimal('0.18')).quantize(Decimal('0.01')),
+                'pis_cst': pis_cst,
+                'pis_base': base,
+                'pis_aliquota': Decimal('1.65'),
+                'pis_valor': (base * Decimal('0.0165')).quantize(Decimal('0.01')),
+                'cofins_cst': pis_cst,
+                'cofins_base': base,
+                'cofins_aliquota': Decimal('7.60'),
+                'cofins_valor': (base * Decimal('0.076')).quantize(Decimal('0.01')),
+                'ipi_cst': '53',
+            }
+
+    return {
+        'homologacao': True,
+        'simples': simples,
+        'uf': 'BA',
+        'municipio': '2927408',
+        'serie': '1',
+        'numero': '1234',
+        'data_emissao': datetime(2026, 6, 20, 18, 30, tzinfo=ZoneInfo('America/Bahia')),
+        'codigo_numerico': '04812345',
+        'emitente': {
+            'razao_social': 'Fogos Aladim LTDA',
+            'nome_fantasia': 'Guardião Aladim',
+            'cnpj': '33445566000173',
+            'inscricao_estadual': '123456789',
+            'codigo_de_regime_tributario': '1' if simples else '3',
+            'endereco_logradouro': 'Rua das Flores',
+            'endereco_numero': '100',
+            'endereco_complemento': '',
+            'endereco_bairro': 'Centro',
+            'endereco_municipio': 'Salvador',
+            'endereco_uf': 'BA',
+            'endereco_cep': '40010000',
+            'endereco_pais': '1058',
+            'endereco_telefone': '7133334444',
+        },
+        'destinatario': {
+            'razao_social': 'NF-E EMITIDA EM AMBIENTE DE HOMOLOGACAO - SEM VALOR FISCAL',
+            'email': 'cliente@example.com',
+            'tipo_documento': 'CPF',
+            'numero_documento': '12345678909',
+            'indicador_ie': 9,
+            'endereco_logradouro': 'Av. Sete de Setembro',
+            'endereco_numero': 'S/N',
+            'endereco_complemento': 'Loja 2',
+            'endereco_bairro': 'Barra',
+            'endereco_municipio': 'Salvador',
+            'endereco_uf': 'BA',
+            'endereco_cep': '',
+            'endereco_pais': '1058',
+            'endereco_telefone': '',
+        },
+        'itens': itens(),
+    }
+
+
+def _c14n(raiz) -> bytes:
+    from lxml import etree
+
+    # Reparse: o <NFe> do PyNFe declara o namespace como atributo xmlns
+    return etree.tostring(etree.fromstring(etree.tostring(raiz)), method='c14n')
+
+
+class TestSerializadorNFeNativo(TestCase):
+    """Serializador lxml (fiscal/nfe_xml_nativo.py) equivalente ao SerializacaoXML do PyNFe."""
+
+    CENARIOS = {
+        'simples': dict(csts=('102', '101', '500', '300', '900', '201'), pis_cst='49'),
+        'regime_normal': dict(simples=False, csts=('00', '20', '40', '60', '10', '90'), cfops=('5102', '5405', '5301')),
+    }
+
+    def _comparar(self, **kwargs):
+        from fiscal.nfe_xml import serializar_nfe_pynfe
+        from fiscal.nfe_xml_nativo import serializar_nfe
+
+        esperado = _c14n(serializar_nfe_pynfe(_dados_nfe(**kwargs)))
+        self.assertEqual(_c14n(serializar_nfe(_dados_nfe(**kwargs))), esperado)
+        return esperado
+
+    def test_equivalente_ao_pynfe_por_cst(self):
+        cenarios = list(self.CENARIOS.values()) + [
+            dict(pis_cst='07'),
+            dict(simples=False, csts=('41', '50'), pis_cst='03'),
+            dict(simples=False, csts=('00',), pis_cst='99'),
+        ]
+        for cenario in cenarios:
+            with self.subTest(**cenario):
+                self._comparar(quantidade_itens=7, **cenario)
+
+    def test_equivalente_ao_pynfe_por_quantidade_de_itens(self):
+        for quantidade in (1, 10, 990):
+            with self.subTest(itens=quantidade):
+                xml = self._comparar(quantidade_itens=quantidade)
+                self.assertIn(f'<det nItem="{quantidade}">'.encode(), xml)
+
+    def test_arquivos_de_referencia(self):
+        import os
+        from lxml import etree
+        from fiscal.nfe_xml_nativo import serializar_nfe
+
+        parser = etree.XMLParser(remove_blank_text=True)
+        pasta = os.path.join(os.path.dirname(__file__), 'testdata')
+        for nome, cenario in self.CENARIOS.items():
+            with self.subTest(cenario=nome):
+                referencia = etree.parse(os.path.join(pasta, f'nfe_{nome}.xml'), parser).getroot()
+                self.assertEqual(
+                    _c14n(serializar_nfe(_dados_nfe(quantidade_itens=7, **cenario))),
+                    _c14n(referencia),
+                )
+
+    def test_totais_em_uma_passada(self):
+        from lxml import etree
+        from fiscal.nfe_xml_nativo import chave_acesso, serializar_nfe
+
+        raiz = etree.fromstring(etree.tostring(serializar_nfe(_dados_nfe(3, simples=False, csts=('00',)))))
+        ns = {'n': 'http://www.portalfiscal.inf.br/nfe'}
+        total = raiz.find('.//n:ICMSTot', ns)
+        # 2 x 13,34 + 1,5 x 14,34 + 2 x 15,34 - 1,00 de desconto no 3º item
+        self.assertEqual(total.findtext('n:vProd', namespaces=ns), '78.87')
+        self.assertEqual(total.findtext('n:vDesc', namespaces=ns), '1.00')
+        self.assertEqual(total.findtext('n:vNF', namespaces=ns), '77.87')
+        self.assertEqual(raiz.findtext('.//n:detPag/n:vPag', namespaces=ns), '77.87')
+        chave = chave_acesso(_dados_nfe(0))
+        self.assertEqual(raiz.find('n:infNFe', ns).get('Id'), f'NFe{chave}')
+        self.assertEqual(chave[-1], raiz.findtext('.//n:cDV', namespaces=ns))
+
+
+class TestPrepararDadosNFe(TestCase):
+    """preparar_dados_nfe: itens lidos em blocos e parâmetros fiscais numa consulta."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from pessoas.models import Cliente
+        from produtos.models import CategoriaProduto, Produto, ProdutoParametrosEmpresa
+        from vendas.models import CondicaoPagamento, PedidoVenda
+        from fiscal.models import NotaFiscalSaida
+
+        empresa = Empresa.objects.create(
+            nome_fantasia='Empresa XML',
+            razao_social='Empresa XML LTDA',
+            cnpj='33445566000173',
+        )
+        loja = Loja.objects.create(empresa=empresa, nome='Loja XML', codigo_ibge_municipio='2927408', uf='BA')
+        ConfiguracaoFiscalLoja.objects.create(
+            loja=loja,
+            cnpj='33445566000173',
+            inscricao_estadual='123456789',
+            regime_tributario='LUCRO_PRESUMIDO',
+        )
+        cliente = Cliente.objects.create(
+            empresa=empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Cliente XML',
+            cpf_cnpj='12345678909',
+        )
+        condicao = CondicaoPagamento.objects.create(
+            empresa=empresa,
+            nome='À vista',
+            numero_parcelas=1,
+            dias_entre_parcelas=0,
+        )
+        pedido = PedidoVenda.objects.create(
+            loja=loja,
+            cliente=cliente,
+            tipo_venda='BALCAO',
+            vendedor=get_user_model().objects.create_user('fiscal_xml', password='secret123'),
+            condicao_pagamento=condicao,
+        )
+        categoria = CategoriaProduto.objects.create(nome='Cat XML')
+        dados = []
+        for i in range(12):
+            produto = Produto.objects.create(
+                categoria=categoria,
+                descricao=f'Produto xml {i}',
+                classe_risco='1.4G',
+                ncm='36041000',
+            )
+            ProdutoParametrosEmpresa.objects.create(
+                empresa=empresa,
+                produto=produto,
+                preco_venda=Decimal('10.00'),
+                cfop_venda_dentro_uf='5102',
+                csosn_cst='00' if i % 2 else '40',
+            )
+            dados.append({
+                'produto': produto,
+                'quantidade': Decimal('1.000') + i,
+                'preco_unitario': Decimal('10.00'),
+            })
+        pedido.adicionar_itens(dados)
+        self.nota = NotaFiscalSaida.objects.create(
+            loja=loja,
+            cliente=cliente,
+            pedido_venda=pedido,
+            tipo_documento='NFE',
+            numero=55,
+            serie='001',
+            valor_total=pedido.valor_total,
+        )
+
+    def test_itens_em_uma_consulta(self):
+        from fiscal.nfe_xml import preparar_dados_nfe
+
+        dados = preparar_dados_nfe(self.nota)
+        # Itens + produtos numa consulta (parâmetros já carregados)
+        with self.assertNumQueries(1):
+            itens = list(dados['itens'])
+        self.assertEqual([i['numero_item'] for i in itens], list(range(1, 13)))
+        self.assertEqual(itens[1]['icms_cst'], '00')
+        self.assertEqual(itens[1]['icms_valor'], Decimal('3.60'))
+
+    def test_xml_da_nota_equivalente_ao_pynfe(self):
+        from fiscal.nfe_xml import preparar_dados_nfe, serializar_nfe_pynfe
+        from fiscal.nfe_xml_nativo import serializar_nfe
+
+        dados = preparar_dados_nfe(self.nota)
+        referencia = preparar_dados_nfe(self.nota)
+        referencia['codigo_numerico'] = dados['codigo_numerico']
+        self.assertEqual(_c14n(serializar_nfe(dados)), _c14n(serializar_nfe_pynfe(referencia)))
+
+    def test_produto_sem_parametros(self):
+        from produtos.models import ProdutoParametrosEmpresa
+        from fiscal.nfe_xml import preparar_dados_nfe
+        from fiscal.nfe_xml_nativo import serializar_nfe
+
+        ProdutoParametrosEmpresa.objects.filter(produto__descricao='Produto xml 5').delete()
+        with self.assertRaisesMessage(ValueError, 'não possui parâmetros fiscais'):
+            serializar_nfe(preparar_dados_nfe(self.nota))
+
+
+class TestArmazenamentoXML(TestCase):
+    """XML fiscal em arquivo comprimido por SHA-256; a linha guarda hash e tamanho."""
+
+    XML = (
+        '<NFe xmlns="http://www.portalfiscal.inf.br/nfe">'
+        '<infNFe Id="NFe29261033445566000173550010000000011000000010" versao="4.00">'
+        '<ide><nNF>1</nNF><xNatOp>Venda de fogos</xNatOp></ide></infNFe></NFe>'
+    )
+
+    def setUp(self):
+        from pessoas.models import Cliente
+
+        empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Arquivo',
+            razao_social='Empresa Arquivo LTDA',
+            cnpj='33445566000173',
+        )
+        self.loja = Loja.objects.create(empresa=empresa, nome='Loja Arquivo')
+        self.cliente = Cliente.objects.create(
+            empresa=empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Cliente Arquivo',
+            cpf_cnpj='12345678909',
+        )
+
+    def _nota(self, numero, xml):
+        from fiscal.models import NotaFiscalSaida
+
+        return NotaFiscalSaida.objects.create(
+            loja=self.loja,
+            cliente=self.cliente,
+            tipo_documento='NFE',
+            numero=numero,
+            serie='001',
+            valor_total=Decimal('10.00'),
+            xml_arquivo=xml,
+        )
+
+    def test_linha_guarda_so_hash_e_tamanho(self):
+        import hashlib
+        from fiscal.models import NotaFiscalSaida
+
+        nota = self._nota(1, self.XML)
+        linha = NotaFiscalSaida.objects.values('xml_arquivo_sha256', 'xml_tamanho', 'xml_legado').get(pk=nota.pk)
+        self.assertEqual(linha, {
+            'xml_arquivo_sha256': hashlib.sha256(self.XML.encode()).hexdigest(),
+            'xml_tamanho': len(self.XML.encode()),
+            'xml_legado': None,
+        })
+        self.assertEqual(NotaFiscalSaida.objects.get(pk=nota.pk).xml_arquivo, self.XML)
+
+    def test_carrega_sob_demanda_e_acompanha_refresh(self):
+        from fiscal.models import NotaFiscalSaida
+
+        nota = self._nota(1, self.XML)
+        lida = NotaFiscalSaida.objects.get(pk=nota.pk)
+        self.assertNotIn('_xml_arquivo_cache', lida.__dict__)
+        with self.assertNumQueries(0):
+            self.assertEqual(lida.xml_arquivo, self.XML)
+
+        nota.xml_arquivo = self.XML.replace('<nNF>1</nNF>', '<nNF>2</nNF>')
+        nota.save(update_fields=['xml_arquivo', 'xml_tamanho'])
+        lida.refresh_from_db()
+        self.assertIn('<nNF>2</nNF>', lida.xml_arquivo)
+
+    def test_conteudo_igual_gravado_uma_vez(self):
+        from fiscal.armazenamento_xml import _storage
+
+        primeira = self._nota(1, self.XML)
+        segunda = self._nota(2, self.XML)
+        self.assertEqual(primeira.xml_arquivo_sha256, segunda.xml_arquivo_sha256)
+        sha = primeira.xml_arquivo_sha256
+        self.assertEqual(len(_storage().listdir(f'{sha[:2]}/{sha[2:4]}')[1]), 1)
+
+    def test_arquivo_corrompido(self):
+        import gzip
+        from fiscal.armazenamento_xml import _storage, carregar_xml
+
+        with self.settings(FISCAL_XML_COMPRESSAO='gzip'):
+            nota = self._nota(1, self.XML)
+        sha = nota.xml_arquivo_sha256
+        with open(_storage().path(f'{sha[:2]}/{sha[2:4]}/{sha}.xml.gz'), 'wb') as arquivo:
+            arquivo.write(gzip.compress(self.XML.replace('fogos', 'outro').encode()))
+        with self.assertRaisesMessage(ValueError, 'corrompido'):
+            carregar_xml(sha)
+
+    def test_migrar_xml_legado(self):
+        from django.core.management import call_command
+        from fiscal.models import NotaFiscalSaida
+
+        legada = self._nota(1, None)
+        vazia = self._nota(2, None)
+        NotaFiscalSaida.objects.filter(pk=legada.pk).update(xml_legado=self.XML)
+        NotaFiscalSaida.objects.filter(pk=vazia.pk).update(xml_legado='')
+        self.assertEqual(NotaFiscalSaida.objects.get(pk=legada.pk).xml_arquivo, self.XML)
+
+        call_command('migrar_xml_fiscal', batch_size=1, stdout=io.StringIO())
+
+        legada = NotaFiscalSaida.objects.get(pk=legada.pk)
+        self.assertIsNone(legada.xml_legado)
+        self.assertEqual(legada.xml_tamanho, len(self.XML.encode()))
+        self.assertEqual(legada.xml_arquivo, self.XML)
+        vazia = NotaFiscalSaida.objects.get(pk=vazia.pk)
+        self.assertEqual((vazia.xml_arquivo_sha256, vazia.xml_legado), (None, None))
+
+    def test_sem_armazenamento_duravel_linha_guarda_copia(self):
+        import shutil
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from fiscal.models import NotaFiscalSaida
+
+        with self.settings(FISCAL_XML_DURAVEL=False):
+            nota = self._nota(1, self.XML)
+            self.assertEqual(NotaFiscalSaida.objects.get(pk=nota.pk).xml_legado, self.XML)
+
+            # Arquivos perdidos num deploy: a cópia da linha é usada
+            from django.conf import settings
+            shutil.rmtree(settings.FISCAL_XML_DIR)
+            self.assertEqual(NotaFiscalSaida.objects.get(pk=nota.pk).xml_arquivo, self.XML)
+
+            with self.assertRaisesMessage(CommandError, 'FISCAL_XML_DURAVEL'):
+                call_command('migrar_xml_fiscal', stdout=io.StringIO())
+            self.assertEqual(NotaFiscalSaida.objects.get(pk=nota.pk).xml_legado, self.XML)
+
+        # Cópia de outro XML (desatualizada) não é servida no lugar do arquivo
+        NotaFiscalSaida.objects.filter(pk=nota.pk).update(xml_legado=self.XML.replace('fogos', 'outro'))
+        with self.assertRaises(FileNotFoundError):
+            NotaFiscalSaida.objects.get(pk=nota.pk).xml_arquivo
+
+    def test_xml_vazio_limpa_coluna_legada(self):
+        from fiscal.models import NotaFiscalSaida
+
+        nota = self._nota(1, self.XML)
+        NotaFiscalSaida.objects.filter(pk=nota.pk).update(xml_legado=self.XML)
+        nota = NotaFiscalSaida.objects.get(pk=nota.pk)
+        nota.xml_arquivo = ''
+        nota.save()
+
+        nota = NotaFiscalSaida.objects.get(pk=nota.pk)
+        self.assertIsNone(nota.xml_legado)
+        self.assertFalse(nota.xml_arquivo)
+
+
+def _xml_nfe_entrada(numero, itens=2):
+    """XML de NF-e de fornecedor (nfeProc) com ``itens`` itens de R$ 10,00."""
+    chave = f'2926061122334400019155001{numero:09d}1{numero:08d}0'
+    dets = ''.join(
+        f'<det nItem="{i}"><prod><cProd>F{i:03d}</cProd><cEAN>789{i:010d}</cEAN>'
+        f'<xProd>Bombinha {i}</xProd><NCM>36041000</NCM><uCom>CX</uCom><qCom>2.0000</qCom>'
+        f'<vUnCom>5.0000000000</vUnCom><vProd>10.00</vProd></prod></det>'
+        for i in range(1, itens + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe>'
+        f'<infNFe Id="NFe{chave}" versao="4.00">'
+        f'<ide><serie>1</serie><nNF>{numero}</nNF><dhEmi>2026-06-10T09:00:00-03:00</dhEmi></ide>'
+        '<emit><CNPJ>11223344000191</CNPJ><xNome>Fogos Fornecedor LTDA</xNome></emit>'
+        f'{dets}<total><ICMSTot><vNF>{itens * 10}.00</vNF></ICMSTot></total>'
+        f'</infNFe></NFe><protNFe versao="4.00"><infProt><chNFe>{chave}</chNFe></infProt></protNFe></nfeProc>'
+    ), chave
+
+
+class TestImportacaoXMLLote(TestCase):
+    """Importação de vários XML/.zip: leitura em processos, status por arquivo, sem reler o XML."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Lote',
+            razao_social='Empresa Lote LTDA',
+            cnpj='33445566000173',
+        )
+        self.loja = Loja.objects.create(empresa=self.empresa, nome='Loja Lote')
+
+    def _upload(self, nome, conteudo):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return SimpleUploadedFile(nome, conteudo.encode() if isinstance(conteudo, str) else conteudo)
+
+    def _zip(self, nome, arquivos):
+        import zipfile
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as pacote:
+            for interno, conteudo in arquivos.items():
+                pacote.writestr(interno, conteudo)
+        return self._upload(nome, buffer.getvalue())
+
+    def _nota_cadastrada(self, chave):
+        from pessoas.models import Fornecedor
+        from fiscal.models import NotaFiscalEntrada
+
+        fornecedor = Fornecedor.objects.create(empresa=self.empresa, razao_social='Forn', cnpj='11223344000191')
+        NotaFiscalEntrada.objects.create(
+            loja=self.loja, fornecedor=fornecedor, numero=9, serie='1', chave_acesso=chave,
+            valor_total=Decimal('20.00'), data_emissao='2026-06-10', data_entrada='2026-06-10',
+        )
+
+    def test_ler_nfe(self):
+        from fiscal.import_nfe import parse_nfe_xml
+
+        xml, chave = _xml_nfe_entrada(7, itens=3)
+        dados = parse_nfe_xml('﻿' + xml)
+        self.assertEqual((dados['chave_acesso'], dados['numero'], dados['serie']), (chave, 7, '1'))
+        self.assertEqual(dados['valor_total'], Decimal('30.00'))
+        self.assertEqual(dados['cnpj_emitente'], '11223344000191')
+        self.assertEqual([i['numero_item'] for i in dados['itens']], [1, 2, 3])
+        self.assertEqual(dados['itens'][0]['codigo_barras'], '7890000000001')
+        self.assertEqual(dados['itens'][0]['quantidade'], Decimal('2.0000'))
+        with self.assertRaisesMessage(ValueError, 'soma dos produtos'):
+            parse_nfe_xml(xml.replace('<vNF>30.00</vNF>', '<vNF>31.00</vNF>'))
+
+    def test_status_por_arquivo(self):
+        from fiscal.armazenamento_xml import carregar_xml
+        from fiscal.import_nfe_lote import importar_arquivos
+        from fiscal.storage_nfe import carregar_dados_temporarios
+
+        nova, _ = _xml_nfe_entrada(1)
+        cadastrada, chave_cadastrada = _xml_nfe_entrada(2)
+        self._nota_cadastrada(chave_cadastrada)
+        pacote = self._zip('fornecedor.zip', {
+            'junho/nota1.xml': nova,
+            'junho/nota1-copia.xml': nova,
+            'leia-me.txt': 'x',
+            'quebrada.xml': '<nfeProc>',
+        })
+
+        with self.assertNumQueries(1):
+            lote = importar_arquivos([pacote, self._upload('nota2.xml', cadastrada)])
+        status = {r['arquivo']: r['status'] for r in lote['arquivos']}
+        self.assertEqual(status, {
+            'fornecedor.zip/nota1.xml': 'PRONTA',
+            'fornecedor.zip/nota1-copia.xml': 'REPETIDA',
+            'fornecedor.zip/quebrada.xml': 'ERRO',
+            'nota2.xml': 'DUPLICADA',
+            'fornecedor.zip/leia-me.txt': 'ERRO',
+        })
+
+        pronta = lote['arquivos'][0]
+        dados = carregar_dados_temporarios(pronta['key'])
+        self.assertNotIn('xml_arquivo', dados)
+        self.assertEqual(dados['valor_total'], Decimal('20.00'))
+        self.assertEqual(carregar_xml(dados['xml_sha256']), nova)
+
+    def test_limites_conferidos_antes_de_expandir_o_zip(self):
+        import zipfile
+        from unittest import mock
+        from fiscal.import_nfe_lote import extrair_arquivos
+
+        pacote = self._zip('muitos.zip', {f'n{i}.xml': 'x' * 80 for i in range(5)})
+        with mock.patch('fiscal.import_nfe_lote.MAX_ARQUIVOS', 2), \
+                mock.patch.object(zipfile.ZipFile, 'read', autospec=True, side_effect=zipfile.ZipFile.read) as leitura:
+            with self.assertRaisesMessage(ValueError, 'no máximo 2 XML'):
+                extrair_arquivos([pacote])
+        self.assertEqual(leitura.call_count, 2)
+
+        pacote.seek(0)
+        with mock.patch('fiscal.import_nfe_lote.MAX_TAMANHO_TOTAL', 100), \
+                mock.patch.object(zipfile.ZipFile, 'read', autospec=True, side_effect=zipfile.ZipFile.read) as leitura:
+            with self.assertRaisesMessage(ValueError, 'MB de XML'):
+                extrair_arquivos([pacote])
+        self.assertEqual(leitura.call_count, 1)
+
+    def test_membro_corrompido_do_zip_vira_erro_do_arquivo(self):
+        import zipfile
+        from fiscal.import_nfe_lote import extrair_arquivos
+
+        nova, _ = _xml_nfe_entrada(1)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+            pacote.writestr('boa.xml', nova)
+            pacote.writestr('ruim.xml', 'x' * 1000)
+        dados = bytearray(buffer.getvalue())
+        with zipfile.ZipFile(io.BytesIO(bytes(dados))) as pacote:
+            info = pacote.getinfo('ruim.xml')
+        # Corrompe o fluxo deflate do segundo membro (o diretório central continua válido)
+        inicio = info.header_offset + 30 + len(info.filename)
+        dados[inicio:inicio + 4] = b'\xff\xff\xff\xff'
+
+        arquivos, recusados = extrair_arquivos([self._upload('fornecedor.zip', bytes(dados))])
+        self.assertEqual([nome for nome, _ in arquivos], ['fornecedor.zip/boa.xml'])
+        self.assertEqual(recusados, [{
+            'arquivo': 'fornecedor.zip/ruim.xml',
+            'status': 'ERRO',
+            'mensagem': 'Arquivo corrompido ou ilegível dentro do .zip.',
+        }])
+
+    def test_leitura_em_processos(self):
+        from fiscal.import_nfe_lote import ler_arquivos
+
+        arquivos = [(f'n{i}.xml', _xml_nfe_entrada(i)[0].encode()) for i in range(1, 9)]
+        arquivos.append(('ruim.xml', b'<x'))
+        self.assertEqual(ler_arquivos(arquivos, processos=2), ler_arquivos(arquivos, processos=1))
+
+    def test_confirmacao_usa_dados_do_upload(self):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from core.models import UsuarioEmpresa
+        from core.tenant import SESSION_KEY
+        from pessoas.models import Fornecedor
+        from fiscal.models import NotaFiscalEntrada
+
+        usuario = get_user_model().objects.create_user('importador', password='secret123')
+        UsuarioEmpresa.objects.create(user=usuario, empresa=self.empresa)
+        self.client.force_login(usuario)
+        session = self.client.session
+        session[SESSION_KEY] = self.empresa.pk
+        session.save()
+        fornecedor = Fornecedor.objects.create(empresa=self.empresa, razao_social='Forn', cnpj='11223344000191')
+
+        primeira, chave = _xml_nfe_entrada(1)
+        segunda, _ = _xml_nfe_entrada(2)
+        resposta = self.client.post('/fiscal/notas-entrada/importar-xml/', {
+            'arquivo_xml': [self._upload('a.xml', primeira), self._upload('b.xml', segunda)],
+        })
+        self.assertRedirects(resposta, '/fiscal/notas-entrada/importar-xml/lote/')
+        resposta = self.client.get('/fiscal/notas-entrada/importar-xml/lote/')
+        key = resposta.context['arquivos'][0]['key']
+
+        with mock.patch('fiscal.import_nfe.ler_nfe', side_effect=AssertionError('XML relido')):
+            resposta = self.client.get(f'/fiscal/notas-entrada/importar-xml/confirmar/?arquivo={key}')
+            self.assertEqual(resposta.context['dados']['chave_acesso'], chave)
+            resposta = self.client.post('/fiscal/notas-entrada/importar-xml/', {
+                'confirmar_import': '1', 'loja': self.loja.pk, 'fornecedor': fornecedor.pk,
+            })
+        self.assertRedirects(resposta, '/fiscal/notas-entrada/importar-xml/lote/')
+
+        nota = NotaFiscalEntrada.objects.get(chave_acesso=chave)
+        self.assertEqual(nota.xml_arquivo, primeira)
+        self.assertEqual(nota.itens.count(), 2)
+        arquivos = self.client.get('/fiscal/notas-entrada/importar-xml/lote/').context['arquivos']
+        self.assertEqual([a['status'] for a in arquivos], ['IMPORTADA', 'PRONTA'])
+
+
+class TestCasamentoProdutosLote(TestCase):
+    """casar_itens_em_lote: códigos em duas consultas IN e sugestões ranqueadas por similaridade."""
+
+    def setUp(self):
+        from pessoas.models import Fornecedor
+        from produtos.models import CategoriaProduto, CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Casamento',
+            razao_social='Empresa Casamento LTDA',
+            cnpj='33445566000173',
+        )
+        outra = Empresa.objects.create(nome_fantasia='Outra', razao_social='Outra LTDA', cnpj='11444777000161')
+        self.fornecedor = Fornecedor.objects.create(
+            empresa=self.empresa, razao_social='Fornecedor', cnpj='11223344000191',
+        )
+        categoria = CategoriaProduto.objects.create(nome='Cat Casamento')
+        self.produtos = {}
+        for nome, ncm, ean, empresa in [
+            ('Bombinha Treme Terra 12 un', '3604.10.00', '7891000000011', self.empresa),
+            ('Bombinha Treme Terra 24 un', '3604.10.00', None, self.empresa),
+            ('Vulcão Colorido Grande', '3604.10.00', None, self.empresa),
+            ('Vulcão Colorido Pequeno', '3604.90.00', None, self.empresa),
+            ('Vela Vulcão Colorido', '3406.00.00', None, self.empresa),
+            ('Vulcão Colorido Outra Empresa', '3604.10.00', '7891000000028', outra),
+        ]:
+            produto = Produto.objects.create(
+                categoria=categoria, descricao=nome, classe_risco='1.4G', ncm=ncm, codigo_barras=ean,
+            )
+            ProdutoParametrosEmpresa.objects.create(empresa=empresa, produto=produto, preco_venda=Decimal('10.00'))
+            self.produtos[nome] = produto
+        CodigoBarrasAlternativo.objects.create(
+            produto=self.produtos['Bombinha Treme Terra 24 un'], codigo_barras='7891000000035',
+        )
+        CodigoBarrasAlternativo.objects.create(
+            produto=self.produtos['Vulcão Colorido Grande'], codigo_barras='VCG-01', fornecedor=self.fornecedor,
+        )
+
+    def test_codigos_em_duas_consultas(self):
+        from fiscal.produto_matching import casar_itens_em_lote
+
+        itens = [
+            {'codigo_barras': '7891000000011'},  # EAN principal
+            {'codigo_barras': '7891000000035'},  # EAN alternativo
+            {'codigo_produto_fornecedor': 'VCG-01'},  # código do fornecedor
+            {'codigo_produto_fornecedor': '7891000000035'},  # cProd usado como EAN
+            {'codigo_barras': '7891000000028'},  # produto de outra empresa
+        ]
+        with self.assertNumQueries(2):
+            resultados = casar_itens_em_lote(itens, self.fornecedor, self.empresa)
+        self.assertEqual([r.status for r in resultados], ['VINCULADO'] * 4 + ['NAO_VINCULADO'])
+        self.assertEqual([r.produto.descricao for r in resultados[:4]], [
+            'Bombinha Treme Terra 12 un',
+            'Bombinha Treme Terra 24 un',
+            'Vulcão Colorido Grande',
+            'Bombinha Treme Terra 24 un',
+        ])
+
+    def test_sugestoes_ranqueadas_por_similaridade(self):
+        from fiscal.produto_matching import casar_itens_em_lote
+
+        itens = [
+            {'ncm': '36041000', 'descricao': 'VULCAO COLORIDO GRD'},
+            {'ncm': '36041000', 'descricao': 'BOMBINHA TREME-TERRA C/24'},
+            {'ncm': '36041000', 'descricao': 'Foguete 12 tiros'},
+            {'ncm': '36041000', 'descricao': 'Bombinha Treme Terra 12 un', 'codigo_barras': '7891000000011'},
+        ]
+        # Duas consultas de códigos + catálogo da empresa numa consulta, para todos os itens
+        with self.assertNumQueries(3):
+            vulcao, bombinha, foguete, vinculado = casar_itens_em_lote(itens, None, self.empresa)
+
+        self.assertEqual(vulcao.status, 'AGUARDANDO_CONFIRMACAO')
+        self.assertIsNone(vulcao.produto)
+        nomes = [p.descricao for p, _ in vulcao.candidatos]
+        # Mesmo NCM (4 dígitos) e empresa; NCM completo igual desempata
+        self.assertEqual(nomes[:2], ['Vulcão Colorido Grande', 'Vulcão Colorido Pequeno'])
+        self.assertNotIn('Vela Vulcão Colorido', nomes)
+        self.assertNotIn('Vulcão Colorido Outra Empresa', nomes)
+        similaridades = [s for _, s in vulcao.candidatos]
+        self.assertEqual(similaridades, sorted(similaridades, reverse=True))
+        self.assertEqual(vulcao.produto_sugerido, vulcao.candidatos[0][0])
+
+        self.assertEqual(bombinha.produto_sugerido.descricao, 'Bombinha Treme Terra 24 un')
+        self.assertEqual((foguete.status, foguete.candidatos), ('NAO_VINCULADO', []))
+        self.assertEqual(vinculado.status, 'VINCULADO')
+
+
+class TestEntradaEstoqueNota(TestCase):
+    """dar_entrada_estoque_nota: validação por item, movimentos e custo médio em lote."""
+
+    def setUp(self):
+        from pessoas.models import Fornecedor
+        from produtos.models import CategoriaProduto, Produto, ProdutoParametrosEmpresa
+        from estoque.models import LocalEstoque
+
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='Empresa Entrada',
+            razao_social='Empresa Entrada LTDA',
+            cnpj='33445566000173',
+        )
+        self.loja = Loja.objects.create(empresa=self.empresa, nome='Loja Entrada')
+        self.local = LocalEstoque.objects.create(loja=self.loja, nome='Depósito')
+        self.fornecedor = Fornecedor.objects.create(
+            empresa=self.empresa, razao_social='Fornecedor', cnpj='11223344000191',
+        )
+        categoria = CategoriaProduto.objects.create(nome='Cat Entrada')
+        self.produtos = []
+        for i in range(3):
+            produto = Produto.objects.create(
+                categoria=categoria, descricao=f'Produto entrada {i}', classe_risco='1.4G', ncm='36041000',
+            )
+            ProdutoParametrosEmpresa.objects.create(empresa=self.empresa, produto=produto, preco_venda=Decimal('10'))
+            self.produtos.append(produto)
+
+    def _nota(self, linhas):
+        from fiscal.models import ItemNotaFiscalEntrada, NotaFiscalEntrada
+
+        numero_nota = NotaFiscalEntrada.objects.count() + 1
+        nota = NotaFiscalEntrada.objects.create(
+            loja=self.loja, fornecedor=self.fornecedor, numero=numero_nota, serie='1',
+            chave_acesso=f'{numero_nota:044d}',
+            valor_total=sum(q * p for _produto, q, p in linhas),
+            data_emissao='2026-06-10', data_entrada='2026-06-10',
+        )
+        for numero, (produto, quantidade, preco) in enumerate(linhas, start=1):
+            ItemNotaFiscalEntrada.objects.create(
+                nota_fiscal=nota, produto=produto, numero_item=numero, descricao=f'Item {numero}',
+                quantidade=quantidade, preco_unitario=preco, valor_total=quantidade * preco,
+                status='VINCULADO' if produto else 'NAO_VINCULADO',
+            )
+        return nota
+
+    def test_linhas_do_mesmo_produto_combinam_custo_medio(self):
+        from estoque.models import EstoqueAtual, EstoqueValorado
+        from estoque.services import realizar_movimento_estoque
+        from fiscal.services_entrada import dar_entrada_estoque_nota
+
+        bombinha, vulcao, _ = self.produtos
+        realizar_movimento_estoque(
+            produto=bombinha, tipo_movimento='ENTRADA', quantidade=Decimal('10'),
+            local_destino=self.local, custo_unitario=Decimal('3.00'),
+        )
+        nota = self._nota([
+            (bombinha, Decimal('10'), Decimal('5.00')),
+            (vulcao, Decimal('5'), Decimal('2.00')),
+            (bombinha, Decimal('30'), Decimal('9.00')),
+            (None, Decimal('1'), Decimal('1.00')),
+            (vulcao, Decimal('0'), Decimal('2.00')),
+        ])
+
+        processados, erros, motivo = dar_entrada_estoque_nota(nota, self.local, None)
+
+        self.assertEqual(processados, 3)
+        self.assertEqual(len(erros), 1)
+        self.assertIn('Item 5', erros[0])
+        self.assertEqual(motivo, 'PARCIAL_COM_ERRO')
+        nota.refresh_from_db()
+        self.assertEqual(nota.status, 'ESTOQUE_PARCIAL')
+        self.assertEqual(
+            list(nota.itens.order_by('numero_item').values_list('status', flat=True)),
+            ['ESTOQUE_ENTRADO', 'ESTOQUE_ENTRADO', 'ESTOQUE_ENTRADO', 'NAO_VINCULADO', 'VINCULADO'],
+        )
+        ev = EstoqueValorado.objects.get(empresa=self.empresa, produto=bombinha)
+        # (10*3 + 10*5 + 30*9) / 50
+        self.assertEqual((ev.custo_medio, ev.quantidade_total), (Decimal('7.0000'), Decimal('50.000')))
+        self.assertEqual(EstoqueAtual.objects.get(produto=bombinha, local_estoque=self.local).quantidade, 50)
+        self.assertEqual(EstoqueValorado.objects.get(produto=vulcao).custo_medio, Decimal('2.0000'))
+
+        # Repetir não lança de novo os itens já entrados
+        self.assertEqual(dar_entrada_estoque_nota(nota, self.local, None)[0], 0)
+        self.assertEqual(EstoqueAtual.objects.get(produto=bombinha, local_estoque=self.local).quantidade, 50)
+
+    def test_consultas_nao_crescem_com_itens(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fiscal.services_entrada import dar_entrada_estoque_nota
+
+        pequena = self._nota([(self.produtos[0], Decimal('1'), Decimal('1.00'))])
+        grande = self._nota([(p, Decimal(n + 1), Decimal('2.00')) for n in range(10) for p in self.produtos[1:]])
+        with CaptureQueriesContext(connection) as poucos:
+            dar_entrada_estoque_nota(pequena, self.local, None)
+        with CaptureQueriesContext(connection) as muitos:
+            self.assertEqual(dar_entrada_estoque_nota(grande, self.local, None)[0], 20)
+        self.assertEqual(len(muitos), len(poucos))
+
+
+class TestCachePDF(TestCase):
+    """DANFE de NF-e autorizada renderizado uma vez, servido do cache com ETag."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from core.models import UsuarioEmpresa
+        from core.tenant import SESSION_KEY
+        from pessoas.models import Cliente
+        from fiscal.models import NotaFiscalSaida
+
+        empresa = Empresa.objects.create(
+            nome_fantasia='Empresa PDF',
+            razao_social='Empresa PDF LTDA',
+            cnpj='33445566000173',
+        )
+        loja = Loja.objects.create(empresa=empresa, nome='Loja PDF')
+        cliente = Cliente.objects.create(
+            empresa=empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Cliente PDF',
+            cpf_cnpj='12345678909',
+        )
+        self.nota = NotaFiscalSaida.objects.create(
+            loja=loja,
+            cliente=cliente,
+            tipo_documento='NFE',
+            numero=7,
+            serie='001',
+            valor_total=Decimal('10.00'),
+            status='AUTORIZADA',
+        )
+        self.url = f'/fiscal/nfe/{self.nota.pk}/pdf/'
+        usuario = get_user_model().objects.create_user('impressor', password='secret123')
+        UsuarioEmpresa.objects.create(user=usuario, empresa=empresa)
+        self.client.force_login(usuario)
+        session = self.client.session
+        session[SESSION_KEY] = empresa.pk
+        session.save()
+
+    def _get(self, gerar, **headers):
+        from unittest import mock
+
+        with mock.patch('fiscal.views.gerar_pdf_danfe', gerar), mock.patch('fiscal.views.WEASYPRINT_AVAILABLE', True):
+            return self.client.get(self.url, headers=headers)
+
+    def _conteudo(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_autorizada_renderiza_uma_vez(self):
+        from unittest import mock
+
+        gerar = mock.Mock(return_value=b'%PDF-1.7 danfe')
+        primeira = self._get(gerar)
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(self._conteudo(primeira), b'%PDF-1.7 danfe')
+        etag = primeira['ETag']
+        self.assertIn('no-cache', primeira['Cache-Control'])
+
+        segunda = self._get(gerar)
+        self.assertEqual(self._conteudo(segunda), b'%PDF-1.7 danfe')
+        self.assertEqual(segunda['ETag'], etag)
+        self.assertEqual(gerar.call_count, 1)
+
+        nao_modificado = self._get(gerar, if_none_match=etag)
+        self.assertEqual(nao_modificado.status_code, 304)
+        self.assertEqual(gerar.call_count, 1)
+
+        # Sem WeasyPrint, o PDF já gravado continua disponível
+        with mock.patch('fiscal.views.WEASYPRINT_AVAILABLE', False):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        # Entrada alterada (nota salva): outro hash, nova renderização
+        self.nota.chave_acesso = '29261033445566000173550010000000071000000070'
+        self.nota.save()
+        terceira = self._get(gerar)
+        self.assertNotEqual(terceira['ETag'], etag)
+        self.assertEqual(gerar.call_count, 2)
+
+    def test_nota_nao_autorizada_nao_e_gravada(self):
+        from unittest import mock
+
+        self.nota.status = 'RASCUNHO'
+        self.nota.save()
+        gerar = mock.Mock(return_value=b'%PDF-1.7 rascunho')
+        for _ in range(2):
+            response = self._get(gerar)
+            self.assertEqual(response.content, b'%PDF-1.7 rascunho')
+            self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(gerar.call_count, 2)
+
+    def test_autorizacao_agenda_pre_renderizacao(self):
+        from unittest import mock
+        from fiscal import cache_pdf
+        from fiscal.services import aplicar_retorno_autorizacao
+
+        self.nota.status = 'EM_PROCESSAMENTO'
+        self.nota.save()
+        resultado = {
+            'autorizada': True, 'cStat': '100', 'xMotivo': 'Autorizado', 'nProt': '1',
+            'chNFe': '29261033445566000173550010000000071000000070', 'xml_proc': '<nfeProc/>',
+        }
+        with self.settings(FISCAL_PDF_PRERENDER=True), \
+                mock.patch('fiscal.danfe.WEASYPRINT_AVAILABLE', True), \
+                mock.patch.object(cache_pdf.threading, 'Thread') as thread, \
+                self.captureOnCommitCallbacks(execute=True):
+            aplicar_retorno_autorizacao(self.nota, resultado)
+        thread.assert_called_once_with(target=cache_pdf._prerenderizar_danfe, args=(self.nota.pk,), daemon=True)
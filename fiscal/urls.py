@@ -26,6 +26,7 @@ urlpatterns = [
     path('notas-entrada/criar/', views.criar_nota_entrada, name='criar_nota_entrada'),
     path('notas-entrada/importar-xml/', views.importar_nota_entrada_xml, name='importar_nota_entrada_xml'),
     path('notas-entrada/importar-xml/confirmar/', views.importar_nota_entrada_confirmar, name='importar_nota_entrada_confirmar'),
+    path('notas-entrada/importar-xml/lote/', views.importar_nota_entrada_lote, name='importar_nota_entrada_lote'),
     path('notas-entrada/detalhes/<int:nota_id>/', views.detalhes_nota_entrada, name='detalhes_nota_entrada'),
     path('notas-entrada/detalhes/<int:nota_id>/dar-entrada-estoque/', views.dar_entrada_estoque_nota_view, name='dar_entrada_estoque_nota'),
     
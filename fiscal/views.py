@@ -1,77 +1,30 @@
 """
 Views do módulo fiscal.
 """
-import base64
-import io
 import logging
-import re
 
+from django.conf import settings
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.http import HttpResponse, Http404, JsonResponse
-from django.template.loader import render_to_string
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from . import cache_pdf
+from .armazenamento_xml import armazenamento_duravel, carregar_xml
+from .danfe import WEASYPRINT_AVAILABLE, documento_danfe, gerar_pdf_danfe
 from .models import NotaFiscalSaida, NotaFiscalEntrada, ItemNotaFiscalEntrada, ConfiguracaoFiscalLoja, AlertaNotaFiscal
 from .forms import NotaFiscalEntradaForm, ItemNotaFiscalEntradaFormSet
-from .import_nfe import parse_nfe_xml
 from core.tenant import get_empresa_ativa
 from core.models import Loja
 
 logger = logging.getLogger(__name__)
 
-try:
-    from weasyprint import HTML
-    WEASYPRINT_AVAILABLE = True
-except ImportError:
-    WEASYPRINT_AVAILABLE = False
-
-try:
-    import qrcode
-    QRCODE_AVAILABLE = True
-except ImportError:
-    qrcode = None  # type: ignore[misc, assignment]
-    QRCODE_AVAILABLE = False
-
-
-def _formatar_cnpj(valor) -> str:
-    digitos = re.sub(r'\D', '', str(valor or ''))
-    if len(digitos) == 14:
-        return f'{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}'
-    return digitos or '-'
-
-
-def _formatar_cpf_ou_cnpj(valor) -> str:
-    digitos = re.sub(r'\D', '', str(valor or ''))
-    if len(digitos) == 11:
-        return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
-    if len(digitos) == 14:
-        return f'{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}'
-    return digitos or '-'
-
-
-def _gerar_qrcode_nfe_base64(chave_acesso: str) -> str:
-    if not chave_acesso or not QRCODE_AVAILABLE:
-        return ''
-    url = (
-        'https://www.nfe.fazenda.gov.br/portal/consultaRecaptcha.aspx'
-        '?tipoConsulta=completa&tipoConteudo=XbSeqxE8pl8='
-        f'&nfe={chave_acesso}'
-    )
-    qr = qrcode.QRCode(version=1, box_size=3, border=2)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color='black', back_color='white')
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    return base64.b64encode(buf.getvalue()).decode('utf-8')
-
 
 @login_required
 def lista_notas_saida(request):
@@ -84,7 +37,7 @@ def lista_notas_saida(request):
         loja__empresa=empresa,
     ).select_related(
         'loja', 'cliente', 'pedido_venda', 'evento'
-    )
+    ).defer('xml_legado')
     
     # Filtros
     tipo_documento_filter = request.GET.get('tipo_documento')
@@ -192,9 +145,13 @@ def detalhes_nota_saida(request, nota_id):
     itens_com_impostos = []
     
     if nota.pedido_venda:
-        itens = nota.pedido_venda.itens.filter(is_active=True).select_related('produto')
+        itens = list(nota.pedido_venda.itens.filter(is_active=True).select_related('produto'))
+        # Cálculo em tempo real já traz os impostos por item, na mesma ordem dos itens
+        calculados = impostos.get('itens') or []
+        if len(calculados) != len(itens):
+            calculados = [None] * len(itens)
         
-        for item in itens:
+        for item, impostos_calculados in zip(itens, calculados):
             # Se autorizada, buscar do snapshot
             if nota.status == 'AUTORIZADA' and nota.impostos_snapshot:
                 item_snapshot = next(
@@ -214,6 +171,8 @@ def detalhes_nota_saida(request, nota_id):
                     from fiscal.calculos import calcular_impostos_item
                     regime = config_fiscal.regime_tributario if config_fiscal else None
                     impostos_item = calcular_impostos_item(item, regime, config_fiscal)
+            elif impostos_calculados is not None:
+                impostos_item = impostos_calculados
             else:
                 # Calcular em tempo real
                 from fiscal.calculos import calcular_impostos_item
@@ -284,8 +243,11 @@ def gerar_xml_nota(request, nota_id):
 
 @login_required
 def autorizar_nota(request, nota_id):
-    """Envia NF-e com XML gerado para autorização na SEFAZ (síncrono)."""
-    from .services import autorizar_nfe
+    """
+    Autoriza a NF-e com XML gerado na SEFAZ: pela fila (envio em lote) com
+    settings.NFE_FILA_ATIVA, ou na própria requisição quando não há worker.
+    """
+    from .services import autorizar_nfe, enfileirar_autorizacao_nfe
 
     if not request.user.is_staff:
         raise PermissionDenied
@@ -306,25 +268,46 @@ def autorizar_nota(request, nota_id):
         )
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
+    if not settings.NFE_FILA_ATIVA:
+        try:
+            resultado = autorizar_nfe(nota.id, usuario=request.user)
+            if resultado['autorizada']:
+                ch = resultado.get('chNFe') or ''
+                preview = (ch[:24] + '…') if len(ch) > 24 else ch
+                messages.success(
+                    request,
+                    f'NF-e {nota.numero}/{nota.serie} autorizada. Chave: {preview}',
+                )
+            else:
+                messages.error(
+                    request,
+                    f'NF-e {nota.numero}/{nota.serie} não autorizada '
+                    f'(cStat {resultado["cStat"]}): {resultado["xMotivo"]}',
+                )
+        except (ValueError, ValidationError) as exc:
+            messages.error(request, str(exc))
+        except Exception as exc:
+            messages.error(request, f'Erro ao autorizar: {exc}')
+            logger.exception('Erro ao autorizar nota %s', nota_id)
+        return redirect(request.META.get('HTTP_REFERER', '/'))
+
     try:
-        resultado = autorizar_nfe(nota.id, usuario=request.user)
-        if resultado['autorizada']:
-            ch = resultado.get('chNFe') or ''
-            preview = (ch[:24] + '…') if len(ch) > 24 else ch
-            messages.success(
+        item = enfileirar_autorizacao_nfe(nota.id, usuario=request.user)
+        if item.status == 'EM_LOTE':
+            messages.info(
                 request,
-                f'NF-e {nota.numero}/{nota.serie} autorizada. Chave: {preview}',
+                f'NF-e {nota.numero}/{nota.serie} já foi enviada em lote; aguardando retorno da SEFAZ.',
             )
         else:
-            messages.error(
+            messages.success(
                 request,
-                f'NF-e {nota.numero}/{nota.serie} não autorizada '
-                f'(cStat {resultado["cStat"]}): {resultado["xMotivo"]}',
+                f'NF-e {nota.numero}/{nota.serie} enviada para a fila de autorização. '
+                'O status é atualizado quando a SEFAZ processar o lote.',
             )
     except (ValueError, ValidationError) as exc:
         messages.error(request, str(exc))
     except Exception as exc:
-        messages.error(request, f'Erro ao autorizar: {exc}')
+        messages.error(request, f'Erro ao enfileirar: {exc}')
         logger.exception('Erro ao autorizar nota %s', nota_id)
 
     return redirect(request.META.get('HTTP_REFERER', '/'))
@@ -394,7 +377,7 @@ def lista_notas_entrada(request):
         loja__empresa=empresa,
     ).select_related(
         'loja', 'fornecedor'
-    )
+    ).defer('xml_legado')
     
     # Filtros
     loja_filter = request.GET.get('loja')
@@ -630,14 +613,16 @@ def criar_nota_entrada(request):
 @require_http_methods(['GET', 'POST'])
 def importar_nota_entrada_xml(request):
     """
-    Importação de Nota Fiscal de Entrada a partir de arquivo XML.
-    Passo 1: Upload do XML -> salva em tmp, chave na sessão.
+    Importação de Nota Fiscal de Entrada a partir de arquivos XML.
+    Passo 1: Upload de um ou mais XML (ou .zip) -> dados extraídos salvos em tmp
+             (fiscal/import_nfe_lote.py), chave na sessão. Com vários arquivos,
+             mostra o status de cada um (importar_nota_entrada_lote).
     Passo 2: Usuário confirma loja/fornecedor e vincula produtos nos itens.
     """
     from pessoas.models import Fornecedor
     from core.models import Loja
-    from fiscal.storage_nfe import salvar_xml_temporario, carregar_xml_temporario, deletar_xml_temporario
-    from fiscal.produto_matching import encontrar_ou_sugerir_produto
+    from fiscal.import_nfe_lote import importar_arquivos
+    from fiscal.storage_nfe import carregar_dados_temporarios, deletar_dados_temporarios, salvar_dados_temporarios
     from datetime import datetime
 
     if request.method == 'POST':
@@ -645,19 +630,13 @@ def importar_nota_entrada_xml(request):
         nfe_key = request.session.get('nfe_import_key')
         if nfe_key and request.POST.get('confirmar_import') == '1':
             try:
-                xml_content = carregar_xml_temporario(nfe_key)
+                dados = carregar_dados_temporarios(nfe_key)
             except FileNotFoundError:
                 messages.warning(request, 'Arquivo temporário expirado. Faça o upload novamente.')
                 if 'nfe_import_key' in request.session:
                     del request.session['nfe_import_key']
                 return redirect('fiscal:importar_nota_entrada_xml')
 
-            try:
-                dados = parse_nfe_xml(xml_content)
-            except ValueError as e:
-                messages.error(request, str(e))
-                return redirect('fiscal:importar_nota_entrada_xml')
-
             loja_id = request.POST.get('loja')
             fornecedor_id = request.POST.get('fornecedor')
             data_entrada_str = request.POST.get('data_entrada')
@@ -686,7 +665,11 @@ def importar_nota_entrada_xml(request):
                 valor_total=Decimal(str(dados['valor_total'])),
                 data_emissao=data_emi,
                 data_entrada=data_entrada,
-                xml_arquivo=dados.get('xml_arquivo', ''),
+                # XML já gravado no armazenamento fiscal no upload
+                xml_arquivo_sha256=dados['xml_sha256'],
+                xml_tamanho=dados['xml_tamanho'],
+                # Sem armazenamento durável, a linha guarda uma cópia do XML
+                xml_legado=None if armazenamento_duravel() else carregar_xml(dados['xml_sha256']),
                 status='CONFIRMADA',
                 created_by=request.user,
                 updated_by=request.user,
@@ -734,40 +717,48 @@ def importar_nota_entrada_xml(request):
             AlertaNotaFiscal.objects.filter(chave_acesso=dados['chave_acesso']).update(
                 status='IMPORTADA', nota_fiscal_entrada=nota, updated_by_id=request.user.id
             )
-            deletar_xml_temporario(nfe_key)
+            deletar_dados_temporarios(nfe_key)
             del request.session['nfe_import_key']
             messages.success(request, f'Nota Fiscal {nota.numero}/{nota.serie} importada com sucesso.')
+
+            lote_key = request.session.get('nfe_import_lote')
+            lote = _carregar_lote_importacao(lote_key)
+            if lote and _marcar_importada_no_lote(lote, nfe_key, nota):
+                salvar_dados_temporarios(lote, key=lote_key)
+                return redirect('fiscal:importar_nota_entrada_lote')
             return redirect('fiscal:detalhes_nota_entrada', nota_id=nota.id)
 
-        # Upload do XML
-        arquivo = request.FILES.get('arquivo_xml')
-        if not arquivo:
+        # Upload dos XML (um ou mais, soltos ou em .zip)
+        arquivos = request.FILES.getlist('arquivo_xml')
+        if not arquivos:
             messages.error(request, 'Selecione um arquivo XML.')
             return redirect('fiscal:importar_nota_entrada_xml')
 
-        if not arquivo.name.lower().endswith(('.xml', '.nfe')):
-            messages.error(request, 'O arquivo deve ser um XML de NF-e (.xml ou .nfe).')
-            return redirect('fiscal:importar_nota_entrada_xml')
-
-        try:
-            xml_content = arquivo.read().decode('utf-8', errors='replace')
-        except Exception as e:
-            messages.error(request, f'Erro ao ler arquivo: {e}')
-            return redirect('fiscal:importar_nota_entrada_xml')
-
         try:
-            dados = parse_nfe_xml(xml_content)
+            lote = importar_arquivos(arquivos)
         except ValueError as e:
             messages.error(request, str(e))
             return redirect('fiscal:importar_nota_entrada_xml')
 
-        if NotaFiscalEntrada.objects.filter(chave_acesso=dados['chave_acesso'], is_active=True).exists():
-            messages.warning(request, 'Nota com esta chave já está cadastrada.')
-            return redirect('fiscal:lista_notas_entrada')
-
-        key = salvar_xml_temporario(xml_content)
-        request.session['nfe_import_key'] = key
-        return redirect('fiscal:importar_nota_entrada_confirmar')
+        resultados = lote['arquivos']
+        if len(arquivos) == 1 and len(resultados) == 1 and not arquivos[0].name.lower().endswith('.zip'):
+            # Um XML: segue direto para a confirmação, como antes do lote
+            resultado = resultados[0]
+            if resultado['status'] == 'ERRO':
+                messages.error(request, resultado['mensagem'])
+                return redirect('fiscal:importar_nota_entrada_xml')
+            if resultado['status'] == 'DUPLICADA':
+                messages.warning(request, resultado['mensagem'])
+                return redirect('fiscal:lista_notas_entrada')
+            request.session.pop('nfe_import_lote', None)
+            request.session['nfe_import_key'] = resultado['key']
+            return redirect('fiscal:importar_nota_entrada_confirmar')
+
+        if not resultados:
+            messages.error(request, 'Nenhum XML de NF-e encontrado nos arquivos enviados.')
+            return redirect('fiscal:importar_nota_entrada_xml')
+        request.session['nfe_import_lote'] = salvar_dados_temporarios(lote)
+        return redirect('fiscal:importar_nota_entrada_lote')
 
     return render(request, 'fiscal/importar_nota_xml.html')
 
@@ -777,39 +768,45 @@ def importar_nota_entrada_xml(request):
 def importar_nota_entrada_confirmar(request):
     """
     Confirmação da importação - usuário seleciona loja, fornecedor e vincula produtos nos itens.
-    Dados carregados do arquivo temporário (chave na sessão).
+    Dados extraídos no upload, carregados do arquivo temporário (chave na sessão ou,
+    vindo da importação em lote, ?arquivo=<chave> de uma nota PRONTA do lote).
     """
     from pessoas.models import Fornecedor
     from core.models import Loja
     from datetime import datetime
-    from fiscal.storage_nfe import carregar_xml_temporario, deletar_xml_temporario
-    from fiscal.produto_matching import encontrar_ou_sugerir_produto
+    from fiscal.storage_nfe import carregar_dados_temporarios, deletar_dados_temporarios
+    from fiscal.produto_matching import casar_itens_em_lote
+
+    lote = _carregar_lote_importacao(request.session.get('nfe_import_lote'))
+    arquivo_lote = request.GET.get('arquivo')
+    if lote and arquivo_lote:
+        if not any(r.get('key') == arquivo_lote and r['status'] == 'PRONTA' for r in lote['arquivos']):
+            raise Http404('Arquivo não encontrado na importação em lote.')
+        request.session['nfe_import_key'] = arquivo_lote
 
     nfe_key = request.session.get('nfe_import_key')
     if not nfe_key:
         messages.warning(request, 'Sessão expirada. Faça o upload do XML novamente.')
         return redirect('fiscal:importar_nota_entrada_xml')
+    do_lote = bool(lote) and any(r.get('key') == nfe_key for r in lote['arquivos'])
 
     if request.method == 'GET' and request.GET.get('cancelar'):
-        deletar_xml_temporario(nfe_key)
         if 'nfe_import_key' in request.session:
             del request.session['nfe_import_key']
+        if do_lote:
+            # Continua disponível na lista do lote
+            return redirect('fiscal:importar_nota_entrada_lote')
+        deletar_dados_temporarios(nfe_key)
         return redirect('fiscal:importar_nota_entrada_xml')
 
     try:
-        xml_content = carregar_xml_temporario(nfe_key)
+        dados = carregar_dados_temporarios(nfe_key)
     except FileNotFoundError:
         messages.warning(request, 'Arquivo temporário expirado. Faça o upload novamente.')
         if 'nfe_import_key' in request.session:
             del request.session['nfe_import_key']
         return redirect('fiscal:importar_nota_entrada_xml')
 
-    try:
-        dados = parse_nfe_xml(xml_content)
-    except ValueError as e:
-        messages.error(request, str(e))
-        return redirect('fiscal:importar_nota_entrada_xml')
-
     # Matching de produtos para cada item
     empresa_sessao = get_empresa_ativa(request)
     primeira_loja = (
@@ -821,13 +818,11 @@ def importar_nota_entrada_confirmar(request):
     fornecedor_match = None  # Será definido quando usuário selecionar
 
     itens = dados.get('itens', [])
-    for item in itens:
-        produto, produto_sugerido, status = encontrar_ou_sugerir_produto(
-            item, fornecedor_match, empresa
-        )
-        item['produto'] = produto
-        item['produto_sugerido'] = produto_sugerido
-        item['status_matching'] = status
+    for item, resultado in zip(itens, casar_itens_em_lote(itens, fornecedor_match, empresa)):
+        item['produto'] = resultado.produto
+        item['produto_sugerido'] = resultado.produto_sugerido
+        item['status_matching'] = resultado.status
+        item['similaridade'] = resultado.candidatos[0][1] if resultado.candidatos else None
 
     # Restaurar data para exibição
     data_emi = dados.get('data_emissao')
@@ -856,10 +851,49 @@ def importar_nota_entrada_confirmar(request):
         'lojas': Loja.objects.filter(empresa=empresa_sessao, is_active=True),
         'fornecedores': Fornecedor.objects.filter(empresa=empresa_sessao, is_active=True),
         'produtos': produtos,
+        'do_lote': do_lote,
     }
     return render(request, 'fiscal/importar_nota_xml_confirmar.html', context)
 
 
+def _carregar_lote_importacao(lote_key):
+    """Resultado da importação em lote (import_nfe_lote.importar_arquivos) ou None."""
+    from fiscal.storage_nfe import carregar_dados_temporarios
+
+    if not lote_key:
+        return None
+    try:
+        return carregar_dados_temporarios(lote_key)
+    except FileNotFoundError:
+        return None
+
+
+def _marcar_importada_no_lote(lote, nfe_key, nota) -> bool:
+    for resultado in lote['arquivos']:
+        if resultado.get('key') == nfe_key:
+            resultado.update(status='IMPORTADA', mensagem='', key=None, nota_id=nota.id)
+            return True
+    return False
+
+
+@login_required
+def importar_nota_entrada_lote(request):
+    """
+    Status de cada arquivo da importação em lote; as notas PRONTA seguem para a
+    confirmação uma a uma.
+    """
+    lote = _carregar_lote_importacao(request.session.get('nfe_import_lote'))
+    if lote is None:
+        messages.warning(request, 'Sessão expirada. Faça o upload dos XML novamente.')
+        return redirect('fiscal:importar_nota_entrada_xml')
+
+    arquivos = lote['arquivos']
+    totais = {}
+    for resultado in arquivos:
+        totais[resultado['status']] = totais.get(resultado['status'], 0) + 1
+    return render(request, 'fiscal/importar_nota_xml_lote.html', {'arquivos': arquivos, 'totais': totais})
+
+
 @login_required
 def lista_alertas_sefaz(request):
     """
@@ -923,108 +957,32 @@ def testar_status_sefaz(request, loja_id):
 @login_required
 def imprimir_nfe_pdf(request, nota_id):
     """
-    Gera PDF da NF-e no layout SEFAZ-BA.
-    
-    Requer weasyprint instalado: pip install weasyprint
+    Gera PDF da NF-e no layout SEFAZ-BA (fiscal/danfe.py).
+
+    NF-e AUTORIZADA é renderizada uma vez e reimpressa do cache de PDF
+    (fiscal/cache_pdf.py), com ETag. Requer weasyprint instalado para renderizar:
+    pip install weasyprint
     """
-    if not WEASYPRINT_AVAILABLE:
-        return HttpResponse(
-            '<h1>Erro: WeasyPrint não instalado</h1>'
-            '<p>Para gerar PDFs, instale o weasyprint:</p>'
-            '<pre>pip install weasyprint</pre>',
-            status=500
-        )
-    
     empresa = get_empresa_ativa(request)
     nota = get_object_or_404(
-        NotaFiscalSaida,
+        NotaFiscalSaida.objects.select_related('loja', 'loja__empresa', 'cliente', 'pedido_venda'),
         id=nota_id,
         loja__empresa=empresa,
         is_active=True,
     )
-    
-    # Buscar dados relacionados
-    pedido = nota.pedido_venda
-    itens = []
-    if pedido:
-        itens = list(
-            pedido.itens.filter(is_active=True).select_related('produto')
-        )
-
-    loja_empresa = nota.loja.empresa
-
-    from produtos.models import ProdutoParametrosEmpresa
-
-    params_map = {}
-    if itens:
-        produto_ids = [item.produto_id for item in itens]
-        params_qs = ProdutoParametrosEmpresa.objects.filter(
-            empresa=loja_empresa,
-            produto_id__in=produto_ids,
+    documento = documento_danfe(nota)
+    if not WEASYPRINT_AVAILABLE and not cache_pdf.em_cache(documento):
+        return HttpResponse(
+            '<h1>Erro: WeasyPrint não instalado</h1>'
+            '<p>Para gerar PDFs, instale o weasyprint:</p>'
+            '<pre>pip install weasyprint</pre>',
+            status=500
         )
-        params_map = {p.produto_id: p for p in params_qs}
-
-    itens_com_params = []
-    for item in itens:
-        params = params_map.get(item.produto_id)
-        itens_com_params.append({
-            'item': item,
-            'cfop': params.cfop_venda_dentro_uf if params else None,
-            'cst': params.csosn_cst if params else None,
-        })
-
-    # Buscar configuração fiscal da loja
-    config_fiscal = None
-    try:
-        config_fiscal = nota.loja.configuracao_fiscal
-    except ConfiguracaoFiscalLoja.DoesNotExist:
-        pass
-
-    cnpj_emitente_raw = ''
-    if config_fiscal and config_fiscal.cnpj:
-        cnpj_emitente_raw = config_fiscal.cnpj
-    elif loja_empresa.cnpj:
-        cnpj_emitente_raw = loja_empresa.cnpj
-    cnpj_emitente_formatado = _formatar_cnpj(cnpj_emitente_raw)
 
-    cliente = nota.cliente
-    cpf_cnpj_dest_formatado = _formatar_cpf_ou_cnpj(
-        cliente.cpf_cnpj if cliente else ''
+    return cache_pdf.resposta_pdf(
+        request,
+        documento,
+        lambda: gerar_pdf_danfe(nota),
+        f'NF-e_{nota.numero}_{nota.serie}.pdf',
     )
 
-    qrcode_b64 = _gerar_qrcode_nfe_base64(nota.chave_acesso or '')
-
-    # Calcular impostos conforme normas SEFAZ-BA
-    # IMPORTANTE: Para Simples Nacional, os impostos não são calculados separadamente
-    # Usar get_impostos() que já considera snapshot se autorizada
-    impostos = nota.get_impostos()
-
-    # Preparar contexto
-    context = {
-        'nota': nota,
-        'loja': nota.loja,
-        'empresa': loja_empresa,
-        'cliente': cliente,
-        'pedido': pedido,
-        'itens': itens,
-        'itens_com_params': itens_com_params,
-        'config_fiscal': config_fiscal,
-        'impostos': impostos,
-        'cnpj_emitente_formatado': cnpj_emitente_formatado,
-        'cpf_cnpj_dest_formatado': cpf_cnpj_dest_formatado,
-        'qrcode_b64': qrcode_b64,
-    }
-    
-    # Renderizar template HTML
-    html_string = render_to_string('fiscal/nfe_pdf.html', context)
-    
-    # Gerar PDF
-    html = HTML(string=html_string)
-    pdf = html.write_pdf()
-    
-    # Retornar PDF como resposta
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="NF-e_{nota.numero}_{nota.serie}.pdf"'
-    
-    return response
-
@@ -137,6 +137,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Diretório temporário para importação de NF-e (evita sessão com XML grande)
 NFE_IMPORT_TMP_DIR = BASE_DIR / 'media' / 'tmp' / 'nfe_import'
+# Processos que leem os XML da importação em lote (fiscal/import_nfe_lote.py); 1 = no próprio worker.
+# Opt-in: cada processo extra é um interpretador a mais na memória da instância web
+NFE_IMPORT_PROCESSOS = int(os.getenv('NFE_IMPORT_PROCESSOS', '1'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -182,3 +185,86 @@ LOGOUT_REDIRECT_URL = '/admin/login/'
 # Deve ter no mínimo 32 caracteres ou será derivada via SHA256
 # Configure via variável de ambiente ENCRYPTION_KEY
 ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', 'django-insecure-encryption-key-change-me-in-production-min-32-chars')
+
+# Chave HMAC do índice cego (busca exata em CPF/CNPJ criptografados).
+# Se não configurada, é derivada de ENCRYPTION_KEY; após trocar esta chave,
+# execute: python manage.py reindexar_indices_cegos
+BLIND_INDEX_KEY = os.getenv('BLIND_INDEX_KEY', '')
+
+# Cache
+# Padrão: memória local do processo. Com REDIS_URL, cache compartilhado entre workers
+# (necessário para que a invalidação do cache de códigos de barras valha para todos).
+# Sem cache compartilhado, a invalidação por signals só alcança o worker que fez a
+# alteração: as validades dos caches abaixo caem para alguns segundos.
+CACHE_COMPARTILHADO = bool(os.getenv('REDIS_URL'))
+if CACHE_COMPARTILHADO:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'guardiao-aladin',
+        }
+    }
+
+# Validade (segundos) da resolução de códigos de barras no PDV (produtos/cache_codigos.py).
+# Em memória local, é o atraso máximo para um preço alterado chegar aos outros workers
+PRODUTO_CODIGO_CACHE_TIMEOUT = int(os.getenv('PRODUTO_CODIGO_CACHE_TIMEOUT', '600' if CACHE_COMPARTILHADO else '5'))
+
+# Validade (segundos) dos acessos usuário→empresas em cache (core/tenant.py); invalidados por signals.
+# Em memória local, é o atraso máximo para um acesso revogado deixar de valer nos outros workers
+TENANT_CACHE_TIMEOUT = int(os.getenv('TENANT_CACHE_TIMEOUT', '3600' if CACHE_COMPARTILHADO else '5'))
+
+# Sincronização do catálogo com os tablets (pdv_movel/sync.py): o cursor só avança até
+# alterações com mais de PDV_MOVEL_SYNC_MARGEM segundos; LIMITE = alterações por resposta
+PDV_MOVEL_SYNC_MARGEM = int(os.getenv('PDV_MOVEL_SYNC_MARGEM', '60'))
+PDV_MOVEL_SYNC_LIMITE = int(os.getenv('PDV_MOVEL_SYNC_LIMITE', '5000'))
+
+# Chaves de idempotência das vendas (core/idempotencia.py): após este tempo (segundos) uma
+# chave ainda PROCESSANDO é considerada abandonada e pode ser reassumida por um reenvio
+IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO = int(os.getenv('IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO', '300'))
+
+# Fila de autorização de NF-e (fiscal/nfe_fila.py, manage.py processar_fila_nfe): tentativas de
+# envio por nota antes de ERRO; SEFAZ_NFE_URL desvia envios/consultas para uma SEFAZ local
+# (fiscal/sefaz_stub.py), sem certificado - apenas testes e desenvolvimento
+NFE_FILA_MAX_TENTATIVAS = int(os.getenv('NFE_FILA_MAX_TENTATIVAS', '8'))
+# Só ligue com o worker rodando (render.yaml: serviço guardiao-aladin-fila-nfe); desligada, a
+# tela autoriza a nota na própria requisição (envio síncrono)
+NFE_FILA_ATIVA = os.getenv('NFE_FILA_ATIVA', 'False').lower() == 'true'
+SEFAZ_NFE_URL = os.getenv('SEFAZ_NFE_URL', '')
+
+# XML das notas fiscais (fiscal/armazenamento_xml.py): arquivos comprimidos por SHA-256, guardados
+# por no mínimo 5 anos (nunca apagados pela aplicação). Vazio = MEDIA_ROOT/xml_fiscal.
+# COMPRESSAO 'zstd' exige o pacote zstandard (sem ele, gzip); 'gzip' força gzip
+FISCAL_XML_DIR = os.getenv('FISCAL_XML_DIR', '')
+FISCAL_XML_COMPRESSAO = os.getenv('FISCAL_XML_COMPRESSAO', 'zstd')
+# Backend de storage dos XML (ex.: storages.backends.s3.S3Storage, com as variáveis AWS_* do
+# django-storages); vazio = disco em FISCAL_XML_DIR
+FISCAL_XML_STORAGE_BACKEND = os.getenv('FISCAL_XML_STORAGE_BACKEND', '')
+if FISCAL_XML_STORAGE_BACKEND:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        'xml_fiscal': {'BACKEND': FISCAL_XML_STORAGE_BACKEND},
+    }
+# O armazenamento sobrevive a deploys (S3, disco persistente)? Sem isso, o XML também fica na
+# linha (coluna legada) e migrar_xml_fiscal não a limpa. O disco do Render é efêmero.
+FISCAL_XML_DURAVEL = os.getenv(
+    'FISCAL_XML_DURAVEL', 'true' if FISCAL_XML_STORAGE_BACKEND else 'false',
+).lower() == 'true'
+
+# PDF renderizados de documentos finais (DANFE autorizado, cupom faturado) - fiscal/cache_pdf.py.
+# Vazio = MEDIA_ROOT/pdf_fiscal. PRERENDER gera o DANFE numa thread logo após a autorização
+FISCAL_PDF_DIR = os.getenv('FISCAL_PDF_DIR', '')
+FISCAL_PDF_PRERENDER = os.getenv('FISCAL_PDF_PRERENDER', 'False').lower() == 'true'
+
+# Backend da busca de produtos (produtos/busca.py): 'postgres', 'memoria' ou 'banco'.
+# Vazio escolhe pelo banco: pg_trgm/full-text no PostgreSQL, n-gramas em memória nos demais.
+PRODUTO_BUSCA_BACKEND = os.getenv('PRODUTO_BUSCA_BACKEND', '')
+# Sem cache compartilhado: intervalo (segundos) em que o índice 'memoria' confere o catálogo no banco
+PRODUTO_BUSCA_VERIFICACAO = int(os.getenv('PRODUTO_BUSCA_VERIFICACAO', '5'))
@@ -2,6 +2,8 @@
 Modelos do módulo de orçamentos.
 """
 from django.db import models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.conf import settings
 from django.utils import timezone
@@ -157,15 +159,15 @@ class OrcamentoVenda(BaseModel):
     
     def recalcular_totais(self):
         """
-        Recalcula os totais do orçamento somando os valores dos itens ativos.
+        Recalcula os totais do orçamento somando os valores dos itens ativos
+        (um único SUM no banco).
         """
-        total_bruto = Decimal('0.00')
+        total_bruto = self.itens.filter(is_active=True).aggregate(
+            total=Coalesce(Sum('valor_total'), Decimal('0.00')),
+        )['total']
         
-        for item in self.itens.filter(is_active=True):
-            total_bruto += item.valor_total
-        
-        self.total_bruto = total_bruto
-        self.total_liquido = total_bruto - self.desconto_total + self.acrescimo_total
+        self.total_bruto = Decimal(total_bruto).quantize(Decimal('0.01'))
+        self.total_liquido = self.total_bruto - self.desconto_total + self.acrescimo_total
         
         self.save(update_fields=['total_bruto', 'total_liquido', 'updated_at'])
         
@@ -186,6 +188,33 @@ class OrcamentoVenda(BaseModel):
             'total_liquido': self.total_liquido,
         }
     
+    def adicionar_itens(self, itens):
+        """
+        Cria vários itens de uma vez (bulk_create) e recalcula os totais uma única vez.
+
+        Args:
+            itens: lista de dicts com os campos de ItemOrcamentoVenda
+                (produto, quantidade, valor_unitario, desconto, created_by...)
+
+        Returns:
+            Lista de ItemOrcamentoVenda criados.
+        """
+        from produtos.models import Produto
+
+        objetos = [ItemOrcamentoVenda(orcamento=self, **dados) for dados in itens]
+        if not objetos:
+            return []
+        # Produtos informados só por id: carrega todos numa consulta para o snapshot
+        ids = {o.produto_id for o in objetos if not ItemOrcamentoVenda.produto.is_cached(o)}
+        produtos = Produto.objects.in_bulk(ids) if ids else {}
+        for item in objetos:
+            if item.produto_id in produtos:
+                item.produto = produtos[item.produto_id]
+            item.preparar_para_salvar()
+        criados = ItemOrcamentoVenda.objects.bulk_create(objetos)
+        self.recalcular_totais()
+        return criados
+
     def converter_para_pedido(self) -> 'vendas.models.PedidoVenda':
         """
         Converte o orçamento em um PedidoVenda.
@@ -199,7 +228,7 @@ class OrcamentoVenda(BaseModel):
         Returns:
             PedidoVenda: O pedido gerado a partir do orçamento.
         """
-        from vendas.models import PedidoVenda, ItemPedidoVenda, CondicaoPagamento
+        from vendas.models import PedidoVenda, CondicaoPagamento
         
         # Se já existe pedido gerado, retornar
         if self.pedido_gerado:
@@ -253,20 +282,17 @@ class OrcamentoVenda(BaseModel):
             created_by=self.created_by,
         )
         
-        # Criar itens do pedido a partir dos itens do orçamento
-        for item_orcamento in self.itens.filter(is_active=True):
-            ItemPedidoVenda.objects.create(
-                pedido=pedido,
-                produto=item_orcamento.produto,
-                quantidade=item_orcamento.quantidade,
-                preco_unitario=item_orcamento.valor_unitario,
-                desconto=item_orcamento.desconto,
-                total=item_orcamento.valor_total,
-                created_by=self.created_by,
-            )
-        
-        # Recalcular total do pedido
-        pedido.recalcular_total()
+        # Criar itens do pedido a partir dos itens do orçamento (recalcula o total uma vez)
+        pedido.adicionar_itens([
+            {
+                'produto_id': item_orcamento.produto_id,
+                'quantidade': item_orcamento.quantidade,
+                'preco_unitario': item_orcamento.valor_unitario,
+                'desconto': item_orcamento.desconto,
+                'created_by': self.created_by,
+            }
+            for item_orcamento in self.itens.filter(is_active=True)
+        ])
         
         # Associar pedido ao orçamento e atualizar status
         self.pedido_gerado = pedido
@@ -333,7 +359,7 @@ class ItemOrcamentoVenda(BaseModel):
     def __str__(self):
         return f"{self.orcamento} - {self.descricao_produto} x {self.quantidade}"
     
-    def save(self, *args, **kwargs):
+    def preparar_para_salvar(self):
         """
         Calcula o valor total e copia dados do produto se necessário.
         """
@@ -349,7 +375,9 @@ class ItemOrcamentoVenda(BaseModel):
         
         # Calcular valor total
         self.valor_total = (self.valor_unitario * self.quantidade) - self.desconto
-        
+
+    def save(self, *args, **kwargs):
+        self.preparar_para_salvar()
         super().save(*args, **kwargs)
         
         # Recalcular totais do orçamento
@@ -1,3 +1,86 @@
-from django.test import TestCase
+"""
+Testes do app orcamentos.
+"""
+import pytest
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core.models import Empresa, Loja
+from pessoas.models import Cliente
+from produtos.models import CategoriaProduto, Produto
+
+from .models import OrcamentoVenda
+
+
+@pytest.fixture
+def orcamento_e_produtos():
+    empresa = Empresa.objects.create(
+        nome_fantasia='Empresa Orc',
+        razao_social='Empresa Orc LTDA',
+        cnpj='77777777000177',
+    )
+    loja = Loja.objects.create(empresa=empresa, nome='Loja Orc')
+    usuario = get_user_model().objects.create_user('vendedor_orc', password='secret123')
+    cliente = Cliente.objects.create(
+        empresa=empresa,
+        tipo_pessoa='PF',
+        nome_razao_social='Cliente Orc',
+        cpf_cnpj='12345678901',
+    )
+    orcamento = OrcamentoVenda.objects.create(
+        empresa=empresa,
+        loja=loja,
+        cliente=cliente,
+        vendedor=usuario,
+        nome_responsavel='Cliente Orc',
+        origem=OrcamentoVenda.OrigemChoices.BALCAO,
+        tipo_operacao=OrcamentoVenda.TipoOperacaoChoices.VAREJO,
+        data_validade=timezone.now().date() + timedelta(days=30),
+        acrescimo_total=Decimal('1.00'),
+        created_by=usuario,
+    )
+    categoria = CategoriaProduto.objects.create(nome='Cat Orc')
+    produtos = [
+        Produto.objects.create(
+            categoria=categoria,
+            descricao=f'Produto orc {i}',
+            classe_risco='1.3G',
+            ncm='36041000',
+        )
+        for i in range(3)
+    ]
+    return orcamento, produtos
+
+
+@pytest.mark.django_db
+class TestItensOrcamento:
+    """Itens em lote e totais por agregação no orçamento."""
+
+    def test_adicionar_itens_copia_snapshot_e_totaliza(self, orcamento_e_produtos):
+        orcamento, produtos = orcamento_e_produtos
+        itens = orcamento.adicionar_itens([
+            {'produto_id': p.pk, 'quantidade': Decimal('2.000'), 'valor_unitario': Decimal('5.00')}
+            for p in produtos
+        ])
+
+        assert [i.descricao_produto for i in itens] == [p.descricao for p in produtos]
+        assert all(i.classe_risco == '1.3G' for i in itens)
+        orcamento.refresh_from_db()
+        assert orcamento.total_bruto == Decimal('30.00')
+        assert orcamento.total_liquido == Decimal('31.00')
+
+    def test_converter_para_pedido_usa_itens_em_lote(self, orcamento_e_produtos):
+        orcamento, produtos = orcamento_e_produtos
+        orcamento.adicionar_itens([
+            {'produto': p, 'quantidade': Decimal('1.000'), 'valor_unitario': Decimal('4.00'),
+             'desconto': Decimal('1.00')}
+            for p in produtos
+        ])
+
+        pedido = orcamento.converter_para_pedido()
+
+        assert pedido.itens.count() == 3
+        assert pedido.valor_total == Decimal('9.00')
@@ -406,7 +406,7 @@ def buscar_clientes_rapido(request):
     ).filter(
         Q(nome_razao_social__icontains=termo) |
         Q(apelido_nome_fantasia__icontains=termo) |
-        Q(cpf_cnpj__icontains=termo) |
+        Q(cpf_cnpj__blind=termo) |
         Q(email__icontains=termo) |
         Q(telefone__icontains=termo)
     )[:10]
@@ -502,6 +502,7 @@ def orcamento_rapido(request):
             )
             
             # Adicionar itens
+            dados_itens = []
             for item_data in itens:
                 produto_id = item_data.get('produto_id')
                 quantidade = Decimal(str(item_data.get('quantidade', 1)))
@@ -522,19 +523,18 @@ def orcamento_rapido(request):
                     pu = preco_venda_para_empresa(produto, orcamento.empresa)
                     if pu is None:
                         continue
-                    ItemOrcamentoVenda.objects.create(
-                        orcamento=orcamento,
-                        produto=produto,
-                        quantidade=quantidade,
-                        valor_unitario=pu,
-                        desconto=desconto,
-                        created_by=request.user,
-                    )
+                    dados_itens.append({
+                        'produto': produto,
+                        'quantidade': quantidade,
+                        'valor_unitario': pu,
+                        'desconto': desconto,
+                        'created_by': request.user,
+                    })
                 except Http404:
                     continue
             
-            # Recalcular totais
-            orcamento.recalcular_totais()
+            # Gravar itens e recalcular totais uma única vez
+            orcamento.adicionar_itens(dados_itens)
             
             # Verificar se deve finalizar ou manter como rascunho
             acao = request.POST.get('acao', 'rascunho')
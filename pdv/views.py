@@ -7,7 +7,7 @@ from django.contrib import messages
 from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
-from django.db.models import Q, Sum
+from django.db.models import Count, Max, Q, Sum
 from django.utils import timezone
 from django.template.loader import render_to_string
 from decimal import Decimal
@@ -16,10 +16,12 @@ import json
 import logging
 
 from core.models import Loja
+from core.idempotencia import idempotente
 from core.tenant import get_empresa_ativa
+from fiscal import cache_pdf
 from produtos.models import Produto
+from produtos.cache_codigos import resolver_codigo_barras
 from produtos.utils import (
-    buscar_produto_por_codigo,
     buscar_produtos_por_termo,
     preco_venda_para_json,
     preco_venda_para_empresa,
@@ -247,19 +249,19 @@ def buscar_produto(request):
     empresa_ctx = get_empresa_ativa(request)
 
     if termo.isdigit() and len(termo) >= 8:
-        produto, codigo_alt, mult = buscar_produto_por_codigo(termo, empresa=empresa_ctx)
-        if produto:
+        resolucao = resolver_codigo_barras(termo, empresa=empresa_ctx)
+        if resolucao:
             resultados = [{
-                'id': produto.id,
-                'codigo_interno': produto.codigo_interno,
+                'id': resolucao['produto_id'],
+                'codigo_interno': resolucao['codigo_interno'],
                 'codigo_barras': termo,
-                'descricao': produto.descricao,
-                'preco_venda_sugerido': preco_venda_para_json(produto, empresa_ctx),
-                'unidade_comercial': produto.unidade_comercial,
-                'possui_restricao_exercito': produto.possui_restricao_exercito,
-                'multiplicador': float(mult),
-                'info_codigo': codigo_alt.descricao if codigo_alt else None,
-                'codigo_alternativo_id': codigo_alt.id if codigo_alt else None,
+                'descricao': resolucao['descricao'],
+                'preco_venda_sugerido': resolucao['preco_venda'],
+                'unidade_comercial': resolucao['unidade_comercial'],
+                'possui_restricao_exercito': resolucao['possui_restricao_exercito'],
+                'multiplicador': float(resolucao['multiplicador']),
+                'info_codigo': resolucao['info_codigo'],
+                'codigo_alternativo_id': resolucao['codigo_alternativo_id'],
             }]
             return JsonResponse({'produtos': resultados})
 
@@ -359,7 +361,7 @@ def criar_orcamento_pdv(request):
             })
         
         # Cria o orçamento
-        from orcamentos.models import OrcamentoVenda, ItemOrcamentoVenda
+        from orcamentos.models import OrcamentoVenda
         
         with transaction.atomic():
             # Data de validade padrão: 30 dias
@@ -378,19 +380,11 @@ def criar_orcamento_pdv(request):
                 created_by=request.user,
             )
             
-            # Cria os itens
-            for item_data in itens_validos:
-                ItemOrcamentoVenda.objects.create(
-                    orcamento=orcamento,
-                    produto=item_data['produto'],
-                    quantidade=item_data['quantidade'],
-                    valor_unitario=item_data['valor_unitario'],
-                    desconto=item_data['desconto'],
-                    created_by=request.user,
-                )
-            
-            # Recalcula totais
-            orcamento.recalcular_totais()
+            # Cria os itens e recalcula os totais uma única vez
+            orcamento.adicionar_itens([
+                {**item_data, 'created_by': request.user}
+                for item_data in itens_validos
+            ])
         
         logger.info(f"Orçamento criado com sucesso: Orçamento #{orcamento.id}")
         
@@ -410,6 +404,7 @@ def criar_orcamento_pdv(request):
 
 @login_required
 @require_http_methods(["POST"])
+@idempotente('pdv.finalizar_venda')
 def finalizar_venda(request):
     """
     Finaliza uma venda no PDV.
@@ -696,15 +691,10 @@ def cupom_fiscal(request, pedido_id: int):
 def cupom_fiscal_pdf(request, pedido_id: int):
     """
     Gera o PDF do cupom fiscal (WeasyPrint).
-    """
-    if not WEASYPRINT_AVAILABLE:
-        return HttpResponse(
-            '<h1>Erro: WeasyPrint não instalado</h1>'
-            '<p>Para gerar PDFs, instale o weasyprint:</p>'
-            '<pre>pip install weasyprint</pre>',
-            status=500,
-        )
 
+    Pedido FATURADO é renderizado uma vez e reimpresso do cache de PDF
+    (fiscal/cache_pdf.py), com ETag.
+    """
     empresa = get_empresa_ativa(request)
     pedido = get_object_or_404(
         PedidoVenda.objects.select_related('loja', 'loja__empresa', 'cliente', 'vendedor'),
@@ -715,19 +705,39 @@ def cupom_fiscal_pdf(request, pedido_id: int):
     itens = pedido.itens.filter(is_active=True).select_related('produto')
     pagamentos = pedido.pagamentos.filter(is_active=True).order_by('created_at')
 
-    context = {
-        'pedido': pedido,
-        'loja': pedido.loja,
-        'empresa': pedido.loja.empresa,
-        'cliente': getattr(pedido, 'cliente', None),
-        'itens': itens,
-        'pagamentos': pagamentos,
-    }
-
-    html_string = render_to_string('pdv/cupom_fiscal_pdf.html', context)
-    base_url = request.build_absolute_uri('/')
-    pdf = HTML(string=html_string, base_url=base_url).write_pdf()
+    marca_itens = itens.aggregate(quantidade=Count('pk'), alterado=Max('updated_at'))
+    marca_pagamentos = pagamentos.aggregate(quantidade=Count('pk'), alterado=Max('updated_at'))
+    cliente = getattr(pedido, 'cliente', None)
+    documento = cache_pdf.DocumentoPDF(
+        tipo='cupom',
+        documento_id=pedido.pk,
+        status=pedido.status,
+        entradas=cache_pdf.hash_entradas(
+            pedido.updated_at, *marca_itens.values(), *marca_pagamentos.values(),
+            pedido.loja.updated_at, pedido.loja.empresa.updated_at, cliente and cliente.updated_at,
+            cache_pdf.hash_template('pdv/cupom_fiscal_pdf.html'),
+        ),
+        cacheavel=pedido.status == 'FATURADO',
+    )
+    if not WEASYPRINT_AVAILABLE and not cache_pdf.em_cache(documento):
+        return HttpResponse(
+            '<h1>Erro: WeasyPrint não instalado</h1>'
+            '<p>Para gerar PDFs, instale o weasyprint:</p>'
+            '<pre>pip install weasyprint</pre>',
+            status=500,
+        )
 
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="Cupom_{pedido.id}.pdf"'
-    return response
+    def renderizar():
+        context = {
+            'pedido': pedido,
+            'loja': pedido.loja,
+            'empresa': pedido.loja.empresa,
+            'cliente': cliente,
+            'itens': itens,
+            'pagamentos': pagamentos,
+        }
+        html_string = render_to_string('pdv/cupom_fiscal_pdf.html', context)
+        base_url = request.build_absolute_uri('/')
+        return HTML(string=html_string, base_url=base_url).write_pdf()
+
+    return cache_pdf.resposta_pdf(request, documento, renderizar, f'Cupom_{pedido.id}.pdf')
@@ -14,10 +14,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.core.exceptions import ValidationError
 
+from core.idempotencia import idempotente
 from core.tenant import get_empresa_ativa
 from produtos.models import Produto
+from produtos.cache_codigos import resolver_codigo_barras
 from produtos.utils import (
-    buscar_produto_por_codigo,
     buscar_produtos_por_termo,
     preco_venda_para_json,
 )
@@ -54,20 +55,20 @@ def buscar_produtos_pdv(request):
     empresa_ctx = get_empresa_ativa(request)
 
     if termo.isdigit() and len(termo) >= 8:
-        produto, codigo_alt, mult = buscar_produto_por_codigo(termo, empresa=empresa_ctx)
-        if produto:
+        resolucao = resolver_codigo_barras(termo, empresa=empresa_ctx)
+        if resolucao:
             resultados = [{
-                'id': produto.id,
-                'codigo_interno': produto.codigo_interno,
+                'id': resolucao['produto_id'],
+                'codigo_interno': resolucao['codigo_interno'],
                 'codigo_barras': termo,
-                'descricao': produto.descricao,
-                'preco_venda_sugerido': preco_venda_para_json(produto, empresa_ctx),
-                'unidade_comercial': produto.unidade_comercial,
-                'possui_restricao_exercito': produto.possui_restricao_exercito,
-                'classe_risco': produto.classe_risco,
-                'multiplicador': float(mult),
-                'info_codigo': codigo_alt.descricao if codigo_alt else None,
-                'codigo_alternativo_id': codigo_alt.id if codigo_alt else None,
+                'descricao': resolucao['descricao'],
+                'preco_venda_sugerido': resolucao['preco_venda'],
+                'unidade_comercial': resolucao['unidade_comercial'],
+                'possui_restricao_exercito': resolucao['possui_restricao_exercito'],
+                'classe_risco': resolucao['classe_risco'],
+                'multiplicador': float(resolucao['multiplicador']),
+                'info_codigo': resolucao['info_codigo'],
+                'codigo_alternativo_id': resolucao['codigo_alternativo_id'],
             }]
             return Response({'produtos': resultados})
 
@@ -235,6 +236,7 @@ def buscar_pedido_tablet(request):
 
 @login_required
 @require_http_methods(['POST'])
+@idempotente('pdv.efetivar_pedido_tablet')
 def efetivar_pedido_tablet_view(request):
     """
     Efetiva pedido do tablet no balcão.
@@ -3,12 +3,12 @@ Serializers para API do PDV Móvel.
 Otimizados para tráfego tablet ↔ servidor.
 """
 from decimal import Decimal
-from django.db.models import Sum
+from django.db.models import OuterRef, Subquery, Sum
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework import serializers
 
-from produtos.models import Produto
+from produtos.models import Produto, ProdutoParametrosEmpresa
 from produtos.utils import preco_venda_para_json
 from vendas.models import PedidoVenda, ItemPedidoVenda, CondicaoPagamento
 from pessoas.models import Cliente
@@ -27,6 +27,49 @@ def _estoque_produto_loja(produto, loja):
     return float(result) if result is not None else 0
 
 
+def anotar_estoque_e_preco(queryset, loja):
+    """
+    Anota estoque da loja (estoque_loja) e preços (preco_empresa/preco_qualquer) com
+    subqueries correlacionadas: a página inteira sai numa consulta, em vez de uma
+    soma de estoque e uma ou duas buscas de preço por produto no serializer.
+    """
+    estoque = (
+        EstoqueAtual.objects.filter(
+            produto=OuterRef("pk"),
+            local_estoque__loja=loja,
+            is_active=True,
+        )
+        .order_by()
+        .values("produto")
+        .annotate(s=Sum("quantidade"))
+        .values("s")
+    )
+    parametros = ProdutoParametrosEmpresa.objects.filter(
+        produto=OuterRef("pk"),
+        ativo_nessa_empresa=True,
+    ).order_by("pk")
+    return queryset.annotate(
+        estoque_loja=Subquery(estoque),
+        preco_empresa=Subquery(parametros.filter(empresa_id=loja.empresa_id).values("preco_venda")[:1]),
+        preco_qualquer=Subquery(parametros.values("preco_venda")[:1]),
+    )
+
+
+def _estoque_disponivel(produto, loja):
+    if hasattr(produto, "estoque_loja"):
+        return float(produto.estoque_loja) if produto.estoque_loja is not None else 0
+    return _estoque_produto_loja(produto, loja)
+
+
+def _preco_venda_sugerido(produto, loja):
+    # Mesmo critério de preco_venda_para_json: preço na empresa, senão o primeiro ativo
+    if hasattr(produto, "preco_empresa"):
+        preco = produto.preco_empresa if produto.preco_empresa is not None else produto.preco_qualquer
+        # SQLite não aplica as casas decimais do campo a subqueries
+        return str(preco.quantize(Decimal("0.01"))) if preco is not None else ""
+    return preco_venda_para_json(produto, loja.empresa if loja else None)
+
+
 class ProdutoListSerializer(serializers.ModelSerializer):
     estoque_disponivel = serializers.SerializerMethodField()
     preco_venda_sugerido = serializers.SerializerMethodField()
@@ -60,12 +103,10 @@ class ProdutoListSerializer(serializers.ModelSerializer):
         return None
 
     def get_estoque_disponivel(self, obj):
-        return _estoque_produto_loja(obj, self._loja_context())
+        return _estoque_disponivel(obj, self._loja_context())
 
     def get_preco_venda_sugerido(self, obj):
-        loja = self._loja_context()
-        emp = loja.empresa if loja else None
-        return preco_venda_para_json(obj, emp)
+        return _preco_venda_sugerido(obj, self._loja_context())
 
 
 class ProdutoDetalheSerializer(serializers.ModelSerializer):
@@ -103,12 +144,10 @@ class ProdutoDetalheSerializer(serializers.ModelSerializer):
         return None
 
     def get_estoque_disponivel(self, obj):
-        return _estoque_produto_loja(obj, self._loja_context())
+        return _estoque_disponivel(obj, self._loja_context())
 
     def get_preco_venda_sugerido(self, obj):
-        loja = self._loja_context()
-        emp = loja.empresa if loja else None
-        return preco_venda_para_json(obj, emp)
+        return _preco_venda_sugerido(obj, self._loja_context())
 
 
 class ItemPedidoSerializer(serializers.ModelSerializer):
@@ -4,6 +4,7 @@ ViewSets para API do PDV Móvel.
 - ProdutosPDVViewSet: busca e lista produtos
 - PedidosPDVViewSet: CRUD de pedidos (atendente)
 - CaixaPDVViewSet: buscar e finalizar pedidos (caixa)
+- CatalogoPDVViewSet: sincronização do catálogo para busca offline
 """
 from decimal import Decimal
 from datetime import timedelta
@@ -11,19 +12,24 @@ from datetime import timedelta
 from django.db import transaction
 from django.db.models import Q, Sum, Prefetch
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 
+from core.idempotencia import idempotente
 from produtos.models import Produto
-from produtos.utils import buscar_produto_por_codigo, buscar_produtos_por_termo
+from produtos.cache_codigos import resolver_codigo_barras
+from produtos.utils import buscar_produtos_por_termo
 from vendas.models import PedidoVenda, ItemPedidoVenda, CondicaoPagamento
+from vendas.venda_diaria import top_produtos
 from pessoas.models import Cliente
 
 from .serializers import (
+    anotar_estoque_e_preco,
     ProdutoListSerializer,
     ProdutoDetalheSerializer,
     PedidoTabletSerializer,
@@ -32,6 +38,7 @@ from .serializers import (
     EstatisticasAtendenteSerializer,
 )
 from .permissions import IsAtendentePDVAtivo, IsCaixaOuAtendente
+from ..sync import sincronizacao_completa, sincronizacao_delta
 
 
 class ProdutosPDVViewSet(viewsets.ReadOnlyModelViewSet):
@@ -50,36 +57,41 @@ class ProdutosPDVViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         atendente = self.request.user.atendente_pdv
-        empresa = atendente.loja.empresa
+        loja = atendente.loja
+        empresa = loja.empresa
         codigo_barras = self.request.query_params.get("codigo_barras", "").strip()
         busca = self.request.query_params.get("busca", "").strip()
 
         if codigo_barras:
-            produto, _alt, _mult = buscar_produto_por_codigo(codigo_barras, empresa=empresa)
-            if produto:
-                return (
-                    Produto.objects.filter(pk=produto.pk)
+            resolucao = resolver_codigo_barras(codigo_barras, empresa=empresa)
+            if resolucao:
+                return anotar_estoque_e_preco(
+                    Produto.objects.filter(pk=resolucao["produto_id"])
                     .select_related("categoria")
-                    .order_by("descricao")
+                    .order_by("descricao"),
+                    loja,
                 )
             return Produto.objects.none()
 
         if busca:
-            return buscar_produtos_por_termo(
-                busca, empresa=empresa, limit=100,
-                order_by=("descricao",), select_related=("categoria",),
+            return anotar_estoque_e_preco(
+                buscar_produtos_por_termo(
+                    busca, empresa=empresa, limit=100,
+                    order_by=("descricao",), select_related=("categoria",),
+                ),
+                loja,
             )
 
-        return (
+        return anotar_estoque_e_preco(
             Produto.objects.filter(
                 is_active=True,
                 parametros_por_empresa__empresa=empresa,
                 parametros_por_empresa__ativo_nessa_empresa=True,
             )
             .distinct()
-            .select_related("categoria")
-            .order_by("descricao")[:100]
-        )
+            .select_related("categoria"),
+            loja,
+        ).order_by("descricao")[:100]
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
@@ -105,41 +117,35 @@ class ProdutosPDVViewSet(viewsets.ReadOnlyModelViewSet):
             )
         atendente = request.user.atendente_pdv
         empresa = atendente.loja.empresa
-        produto, codigo_alt, mult = buscar_produto_por_codigo(codigo, empresa=empresa)
-        if not produto:
+        resolucao = resolver_codigo_barras(codigo, empresa=empresa)
+        if not resolucao:
             return Response(
                 {"erro": "Produto não encontrado"},
                 status=status.HTTP_404_NOT_FOUND,
             )
         return Response({
             "codigo": codigo,
-            "tipo": "alternativo" if codigo_alt else "principal",
-            "produto_id": produto.id,
-            "produto_descricao": produto.descricao,
-            "multiplicador": float(mult),
-            "descricao_codigo": codigo_alt.descricao if codigo_alt else None,
-            "codigo_alternativo_id": codigo_alt.id if codigo_alt else None,
+            "tipo": "alternativo" if resolucao["codigo_alternativo_id"] else "principal",
+            "produto_id": resolucao["produto_id"],
+            "produto_descricao": resolucao["descricao"],
+            "multiplicador": float(resolucao["multiplicador"]),
+            "descricao_codigo": resolucao["info_codigo"],
+            "codigo_alternativo_id": resolucao["codigo_alternativo_id"],
         })
 
     @action(detail=False, methods=["get"])
     def mais_vendidos(self, request):
         atendente = request.user.atendente_pdv
         loja = atendente.loja
-        data_inicio = timezone.now() - timedelta(days=30)
-        rows = (
-            ItemPedidoVenda.objects.filter(
-                pedido__loja=loja,
-                pedido__created_at__gte=data_inicio,
-                pedido__status="FATURADO",
-                is_active=True,
-            )
-            .values("produto")
-            .annotate(total_vendido=Sum("quantidade"))
-            .order_by("-total_vendido")[:10]
+        # Fato VendaDiaria (pedidos faturados da loja nos últimos 30 dias)
+        rows = top_produtos(
+            loja=loja,
+            desde=timezone.localdate() - timedelta(days=30),
+            limite=10,
         )
-        ids = [r["produto"] for r in rows]
+        ids = [r["produto_id"] for r in rows]
         empresa = atendente.loja.empresa
-        produtos = (
+        produtos = anotar_estoque_e_preco(
             Produto.objects.filter(
                 id__in=ids,
                 is_active=True,
@@ -147,7 +153,8 @@ class ProdutosPDVViewSet(viewsets.ReadOnlyModelViewSet):
                 parametros_por_empresa__ativo_nessa_empresa=True,
             )
             .select_related("categoria")
-            .distinct()
+            .distinct(),
+            loja,
         )
         # manter ordem por total_vendido
         order = {pid: i for i, pid in enumerate(ids)}
@@ -202,6 +209,11 @@ class PedidosPDVViewSet(viewsets.ModelViewSet):
                 qs = qs.filter(created_at__date=hoje)
         return qs.order_by("-created_at")
 
+    @method_decorator(idempotente('pdv_movel.criar_pedido'))
+    def create(self, request, *args, **kwargs):
+        # Header Idempotency-Key: reenvio da fila offline não duplica o pedido
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         atendente = self.request.user.atendente_pdv
         try:
@@ -218,13 +230,7 @@ class PedidosPDVViewSet(viewsets.ModelViewSet):
             raise ValidationError({"cliente": "Cliente é obrigatório nas configurações do PDV Móvel."})
 
         if not cliente:
-            cliente, _ = Cliente.objects.get_or_create(
-                empresa=atendente.loja.empresa,
-                tipo_pessoa="PF",
-                nome_razao_social="Consumidor Final",
-                cpf_cnpj="00000000000",
-                defaults={"created_by": self.request.user},
-            )
+            cliente = Cliente.consumidor_final(atendente.loja.empresa, self.request.user)
 
         condicao = data.get("condicao_pagamento")
         if not condicao:
@@ -435,6 +441,32 @@ class PedidosPDVViewSet(viewsets.ModelViewSet):
         return Response(ser.data)
 
 
+class CatalogoPDVViewSet(viewsets.ViewSet):
+    """
+    Catálogo da empresa para cópia local no tablet.
+
+    GET /api/catalogo/sync/ - Sincronização completa
+    GET /api/catalogo/sync/?desde=<cursor> - Só o que mudou depois do cursor
+    """
+
+    permission_classes = [IsAuthenticated, IsAtendentePDVAtivo]
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        empresa = request.user.atendente_pdv.loja.empresa
+        desde = request.query_params.get("desde", "").strip()
+        completo = request.query_params.get("completo") in ("1", "true")
+        if not desde or completo:
+            return Response(sincronizacao_completa(empresa))
+        try:
+            desde = int(desde)
+        except ValueError:
+            raise ValidationError({"desde": "Cursor inválido."})
+        if desde <= 0:
+            return Response(sincronizacao_completa(empresa))
+        return Response(sincronizacao_delta(empresa, desde))
+
+
 class CaixaPDVViewSet(viewsets.ViewSet):
     """
     API para o caixa buscar e finalizar pedidos do tablet.
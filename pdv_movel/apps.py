@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PdvMovelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pdv_movel'
+
+    def ready(self):
+        import pdv_movel.signals  # noqa: F401
@@ -0,0 +1,41 @@
+"""
+Remove do log de alterações do catálogo (AlteracaoCatalogo) registros antigos.
+Tablets com cursor anterior ao que sobrou recebem a sincronização completa.
+Rodar periodicamente (cron/celery beat).
+
+Uso:
+    python manage.py limpar_alteracoes_catalogo
+    python manage.py limpar_alteracoes_catalogo --dias 7
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Remove alterações do catálogo mais antigas que N dias (sincronização dos tablets)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=30,
+            help="Idade mínima em dias para remoção (padrão: 30)",
+        )
+
+    def handle(self, *args, **options):
+        from pdv_movel.models import AlteracaoCatalogo
+
+        dias = options["dias"]
+        ultimo = AlteracaoCatalogo.objects.aggregate(m=Max("pk"))["m"]
+        # Mantém sempre o último registro: é por ele que cursores antigos são detectados
+        removidos, _ = (
+            AlteracaoCatalogo.objects.filter(data_hora__lt=timezone.now() - timedelta(days=dias))
+            .exclude(pk=ultimo)
+            .delete()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Removidas {removidos} alteração(ões) do catálogo com mais de {dias} dia(s)")
+        )
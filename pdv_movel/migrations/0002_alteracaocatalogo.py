@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv_movel', '0001_criar_models_pdv_movel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('PRODUTO', 'Produto'), ('CODIGO', 'Código de barras alternativo'), ('PRECO', 'Parâmetros/preço por empresa')], max_length=10, verbose_name='Tipo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='ID do Objeto')),
+                ('produto_id', models.BigIntegerField(verbose_name='ID do Produto')),
+                ('empresa_id', models.BigIntegerField(blank=True, help_text='Só para preços; vazio vale para todas as empresas', null=True, verbose_name='ID da Empresa')),
+                ('data_hora', models.DateTimeField(auto_now_add=True, verbose_name='Data/Hora')),
+            ],
+            options={
+                'verbose_name': 'Alteração do Catálogo',
+                'verbose_name_plural': 'Alterações do Catálogo',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['data_hora'], name='pdv_movel_a_data_ho_c36c00_idx')],
+            },
+        ),
+    ]
@@ -143,3 +143,42 @@ class AtendentePDV(BaseModel):
             raise ValidationError({'pin': 'PIN deve conter apenas números'})
         if len(self.pin) != 4:
             raise ValidationError({'pin': 'PIN deve ter exatamente 4 dígitos'})
+
+
+class AlteracaoCatalogo(models.Model):
+    """
+    Log de alterações do catálogo para a sincronização delta dos tablets.
+
+    O id (autoincremento) é o cursor: o tablet guarda o último cursor recebido e
+    pede só o que mudou depois dele (pdv_movel/sync.py). Gravado pelos signals de
+    Produto, CodigoBarrasAlternativo e ProdutoParametrosEmpresa (pdv_movel/signals.py).
+    Guarda ids soltos (sem FK) para sobreviver à exclusão do registro alterado.
+    """
+
+    TIPO_CHOICES = [
+        ('PRODUTO', 'Produto'),
+        ('CODIGO', 'Código de barras alternativo'),
+        ('PRECO', 'Parâmetros/preço por empresa'),
+    ]
+
+    tipo = models.CharField('Tipo', max_length=10, choices=TIPO_CHOICES)
+    objeto_id = models.BigIntegerField('ID do Objeto')
+    produto_id = models.BigIntegerField('ID do Produto')
+    empresa_id = models.BigIntegerField(
+        'ID da Empresa',
+        null=True,
+        blank=True,
+        help_text='Só para preços; vazio vale para todas as empresas',
+    )
+    data_hora = models.DateTimeField('Data/Hora', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Alteração do Catálogo'
+        verbose_name_plural = 'Alterações do Catálogo'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['data_hora']),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.tipo} {self.objeto_id}"
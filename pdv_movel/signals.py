@@ -0,0 +1,27 @@
+"""
+Signals do PDV Móvel: log de alterações do catálogo para a sincronização dos tablets.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+from .sync import registrar_alteracao
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def registrar_alteracao_produto(sender, instance, **kwargs):
+    registrar_alteracao('PRODUTO', instance.pk, instance.pk)
+
+
+@receiver(post_save, sender=CodigoBarrasAlternativo)
+@receiver(post_delete, sender=CodigoBarrasAlternativo)
+def registrar_alteracao_codigo(sender, instance, **kwargs):
+    registrar_alteracao('CODIGO', instance.pk, instance.produto_id)
+
+
+@receiver(post_save, sender=ProdutoParametrosEmpresa)
+@receiver(post_delete, sender=ProdutoParametrosEmpresa)
+def registrar_alteracao_preco(sender, instance, **kwargs):
+    registrar_alteracao('PRECO', instance.pk, instance.produto_id, empresa_id=instance.empresa_id)
@@ -0,0 +1,178 @@
+"""
+Sincronização do catálogo com os tablets (cópia local para busca offline).
+
+O tablet guarda produtos, códigos alternativos e preços da empresa em IndexedDB e
+pede só o que mudou desde o último cursor (id de AlteracaoCatalogo):
+
+- completo: todos os produtos ativos na empresa, seus códigos e preços
+- delta: registros alterados depois do cursor, com tombstones (*_removidos) para
+  exclusões e desativações
+
+O cursor devolvido só avança até alterações com mais de PDV_MOVEL_SYNC_MARGEM
+segundos: ids de transações ainda abertas podem aparecer depois de ids maiores, então
+as alterações recentes são reenviadas na próxima chamada (o tablet aplica como upsert).
+Alterações feitas com update()/bulk_create não passam pelos signals e só chegam ao
+tablet na próxima sincronização completa.
+"""
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import F, Max, Min, Q
+from django.utils import timezone
+
+from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+from .models import AlteracaoCatalogo
+
+CAMPOS_PRODUTO = ['id', 'codigo_interno', 'codigo_barras', 'descricao', 'unidade_comercial']
+
+
+def _margem():
+    return timedelta(seconds=getattr(settings, 'PDV_MOVEL_SYNC_MARGEM', 60))
+
+
+def _limite():
+    return getattr(settings, 'PDV_MOVEL_SYNC_LIMITE', 5000)
+
+
+def registrar_alteracao(tipo: str, objeto_id, produto_id, empresa_id=None):
+    """Acrescenta uma alteração ao log (chamado pelos signals)."""
+    AlteracaoCatalogo.objects.create(
+        tipo=tipo,
+        objeto_id=objeto_id,
+        produto_id=produto_id,
+        empresa_id=empresa_id,
+    )
+
+
+def _cursor_consolidado(ate_id: Optional[int] = None) -> int:
+    """Maior id com mais de PDV_MOVEL_SYNC_MARGEM (opcionalmente limitado a ate_id)."""
+    qs = AlteracaoCatalogo.objects.filter(data_hora__lte=timezone.now() - _margem())
+    if ate_id is not None:
+        qs = qs.filter(pk__lte=ate_id)
+    return qs.aggregate(m=Max('pk'))['m'] or 0
+
+
+def _produtos_da_empresa(empresa):
+    """Produtos ativos e ativos na empresa (os que o tablet pode ter)."""
+    return Produto.objects.filter(
+        is_active=True,
+        parametros_por_empresa__empresa=empresa,
+        parametros_por_empresa__ativo_nessa_empresa=True,
+    ).distinct()
+
+
+def _produtos(ids=None, empresa=None) -> list:
+    qs = Produto.objects.filter(is_active=True) if empresa is None else _produtos_da_empresa(empresa)
+    if ids is not None:
+        qs = qs.filter(pk__in=ids)
+    return list(qs.order_by('pk').values(*CAMPOS_PRODUTO, categoria_nome=F('categoria__nome')))
+
+
+def _codigos(qs) -> list:
+    return [
+        {
+            'id': pk,
+            'produto_id': produto_id,
+            'codigo_barras': codigo,
+            'multiplicador': str(multiplicador),
+            'descricao': descricao or '',
+        }
+        for pk, produto_id, codigo, multiplicador, descricao in qs.order_by('pk').values_list(
+            'pk', 'produto_id', 'codigo_barras', 'multiplicador', 'descricao',
+        )
+    ]
+
+
+def _precos(qs) -> list:
+    # Um preço por produto (o primeiro parâmetro ativo, como em preco_venda_para_empresa)
+    precos = {}
+    for produto_id, preco in qs.order_by('-pk').values_list('produto_id', 'preco_venda'):
+        precos[produto_id] = str(preco)
+    return [{'produto_id': pk, 'preco_venda': preco} for pk, preco in sorted(precos.items())]
+
+
+def _resposta(modo, cursor, mais=False, **listas) -> dict:
+    resposta = {'modo': modo, 'cursor': cursor, 'mais': mais}
+    for nome in ['produtos', 'produtos_removidos', 'codigos', 'codigos_removidos', 'precos', 'precos_removidos']:
+        resposta[nome] = listas.get(nome, [])
+    return resposta
+
+
+def sincronizacao_completa(empresa) -> dict:
+    """Snapshot do catálogo da empresa; o cursor é lido antes dos dados."""
+    cursor = _cursor_consolidado()
+    produtos = _produtos(empresa=empresa)
+    ids = [p['id'] for p in produtos]
+    codigos = _codigos(CodigoBarrasAlternativo.objects.filter(produto_id__in=ids, is_active=True))
+    precos = _precos(ProdutoParametrosEmpresa.objects.filter(empresa=empresa, ativo_nessa_empresa=True, produto_id__in=ids))
+    return _resposta('completo', cursor, produtos=produtos, codigos=codigos, precos=precos)
+
+
+def sincronizacao_delta(empresa, desde: int, limite: Optional[int] = None) -> dict:
+    """
+    Alterações depois do cursor `desde`. Se o log já foi podado além do cursor
+    (limpar_alteracoes_catalogo), devolve a sincronização completa.
+    """
+    limite = limite or _limite()
+    minimo = AlteracaoCatalogo.objects.aggregate(m=Min('pk'))['m']
+    if minimo is not None and desde < minimo - 1:
+        return sincronizacao_completa(empresa)
+
+    alteracoes = list(
+        AlteracaoCatalogo.objects.filter(pk__gt=desde)
+        .filter(Q(empresa_id__isnull=True) | Q(empresa_id=empresa.pk))
+        .order_by('pk')[:limite + 1]
+    )
+    mais = len(alteracoes) > limite
+    alteracoes = alteracoes[:limite]
+    if not alteracoes:
+        return _resposta('delta', desde)
+
+    # Registros alterados no lote; o estado atual (ou a ausência dele) vem do banco
+    produto_ids, codigo_ids, preco_produto_ids = set(), set(), set()
+    for alteracao in alteracoes:
+        if alteracao.tipo == 'PRODUTO':
+            produto_ids.add(alteracao.objeto_id)
+        elif alteracao.tipo == 'CODIGO':
+            codigo_ids.add(alteracao.objeto_id)
+        else:
+            preco_produto_ids.add(alteracao.produto_id)
+
+    # Produto que ganhou preço na empresa vai junto, com os códigos alternativos,
+    # para o tablet ter o cadastro; produto fora da empresa (ou desativado) vira
+    # tombstone. Códigos de produtos fora da empresa não são enviados.
+    produtos = _produtos(ids=produto_ids | preco_produto_ids, empresa=empresa)
+    encontrados = {p['id'] for p in produtos}
+    codigos = _codigos(
+        CodigoBarrasAlternativo.objects.filter(
+            Q(pk__in=codigo_ids) | Q(produto_id__in=preco_produto_ids),
+            is_active=True,
+            produto_id__in=_produtos_da_empresa(empresa).values('pk'),
+        )
+    )
+    precos = _precos(
+        ProdutoParametrosEmpresa.objects.filter(
+            empresa=empresa,
+            ativo_nessa_empresa=True,
+            produto_id__in=preco_produto_ids,
+        )
+    )
+    com_preco = {p['produto_id'] for p in precos}
+
+    # Com mais páginas avança pelo lote; na última, só até as alterações consolidadas
+    cursor = alteracoes[-1].pk
+    if not mais:
+        cursor = max(desde, _cursor_consolidado(ate_id=cursor))
+    return _resposta(
+        'delta',
+        cursor,
+        mais=mais,
+        produtos=produtos,
+        produtos_removidos=sorted((produto_ids | preco_produto_ids) - encontrados),
+        codigos=codigos,
+        codigos_removidos=sorted(codigo_ids - {c['id'] for c in codigos}),
+        precos=precos,
+        precos_removidos=sorted(preco_produto_ids - com_preco),
+    )
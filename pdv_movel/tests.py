@@ -0,0 +1,268 @@
+"""
+Testes do PDV Móvel.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Empresa, Loja
+from estoque.models import EstoqueAtual, LocalEstoque
+from pdv_movel.models import AtendentePDV, ConfiguracaoPDVMovel
+from produtos.models import CategoriaProduto, Produto, ProdutoParametrosEmpresa
+
+User = get_user_model()
+
+
+@pytest.fixture
+def loja():
+    empresa = Empresa.objects.create(
+        nome_fantasia='Empresa Tablet',
+        razao_social='Empresa Tablet LTDA',
+        cnpj='33333333000191',
+    )
+    loja = Loja.objects.create(empresa=empresa, nome='Loja Tablet')
+    ConfiguracaoPDVMovel.objects.create(loja=loja)
+    return loja
+
+
+@pytest.fixture
+def client(loja):
+    user = User.objects.create_user('atendente_tablet', password='pass12345')
+    AtendentePDV.objects.create(user=user, loja=loja, pin='1234')
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.mark.django_db
+class TestProdutosPDVApi:
+    """Catálogo do tablet: estoque e preço anotados, consultas independentes do tamanho da página."""
+
+    def _criar_produtos(self, loja, total, inicio=0):
+        categoria, _ = CategoriaProduto.objects.get_or_create(nome='Cat Tablet')
+        local, _ = LocalEstoque.objects.get_or_create(loja=loja, nome='Depósito Tablet')
+        outra = Empresa.objects.create(
+            nome_fantasia='Outra',
+            razao_social='Outra LTDA',
+            cnpj='44444444000191',
+        )
+        for i in range(inicio, inicio + total):
+            produto = Produto.objects.create(
+                categoria=categoria,
+                codigo_interno=f'TAB-{i:03d}',
+                descricao=f'Produto tablet {i:03d}',
+                classe_risco='1.4G',
+                ncm='36041000',
+            )
+            ProdutoParametrosEmpresa.objects.create(
+                empresa=outra, produto=produto, preco_venda=Decimal('99.00'),
+            )
+            ProdutoParametrosEmpresa.objects.create(
+                empresa=loja.empresa, produto=produto, preco_venda=Decimal('12.50'),
+            )
+            EstoqueAtual.objects.create(produto=produto, local_estoque=local, quantidade=Decimal(i))
+
+    def _consultas(self, client, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        assert response.status_code == 200
+        return response, len(ctx.captured_queries)
+
+    def test_lista_com_estoque_e_preco(self, client, loja):
+        self._criar_produtos(loja, 3)
+        response, _ = self._consultas(client, '/pdv-movel/api/produtos/')
+        dados = response.json()
+        itens = dados['results'] if isinstance(dados, dict) else dados
+        assert [p['codigo_interno'] for p in itens] == ['TAB-000', 'TAB-001', 'TAB-002']
+        assert [p['estoque_disponivel'] for p in itens] == [0.0, 1.0, 2.0]
+        assert {p['preco_venda_sugerido'] for p in itens} == {'12.50'}
+
+    def test_consultas_nao_crescem_com_a_pagina(self, client, loja):
+        self._criar_produtos(loja, 3)
+        _, poucos = self._consultas(client, '/pdv-movel/api/produtos/')
+        self._criar_produtos(loja, 30, inicio=3)
+        _, muitos = self._consultas(client, '/pdv-movel/api/produtos/')
+        assert poucos <= 3
+        assert muitos == poucos
+        # 1ª busca monta o índice em memória (produtos/busca.py); mede a seguinte
+        self._consultas(client, '/pdv-movel/api/produtos/?busca=tablet')
+        _, busca = self._consultas(client, '/pdv-movel/api/produtos/?busca=tablet')
+        assert busca == poucos
+
+
+@pytest.mark.django_db
+class TestCatalogoSync:
+    """Sincronização completa e delta do catálogo do tablet."""
+
+    URL = '/pdv-movel/api/catalogo/sync/'
+
+    @pytest.fixture
+    def produtos(self, loja):
+        from produtos.models import CodigoBarrasAlternativo
+
+        categoria = CategoriaProduto.objects.create(nome='Cat Sync')
+        produtos = []
+        for i in range(3):
+            produto = Produto.objects.create(
+                categoria=categoria,
+                codigo_interno=f'SYNC-{i}',
+                descricao=f'Produto sync {i}',
+                classe_risco='1.4G',
+                ncm='36041000',
+            )
+            ProdutoParametrosEmpresa.objects.create(
+                empresa=loja.empresa, produto=produto, preco_venda=Decimal('5.00'),
+            )
+            CodigoBarrasAlternativo.objects.create(
+                produto=produto, codigo_barras=f'7900000000{i}', multiplicador=Decimal('12'),
+            )
+            produtos.append(produto)
+        return produtos
+
+    def test_sincronizacao_completa(self, client, produtos, settings):
+        settings.PDV_MOVEL_SYNC_MARGEM = 0
+        dados = client.get(self.URL).json()
+        assert dados['modo'] == 'completo'
+        assert [p['codigo_interno'] for p in dados['produtos']] == ['SYNC-0', 'SYNC-1', 'SYNC-2']
+        assert {p['preco_venda'] for p in dados['precos']} == {'5.00'}
+        assert len(dados['codigos']) == 3
+        assert dados['cursor'] > 0
+
+    def test_delta_com_tombstones(self, client, loja, produtos, settings):
+        settings.PDV_MOVEL_SYNC_MARGEM = 0
+        cursor = client.get(self.URL).json()['cursor']
+
+        produtos[0].is_active = False
+        produtos[0].save()
+        produtos[1].codigos_alternativos.get().delete()
+        parametros = ProdutoParametrosEmpresa.objects.get(produto=produtos[2], empresa=loja.empresa)
+        parametros.preco_venda = Decimal('6.50')
+        parametros.save()
+
+        dados = client.get(self.URL, {'desde': cursor}).json()
+        assert dados['modo'] == 'delta'
+        assert dados['produtos_removidos'] == [produtos[0].pk]
+        assert [p['id'] for p in dados['produtos']] == [produtos[2].pk]
+        # Produto com preço alterado vai com os códigos (pode ter entrado na empresa agora)
+        assert [c['codigo_barras'] for c in dados['codigos']] == ['79000000002']
+        assert len(dados['codigos_removidos']) == 1
+        assert dados['precos'] == [{'produto_id': produtos[2].pk, 'preco_venda': '6.50'}]
+
+        vazio = client.get(self.URL, {'desde': dados['cursor']}).json()
+        assert vazio['produtos'] == [] and vazio['cursor'] == dados['cursor']
+
+    def test_delta_so_com_codigos_da_empresa(self, client, loja, produtos, settings):
+        from produtos.models import CodigoBarrasAlternativo
+
+        settings.PDV_MOVEL_SYNC_MARGEM = 0
+        outra = Empresa.objects.create(
+            nome_fantasia='Outra Empresa', razao_social='Outra Empresa LTDA', cnpj='44444444000191',
+        )
+        de_fora, entra = [
+            Produto.objects.create(
+                categoria=produtos[0].categoria, codigo_interno=f'SYNC-FORA-{i}', descricao='Produto de outra empresa',
+                classe_risco='1.4G', ncm='36041000',
+            )
+            for i in range(2)
+        ]
+        for produto in (de_fora, entra):
+            ProdutoParametrosEmpresa.objects.create(empresa=outra, produto=produto, preco_venda=Decimal('3.00'))
+        CodigoBarrasAlternativo.objects.create(produto=entra, codigo_barras='79000000009')
+        cursor = client.get(self.URL).json()['cursor']
+
+        # Código novo de produto de outra empresa e de produto desativado não vão
+        CodigoBarrasAlternativo.objects.create(produto=de_fora, codigo_barras='79000000010')
+        produtos[0].is_active = False
+        produtos[0].save()
+        CodigoBarrasAlternativo.objects.create(produto=produtos[0], codigo_barras='79000000011')
+        # Produto que entra na empresa pelo preço leva os códigos que já tinha
+        ProdutoParametrosEmpresa.objects.create(empresa=loja.empresa, produto=entra, preco_venda=Decimal('4.00'))
+
+        dados = client.get(self.URL, {'desde': cursor}).json()
+        assert [p['id'] for p in dados['produtos']] == [entra.pk]
+        assert [c['codigo_barras'] for c in dados['codigos']] == ['79000000009']
+        assert len(dados['codigos_removidos']) == 2
+
+    def test_cursor_nao_avanca_sobre_alteracoes_recentes(self, client, produtos):
+        dados = client.get(self.URL, {'desde': 1}).json()
+        assert dados['modo'] == 'delta'
+        assert dados['cursor'] == 1
+        assert len(dados['produtos']) == 3
+
+    def test_cursor_podado_volta_para_completa(self, client, produtos, settings):
+        from pdv_movel.models import AlteracaoCatalogo
+
+        settings.PDV_MOVEL_SYNC_MARGEM = 0
+        primeiro = AlteracaoCatalogo.objects.order_by('pk').first().pk
+        AlteracaoCatalogo.objects.filter(pk__lte=primeiro + 2).delete()
+        dados = client.get(self.URL, {'desde': primeiro}).json()
+        assert dados['modo'] == 'completo'
+
+
+@pytest.mark.django_db
+class TestPedidoIdempotente:
+    """Reenvio do mesmo pedido (Idempotency-Key) não duplica a venda."""
+
+    URL = '/pdv-movel/api/pedidos/'
+
+    def _corpo(self, observacoes='Mesa 1'):
+        return json.dumps({'observacoes': observacoes})
+
+    def _criar(self, client, chave, observacoes='Mesa 1'):
+        return client.post(
+            self.URL, self._corpo(observacoes), content_type='application/json', HTTP_IDEMPOTENCY_KEY=chave,
+        )
+
+    def test_reenvio_devolve_a_mesma_resposta(self, client):
+        from vendas.models import PedidoVenda
+
+        primeira = self._criar(client, 'chave-1')
+        assert primeira.status_code == 201
+        repetida = self._criar(client, 'chave-1')
+        assert repetida.status_code == 201
+        assert repetida['Idempotent-Replayed'] == 'true'
+        assert repetida.json()['id'] == primeira.json()['id']
+        assert PedidoVenda.objects.filter(origem='TABLET').count() == 1
+
+        # Outra chave é outro pedido
+        assert self._criar(client, 'chave-2').status_code == 201
+        assert PedidoVenda.objects.filter(origem='TABLET').count() == 2
+
+    def test_mesma_chave_com_outro_corpo(self, client):
+        assert self._criar(client, 'chave-1').status_code == 201
+        assert self._criar(client, 'chave-1', observacoes='Mesa 2').status_code == 422
+
+    def test_chave_em_processamento_e_reassumida_apos_timeout(self, client, settings):
+        from core.models import ChaveIdempotencia
+
+        registro = ChaveIdempotencia.objects.create(
+            usuario=User.objects.get(username='atendente_tablet'),
+            escopo='pdv_movel.criar_pedido',
+            chave='chave-1',
+            hash_requisicao=hashlib.sha256(self._corpo().encode()).hexdigest(),
+        )
+        assert self._criar(client, 'chave-1').status_code == 409
+
+        ChaveIdempotencia.objects.filter(pk=registro.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO + 1),
+        )
+        assert self._criar(client, 'chave-1').status_code == 201
+        registro.refresh_from_db()
+        assert registro.status == 'CONCLUIDA'
+
+    def test_erro_libera_a_chave(self, client, loja):
+        loja.config_pdv_movel.exigir_cliente = True
+        loja.config_pdv_movel.save()
+        assert self._criar(client, 'chave-1').status_code == 400
+
+        loja.config_pdv_movel.exigir_cliente = False
+        loja.config_pdv_movel.save()
+        assert self._criar(client, 'chave-1').status_code == 201
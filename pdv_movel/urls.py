@@ -4,7 +4,7 @@ URLs da API do PDV Móvel + Frontend Tablet.
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .api.viewsets import ProdutosPDVViewSet, PedidosPDVViewSet, CaixaPDVViewSet
+from .api.viewsets import ProdutosPDVViewSet, PedidosPDVViewSet, CaixaPDVViewSet, CatalogoPDVViewSet
 from . import views
 
 app_name = "pdv_movel"
@@ -13,6 +13,7 @@ router = DefaultRouter()
 router.register(r"produtos", ProdutosPDVViewSet, basename="produtos")
 router.register(r"pedidos", PedidosPDVViewSet, basename="pedidos")
 router.register(r"caixa", CaixaPDVViewSet, basename="caixa")
+router.register(r"catalogo", CatalogoPDVViewSet, basename="catalogo")
 
 # Rota explícita para adicionar_item (evita 404 com o router em alguns ambientes)
 adicionar_item_view = PedidosPDVViewSet.as_view(actions={"post": "adicionar_item"})
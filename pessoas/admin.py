@@ -9,7 +9,7 @@ from .models import Cliente, Fornecedor
 class ClienteAdmin(admin.ModelAdmin):
     list_display = ['nome_razao_social', 'empresa', 'tipo_pessoa', 'cpf_cnpj', 'telefone', 'whatsapp', 'email', 'is_active']
     list_filter = ['empresa', 'tipo_pessoa', 'is_active', 'created_at']
-    search_fields = ['nome_razao_social', 'apelido_nome_fantasia', 'cpf_cnpj', 'email']
+    search_fields = ['nome_razao_social', 'apelido_nome_fantasia', 'cpf_cnpj__blind', 'email']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     
     fieldsets = (
@@ -35,7 +35,7 @@ class ClienteAdmin(admin.ModelAdmin):
 class FornecedorAdmin(admin.ModelAdmin):
     list_display = ['razao_social', 'empresa', 'cnpj', 'telefone', 'whatsapp', 'email', 'is_active']
     list_filter = ['empresa', 'is_active', 'created_at']
-    search_fields = ['razao_social', 'nome_fantasia', 'cnpj', 'email']
+    search_fields = ['razao_social', 'nome_fantasia', 'cnpj__blind', 'email']
     readonly_fields = ['created_at', 'updated_at', 'created_by', 'updated_by']
     
     fieldsets = (
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:57
+
+import core.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_indices_cegos(apps, schema_editor):
+    """Calcula o índice cego dos documentos já cadastrados (em lotes)."""
+    for model_name, source, target in (
+        ('Cliente', 'cpf_cnpj', 'cpf_cnpj_hash'),
+        ('Fornecedor', 'cnpj', 'cnpj_hash'),
+    ):
+        model = apps.get_model('pessoas', model_name)
+        field = model._meta.get_field(target)
+        lote = []
+        for obj in model.objects.only('pk', source).iterator(chunk_size=500):
+            setattr(obj, target, field.calcular(getattr(obj, source)))
+            lote.append(obj)
+            if len(lote) >= 500:
+                model.objects.bulk_update(lote, [target])
+                lote = []
+        if lote:
+            model.objects.bulk_update(lote, [target])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_add_codigo_ibge_municipio'),
+        ('pessoas', '0002_increase_document_fields_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='cpf_cnpj_hash',
+            field=core.fields.BlindIndexField('cpf_cnpj', blank=True, editable=False, modo='digitos', null=True, verbose_name='Índice cego (cpf_cnpj)'),
+        ),
+        migrations.AddField(
+            model_name='fornecedor',
+            name='cnpj_hash',
+            field=core.fields.BlindIndexField('cnpj', blank=True, editable=False, modo='digitos', null=True, verbose_name='Índice cego (cnpj)'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['empresa', 'cpf_cnpj_hash'], name='pessoas_cli_empresa_94aea8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fornecedor',
+            index=models.Index(fields=['empresa', 'cnpj_hash'], name='pessoas_for_empresa_113725_idx'),
+        ),
+        migrations.RunPython(preencher_indices_cegos, migrations.RunPython.noop),
+    ]
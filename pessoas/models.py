@@ -3,7 +3,7 @@ Modelos de Clientes e Fornecedores.
 """
 from django.db import models
 from core.models import BaseModel, Empresa, Loja
-from core.fields import EncryptedCharField
+from core.fields import BlindIndexField, EncryptedCharField
 
 
 class Cliente(BaseModel):
@@ -39,6 +39,7 @@ class Cliente(BaseModel):
     nome_razao_social = models.CharField('Nome / Razão Social', max_length=255)
     apelido_nome_fantasia = models.CharField('Apelido / Nome Fantasia', max_length=255, blank=True, null=True)
     cpf_cnpj = EncryptedCharField('CPF / CNPJ', max_length=255)  # 255 para valor criptografado
+    cpf_cnpj_hash = BlindIndexField('cpf_cnpj', modo='digitos')  # busca exata: cpf_cnpj__blind=
     rg_inscricao_estadual = models.CharField('RG / Inscrição Estadual', max_length=20, blank=True, null=True)
     data_nascimento = models.DateField('Data de Nascimento', blank=True, null=True)
     telefone = EncryptedCharField('Telefone', max_length=255, blank=True, null=True)
@@ -61,11 +62,36 @@ class Cliente(BaseModel):
         indexes = [
             models.Index(fields=['empresa', 'is_active']),
             models.Index(fields=['tipo_pessoa', 'is_active']),
+            models.Index(fields=['empresa', 'cpf_cnpj_hash']),
         ]
     
     def __str__(self):
         return self.nome_razao_social
 
+    @classmethod
+    def consumidor_final(cls, empresa, usuario=None):
+        """
+        Cliente genérico "Consumidor Final" da empresa (vendas sem cliente).
+
+        Bases antigas têm várias linhas dele (com o mesmo índice cego após a
+        migração 0003): usa a mais antiga e só cria quando não há nenhuma.
+        """
+        cliente = cls.objects.filter(
+            empresa=empresa,
+            tipo_pessoa='PF',
+            nome_razao_social='Consumidor Final',
+            cpf_cnpj__blind='00000000000',
+        ).order_by('pk').first()
+        if cliente is None:
+            cliente = cls.objects.create(
+                empresa=empresa,
+                tipo_pessoa='PF',
+                nome_razao_social='Consumidor Final',
+                cpf_cnpj='00000000000',
+                created_by=usuario,
+            )
+        return cliente
+
 
 class Fornecedor(BaseModel):
     """
@@ -80,6 +106,7 @@ class Fornecedor(BaseModel):
     razao_social = models.CharField('Razão Social', max_length=255)
     nome_fantasia = models.CharField('Nome Fantasia', max_length=255, blank=True, null=True)
     cnpj = EncryptedCharField('CNPJ', max_length=255)
+    cnpj_hash = BlindIndexField('cnpj', modo='digitos')  # busca exata: cnpj__blind=
     inscricao_estadual = models.CharField('Inscrição Estadual', max_length=20, blank=True, null=True)
     telefone = EncryptedCharField('Telefone', max_length=255, blank=True, null=True)
     whatsapp = EncryptedCharField('WhatsApp', max_length=255, blank=True, null=True)
@@ -100,6 +127,7 @@ class Fornecedor(BaseModel):
         ordering = ['razao_social']
         indexes = [
             models.Index(fields=['empresa', 'is_active']),
+            models.Index(fields=['empresa', 'cnpj_hash']),
         ]
     
     def __str__(self):
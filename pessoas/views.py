@@ -54,7 +54,7 @@ def lista_clientes(request):
         clientes = clientes.filter(
             Q(nome_razao_social__icontains=search) |
             Q(apelido_nome_fantasia__icontains=search) |
-            Q(cpf_cnpj__icontains=search) |
+            Q(cpf_cnpj__blind=search) |
             Q(email__icontains=search)
         )
     
@@ -200,7 +200,7 @@ def lista_fornecedores(request):
         fornecedores = fornecedores.filter(
             Q(razao_social__icontains=search) |
             Q(nome_fantasia__icontains=search) |
-            Q(cnpj__icontains=search) |
+            Q(cnpj__blind=search) |
             Q(email__icontains=search)
         )
     
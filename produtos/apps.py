@@ -6,3 +6,6 @@ class ProdutosConfig(AppConfig):
     name = 'produtos'
     verbose_name = 'Produtos'
 
+
+    def ready(self):
+        import produtos.signals  # noqa: F401
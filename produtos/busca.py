@@ -0,0 +1,319 @@
+"""
+Backends de busca textual de produtos (PDV, orçamento rápido, tablet).
+
+buscar_produtos_por_termo (produtos/utils.py) delega a um backend, escolhido por
+settings.PRODUTO_BUSCA_BACKEND:
+
+- 'postgres': índices GIN pg_trgm (descrição e códigos) + tsvector com configuração
+  'portugues_unaccent' (migration 0011_busca_textual); relevância por ts_rank,
+  word_similarity e prefixo de código.
+- 'memoria': índice invertido de trigramas em memória do processo, para SQLite/dev.
+  Reconstruído sob demanda quando os signals de produtos mudam a versão no cache.
+  Sem cache compartilhado (settings.CACHE_COMPARTILHADO), a versão no cache só muda
+  no worker que salvou; por isso, a cada PRODUTO_BUSCA_VERIFICACAO segundos o
+  índice também confere uma assinatura do catálogo no banco (maior updated_at e
+  total de linhas de produtos, códigos alternativos e parâmetros por empresa).
+- 'banco': filtros icontains originais (sem relevância), para outros bancos.
+- '' (padrão): 'postgres' em PostgreSQL, 'memoria' nos demais.
+
+Todos os backends devolvem [(produto_id, relevancia)] já filtrados por produto ativo
+e, se informada, empresa com ativo_nessa_empresa=True.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+
+CHAVE_VERSAO = 'produtos:busca:versao'
+
+# Fração mínima de trigramas do termo presentes no produto para aceitar erro de digitação
+# (mesmo valor padrão de pg_trgm.word_similarity_threshold)
+LIMIAR_SIMILARIDADE = 0.6
+
+Resultado = List[Tuple[int, float]]
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """Minúsculas e sem acentos ('Vulcão' → 'vulcao')."""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def trigramas(texto: str) -> set:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _incrementar_versao():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, time.time_ns(), None)
+
+
+def invalidar_indice():
+    """
+    Muda a versão do índice (chamado pelos signals de Produto/código/parâmetros).
+    Repete após o commit para descartar índices reconstruídos durante a transação.
+    """
+    _incrementar_versao()
+    transaction.on_commit(_incrementar_versao)
+
+
+class BackendBanco:
+    """Busca original: icontains em descrição/códigos + subquery de códigos alternativos."""
+
+    def buscar(self, termo: str, empresa_id=None, limit: int = 100) -> Resultado:
+        from produtos.models import CodigoBarrasAlternativo, Produto
+
+        qs = Produto.objects.filter(is_active=True)
+        if empresa_id:
+            qs = qs.filter(
+                parametros_por_empresa__empresa_id=empresa_id,
+                parametros_por_empresa__ativo_nessa_empresa=True,
+            )
+        ids_alt = CodigoBarrasAlternativo.objects.filter(
+            codigo_barras__icontains=termo,
+            is_active=True,
+        ).values_list('produto_id', flat=True)
+        qs = qs.filter(
+            Q(descricao__icontains=termo)
+            | Q(codigo_interno__icontains=termo)
+            | Q(codigo_barras__icontains=termo)
+            | Q(id__in=ids_alt)
+        ).distinct().order_by('descricao')
+        return [(pk, 0.0) for pk in qs.values_list('pk', flat=True)[:limit]]
+
+
+class BackendPostgres:
+    """pg_trgm + full-text em português sem acentos; usa os índices GIN da migration 0011."""
+
+    def _tsquery(self, termo: str) -> str:
+        # Cada palavra vira prefixo ('vulc:*'); remove operadores do tsquery
+        palavras = re.findall(r'\w+', termo)
+        return ' & '.join(f'{p}:*' for p in palavras)
+
+    def buscar(self, termo: str, empresa_id=None, limit: int = 100) -> Resultado:
+        from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+        params = {
+            'termo': termo,
+            'contem': f'%{termo}%',
+            'prefixo': f'{termo}%',
+            'limit': limit,
+        }
+        tsquery = self._tsquery(termo)
+        vetor = "to_tsvector('portugues_unaccent'::regconfig, p.descricao)"
+        condicoes = [
+            'p.descricao ILIKE %(contem)s',
+            'p.codigo_interno ILIKE %(contem)s',
+            'p.codigo_barras ILIKE %(contem)s',
+            '%(termo)s <%% p.descricao',
+            f'p.id IN (SELECT a.produto_id FROM {CodigoBarrasAlternativo._meta.db_table} a '
+            'WHERE a.is_active AND a.codigo_barras LIKE %(contem)s)',
+        ]
+        rank_ts = '0'
+        if tsquery:
+            params['tsquery'] = tsquery
+            condicoes.append(f"{vetor} @@ to_tsquery('portugues_unaccent', %(tsquery)s)")
+            rank_ts = f"ts_rank({vetor}, to_tsquery('portugues_unaccent', %(tsquery)s))"
+
+        filtro_empresa = ''
+        if empresa_id:
+            params['empresa_id'] = empresa_id
+            filtro_empresa = (
+                f'AND EXISTS (SELECT 1 FROM {ProdutoParametrosEmpresa._meta.db_table} pe '
+                'WHERE pe.produto_id = p.id AND pe.empresa_id = %(empresa_id)s '
+                'AND pe.ativo_nessa_empresa)'
+            )
+
+        sql = f"""
+            SELECT p.id,
+                   (CASE WHEN p.codigo_interno ILIKE %(prefixo)s THEN 3 ELSE 0 END
+                    + CASE WHEN p.codigo_barras = %(termo)s THEN 3 ELSE 0 END
+                    + CASE WHEN p.descricao ILIKE %(prefixo)s THEN 1 ELSE 0 END
+                    + 2 * {rank_ts}
+                    + word_similarity(unaccent(%(termo)s), unaccent(p.descricao))) AS relevancia
+              FROM {Produto._meta.db_table} p
+             WHERE p.is_active
+               AND ({' OR '.join(condicoes)})
+               {filtro_empresa}
+             ORDER BY relevancia DESC, p.descricao
+             LIMIT %(limit)s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(pk, float(rel)) for pk, rel in cursor.fetchall()]
+
+
+class _IndiceTrigramas:
+    """Snapshot do catálogo em memória: texto normalizado + listas invertidas de trigramas."""
+
+    def __init__(self, versao):
+        from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+        self.versao = versao
+        self.textos: Dict[int, str] = {}
+        self.descricoes: Dict[int, str] = {}
+        self.codigos_internos: Dict[int, str] = {}
+        self.codigos_barras: Dict[int, set] = {}
+        self.empresas: Dict[int, set] = {}
+        self.postings: Dict[str, List[int]] = {}
+
+        alternativos: Dict[int, List[str]] = {}
+        for produto_id, codigo in (
+            CodigoBarrasAlternativo.objects.filter(is_active=True)
+            .values_list('produto_id', 'codigo_barras')
+        ):
+            alternativos.setdefault(produto_id, []).append(codigo)
+
+        for produto_id, empresa_id in (
+            ProdutoParametrosEmpresa.objects.filter(ativo_nessa_empresa=True)
+            .values_list('produto_id', 'empresa_id')
+        ):
+            self.empresas.setdefault(produto_id, set()).add(empresa_id)
+
+        produtos = (
+            Produto.objects.filter(is_active=True)
+            .order_by('pk')
+            .values_list('pk', 'descricao', 'codigo_interno', 'codigo_barras')
+        )
+        for pk, descricao, codigo_interno, codigo_barras in produtos.iterator(chunk_size=2000):
+            codigos = [c for c in [codigo_barras, *alternativos.get(pk, [])] if c]
+            descricao_n = normalizar(descricao)
+            interno_n = normalizar(codigo_interno)
+            texto = '|'.join([descricao_n, interno_n, *map(normalizar, codigos)])
+            self.textos[pk] = texto
+            self.descricoes[pk] = descricao_n
+            self.codigos_internos[pk] = interno_n
+            self.codigos_barras[pk] = set(codigos)
+            for grama in trigramas(texto):
+                self.postings.setdefault(grama, []).append(pk)
+
+    def _pontuar(self, pk, termo, termo_n, similaridade, contem):
+        descricao = self.descricoes[pk]
+        relevancia = similaridade
+        if self.codigos_internos[pk].startswith(termo_n):
+            relevancia += 3
+        if termo in self.codigos_barras[pk]:
+            relevancia += 3
+        if descricao.startswith(termo_n):
+            relevancia += 2
+        elif f' {termo_n}' in descricao:
+            relevancia += 1.5
+        if contem:
+            relevancia += 1
+        return (-relevancia, descricao, pk)
+
+    def buscar(self, termo: str, empresa_id=None, limit: int = 100) -> Resultado:
+        termo_n = normalizar(termo)
+        gramas = trigramas(termo_n)
+
+        # 1) Substring (equivalente ao icontains): interseção das listas, da menor para a maior
+        listas = sorted((self.postings.get(g, ()) for g in gramas), key=len)
+        if listas:
+            exatos = set(listas[0])
+            for lista in listas[1:]:
+                if not exatos:
+                    break
+                exatos.intersection_update(lista)
+            exatos = {pk for pk in exatos if termo_n in self.textos[pk]}
+        else:
+            # Termos com menos de 3 caracteres: varredura linear
+            exatos = {pk for pk, texto in self.textos.items() if termo_n in texto}
+        if empresa_id:
+            exatos = {pk for pk in exatos if empresa_id in self.empresas.get(pk, ())}
+
+        pontuados = [self._pontuar(pk, termo, termo_n, 1.0, True) for pk in exatos]
+
+        # 2) Tolerância a erro de digitação só em texto (não em códigos) e quando faltam resultados
+        if len(exatos) < limit and len(gramas) >= 3 and not termo_n.isdigit():
+            contagem = Counter()
+            for lista in listas:
+                contagem.update(lista)
+            for pk, n in contagem.items():
+                similaridade = n / len(gramas)
+                if similaridade < LIMIAR_SIMILARIDADE or pk in exatos:
+                    continue
+                if empresa_id and empresa_id not in self.empresas.get(pk, ()):
+                    continue
+                pontuados.append(self._pontuar(pk, termo, termo_n, similaridade, False))
+
+        return [(pk, -rel) for rel, _desc, pk in heapq.nsmallest(limit, pontuados)]
+
+
+def _assinatura_catalogo() -> tuple:
+    """Maior updated_at e total de linhas das tabelas que entram no índice."""
+    from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+    return tuple(
+        tuple(modelo.objects.aggregate(alterado=Max('updated_at'), total=Count('pk')).values())
+        for modelo in (Produto, CodigoBarrasAlternativo, ProdutoParametrosEmpresa)
+    )
+
+
+class BackendMemoria:
+    """Índice de n-gramas em memória; um cache.get por busca para checar a versão."""
+
+    _indice: Optional[_IndiceTrigramas] = None
+    _lock = threading.Lock()
+    # (time.monotonic() da última conferência, assinatura do catálogo no banco)
+    _verificacao: Tuple[float, Optional[tuple]] = (0.0, None)
+
+    @staticmethod
+    def _assinatura_banco() -> tuple:
+        """Assinatura do catálogo, relida no máximo a cada PRODUTO_BUSCA_VERIFICACAO segundos."""
+        verificado_em, assinatura = BackendMemoria._verificacao
+        agora = time.monotonic()
+        if assinatura is None or agora - verificado_em >= getattr(settings, 'PRODUTO_BUSCA_VERIFICACAO', 5):
+            assinatura = _assinatura_catalogo()
+            BackendMemoria._verificacao = (agora, assinatura)
+        return assinatura
+
+    def _obter_indice(self) -> _IndiceTrigramas:
+        versao = cache.get(CHAVE_VERSAO)
+        if versao is None:
+            # Cache limpo/expirado: nova versão, para não reaproveitar índice antigo
+            cache.add(CHAVE_VERSAO, time.time_ns(), None)
+            versao = cache.get(CHAVE_VERSAO)
+        if not getattr(settings, 'CACHE_COMPARTILHADO', False):
+            # Alterações salvas em outro worker não chegam à versão deste cache local
+            versao = (versao, self._assinatura_banco())
+        indice = BackendMemoria._indice
+        if indice is not None and indice.versao == versao:
+            return indice
+        with BackendMemoria._lock:
+            indice = BackendMemoria._indice
+            if indice is None or indice.versao != versao:
+                indice = _IndiceTrigramas(versao)
+                BackendMemoria._indice = indice
+        return indice
+
+    def buscar(self, termo: str, empresa_id=None, limit: int = 100) -> Resultado:
+        return self._obter_indice().buscar(termo, empresa_id, limit)
+
+
+BACKENDS = {
+    'postgres': BackendPostgres,
+    'memoria': BackendMemoria,
+    'banco': BackendBanco,
+}
+
+
+def get_backend(nome: Optional[str] = None):
+    """Instancia o backend configurado (ou o informado); '' escolhe pelo banco em uso."""
+    nome = nome if nome is not None else getattr(settings, 'PRODUTO_BUSCA_BACKEND', '')
+    if not nome:
+        nome = 'postgres' if connection.vendor == 'postgresql' else 'memoria'
+    if nome not in BACKENDS:
+        raise ValueError(f'Backend de busca de produtos inválido: {nome}')
+    return BACKENDS[nome]()
@@ -0,0 +1,148 @@
+"""
+Cache de resolução de códigos de barras para a leitura no PDV.
+
+Cada leitura do scanner resolve (empresa, código) → produto/código alternativo,
+multiplicador, preço e flags. Sem cache isso custa um JOIN com DISTINCT em
+parametros_por_empresa, outro em CodigoBarrasAlternativo e a busca do preço.
+
+A resolução fica no cache do Django (CACHES['default']: locmem por padrão, Redis
+com REDIS_URL) e o caminho quente é um único cache.get. Resultados negativos também
+são armazenados, para que códigos desconhecidos não voltem ao banco a cada leitura.
+
+Invalidação: signals de Produto, CodigoBarrasAlternativo e ProdutoParametrosEmpresa
+(produtos/signals.py) apagam as chaves de todos os códigos do produto afetado.
+Alterações feitas com update()/bulk_update não disparam signals e ficam limitadas
+pelo timeout (PRODUTO_CODIGO_CACHE_TIMEOUT). Em memória local a invalidação só
+alcança o worker que fez a alteração, e o timeout padrão é de poucos segundos
+(settings.CACHE_COMPARTILHADO): os outros workers leem o preço novo logo depois.
+"""
+import threading
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+if TYPE_CHECKING:
+    from produtos.models import Empresa
+
+# Marcador de "código não encontrado" (cache.get devolve None quando não há chave)
+_NAO_ENCONTRADO = 0
+
+_lock = threading.Lock()
+_contadores = {'hits': 0, 'misses': 0}
+
+
+def _timeout():
+    return getattr(settings, 'PRODUTO_CODIGO_CACHE_TIMEOUT', 600 if getattr(settings, 'CACHE_COMPARTILHADO', False) else 5)
+
+
+def _chave(empresa_id, codigo: str) -> str:
+    return f'produtos:codigo:{empresa_id or 0}:{codigo}'
+
+
+def _contar(nome: str):
+    with _lock:
+        _contadores[nome] += 1
+
+
+def estatisticas() -> dict:
+    """Contadores de hit/miss deste processo (para métricas e diagnóstico)."""
+    with _lock:
+        hits, misses = _contadores['hits'], _contadores['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'taxa_acerto': (hits / total) if total else 0.0,
+    }
+
+
+def resetar_estatisticas():
+    with _lock:
+        _contadores['hits'] = 0
+        _contadores['misses'] = 0
+
+
+def _resolver_no_banco(codigo: str, empresa: Optional['Empresa']) -> Optional[dict]:
+    from produtos.utils import buscar_produto_por_codigo, preco_venda_para_json
+
+    produto, codigo_alt, mult = buscar_produto_por_codigo(codigo, empresa=empresa)
+    if not produto:
+        return None
+    return {
+        'produto_id': produto.id,
+        'codigo_interno': produto.codigo_interno,
+        'descricao': produto.descricao,
+        'unidade_comercial': produto.unidade_comercial,
+        'classe_risco': produto.classe_risco,
+        'possui_restricao_exercito': produto.possui_restricao_exercito,
+        'preco_venda': preco_venda_para_json(produto, empresa),
+        'multiplicador': mult,
+        'codigo_alternativo_id': codigo_alt.id if codigo_alt else None,
+        'info_codigo': codigo_alt.descricao if codigo_alt else None,
+    }
+
+
+def resolver_codigo_barras(codigo: str, empresa: Optional['Empresa'] = None) -> Optional[dict]:
+    """
+    Resolve código de barras (principal ou alternativo) usando o cache.
+
+    Args:
+        codigo: Código lido no scanner
+        empresa: Empresa ativa (None = todas, mesmo critério de buscar_produto_por_codigo)
+
+    Returns:
+        dict com produto_id, codigo_interno, descricao, unidade_comercial, classe_risco,
+        possui_restricao_exercito, preco_venda (str), multiplicador (Decimal),
+        codigo_alternativo_id e info_codigo; ou None se o código não existir.
+    """
+    codigo = (codigo or '').strip()
+    if not codigo:
+        return None
+
+    chave = _chave(empresa.pk if empresa else None, codigo)
+    valor = cache.get(chave)
+    if valor is not None:
+        _contar('hits')
+        return valor or None
+
+    _contar('misses')
+    resolucao = _resolver_no_banco(codigo, empresa)
+    cache.set(chave, resolucao if resolucao else _NAO_ENCONTRADO, _timeout())
+    return resolucao
+
+
+def invalidar_codigos(codigos: Iterable[str], empresa_ids: Iterable = ()):
+    """
+    Remove do cache as resoluções dos códigos informados nas empresas informadas
+    (e na busca sem empresa). Repete a remoção após o commit para não deixar
+    valores antigos gravados por leituras concorrentes à transação.
+    """
+    codigos = {c.strip() for c in codigos if c and c.strip()}
+    if not codigos:
+        return
+    empresas = {None, *empresa_ids}
+    chaves = [_chave(e, c) for e in empresas for c in codigos]
+    cache.delete_many(chaves)
+    transaction.on_commit(lambda: cache.delete_many(chaves))
+
+
+def invalidar_produto(produto_id, codigos_extras: Iterable[str] = ()):
+    """Invalida todos os códigos (principal e alternativos) de um produto."""
+    from produtos.models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+    codigos = list(codigos_extras)
+    codigos.extend(
+        Produto.objects.filter(pk=produto_id)
+        .exclude(codigo_barras__isnull=True)
+        .values_list('codigo_barras', flat=True)
+    )
+    codigos.extend(
+        CodigoBarrasAlternativo.objects.filter(produto_id=produto_id)
+        .values_list('codigo_barras', flat=True)
+    )
+    empresa_ids = ProdutoParametrosEmpresa.objects.filter(
+        produto_id=produto_id,
+    ).values_list('empresa_id', flat=True)
+    invalidar_codigos(codigos, empresa_ids)
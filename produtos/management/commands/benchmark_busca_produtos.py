@@ -0,0 +1,144 @@
+"""
+Mede a latência de buscar_produtos_por_termo com um catálogo sintético.
+
+Cria os produtos (e uma empresa) dentro de uma transação que é desfeita ao final:
+nada fica gravado no banco. Reporta p50/p95/p99 por backend de busca.
+
+Uso:
+  python manage.py benchmark_busca_produtos
+  python manage.py benchmark_busca_produtos --produtos 50000 --consultas 500 --backend memoria banco
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Empresa
+from produtos import busca
+from produtos.models import CategoriaProduto, CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+from produtos.utils import buscar_produtos_por_termo
+
+TIPOS = [
+    'Bomba', 'Vulcão', 'Rojão', 'Foguete', 'Estrelinha', 'Bateria', 'Chuvinha',
+    'Traque', 'Cobrinha', 'Girândola', 'Torta', 'Cometa', 'Pistola', 'Fumaça',
+]
+ADJETIVOS = [
+    'Colorida', 'Dourado', 'Prateada', 'Tricolor', 'Gigante', 'Mini', 'Luminoso',
+    'Assobio', 'Crepitante', 'Estrela', 'Cascata', 'Flash', 'Neon', 'Festa Junina',
+]
+MEDIDAS = ['12 tiros', '25 tiros', '100 tiros', '3 polegadas', '12x1', 'cx 10 un', '1 kg', 'sem estampido']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark da busca de produtos (p50/p95/p99) com catálogo sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=50000, help='Tamanho do catálogo (padrão: 50000)')
+        parser.add_argument('--consultas', type=int, default=300, help='Consultas por backend (padrão: 300)')
+        parser.add_argument('--limit', type=int, default=20, help='Limite de resultados por busca (padrão: 20)')
+        parser.add_argument(
+            '--backend',
+            nargs='+',
+            choices=sorted(busca.BACKENDS),
+            help='Backends a medir (padrão: o automático do banco e o "banco")',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        backends = options['backend'] or [
+            'postgres' if connection.vendor == 'postgresql' else 'memoria',
+            'banco',
+        ]
+
+        with transaction.atomic():
+            empresa = self._popular(options['produtos'], rnd)
+            termos = self._termos(options['consultas'], rnd)
+            for nome in backends:
+                self._medir(nome, termos, empresa, options['limit'])
+            transaction.set_rollback(True)
+        busca.invalidar_indice()
+
+    def _popular(self, total, rnd):
+        self.stdout.write(f'Criando {total} produtos sintéticos ({connection.vendor})...')
+        empresa = Empresa.objects.create(
+            nome_fantasia='Benchmark Busca',
+            razao_social='Benchmark Busca LTDA',
+            cnpj='00000000000000',
+        )
+        categoria = CategoriaProduto.objects.create(nome='Benchmark Busca')
+        produtos = [
+            Produto(
+                categoria=categoria,
+                codigo_interno=f'BENCH-{i:06d}',
+                codigo_barras=f'789{i:010d}',
+                descricao=f'{rnd.choice(TIPOS)} {rnd.choice(ADJETIVOS)} {rnd.choice(MEDIDAS)}',
+                classe_risco='1.4G',
+                ncm='36041000',
+            )
+            for i in range(total)
+        ]
+        produtos = Produto.objects.bulk_create(produtos, batch_size=2000)
+        if not produtos or produtos[0].pk is None:
+            produtos = list(Produto.objects.filter(categoria=categoria).order_by('pk'))
+        ProdutoParametrosEmpresa.objects.bulk_create(
+            [
+                ProdutoParametrosEmpresa(
+                    empresa=empresa,
+                    produto=p,
+                    preco_venda=Decimal('10.00'),
+                    cfop_venda_dentro_uf='5102',
+                    csosn_cst='102',
+                )
+                for p in produtos
+            ],
+            batch_size=2000,
+        )
+        CodigoBarrasAlternativo.objects.bulk_create(
+            [
+                CodigoBarrasAlternativo(produto=p, codigo_barras=f'790{p.pk:010d}', multiplicador=Decimal('12'))
+                for p in produtos[::10]
+            ],
+            batch_size=2000,
+        )
+        # bulk_create não dispara signals
+        busca.invalidar_indice()
+        return empresa
+
+    def _termos(self, total, rnd):
+        geradores = [
+            lambda: rnd.choice(TIPOS)[:rnd.randint(3, 6)],
+            lambda: f'{rnd.choice(TIPOS)} {rnd.choice(ADJETIVOS)}'.lower(),
+            lambda: rnd.choice(ADJETIVOS)[:4],
+            lambda: f'BENCH-{rnd.randint(0, 999):03d}',
+            lambda: f'789{rnd.randint(0, 99999):05d}',
+            lambda: 'vulcao',
+            lambda: 'fogute',
+        ]
+        return [rnd.choice(geradores)() for _ in range(total)]
+
+    def _medir(self, nome, termos, empresa, limit):
+        from django.test.utils import override_settings
+
+        with override_settings(PRODUTO_BUSCA_BACKEND=nome):
+            inicio = time.perf_counter()
+            list(buscar_produtos_por_termo(termos[0], empresa=empresa, limit=limit))
+            aquecimento = (time.perf_counter() - inicio) * 1000
+
+            tempos = []
+            for termo in termos:
+                inicio = time.perf_counter()
+                list(buscar_produtos_por_termo(termo, empresa=empresa, limit=limit))
+                tempos.append((time.perf_counter() - inicio) * 1000)
+
+        tempos.sort()
+        p50 = statistics.median(tempos)
+        p95 = tempos[int(len(tempos) * 0.95) - 1]
+        p99 = tempos[int(len(tempos) * 0.99) - 1]
+        self.stdout.write(self.style.SUCCESS(
+            f'{nome:>8}: p50={p50:.1f}ms p95={p95:.1f}ms p99={p99:.1f}ms '
+            f'(1ª busca {aquecimento:.0f}ms, {len(tempos)} consultas)'
+        ))
@@ -0,0 +1,59 @@
+# Busca textual de produtos no PostgreSQL (produtos/busca.py - BackendPostgres).
+# Em outros bancos não faz nada: a busca usa o índice de n-gramas em memória.
+
+from django.db import migrations
+
+SQL_CRIAR = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portugues_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION portugues_unaccent (COPY = portuguese);
+            ALTER TEXT SEARCH CONFIGURATION portugues_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+        END IF;
+    END
+    $$
+    """,
+    'CREATE INDEX IF NOT EXISTS produtos_produto_descricao_trgm '
+    'ON produtos_produto USING gin (descricao gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS produtos_produto_cod_interno_trgm '
+    'ON produtos_produto USING gin (codigo_interno gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS produtos_produto_cod_barras_trgm '
+    'ON produtos_produto USING gin (codigo_barras gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS produtos_codalt_cod_barras_trgm '
+    'ON produtos_codigobarrasalternativo USING gin (codigo_barras gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS produtos_produto_descricao_fts '
+    "ON produtos_produto USING gin (to_tsvector('portugues_unaccent'::regconfig, descricao))",
+]
+
+SQL_REMOVER = [
+    'DROP INDEX IF EXISTS produtos_produto_descricao_fts',
+    'DROP INDEX IF EXISTS produtos_codalt_cod_barras_trgm',
+    'DROP INDEX IF EXISTS produtos_produto_cod_barras_trgm',
+    'DROP INDEX IF EXISTS produtos_produto_cod_interno_trgm',
+    'DROP INDEX IF EXISTS produtos_produto_descricao_trgm',
+    'DROP TEXT SEARCH CONFIGURATION IF EXISTS portugues_unaccent',
+]
+
+
+def _executar(comandos):
+    def operacao(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in comandos:
+            schema_editor.execute(sql)
+    return operacao
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0010_catalogo_global_fase2'),
+    ]
+
+    operations = [
+        migrations.RunPython(_executar(SQL_CRIAR), _executar(SQL_REMOVER)),
+    ]
@@ -0,0 +1,49 @@
+"""
+Signals do módulo de produtos.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .busca import invalidar_indice
+from .cache_codigos import invalidar_produto
+from .models import CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+
+@receiver(pre_save, sender=Produto)
+@receiver(pre_save, sender=CodigoBarrasAlternativo)
+def guardar_codigo_anterior(sender, instance, **kwargs):
+    """Guarda o código de barras gravado no banco para invalidar também o valor antigo."""
+    instance._codigo_barras_anterior = None
+    if instance.pk:
+        instance._codigo_barras_anterior = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('codigo_barras', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def invalidar_cache_produto(sender, instance, **kwargs):
+    invalidar_indice()
+    invalidar_produto(
+        instance.pk,
+        [instance.codigo_barras, getattr(instance, '_codigo_barras_anterior', None)],
+    )
+
+
+@receiver(post_save, sender=CodigoBarrasAlternativo)
+@receiver(post_delete, sender=CodigoBarrasAlternativo)
+def invalidar_cache_codigo_alternativo(sender, instance, **kwargs):
+    invalidar_indice()
+    invalidar_produto(
+        instance.produto_id,
+        [instance.codigo_barras, getattr(instance, '_codigo_barras_anterior', None)],
+    )
+
+
+@receiver(post_save, sender=ProdutoParametrosEmpresa)
+@receiver(post_delete, sender=ProdutoParametrosEmpresa)
+def invalidar_cache_parametros(sender, instance, **kwargs):
+    invalidar_indice()
+    invalidar_produto(instance.produto_id)
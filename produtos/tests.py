@@ -5,12 +5,14 @@ from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 import unittest
 
+from django.core.cache import cache
 from django.db import connection
 from django.test import TestCase
 
 from core.models import Empresa, Loja
 from produtos.models import (
     CategoriaProduto,
+    CodigoBarrasAlternativo,
     Produto,
     ProdutoParametrosEmpresa,
     SequenciaCodigoInterno,
@@ -138,3 +140,199 @@ class CatalogoGlobalProdutoTests(TestCase):
             empresa=self.empresa,
         )
         self.assertEqual(produto, self.produto)
+
+
+class TestCacheCodigoBarras(TestCase):
+    """Resolução de códigos de barras do PDV via cache, com invalidação por signals."""
+
+    def setUp(self):
+        from produtos.cache_codigos import resetar_estatisticas
+
+        cache.clear()
+        resetar_estatisticas()
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='E Cache',
+            razao_social='E Cache LTDA',
+            cnpj='22222222000191',
+        )
+        self.categoria = CategoriaProduto.objects.create(nome='Cat Cache')
+        self.produto = Produto.objects.create(
+            categoria=self.categoria,
+            descricao='Vulcão',
+            classe_risco='1.4G',
+            ncm='36041000',
+            codigo_barras='7891000200009',
+        )
+        self.parametros = ProdutoParametrosEmpresa.objects.create(
+            empresa=self.empresa,
+            produto=self.produto,
+            preco_venda=Decimal('12.50'),
+            cfop_venda_dentro_uf='5102',
+            csosn_cst='102',
+        )
+        self.alternativo = CodigoBarrasAlternativo.objects.create(
+            produto=self.produto,
+            codigo_barras='7891000200016',
+            descricao='Caixa 12 un',
+            multiplicador=Decimal('12.000'),
+        )
+
+    def test_segunda_leitura_sem_consulta_ao_banco(self):
+        from produtos.cache_codigos import estatisticas, resolver_codigo_barras
+
+        primeira = resolver_codigo_barras('7891000200009', self.empresa)
+        with self.assertNumQueries(0):
+            segunda = resolver_codigo_barras('7891000200009', self.empresa)
+        self.assertEqual(primeira, segunda)
+        self.assertEqual(segunda['produto_id'], self.produto.pk)
+        self.assertEqual(segunda['preco_venda'], '12.50')
+        self.assertEqual(estatisticas()['hits'], 1)
+        self.assertEqual(estatisticas()['misses'], 1)
+
+    def test_codigo_alternativo_e_nao_encontrado(self):
+        from produtos.cache_codigos import resolver_codigo_barras
+
+        resolucao = resolver_codigo_barras('7891000200016', self.empresa)
+        self.assertEqual(resolucao['codigo_alternativo_id'], self.alternativo.pk)
+        self.assertEqual(resolucao['multiplicador'], Decimal('12.000'))
+        self.assertEqual(resolucao['info_codigo'], 'Caixa 12 un')
+
+        self.assertIsNone(resolver_codigo_barras('7890000000000', self.empresa))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolver_codigo_barras('7890000000000', self.empresa))
+
+    def test_invalida_ao_alterar_preco_e_codigo(self):
+        from produtos.cache_codigos import resolver_codigo_barras
+
+        resolver_codigo_barras('7891000200009', self.empresa)
+        self.parametros.preco_venda = Decimal('14.00')
+        self.parametros.save()
+        self.assertEqual(resolver_codigo_barras('7891000200009', self.empresa)['preco_venda'], '14.00')
+
+        self.produto.codigo_barras = '7891000200023'
+        self.produto.save()
+        self.assertIsNone(resolver_codigo_barras('7891000200009', self.empresa))
+        self.assertEqual(
+            resolver_codigo_barras('7891000200023', self.empresa)['produto_id'],
+            self.produto.pk,
+        )
+
+    def test_preco_alterado_em_outro_worker_vale_apos_a_validade(self):
+        import time
+        from unittest import mock
+        from django.test import override_settings
+        from produtos.cache_codigos import resolver_codigo_barras
+
+        with override_settings(PRODUTO_CODIGO_CACHE_TIMEOUT=5):
+            resolver_codigo_barras('7891000200009', self.empresa)
+        # update() não dispara o signal: como uma alteração feita em outro worker com LocMemCache
+        ProdutoParametrosEmpresa.objects.filter(pk=self.parametros.pk).update(preco_venda=Decimal('14.00'))
+        self.assertEqual(resolver_codigo_barras('7891000200009', self.empresa)['preco_venda'], '12.50')
+        with mock.patch('time.time', return_value=time.time() + 6):
+            self.assertEqual(resolver_codigo_barras('7891000200009', self.empresa)['preco_venda'], '14.00')
+
+    def test_invalida_codigo_alternativo_desativado(self):
+        from produtos.cache_codigos import resolver_codigo_barras
+
+        self.assertIsNotNone(resolver_codigo_barras('7891000200016', self.empresa))
+        self.alternativo.is_active = False
+        self.alternativo.save()
+        self.assertIsNone(resolver_codigo_barras('7891000200016', self.empresa))
+
+    def test_invalida_produto_ativado_na_empresa(self):
+        from produtos.cache_codigos import resolver_codigo_barras
+
+        outra = Empresa.objects.create(
+            nome_fantasia='E2 Cache',
+            razao_social='E2 Cache LTDA',
+            cnpj='33333333000191',
+        )
+        self.assertIsNone(resolver_codigo_barras('7891000200009', outra))
+        _ensure_parametros(self.produto, outra)
+        self.assertIsNotNone(resolver_codigo_barras('7891000200009', outra))
+
+
+class TestBuscaProdutosPorTermo(TestCase):
+    """buscar_produtos_por_termo com o backend de n-gramas em memória (SQLite)."""
+
+    def setUp(self):
+        cache.clear()
+        self.empresa = Empresa.objects.create(
+            nome_fantasia='E Busca',
+            razao_social='E Busca LTDA',
+            cnpj='44444444000191',
+        )
+        self.categoria = CategoriaProduto.objects.create(nome='Cat Busca')
+        self.vulcao = self._criar('Vulcão Colorido 12 tiros', '7891000300005')
+        self.bateria = self._criar('Bateria 100 tiros com vulcão', '7891000300012')
+        self.foguete = self._criar('Foguete Assobio', '7891000300029')
+        CodigoBarrasAlternativo.objects.create(
+            produto=self.foguete,
+            codigo_barras='7891000300036',
+            multiplicador=Decimal('12.000'),
+        )
+
+    def _criar(self, descricao, codigo_barras):
+        produto = Produto.objects.create(
+            categoria=self.categoria,
+            descricao=descricao,
+            classe_risco='1.4G',
+            ncm='36041000',
+            codigo_barras=codigo_barras,
+        )
+        _ensure_parametros(produto, self.empresa)
+        return produto
+
+    def _buscar(self, termo, **kwargs):
+        from produtos.utils import buscar_produtos_por_termo
+
+        kwargs.setdefault('empresa', self.empresa)
+        return list(buscar_produtos_por_termo(termo, **kwargs))
+
+    def test_sem_acento_e_relevancia(self):
+        """'vulcao' encontra 'Vulcão'; descrição que começa com o termo vem primeiro."""
+        self.assertEqual(self._buscar('vulcao'), [self.vulcao, self.bateria])
+
+    def test_prefixo_codigo_interno_primeiro(self):
+        resultado = self._buscar(self.foguete.codigo_interno)
+        self.assertEqual(resultado[0], self.foguete)
+
+    def test_codigo_alternativo_e_erro_de_digitacao(self):
+        self.assertEqual(self._buscar('7891000300036'), [self.foguete])
+        self.assertEqual(self._buscar('asobio'), [self.foguete])
+
+    def test_filtra_empresa_e_invalida_indice(self):
+        outra = Empresa.objects.create(
+            nome_fantasia='E2 Busca',
+            razao_social='E2 Busca LTDA',
+            cnpj='55555555000191',
+        )
+        self.assertEqual(self._buscar('foguete', empresa=outra), [])
+        _ensure_parametros(self.foguete, outra)
+        self.assertEqual(self._buscar('foguete', empresa=outra), [self.foguete])
+
+        self.foguete.descricao = 'Foguete Dourado'
+        self.foguete.save()
+        self.assertEqual(self._buscar('assobio'), [])
+        self.assertEqual(self._buscar('dourado'), [self.foguete])
+
+    def test_alteracao_em_outro_worker_vale_apos_a_verificacao(self):
+        import time
+        from unittest import mock
+        from django.utils import timezone
+
+        self.assertEqual(self._buscar('assobio'), [self.foguete])
+        # update() não dispara o signal: como um save feito em outro worker com LocMemCache
+        Produto.objects.filter(pk=self.foguete.pk).update(descricao='Foguete Dourado', updated_at=timezone.now())
+        self.assertEqual(self._buscar('dourado'), [])
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 6):
+            self.assertEqual(self._buscar('dourado'), [self.foguete])
+
+    def test_backend_banco_mantem_busca_original(self):
+        from django.test.utils import override_settings
+
+        with override_settings(PRODUTO_BUSCA_BACKEND='banco'):
+            self.assertEqual(
+                set(self._buscar('tiros')),
+                {self.vulcao, self.bateria},
+            )
@@ -4,7 +4,7 @@ Funções auxiliares para produtos.
 from decimal import Decimal
 from typing import TYPE_CHECKING, Optional, Tuple
 
-from django.db.models import Q
+from django.db.models import Case, FloatField, Value, When
 
 if TYPE_CHECKING:
     from produtos.models import CodigoBarrasAlternativo, Empresa, Produto
@@ -90,55 +90,44 @@ def buscar_produtos_por_termo(
     """
     Busca produtos por nome, código interno ou código de barras (principal/alternativo).
 
+    A busca é feita pelo backend de produtos/busca.py (pg_trgm + full-text no
+    PostgreSQL, índice de n-gramas em memória nos demais), com ordenação por
+    relevância: prefixo de código interno, código de barras exato, início da
+    descrição e similaridade.
+
     Args:
         termo: Termo de busca
         empresa: Filtrar por empresa (None = todos)
         limit: Limite de resultados
-        order_by: Campos para order_by (antes do slice)
-        select_related: Campos para select_related (antes do slice)
+        order_by: Desempate entre produtos de mesma relevância
+        select_related: Campos para select_related
 
     Returns:
-        QuerySet de Produto (distinct, limitado, ordenado)
+        QuerySet de Produto (anotado com relevancia, limitado, ordenado)
     """
-    from produtos.models import CodigoBarrasAlternativo, Produto
+    from produtos.busca import get_backend
+    from produtos.models import Produto
 
     if not termo:
         return Produto.objects.none()
 
     termo = termo.strip()
+    resultados = get_backend().buscar(termo, empresa_id=empresa.pk if empresa else None, limit=limit)
+    if not resultados:
+        return Produto.objects.none()
 
-    qs = Produto.objects.filter(is_active=True)
-    if empresa:
-        qs = qs.filter(
-            parametros_por_empresa__empresa=empresa,
-            parametros_por_empresa__ativo_nessa_empresa=True,
-        ).distinct()
-
-    produtos = qs.filter(
-        Q(descricao__icontains=termo)
-        | Q(codigo_interno__icontains=termo)
-        | Q(codigo_barras__icontains=termo)
+    relevancia = Case(
+        *[When(pk=pk, then=Value(rel)) for pk, rel in resultados],
+        default=Value(0.0),
+        output_field=FloatField(),
     )
-
-    ids_alt = CodigoBarrasAlternativo.objects.filter(
-        codigo_barras__icontains=termo,
-        produto__is_active=True,
+    qs = Produto.objects.filter(
         is_active=True,
-    )
-    if empresa:
-        ids_alt = ids_alt.filter(
-            produto__parametros_por_empresa__empresa=empresa,
-            produto__parametros_por_empresa__ativo_nessa_empresa=True,
-        )
-    ids_alt = ids_alt.values_list('produto_id', flat=True)
-
-    produtos = produtos | qs.filter(id__in=ids_alt)
-    qs = produtos.distinct()
+        pk__in=[pk for pk, _rel in resultados],
+    ).annotate(relevancia=relevancia)
     if select_related:
         qs = qs.select_related(*select_related)
-    if order_by:
-        qs = qs.order_by(*order_by)
-    return qs[:limit]
+    return qs.order_by('-relevancia', *order_by)
 
 
 def validar_codigo_barras_formato(codigo: str) -> Tuple[bool, str]:
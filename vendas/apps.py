@@ -6,3 +6,6 @@ class VendasConfig(AppConfig):
     name = 'vendas'
     verbose_name = 'Vendas'
 
+    def ready(self):
+        import vendas.signals  # noqa: F401
+
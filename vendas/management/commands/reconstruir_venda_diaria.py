@@ -0,0 +1,40 @@
+"""
+Reconstrói o fato VendaDiaria a partir dos pedidos faturados.
+
+O fato é mantido por delta a cada faturamento/cancelamento; este comando o
+recalcula do zero (carga inicial, exclusões pelo admin, SQL direto, update() em
+massa) e remove as linhas zeradas. Pode ser limitado a uma empresa e/ou período.
+
+Uso:
+  python manage.py reconstruir_venda_diaria
+  python manage.py reconstruir_venda_diaria --empresa 1 --data-inicio 2026-01-01 --data-fim 2026-01-31
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o fato VendaDiaria (dashboard/relatórios) a partir dos pedidos faturados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+        parser.add_argument('--data-inicio', type=date.fromisoformat, help='AAAA-MM-DD')
+        parser.add_argument('--data-fim', type=date.fromisoformat, help='AAAA-MM-DD')
+
+    def handle(self, *args, **options):
+        from core.models import Empresa
+        from vendas.venda_diaria import reconstruir
+
+        empresa = None
+        if options['empresa']:
+            empresa = Empresa.objects.filter(pk=options['empresa']).first()
+            if empresa is None:
+                raise CommandError(f'Empresa {options["empresa"]} não encontrada.')
+
+        linhas = reconstruir(
+            empresa=empresa,
+            data_inicio=options['data_inicio'],
+            data_fim=options['data_fim'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'VendaDiaria reconstruída: {linhas} linha(s).'))
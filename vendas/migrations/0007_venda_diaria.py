@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:33
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_chave_idempotencia'),
+        ('produtos', '0011_busca_textual'),
+        ('vendas', '0006_increase_document_fields_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('quantidade', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14, verbose_name='Quantidade')),
+                ('valor', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Valor')),
+                ('desconto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Desconto')),
+                ('pedidos', models.IntegerField(default=0, verbose_name='Pedidos')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='core.empresa', verbose_name='Empresa')),
+                ('loja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='core.loja', verbose_name='Loja')),
+                ('produto', models.ForeignKey(blank=True, help_text='Vazio na linha de totais do dia', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='produtos.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária',
+                'verbose_name_plural': 'Vendas Diárias',
+                'ordering': ['-data', 'loja', 'produto'],
+                'indexes': [models.Index(fields=['empresa', 'data'], name='vendas_vend_empresa_a5ed2e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('loja', 'data', 'produto'), name='venda_diaria_loja_data_produto'), models.UniqueConstraint(condition=models.Q(('produto__isnull', True)), fields=('loja', 'data'), name='venda_diaria_loja_data_total')],
+            },
+        ),
+    ]
@@ -2,6 +2,8 @@
 Modelos do módulo de vendas.
 """
 from django.db import models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.conf import settings
@@ -10,6 +12,8 @@ from core.models import BaseModel, Loja
 from pessoas.models import Cliente
 from produtos.models import Produto
 
+from .venda_diaria import alteracao_itens
+
 
 class CondicaoPagamento(BaseModel):
     """
@@ -179,14 +183,42 @@ class PedidoVenda(BaseModel):
     
     def recalcular_total(self):
         """
-        Recalcula o valor total do pedido somando os totais dos itens ativos.
+        Recalcula o valor total do pedido somando os totais dos itens ativos
+        (um único SUM no banco).
         """
-        total = Decimal('0.00')
-        for item in self.itens.filter(is_active=True):
-            total += item.total
-        self.valor_total = total
+        total = self.itens.filter(is_active=True).aggregate(
+            total=Coalesce(Sum('total'), Decimal('0.00')),
+        )['total']
+        self.valor_total = Decimal(total).quantize(Decimal('0.01'))
         self.save(update_fields=['valor_total', 'updated_at'])
-        return total
+        return self.valor_total
+
+    def adicionar_itens(self, itens):
+        """
+        Cria vários itens de uma vez e atualiza valor_total uma única vez.
+
+        Evita o custo de ItemPedidoVenda.save() por item (full_clean consultando as FKs
+        e recálculo do total do pedido a cada item): valida em lote, usa bulk_create
+        e faz um único SUM no final.
+
+        Args:
+            itens: lista de dicts com os campos de ItemPedidoVenda
+                (produto, quantidade, preco_unitario, desconto, codigo_barras_usado,
+                codigo_alternativo_usado, multiplicador_aplicado, created_by...)
+
+        Returns:
+            Lista de ItemPedidoVenda criados.
+        """
+        objetos = [ItemPedidoVenda(pedido=self, **dados) for dados in itens]
+        if not objetos:
+            return []
+        for item in objetos:
+            item.calcular_total()
+        ItemPedidoVenda.validar_em_lote(objetos)
+        with alteracao_itens(self):
+            criados = ItemPedidoVenda.objects.bulk_create(objetos)
+        self.recalcular_total()
+        return criados
 
 
 class ItemPedidoVenda(BaseModel):
@@ -281,22 +313,137 @@ class ItemPedidoVenda(BaseModel):
                     f'Código alternativo "{self.codigo_alternativo_usado.codigo_barras}" '
                     f'não pertence ao produto "{self.produto.descricao}".'
                 )
-    
-    def save(self, *args, **kwargs):
-        """
-        Calcula o total do item antes de salvar.
-        """
+
+    def calcular_total(self):
+        """Total do item (preço x quantidade - desconto), com 2 casas decimais."""
         self.total = (self.preco_unitario * self.quantidade) - self.desconto
-        # total é armazenado com 2 casas decimais
         try:
             self.total = Decimal(self.total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         except Exception:
             # deixa o Django validar/lançar erro se for inválido
             pass
+        return self.total
+
+    @classmethod
+    def validar_em_lote(cls, itens):
+        """
+        Equivalente ao full_clean() de cada item, com uma consulta por model relacionado
+        em vez de uma por item (existência de produtos e códigos alternativos + clean()).
+        """
+        from produtos.models import CodigoBarrasAlternativo
+
+        erros = []
+        for item in itens:
+            try:
+                item.clean_fields(exclude=[
+                    'pedido', 'produto', 'codigo_alternativo_usado', 'created_by', 'updated_by',
+                ])
+            except ValidationError as e:
+                erros.append(e)
+        if erros:
+            raise ValidationError(erros)
+
+        produtos = dict(
+            Produto._base_manager.filter(pk__in={i.produto_id for i in itens})
+            .values_list('pk', 'descricao')
+        )
+        ids_alt = {i.codigo_alternativo_usado_id for i in itens if i.codigo_alternativo_usado_id}
+        alternativos = {
+            pk: (produto_id, codigo)
+            for pk, produto_id, codigo in CodigoBarrasAlternativo._base_manager.filter(
+                pk__in=ids_alt,
+            ).values_list('pk', 'produto_id', 'codigo_barras')
+        }
+        for item in itens:
+            if item.produto_id not in produtos:
+                raise ValidationError({'produto': f'Produto {item.produto_id} não existe.'})
+            if not item.codigo_alternativo_usado_id:
+                continue
+            if item.codigo_alternativo_usado_id not in alternativos:
+                raise ValidationError({
+                    'codigo_alternativo_usado': (
+                        f'Código alternativo {item.codigo_alternativo_usado_id} não existe.'
+                    ),
+                })
+            produto_id, codigo = alternativos[item.codigo_alternativo_usado_id]
+            if produto_id != item.produto_id:
+                raise ValidationError(
+                    f'Código alternativo "{codigo}" '
+                    f'não pertence ao produto "{produtos[item.produto_id]}".'
+                )
+    
+    def save(self, *args, **kwargs):
+        """
+        Calcula o total do item antes de salvar.
+        """
+        self.calcular_total()
         # Garante validações (inclui clean() acima) antes de persistir.
         self.full_clean()
-        super().save(*args, **kwargs)
+        # Pedido já faturado: o fato VendaDiaria acompanha a alteração do item
+        with alteracao_itens(self.pedido):
+            super().save(*args, **kwargs)
         # Recalcula o total do pedido
         if self.pedido:
             self.pedido.recalcular_total()
 
+
+
+class VendaDiaria(models.Model):
+    """
+    Fato de vendas faturadas por loja, dia e produto (dashboard e relatórios).
+
+    Mantido por delta em vendas/venda_diaria.py quando um pedido entra ou sai de
+    FATURADO ou tem itens alterados depois de faturado. A linha com produto vazio
+    guarda os totais do dia da loja (pedidos distintos, valor, quantidade).
+    Linhas zeradas (pedidos = 0) ficam até a próxima reconstrução
+    (manage.py reconstruir_venda_diaria).
+    """
+
+    empresa = models.ForeignKey(
+        'core.Empresa',
+        on_delete=models.CASCADE,
+        related_name='vendas_diarias',
+        verbose_name='Empresa',
+    )
+    loja = models.ForeignKey(
+        Loja,
+        on_delete=models.CASCADE,
+        related_name='vendas_diarias',
+        verbose_name='Loja',
+    )
+    data = models.DateField('Data')
+    produto = models.ForeignKey(
+        Produto,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='vendas_diarias',
+        verbose_name='Produto',
+        help_text='Vazio na linha de totais do dia',
+    )
+    quantidade = models.DecimalField('Quantidade', max_digits=14, decimal_places=3, default=Decimal('0.000'))
+    valor = models.DecimalField('Valor', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    desconto = models.DecimalField('Desconto', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    pedidos = models.IntegerField('Pedidos', default=0)
+
+    class Meta:
+        verbose_name = 'Venda Diária'
+        verbose_name_plural = 'Vendas Diárias'
+        ordering = ['-data', 'loja', 'produto']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['loja', 'data', 'produto'],
+                name='venda_diaria_loja_data_produto',
+            ),
+            models.UniqueConstraint(
+                fields=['loja', 'data'],
+                condition=models.Q(produto__isnull=True),
+                name='venda_diaria_loja_data_total',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['empresa', 'data']),
+        ]
+
+    def __str__(self):
+        return f"{self.loja} - {self.data} - {self.produto or 'Total'}"
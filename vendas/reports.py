@@ -2,22 +2,29 @@
 Rotinas de relatório de vendas (consolidado).
 
 - Base: ItemPedidoVenda + PedidoVenda (somente FATURADO)
-- Export: Excel (openpyxl) e PDF (WeasyPrint)
+- Agrupamentos por produto/dia/mês sem filtros de cliente, categoria, classe de
+  risco ou fornecedor leem o fato VendaDiaria (vendas/venda_diaria.py)
+- Export: CSV e Excel (openpyxl write-only) em streaming, consolidado ou um item
+  por linha (ItemPedidoVenda), e PDF (WeasyPrint). As linhas vêm do banco por
+  .iterator(chunk_size=...): a memória não cresce com o número de linhas
 """
 from __future__ import annotations
 
+import csv
+import tempfile
 from dataclasses import dataclass
+from datetime import date, datetime, time
 from decimal import Decimal
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from django.db.models import Count, F, Sum
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q, Sum, Value
 from django.db.models.functions import TruncDate, TruncMonth
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.utils import timezone
 
 from produtos.models import CodigoBarrasAlternativo
-from vendas.models import ItemPedidoVenda
+from vendas.models import ItemPedidoVenda, VendaDiaria
 
 try:
     from weasyprint import HTML
@@ -26,6 +33,11 @@ try:
 except ImportError:
     WEASYPRINT_AVAILABLE = False
 
+# Linhas buscadas por vez do cursor nas exportações
+CHUNK_EXPORTACAO = 2000
+# XLSX até este tamanho fica em memória; acima, vai para arquivo temporário
+XLSX_MAX_MEMORIA = 8 * 1024 * 1024
+
 
 @dataclass(frozen=True)
 class TotaisRelatorio:
@@ -89,7 +101,44 @@ def aplicar_filtros(qs, form):
     return qs
 
 
+# Filtros que o fato VendaDiaria não tem (dimensões fora de loja/dia/produto)
+_FILTROS_FORA_DO_FATO = ("categoria", "cliente", "classe_risco", "fornecedor")
+
+
+def pode_usar_venda_diaria(form, agrupar_por: str) -> bool:
+    if agrupar_por not in ("produto", "dia", "mes") or not form.is_valid():
+        return False
+    return not any(form.cleaned_data.get(campo) for campo in _FILTROS_FORA_DO_FATO)
+
+
+def queryset_venda_diaria(empresa, form):
+    """
+    Linhas do fato VendaDiaria com os filtros do formulário (ver pode_usar_venda_diaria).
+
+    linha_total marca as linhas cujas somas formam os totais (quantidade, valor,
+    pedidos distintos): a de totais do dia ou, com filtro de produto, a do produto.
+    """
+    qs = VendaDiaria.objects.filter(pedidos__gt=0)
+    if empresa is not None:
+        qs = qs.filter(empresa=empresa)
+
+    cd = form.cleaned_data
+    if cd.get("data_inicio"):
+        qs = qs.filter(data__gte=cd["data_inicio"])
+    if cd.get("data_fim"):
+        qs = qs.filter(data__lte=cd["data_fim"])
+    if cd.get("loja"):
+        qs = qs.filter(loja=cd["loja"])
+    if cd.get("produto"):
+        return qs.filter(produto=cd["produto"]).alias(linha_total=Value(True))
+    return qs.alias(
+        linha_total=ExpressionWrapper(Q(produto__isnull=True), output_field=BooleanField()),
+    )
+
+
 def calcular_totais(qs) -> TotaisRelatorio:
+    if qs.model is VendaDiaria:
+        return _calcular_totais_venda_diaria(qs)
     agg = qs.aggregate(
         total_quantidade=Sum("quantidade"),
         total_valor=Sum("total"),
@@ -106,7 +155,35 @@ def calcular_totais(qs) -> TotaisRelatorio:
     )
 
 
+def _calcular_totais_venda_diaria(qs) -> TotaisRelatorio:
+    total = Q(linha_total=True)
+    agg = qs.aggregate(
+        total_quantidade=Sum("quantidade", filter=total),
+        total_valor=Sum("valor", filter=total),
+        total_desconto=Sum("desconto", filter=total),
+        total_pedidos=Sum("pedidos", filter=total),
+        total_produtos=Count("produto_id", distinct=True),
+    )
+    return TotaisRelatorio(
+        total_quantidade=agg["total_quantidade"] or Decimal("0.000"),
+        total_valor=agg["total_valor"] or Decimal("0.00"),
+        total_desconto=agg["total_desconto"] or Decimal("0.00"),
+        total_pedidos=int(agg["total_pedidos"] or 0),
+        total_produtos=int(agg["total_produtos"] or 0),
+    )
+
+
 def top_produtos(qs, limit: int = 10):
+    if qs.model is VendaDiaria:
+        return list(
+            qs.filter(produto__isnull=False)
+            .values("produto_id", "produto__codigo_interno", "produto__descricao")
+            .annotate(
+                quantidade=Sum("quantidade"),
+                valor_total=Sum("valor"),
+            )
+            .order_by("-quantidade")[:limit]
+        )
     return list(
         qs.values("produto_id", "produto__codigo_interno", "produto__descricao")
         .annotate(
@@ -140,6 +217,8 @@ def codigos_alternativos_info(produto_id: Optional[int]) -> List[Dict[str, Any]]
 
 def agregar(qs, agrupar_por: str, ordenar_por: str):
     # Para simplificar ordenação, normalizamos campos “nome/valor_total/quantidade”
+    if qs.model is VendaDiaria:
+        return _agregar_venda_diaria(qs, agrupar_por, ordenar_por)
     if agrupar_por == "produto":
         base = qs.values(
             "produto_id",
@@ -217,10 +296,151 @@ def agregar(qs, agrupar_por: str, ordenar_por: str):
     return []
 
 
-def exportar_excel(dados: List[Dict[str, Any]], totais: TotaisRelatorio, filtros_desc: str) -> HttpResponse:
+def _agregar_venda_diaria(qs, agrupar_por: str, ordenar_por: str):
+    """agregar() sobre o fato VendaDiaria, com as mesmas chaves da versão por itens."""
+    if agrupar_por == "produto":
+        base = qs.filter(produto__isnull=False).values(
+            "produto_id",
+            "produto__codigo_interno",
+            "produto__descricao",
+            "produto__categoria__nome",
+            "produto__classe_risco",
+        ).annotate(
+            nome=F("produto__descricao"),
+            quantidade=Sum("quantidade"),
+            valor_total=Sum("valor"),
+            pedidos_count=Sum("pedidos"),
+        )
+        return base.order_by(ordenar_por)
+
+    total = Q(linha_total=True)
+    somas = {
+        "quantidade": Sum("quantidade", filter=total),
+        "valor_total": Sum("valor", filter=total),
+        "produtos_count": Count("produto_id", distinct=True),
+        "pedidos_count": Sum("pedidos", filter=total),
+    }
+    if agrupar_por == "dia":
+        return qs.values("data").annotate(nome=F("data"), **somas).order_by("-data")
+
+    if agrupar_por == "mes":
+        # TruncMonth de uma data devolve date; a versão por itens trunca o datetime
+        # de emissão (meia-noite local do 1º dia), então convertemos para o mesmo valor
+        dados = []
+        for row in qs.values(mes=TruncMonth("data")).annotate(**somas).order_by("-mes"):
+            inicio = timezone.make_aware(datetime.combine(row.pop("mes"), time.min))
+            dados.append({"data": inicio, "nome": inicio, **row})
+        return dados
+
+    return []
+
+
+COLUNAS_CONSOLIDADO = ["Nome", "Quantidade", "Valor Total", "Pedidos", "Produtos"]
+
+COLUNAS_ITENS = [
+    "Data",
+    "Pedido",
+    "Loja",
+    "Cliente",
+    "Código",
+    "Produto",
+    "Categoria",
+    "Quantidade",
+    "Preço Unitário",
+    "Desconto",
+    "Total",
+    "Código Usado",
+    "Fornecedor (código alternativo)",
+]
+
+
+def linhas_consolidado(dados) -> Iterator[List[Any]]:
+    """Linhas da exportação consolidada a partir do resultado de agregar()."""
+    if hasattr(dados, "iterator"):
+        dados = dados.iterator(chunk_size=CHUNK_EXPORTACAO)
+    for item in dados:
+        yield [
+            str(item.get("nome") or "—"),
+            item.get("quantidade") or Decimal("0"),
+            item.get("valor_total") or Decimal("0"),
+            int(item.get("pedidos_count") or 0),
+            int(item.get("produtos_count") or 0),
+        ]
+
+
+def linhas_itens(qs) -> Iterator[List[Any]]:
+    """Uma linha por ItemPedidoVenda de queryset_base_vendas/aplicar_filtros, na ordem de emissão."""
+    campos = (
+        "pedido__data_emissao",
+        "pedido_id",
+        "pedido__loja__nome",
+        "pedido__cliente__nome_razao_social",
+        "produto__codigo_interno",
+        "produto__descricao",
+        "produto__categoria__nome",
+        "quantidade",
+        "preco_unitario",
+        "desconto",
+        "total",
+        "codigo_barras_usado",
+        "codigo_alternativo_usado__fornecedor__razao_social",
+    )
+    linhas = (
+        qs.order_by("pedido__data_emissao", "pedido_id", "pk")
+        .values_list(*campos)
+        .iterator(chunk_size=CHUNK_EXPORTACAO)
+    )
+    for emissao, *resto in linhas:
+        yield [timezone.localtime(emissao) if emissao else None, *resto]
+
+
+def _valor_csv(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime("%d/%m/%Y %H:%M")
+    if isinstance(valor, date):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, (Decimal, float)):
+        # Separador decimal do Excel em pt-BR
+        return str(valor).replace(".", ",")
+    return str(valor)
+
+
+class _Eco:
+    """Arquivo falso para o csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def exportar_csv(cabecalhos: Sequence[str], linhas: Iterable[Sequence[Any]], nome_arquivo: str) -> StreamingHttpResponse:
+    """CSV (;, UTF-8 com BOM, vírgula decimal) enviado conforme as linhas são lidas."""
+    writer = csv.writer(_Eco(), delimiter=";")
+
+    def conteudo():
+        yield "\ufeff" + writer.writerow(cabecalhos)
+        for linha in linhas:
+            yield writer.writerow([_valor_csv(v) for v in linha])
+
+    resp = StreamingHttpResponse(conteudo(), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{nome_arquivo}"'
+    return resp
+
+
+def _planilha_excel(
+    titulo: str,
+    cabecalhos: Sequence[str],
+    linhas: Iterable[Sequence[Any]],
+    totais: TotaisRelatorio,
+    filtros_desc: str,
+    nome_arquivo: str,
+    larguras: Sequence[int],
+) -> HttpResponse:
     try:
         from openpyxl import Workbook
-        from openpyxl.styles import Alignment, Font, PatternFill
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
         from openpyxl.utils import get_column_letter
     except ImportError:
         return HttpResponse(
@@ -228,50 +448,70 @@ def exportar_excel(dados: List[Dict[str, Any]], totais: TotaisRelatorio, filtros
             status=500,
         )
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relatório de Vendas"
-
-    ws.merge_cells("A1:F1")
-    ws["A1"] = "RELATÓRIO DE VENDAS (FATURADO)"
-    ws["A1"].font = Font(size=16, bold=True)
-    ws["A1"].alignment = Alignment(horizontal="center")
-
-    ws["A3"] = "Filtros:"
-    ws["B3"] = filtros_desc
-
-    ws["A5"] = "Total Quantidade:"
-    ws["B5"] = float(totais.total_quantidade)
-    ws["A6"] = "Total Valor:"
-    ws["B6"] = float(totais.total_valor)
-    ws["A7"] = "Total Pedidos:"
-    ws["B7"] = totais.total_pedidos
-
-    row = 9
-    headers = ["Nome", "Quantidade", "Valor Total", "Pedidos", "Produtos"]
-    for col, h in enumerate(headers, start=1):
-        c = ws.cell(row=row, column=col, value=h)
-        c.font = Font(bold=True)
-        c.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
-    row += 1
+    # write-only: as linhas vão direto para o XML da planilha, sem células em memória
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Relatório de Vendas")
+    for col, largura in enumerate(larguras, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = largura
+
+    def celula(valor, **estilo):
+        c = WriteOnlyCell(ws, value=valor)
+        for nome, v in estilo.items():
+            setattr(c, nome, v)
+        return c
+
+    ws.append([celula(titulo, font=Font(size=16, bold=True))])
+    ws.append([])
+    ws.append(["Filtros:", filtros_desc])
+    ws.append([])
+    ws.append(["Total Quantidade:", float(totais.total_quantidade)])
+    ws.append(["Total Valor:", float(totais.total_valor)])
+    ws.append(["Total Pedidos:", totais.total_pedidos])
+    ws.append([])
+
+    fundo = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
+    ws.append([celula(h, font=Font(bold=True), fill=fundo) for h in cabecalhos])
+    for linha in linhas:
+        ws.append([
+            float(v) if isinstance(v, Decimal)
+            else v.replace(tzinfo=None) if isinstance(v, datetime)
+            else v
+            for v in linha
+        ])
+
+    arquivo = tempfile.SpooledTemporaryFile(max_size=XLSX_MAX_MEMORIA)
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=nome_arquivo,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
 
-    for item in dados:
-        ws.cell(row=row, column=1, value=str(item.get("nome") or "—"))
-        ws.cell(row=row, column=2, value=float(item.get("quantidade") or 0))
-        ws.cell(row=row, column=3, value=float(item.get("valor_total") or 0))
-        ws.cell(row=row, column=4, value=int(item.get("pedidos_count") or 0))
-        ws.cell(row=row, column=5, value=int(item.get("produtos_count") or 0))
-        row += 1
-
-    for col in range(1, 6):
-        ws.column_dimensions[get_column_letter(col)].width = 24 if col == 1 else 16
-
-    resp = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+def exportar_excel(dados: Iterable[Dict[str, Any]], totais: TotaisRelatorio, filtros_desc: str) -> HttpResponse:
+    return _planilha_excel(
+        "RELATÓRIO DE VENDAS (FATURADO)",
+        COLUNAS_CONSOLIDADO,
+        linhas_consolidado(dados),
+        totais,
+        filtros_desc,
+        "relatorio_vendas.xlsx",
+        [24, 16, 16, 16, 16],
+    )
+
+
+def exportar_excel_itens(qs, totais: TotaisRelatorio, filtros_desc: str) -> HttpResponse:
+    return _planilha_excel(
+        "RELATÓRIO DE VENDAS (FATURADO) - ITENS",
+        COLUNAS_ITENS,
+        linhas_itens(qs),
+        totais,
+        filtros_desc,
+        "relatorio_vendas_itens.xlsx",
+        [17, 10, 20, 30, 14, 36, 18, 12, 14, 12, 12, 16, 30],
     )
-    resp["Content-Disposition"] = 'attachment; filename="relatorio_vendas.xlsx"'
-    wb.save(resp)
-    return resp
 
 
 def exportar_pdf(request, dados: List[Dict[str, Any]], totais: TotaisRelatorio, context_extra: Dict[str, Any]) -> HttpResponse:
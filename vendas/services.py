@@ -7,7 +7,7 @@ from django.utils import timezone
 from decimal import Decimal
 from typing import List, Dict, Optional
 import random
-from .models import PedidoVenda, ItemPedidoVenda, CondicaoPagamento
+from .models import PedidoVenda, CondicaoPagamento
 from produtos.models import Produto
 from produtos.models import CodigoBarrasAlternativo
 from pessoas.models import Cliente
@@ -87,15 +87,7 @@ def criar_pedido_venda_balcao(
     
     # Se não houver cliente, cria ou busca cliente genérico "Consumidor Final"
     if not cliente:
-        cliente, _ = Cliente.objects.get_or_create(
-            empresa=loja.empresa,
-            tipo_pessoa='PF',
-            nome_razao_social='Consumidor Final',
-            cpf_cnpj='00000000000',
-            defaults={
-                'created_by': usuario,
-            }
-        )
+        cliente = Cliente.consumidor_final(loja.empresa, usuario)
         logger.info(f"Usando cliente genérico 'Consumidor Final' para venda balcão")
     
     # Cria o pedido
@@ -111,7 +103,7 @@ def criar_pedido_venda_balcao(
     )
     
     # Cria os itens
-    valor_total_pedido = Decimal('0.00')
+    dados_itens = []
     produtos_com_restricao = []
     
     for item_data in itens:
@@ -163,23 +155,20 @@ def criar_pedido_venda_balcao(
             # TODO: No futuro, exigir dados específicos do comprador para produtos com restrição
             # TODO: Registrar em auditoria para possível verificação futura
         
-        item = ItemPedidoVenda.objects.create(
-            pedido=pedido,
-            produto=produto,
-            quantidade=quantidade,
-            preco_unitario=preco_unitario,
-            desconto=desconto,
-            codigo_barras_usado=codigo_barras_usado,
-            codigo_alternativo_usado=codigo_alt_obj,
-            multiplicador_aplicado=multiplicador_aplicado,
-            created_by=usuario,
-        )
-        
-        valor_total_pedido += item.total
+        dados_itens.append({
+            'produto': produto,
+            'quantidade': quantidade,
+            'preco_unitario': preco_unitario,
+            'desconto': desconto,
+            'codigo_barras_usado': codigo_barras_usado,
+            'codigo_alternativo_usado': codigo_alt_obj,
+            'multiplicador_aplicado': multiplicador_aplicado,
+            'created_by': usuario,
+        })
     
-    # Atualiza valor total do pedido
-    pedido.valor_total = valor_total_pedido
-    pedido.save(update_fields=['valor_total', 'updated_at'])
+    # Grava os itens em lote e atualiza o valor total do pedido uma única vez
+    pedido.adicionar_itens(dados_itens)
+    valor_total_pedido = pedido.valor_total
     
     # Baixa estoque
     if local_estoque:
@@ -0,0 +1,52 @@
+"""
+Signals do módulo de vendas: manutenção do fato VendaDiaria (vendas/venda_diaria.py).
+"""
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import PedidoVenda
+from .venda_diaria import atualizar_pedido, contabilizado, data_venda
+
+# Campos que mudam a contribuição do pedido no fato
+_CAMPOS_VENDA_DIARIA = {'status', 'is_active', 'loja', 'loja_id'}
+
+
+def _chave(pedido):
+    return (pedido.loja_id, data_venda(pedido.data_emissao)) if contabilizado(pedido) else None
+
+
+@receiver(pre_save, sender=PedidoVenda)
+def guardar_contabilizacao_anterior(sender, instance, update_fields=None, **kwargs):
+    """Guarda (loja, dia) em que o pedido estava contabilizado no banco (None se não estava)."""
+    instance._venda_diaria_verificar = update_fields is None or bool(
+        _CAMPOS_VENDA_DIARIA & set(update_fields)
+    )
+    instance._venda_diaria_anterior = None
+    if not instance.pk or not instance._venda_diaria_verificar:
+        return
+    anterior = sender._base_manager.filter(pk=instance.pk).only(
+        'status', 'is_active', 'loja_id', 'data_emissao',
+    ).first()
+    if anterior is not None:
+        instance._venda_diaria_anterior = _chave(anterior)
+
+
+@receiver(post_save, sender=PedidoVenda)
+def atualizar_venda_diaria(sender, instance, **kwargs):
+    if not getattr(instance, '_venda_diaria_verificar', True):
+        return
+    anterior = getattr(instance, '_venda_diaria_anterior', None)
+    atual = _chave(instance)
+    if anterior == atual:
+        return
+    if anterior is not None:
+        atualizar_pedido(instance, -1, loja_id=anterior[0], data=anterior[1])
+    if atual is not None:
+        atualizar_pedido(instance, 1)
+
+
+@receiver(pre_delete, sender=PedidoVenda)
+def retirar_pedido_excluido(sender, instance, **kwargs):
+    # pre_delete: os itens ainda existem para calcular a contribuição
+    if contabilizado(instance):
+        atualizar_pedido(instance, -1)
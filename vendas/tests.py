@@ -0,0 +1,303 @@
+"""
+Testes do app vendas.
+"""
+import pytest
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Empresa, Loja
+from pessoas.models import Cliente
+from produtos.models import CategoriaProduto, CodigoBarrasAlternativo, Produto, ProdutoParametrosEmpresa
+
+from .models import CondicaoPagamento, ItemPedidoVenda, PedidoVenda
+
+
+@pytest.fixture
+def pedido_e_produtos():
+    empresa = Empresa.objects.create(
+        nome_fantasia='Empresa Itens',
+        razao_social='Empresa Itens LTDA',
+        cnpj='66666666000166',
+    )
+    loja = Loja.objects.create(empresa=empresa, nome='Loja Itens')
+    usuario = get_user_model().objects.create_user('vendedor_itens', password='secret123')
+    cliente = Cliente.objects.create(
+        empresa=empresa,
+        tipo_pessoa='PF',
+        nome_razao_social='Cliente Itens',
+        cpf_cnpj='12345678901',
+    )
+    condicao = CondicaoPagamento.objects.create(
+        empresa=empresa,
+        nome='À vista',
+        numero_parcelas=1,
+        dias_entre_parcelas=0,
+    )
+    pedido = PedidoVenda.objects.create(
+        loja=loja,
+        cliente=cliente,
+        tipo_venda='BALCAO',
+        vendedor=usuario,
+        condicao_pagamento=condicao,
+    )
+    categoria = CategoriaProduto.objects.create(nome='Cat Itens')
+    produtos = [
+        Produto.objects.create(
+            categoria=categoria,
+            descricao=f'Produto item {i}',
+            classe_risco='1.4G',
+            ncm='36041000',
+        )
+        for i in range(8)
+    ]
+    return pedido, produtos, usuario
+
+
+def _dados(produtos, usuario):
+    return [
+        {
+            'produto': produto,
+            'quantidade': Decimal('3.000'),
+            'preco_unitario': Decimal('2.50'),
+            'desconto': Decimal('0.50'),
+            'created_by': usuario,
+        }
+        for produto in produtos
+    ]
+
+
+@pytest.mark.django_db
+class TestItensPedidoVenda:
+    """Criação de itens em lote e recálculo do total por agregação."""
+
+    def test_adicionar_itens_calcula_totais(self, pedido_e_produtos):
+        pedido, produtos, usuario = pedido_e_produtos
+        itens = pedido.adicionar_itens(_dados(produtos[:3], usuario))
+
+        assert [i.total for i in itens] == [Decimal('7.00')] * 3
+        pedido.refresh_from_db()
+        assert pedido.valor_total == Decimal('21.00')
+        assert pedido.itens.count() == 3
+
+    def test_numero_de_consultas_nao_cresce_com_itens(self, pedido_e_produtos):
+        pedido, produtos, usuario = pedido_e_produtos
+        with CaptureQueriesContext(connection) as poucos:
+            pedido.adicionar_itens(_dados(produtos[:1], usuario))
+        with CaptureQueriesContext(connection) as muitos:
+            pedido.adicionar_itens(_dados(produtos[1:], usuario))
+        assert len(muitos) == len(poucos)
+        pedido.refresh_from_db()
+        assert pedido.valor_total == Decimal('56.00')
+
+    def test_codigo_alternativo_de_outro_produto_rejeitado(self, pedido_e_produtos):
+        pedido, produtos, usuario = pedido_e_produtos
+        alternativo = CodigoBarrasAlternativo.objects.create(
+            produto=produtos[1],
+            codigo_barras='7891000400001',
+        )
+        dados = _dados(produtos[:1], usuario)
+        dados[0]['codigo_alternativo_usado'] = alternativo
+
+        with pytest.raises(ValidationError, match='não pertence ao produto'):
+            pedido.adicionar_itens(dados)
+        assert not pedido.itens.exists()
+
+    def test_recalcular_total_ignora_itens_inativos(self, pedido_e_produtos):
+        pedido, produtos, usuario = pedido_e_produtos
+        item = ItemPedidoVenda.objects.create(pedido=pedido, **_dados(produtos[:1], usuario)[0])
+        ItemPedidoVenda.objects.create(pedido=pedido, **_dados(produtos[1:2], usuario)[0])
+        pedido.refresh_from_db()
+        assert pedido.valor_total == Decimal('14.00')
+
+        ItemPedidoVenda.objects.filter(pk=item.pk).update(is_active=False)
+        assert pedido.recalcular_total() == Decimal('7.00')
+
+
+def _linhas_fato():
+    from .models import VendaDiaria
+
+    return sorted(
+        (l.loja_id, l.data, l.produto_id or 0, l.quantidade, l.valor, l.desconto, l.pedidos)
+        for l in VendaDiaria.objects.filter(pedidos__gt=0)
+    )
+
+
+@pytest.mark.django_db
+class TestVendaDiaria:
+    """Fato de vendas diárias mantido por delta e equivalente ao relatório por itens."""
+
+    def _faturar(self, pedido):
+        pedido.status = 'FATURADO'
+        pedido.save()
+
+    def test_delta_acompanha_faturamento_itens_e_cancelamento(self, pedido_e_produtos):
+        from .models import VendaDiaria
+        from .venda_diaria import data_venda, reconstruir
+
+        pedido, produtos, usuario = pedido_e_produtos
+        pedido.adicionar_itens(_dados(produtos[:2], usuario))
+        assert _linhas_fato() == []
+
+        self._faturar(pedido)
+        total = VendaDiaria.objects.get(produto__isnull=True)
+        assert (total.quantidade, total.valor, total.desconto, total.pedidos) == (
+            Decimal('6.000'), Decimal('14.00'), Decimal('1.00'), 1,
+        )
+        assert total.data == data_venda(pedido.data_emissao)
+        assert total.empresa_id == pedido.loja.empresa_id
+
+        # Itens alterados depois de faturado (inclusão, item desativado)
+        pedido.adicionar_itens(_dados(produtos[:1], usuario))
+        item = pedido.itens.filter(produto=produtos[1]).get()
+        item.is_active = False
+        item.save()
+        linha = VendaDiaria.objects.get(produto=produtos[0])
+        assert (linha.quantidade, linha.valor, linha.pedidos) == (Decimal('6.000'), Decimal('14.00'), 1)
+        assert VendaDiaria.objects.get(produto=produtos[1]).pedidos == 0
+
+        esperado = _linhas_fato()
+        reconstruir()
+        assert _linhas_fato() == esperado
+
+        pedido.status = 'CANCELADO'
+        pedido.save(update_fields=['status', 'updated_at'])
+        assert _linhas_fato() == []
+
+    def test_relatorio_pelo_fato_igual_ao_dos_itens(self, pedido_e_produtos):
+        from . import reports
+        from .forms import RelatorioVendasForm
+
+        pedido, produtos, usuario = pedido_e_produtos
+        pedido.adicionar_itens(_dados(produtos[:3], usuario))
+        self._faturar(pedido)
+        outro = PedidoVenda.objects.create(
+            loja=pedido.loja,
+            cliente=pedido.cliente,
+            tipo_venda='BALCAO',
+            vendedor=usuario,
+            condicao_pagamento=pedido.condicao_pagamento,
+            status='FATURADO',
+        )
+        outro.adicionar_itens(_dados(produtos[2:4], usuario))
+        empresa = pedido.loja.empresa
+        ProdutoParametrosEmpresa.objects.create(empresa=empresa, produto=produtos[2], preco_venda=Decimal('2.50'))
+
+        for agrupar_por in ['produto', 'dia', 'mes']:
+            for filtros in [{}, {'produto': produtos[2].pk}]:
+                form = RelatorioVendasForm(
+                    {'agrupar_por': agrupar_por, 'ordenar_por': 'nome', **filtros}, empresa=empresa,
+                )
+                assert reports.pode_usar_venda_diaria(form, agrupar_por)
+                fato = reports.queryset_venda_diaria(empresa, form)
+                itens = reports.aplicar_filtros(reports.queryset_base_vendas(empresa), form)
+                assert list(reports.agregar(fato, agrupar_por, 'nome')) == list(
+                    reports.agregar(itens, agrupar_por, 'nome')
+                )
+                assert reports.calcular_totais(fato) == reports.calcular_totais(itens)
+                assert reports.top_produtos(fato) == reports.top_produtos(itens)
+
+        form = RelatorioVendasForm(
+            {'agrupar_por': 'produto', 'ordenar_por': 'nome', 'cliente': pedido.cliente.pk}, empresa=empresa,
+        )
+        assert not reports.pode_usar_venda_diaria(form, 'produto')
+
+    def test_leitura_soma_pedidos_abertos(self, pedido_e_produtos, client):
+        from core.models import UsuarioEmpresa
+        from core.tenant import SESSION_KEY
+
+        from .venda_diaria import data_venda, top_produtos, valor_por_dia
+
+        pedido, produtos, usuario = pedido_e_produtos
+        pedido.adicionar_itens(_dados(produtos[:2], usuario))
+        self._faturar(pedido)
+        aberto = PedidoVenda.objects.create(
+            loja=pedido.loja,
+            cliente=pedido.cliente,
+            tipo_venda='BALCAO',
+            vendedor=usuario,
+            condicao_pagamento=pedido.condicao_pagamento,
+            status='ABERTO',
+        )
+        aberto.adicionar_itens(_dados(produtos[1:2] * 2 + produtos[5:6], usuario))
+        empresa = pedido.loja.empresa
+        hoje = data_venda(pedido.data_emissao)
+
+        assert valor_por_dia(empresa, hoje) == {hoje: Decimal('14.00')}
+        assert valor_por_dia(empresa, hoje, incluir_abertos=True) == {hoje: Decimal('35.00')}
+        top = top_produtos(empresa, desde=hoje, limite=2, incluir_abertos=True)
+        assert [(p['produto_id'], p['quantidade']) for p in top] == [
+            (produtos[1].pk, Decimal('9.000')),
+            (produtos[0].pk, Decimal('3.000')),
+        ]
+        assert [p['produto_id'] for p in top_produtos(loja=pedido.loja, limite=1)] == [produtos[0].pk]
+
+        UsuarioEmpresa.objects.create(user=usuario, empresa=empresa)
+        client.force_login(usuario)
+        session = client.session
+        session[SESSION_KEY] = empresa.pk
+        session.save()
+        response = client.get('/')
+        assert response.status_code == 200
+        assert response.context['produtos_labels'] == '["Produto item 1", "Produto item 0", "Produto item 5"]'
+
+
+@pytest.mark.django_db
+class TestExportacaoRelatorio:
+    """Exportações do relatório de vendas em streaming (CSV/XLSX, consolidado e por item)."""
+
+    @pytest.fixture
+    def cliente_logado(self, pedido_e_produtos, client):
+        from core.models import UsuarioEmpresa
+        from core.tenant import SESSION_KEY
+
+        pedido, produtos, usuario = pedido_e_produtos
+        pedido.adicionar_itens(_dados(produtos[:3], usuario))
+        pedido.status = 'FATURADO'
+        pedido.save()
+        UsuarioEmpresa.objects.create(user=usuario, empresa=pedido.loja.empresa)
+        client.force_login(usuario)
+        session = client.session
+        session[SESSION_KEY] = pedido.loja.empresa.pk
+        session.save()
+        return client
+
+    def _csv(self, response):
+        assert response.streaming
+        conteudo = b''.join(response.streaming_content).decode('utf-8')
+        assert conteudo.startswith('\ufeff')
+        return [linha.split(';') for linha in conteudo[1:].splitlines()]
+
+    def test_csv_consolidado_e_por_item(self, cliente_logado):
+        url = '/vendas/relatorios/vendas/'
+        filtros = {'agrupar_por': 'produto', 'ordenar_por': 'nome'}
+        linhas = self._csv(cliente_logado.get(url, {**filtros, 'export': 'csv'}))
+        assert linhas[0] == ['Nome', 'Quantidade', 'Valor Total', 'Pedidos', 'Produtos']
+        assert [
+            (nome, Decimal(qtd.replace(',', '.')), Decimal(valor.replace(',', '.')), pedidos)
+            for nome, qtd, valor, pedidos, _produtos in linhas[1:]
+        ] == [(f'Produto item {i}', Decimal('3'), Decimal('7'), '1') for i in range(3)]
+
+        linhas = self._csv(cliente_logado.get(url, {**filtros, 'export': 'itens_csv'}))
+        assert len(linhas) == 4
+        assert linhas[0][:2] == ['Data', 'Pedido']
+        assert [l[5] for l in linhas[1:]] == ['Produto item 0', 'Produto item 1', 'Produto item 2']
+        assert linhas[1][7:11] == ['3,000', '2,50', '0,50', '7,00']
+
+    def test_excel_por_item(self, cliente_logado):
+        openpyxl = pytest.importorskip('openpyxl')
+        from io import BytesIO
+
+        response = cliente_logado.get(
+            '/vendas/relatorios/vendas/', {'agrupar_por': 'produto', 'ordenar_por': 'nome', 'export': 'itens_excel'},
+        )
+        assert response.streaming
+        assert 'relatorio_vendas_itens.xlsx' in response['Content-Disposition']
+        planilha = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        linhas = list(planilha.iter_rows(values_only=True))
+        assert linhas[8][0] == 'Data'
+        assert [l[5] for l in linhas[9:]] == ['Produto item 0', 'Produto item 1', 'Produto item 2']
+        assert linhas[9][10] == 7.0
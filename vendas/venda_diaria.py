@@ -0,0 +1,276 @@
+"""
+Manutenção e leitura do fato VendaDiaria (vendas faturadas por loja/dia/produto).
+
+O fato soma a contribuição de cada pedido contabilizado (FATURADO e ativo): por
+produto, a soma dos itens ativos; na linha de totais (produto vazio), o pedido
+inteiro. As atualizações são deltas na mesma transação da venda:
+
+- pedido entra em FATURADO → soma a contribuição; sai (cancelado, inativo) → subtrai
+- itens alterados num pedido já faturado (ItemPedidoVenda.save, adicionar_itens)
+  → subtrai a contribuição antes e soma de novo depois (alteracao_itens)
+
+Exclusões físicas e update()/bulk_update em massa não passam por aqui e só
+aparecem após manage.py reconstruir_venda_diaria.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+STATUS_CONTABILIZADO = 'FATURADO'
+
+_ZERO_QTD = Decimal('0.000')
+_ZERO_VALOR = Decimal('0.00')
+
+
+def contabilizado(pedido) -> bool:
+    return pedido.status == STATUS_CONTABILIZADO and pedido.is_active
+
+
+def data_venda(data_emissao) -> date:
+    """Dia da venda no fuso do sistema (o mesmo de TruncDate nas consultas)."""
+    return timezone.localtime(data_emissao).date()
+
+
+def _contribuicao(pedido_id) -> Dict[int, Tuple[Decimal, Decimal, Decimal]]:
+    """Itens ativos do pedido somados por produto: {produto_id: (quantidade, valor, desconto)}."""
+    from .models import ItemPedidoVenda
+
+    return {
+        row['produto_id']: (row['quantidade'], row['valor'], row['desconto'])
+        for row in ItemPedidoVenda.objects.filter(pedido_id=pedido_id, is_active=True)
+        .values('produto_id')
+        .annotate(quantidade=Sum('quantidade'), valor=Sum('total'), desconto=Sum('desconto'))
+        .order_by()
+    }
+
+
+def _aplicar(empresa_id, loja_id, data, contribuicao, sinal: int):
+    """Soma (sinal=1) ou subtrai (sinal=-1) uma contribuição nas linhas do fato."""
+    from .models import VendaDiaria
+
+    deltas = {
+        produto_id: (quantidade, valor, desconto, 1)
+        for produto_id, (quantidade, valor, desconto) in contribuicao.items()
+    }
+    # Totais do dia; como nos relatórios, só conta pedido com itens ativos
+    deltas[None] = (
+        sum((q for q, _v, _d in contribuicao.values()), _ZERO_QTD),
+        sum((v for _q, v, _d in contribuicao.values()), _ZERO_VALOR),
+        sum((d for _q, _v, d in contribuicao.values()), _ZERO_VALOR),
+        1 if contribuicao else 0,
+    )
+
+    with transaction.atomic():
+        # Garante as linhas (concorrentes podem criar as mesmas) e as trava em ordem
+        VendaDiaria.objects.bulk_create(
+            [
+                VendaDiaria(empresa_id=empresa_id, loja_id=loja_id, data=data, produto_id=produto_id)
+                for produto_id in deltas
+            ],
+            ignore_conflicts=True,
+        )
+        produtos = [p for p in deltas if p is not None]
+        linhas = list(
+            VendaDiaria.objects.select_for_update()
+            .filter(loja_id=loja_id, data=data)
+            .filter(Q(produto_id__in=produtos) | Q(produto__isnull=True))
+            .order_by('pk')
+        )
+        for linha in linhas:
+            quantidade, valor, desconto, pedidos = deltas[linha.produto_id]
+            linha.quantidade += sinal * quantidade
+            linha.valor += sinal * valor
+            linha.desconto += sinal * desconto
+            linha.pedidos += sinal * pedidos
+        VendaDiaria.objects.bulk_update(linhas, ['quantidade', 'valor', 'desconto', 'pedidos'])
+
+
+def atualizar_pedido(pedido, sinal: int, loja_id=None, data=None):
+    """
+    Soma/subtrai no fato a contribuição atual (itens gravados) do pedido.
+    loja_id/data permitem usar a chave anterior quando o pedido mudou de loja.
+    """
+    from core.models import Loja
+
+    loja_id = loja_id or pedido.loja_id
+    empresa_id = Loja.objects.filter(pk=loja_id).values_list('empresa_id', flat=True).get()
+    _aplicar(
+        empresa_id,
+        loja_id,
+        data or data_venda(pedido.data_emissao),
+        _contribuicao(pedido.pk),
+        sinal,
+    )
+
+
+@contextmanager
+def alteracao_itens(pedido):
+    """
+    Envolve alterações nos itens de um pedido: se já faturado, retira a contribuição
+    antes e soma a nova depois, na mesma transação.
+    """
+    if pedido is None or pedido.pk is None or not contabilizado(pedido):
+        yield
+        return
+    with transaction.atomic():
+        atualizar_pedido(pedido, -1)
+        yield
+        atualizar_pedido(pedido, 1)
+
+
+def reconstruir(empresa=None, data_inicio=None, data_fim=None) -> int:
+    """
+    Recalcula o fato a partir dos pedidos (todo ou por empresa/período).
+    Devolve o número de linhas gravadas.
+    """
+    from .models import ItemPedidoVenda, PedidoVenda, VendaDiaria
+
+    pedidos = PedidoVenda.objects.filter(is_active=True, status=STATUS_CONTABILIZADO)
+    fato = VendaDiaria.objects.all()
+    if empresa is not None:
+        pedidos = pedidos.filter(loja__empresa=empresa)
+        fato = fato.filter(empresa=empresa)
+    if data_inicio:
+        pedidos = pedidos.filter(data_emissao__date__gte=data_inicio)
+        fato = fato.filter(data__gte=data_inicio)
+    if data_fim:
+        pedidos = pedidos.filter(data_emissao__date__lte=data_fim)
+        fato = fato.filter(data__lte=data_fim)
+
+    chave_pedido = {}
+    for pk, loja_id, empresa_id, data_emissao in pedidos.values_list(
+        'pk', 'loja_id', 'loja__empresa_id', 'data_emissao',
+    ).iterator(chunk_size=5000):
+        chave_pedido[pk] = (empresa_id, loja_id, data_venda(data_emissao))
+
+    # Agregado em Python: o dia local do pedido não depende do fuso do banco
+    linhas = defaultdict(lambda: [_ZERO_QTD, _ZERO_VALOR, _ZERO_VALOR, set()])
+    itens = ItemPedidoVenda.objects.filter(
+        is_active=True, pedido__in=pedidos,
+    ).values_list('pedido_id', 'produto_id', 'quantidade', 'total', 'desconto')
+    for pedido_id, produto_id, quantidade, total, desconto in itens.iterator(chunk_size=5000):
+        empresa_id, loja_id, data = chave_pedido[pedido_id]
+        for chave in ((empresa_id, loja_id, data, produto_id), (empresa_id, loja_id, data, None)):
+            linha = linhas[chave]
+            linha[0] += quantidade
+            linha[1] += total
+            linha[2] += desconto
+            linha[3].add(pedido_id)
+
+    with transaction.atomic():
+        fato.delete()
+        VendaDiaria.objects.bulk_create(
+            [
+                VendaDiaria(
+                    empresa_id=empresa_id,
+                    loja_id=loja_id,
+                    data=data,
+                    produto_id=produto_id,
+                    quantidade=quantidade,
+                    valor=valor,
+                    desconto=desconto,
+                    pedidos=len(ids),
+                )
+                for (empresa_id, loja_id, data, produto_id), (quantidade, valor, desconto, ids)
+                in linhas.items()
+            ],
+            batch_size=1000,
+        )
+    return len(linhas)
+
+
+# ---------------------------------------------------------------------------
+# Leitura (dashboard e PDV Móvel)
+# ---------------------------------------------------------------------------
+
+def fato_empresa(empresa):
+    """Linhas com vendas (pedidos > 0) da empresa."""
+    from .models import VendaDiaria
+
+    return VendaDiaria.objects.filter(empresa=empresa, pedidos__gt=0)
+
+
+def valor_por_dia(empresa, desde: date, incluir_abertos: bool = False) -> Dict[date, Decimal]:
+    """
+    Valor vendido por dia desde `desde`. incluir_abertos soma os pedidos ABERTO
+    (ainda não faturados, fora do fato), lidos dos pedidos.
+    """
+    from .models import PedidoVenda
+
+    valores = defaultdict(Decimal)
+    for data, valor in (
+        fato_empresa(empresa).filter(produto__isnull=True, data__gte=desde)
+        .values('data').annotate(total=Sum('valor')).values_list('data', 'total')
+    ):
+        valores[data] += valor
+    if incluir_abertos:
+        for data_emissao, valor in PedidoVenda.objects.filter(
+            is_active=True,
+            loja__empresa=empresa,
+            status='ABERTO',
+            data_emissao__date__gte=desde,
+        ).values_list('data_emissao', 'valor_total'):
+            valores[data_venda(data_emissao)] += valor
+    return dict(valores)
+
+
+def top_produtos(empresa=None, desde: Optional[date] = None, limite: int = 5,
+                 loja=None, incluir_abertos: bool = False) -> List[Dict]:
+    """
+    Produtos mais vendidos (quantidade) desde `desde`, da empresa ou da loja:
+    [{'produto_id', 'produto__descricao', 'quantidade'}].
+    """
+    from .models import ItemPedidoVenda, VendaDiaria
+
+    fato = VendaDiaria.objects.filter(pedidos__gt=0, produto__isnull=False)
+    itens_abertos = ItemPedidoVenda.objects.filter(
+        is_active=True, pedido__is_active=True, pedido__status='ABERTO',
+    )
+    if empresa is not None:
+        fato = fato.filter(empresa=empresa)
+        itens_abertos = itens_abertos.filter(pedido__loja__empresa=empresa)
+    if loja is not None:
+        fato = fato.filter(loja=loja)
+        itens_abertos = itens_abertos.filter(pedido__loja=loja)
+    if desde is not None:
+        fato = fato.filter(data__gte=desde)
+        itens_abertos = itens_abertos.filter(pedido__data_emissao__date__gte=desde)
+
+    abertos = {}
+    if incluir_abertos:
+        abertos = {
+            row['produto_id']: row
+            for row in itens_abertos.values('produto_id', 'produto__descricao')
+            .annotate(quantidade=Sum('quantidade')).order_by()
+        }
+
+    # Produtos com pedidos abertos primeiro (precisam do total faturado para somar),
+    # depois os `limite` mais vendidos entre os demais: o top final está nesse conjunto
+    prioridade = Case(
+        When(produto_id__in=list(abertos), then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    linhas = list(
+        fato.values('produto_id', 'produto__descricao')
+        .annotate(quantidade=Sum('quantidade'), prioridade=prioridade)
+        .order_by('prioridade', '-quantidade', 'produto_id')[:limite + len(abertos)]
+    )
+    totais = {row['produto_id']: row for row in linhas}
+    for produto_id, row in abertos.items():
+        if produto_id in totais:
+            totais[produto_id]['quantidade'] += row['quantidade']
+        else:
+            totais[produto_id] = row
+    ranking = sorted(totais.values(), key=lambda row: (-row['quantidade'], row['produto_id']))
+    return [
+        {'produto_id': row['produto_id'], 'produto__descricao': row['produto__descricao'],
+         'quantidade': row['quantidade']}
+        for row in ranking[:limite]
+    ]
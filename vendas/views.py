@@ -226,7 +226,6 @@ def relatorio_vendas_consolidado(request):
     empresa = get_empresa_ativa(request)
 
     form = RelatorioVendasForm(request.GET or None, empresa=empresa)
-    qs = reports.aplicar_filtros(reports.queryset_base_vendas(empresa), form)
 
     agrupar_por = "produto"
     ordenar_por = "-valor_total"
@@ -234,21 +233,41 @@ def relatorio_vendas_consolidado(request):
         agrupar_por = form.cleaned_data.get("agrupar_por") or "produto"
         ordenar_por = form.cleaned_data.get("ordenar_por") or "-valor_total"
 
-    dados_qs = reports.agregar(qs, agrupar_por=agrupar_por, ordenar_por=ordenar_por)
-    dados = list(dados_qs) if hasattr(dados_qs, "__iter__") else []
+    # Sem filtros fora de loja/dia/produto, lê o fato VendaDiaria em vez dos itens
+    if reports.pode_usar_venda_diaria(form, agrupar_por):
+        qs = reports.queryset_venda_diaria(empresa, form)
+    else:
+        qs = reports.aplicar_filtros(reports.queryset_base_vendas(empresa), form)
 
+    dados_qs = reports.agregar(qs, agrupar_por=agrupar_por, ordenar_por=ordenar_por)
     totais = reports.calcular_totais(qs)
+
+    # exportações em streaming: as linhas saem do cursor direto para a resposta
+    export = request.GET.get("export")
+    filtros_desc = request.GET.urlencode()
+    if export == "csv":
+        return reports.exportar_csv(
+            reports.COLUNAS_CONSOLIDADO, reports.linhas_consolidado(dados_qs), "relatorio_vendas.csv"
+        )
+    if export == "excel":
+        return reports.exportar_excel(dados_qs, totais, filtros_desc=filtros_desc)
+    if export in ("itens_csv", "itens_excel"):
+        # Um item por linha: sempre sobre ItemPedidoVenda, mesmo quando o
+        # consolidado usa o fato VendaDiaria
+        itens = reports.aplicar_filtros(reports.queryset_base_vendas(empresa), form)
+        if export == "itens_csv":
+            return reports.exportar_csv(
+                reports.COLUNAS_ITENS, reports.linhas_itens(itens), "relatorio_vendas_itens.csv"
+            )
+        return reports.exportar_excel_itens(itens, totais, filtros_desc=filtros_desc)
+
+    dados = list(dados_qs) if hasattr(dados_qs, "__iter__") else []
     produtos_top = reports.top_produtos(qs, limit=10)
 
     codigos_alt_info = []
     if form.is_valid() and form.cleaned_data.get("produto"):
         codigos_alt_info = reports.codigos_alternativos_info(form.cleaned_data["produto"].id)
 
-    # exportações
-    export = request.GET.get("export")
-    filtros_desc = request.GET.urlencode()
-    if export == "excel":
-        return reports.exportar_excel(dados, totais, filtros_desc=filtros_desc)
     if export == "pdf":
         return reports.exportar_pdf(
             request,
@@ -823,7 +842,7 @@ def buscar_clientes_rapido(request):
     ).filter(
         Q(nome_razao_social__icontains=termo) |
         Q(apelido_nome_fantasia__icontains=termo) |
-        Q(cpf_cnpj__icontains=termo) |
+        Q(cpf_cnpj__blind=termo) |
         Q(email__icontains=termo) |
         Q(telefone__icontains=termo)
     )[:10]